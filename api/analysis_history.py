@@ -0,0 +1,242 @@
+"""
+Per-user history of analysis results.
+
+Results are stored content-addressed: the canonical JSON of a result is
+hashed with SHA-256 and compressed with zlib (primed with a dictionary of
+the keys and phrases every analysis shares), and identical results are
+stored once no matter how many users or requests produced them. Each
+user's history is a time-ordered index of (id, url, created_at, hash)
+rows, paginated with an opaque cursor over the row id so every page is an
+index range scan.
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from shared_state import SQLiteState, state_dir
+
+logger = logging.getLogger(__name__)
+
+# Preset dictionaries for zlib. Payloads are small (a few KB) and mostly the
+# same keys and phrases, so priming the compressor shrinks them a lot.
+# A codec's dictionary never changes, so blobs stay readable; a new
+# dictionary gets a new codec name.
+# zlib-d2 is built from real analyze() results with `python analysis_history.py --build-dictionary`.
+DICTIONARY_V2_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_history_dict_v2.json')
+with open(DICTIONARY_V2_PATH, 'rb') as f:
+    ZDICT_V2 = f.read()
+CODECS = {'zlib-d2': ZDICT_V2}
+DEFAULT_CODEC = 'zlib-d2'
+# zlib only looks back 32 KB, so a larger dictionary is wasted
+MAX_DICTIONARY_BYTES = 32 * 1024
+# URLs whose analyses make up the v2 dictionary: each default industry,
+# an unclassified site and every business size
+SAMPLE_ANALYSES = [
+    ('https://www.example.com/skincare/organic-serum', 10),
+    ('https://shop.example.co.nz/beauty/moisturizer', None),
+    ('https://www.example.com/tech/cloud-software', 200),
+    ('https://example.io/saas/analytics-platform', 2000),
+    ('https://www.example.com/bakery/sourdough', 5),
+    ('https://www.example.de/garden/tools', 60),
+]
+
+
+def canonical_json(value: Any) -> bytes:
+    """Stable JSON encoding, so equal results hash the same."""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def compress(data: bytes, codec: str = DEFAULT_CODEC) -> bytes:
+    compressor = zlib.compressobj(level=9, zdict=CODECS[codec])
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    decompressor = zlib.decompressobj(zdict=CODECS[codec])
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def build_dictionary(results: List[Any], size: int = MAX_DICTIONARY_BYTES) -> bytes:
+    """
+    zlib preset dictionary from sample results: their canonical JSON,
+    joined and cut to the last size bytes. zlib codes matches against
+    nearby bytes more cheaply, so the samples listed last count most.
+    """
+    return b''.join(canonical_json(result) for result in results)[-size:]
+
+
+def encode_cursor(row_id: int) -> str:
+    return base64.urlsafe_b64encode(str(row_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    """Row id from a cursor; raises ValueError for malformed cursors."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+class AnalysisHistory(SQLiteState):
+    """
+    Compressed, deduplicated analysis results with a per-user time index.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            raw_size INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS analyses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL,
+            url TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            hash TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS analyses_email_id ON analyses (email, id);
+        CREATE INDEX IF NOT EXISTS analyses_hash ON analyses (hash);
+    """
+
+    # Trimming of old entries runs once every this many writes
+    trim_every = 100
+
+    def __init__(self, path: Optional[str] = None, max_per_user: int = 1000):
+        """
+        Args:
+            path: SQLite file, defaults to analysis_history.db in the shared state dir
+            max_per_user: Oldest entries beyond this many per user are dropped
+        """
+        super().__init__(path or os.path.join(state_dir(), 'analysis_history.db'))
+        self.max_per_user = max_per_user
+        self._writes = 0
+
+    def record(self, email: str, url: str, result: Any, created_at: Optional[float] = None) -> Dict:
+        """
+        Add a result to a user's history.
+
+        Returns:
+            Dict with id, hash and created_at of the new entry
+        """
+        data = canonical_json(result)
+        digest = hashlib.sha256(data).hexdigest()
+        created_at = time.time() if created_at is None else created_at
+        # One write transaction, so a trim() in another worker cannot drop the
+        # blob between the existence check and the index insert
+        with self._transaction() as conn:
+            if not conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone():
+                conn.execute(
+                    'INSERT INTO blobs (hash, codec, data, raw_size) VALUES (?, ?, ?, ?)',
+                    (digest, DEFAULT_CODEC, compress(data, DEFAULT_CODEC), len(data))
+                )
+            row_id = conn.execute(
+                'INSERT INTO analyses (email, url, created_at, hash) VALUES (?, ?, ?, ?)',
+                (email, url, created_at, digest)
+            ).lastrowid
+        self._writes += 1
+        if self._writes % self.trim_every == 0:
+            self.trim()
+        return {'id': row_id, 'hash': digest, 'created_at': created_at}
+
+    def page(self, email: str, cursor: Optional[str] = None, limit: int = 20,
+             include_results: bool = True) -> Dict:
+        """
+        One page of a user's history, newest first.
+
+        Args:
+            email: User whose history to read
+            cursor: next_cursor from the previous page, None for the first page
+            limit: Entries per page
+            include_results: Decompress and include each result
+
+        Returns:
+            Dict with analyses (id, url, created_at[, result]) and next_cursor (None on the last page)
+        """
+        before = decode_cursor(cursor) if cursor else None
+        conn = self._connection()
+        query = 'SELECT a.id, a.url, a.created_at, a.hash{} FROM analyses a {} WHERE a.email = ?{} ' \
+                'ORDER BY a.id DESC LIMIT ?'.format(
+                    ', b.codec, b.data' if include_results else '',
+                    'JOIN blobs b ON b.hash = a.hash' if include_results else '',
+                    ' AND a.id < ?' if before is not None else '')
+        params = [email] + ([before] if before is not None else []) + [limit + 1]
+        rows = conn.execute(query, params).fetchall()
+        analyses = []
+        for row in rows[:limit]:
+            entry = {'id': row[0], 'url': row[1], 'created_at': row[2], 'hash': row[3]}
+            if include_results:
+                entry['result'] = json.loads(decompress(row[5], row[4]))
+            analyses.append(entry)
+        next_cursor = encode_cursor(analyses[-1]['id']) if len(rows) > limit else None
+        return {'analyses': analyses, 'next_cursor': next_cursor}
+
+    def get(self, email: str, analysis_id: int) -> Optional[Any]:
+        """A single stored result, or None if the user has no such entry."""
+        row = self._connection().execute(
+            'SELECT b.codec, b.data FROM analyses a JOIN blobs b ON b.hash = a.hash '
+            'WHERE a.email = ? AND a.id = ?',
+            (email, analysis_id)
+        ).fetchone()
+        return json.loads(decompress(row[1], row[0])) if row else None
+
+    def trim(self):
+        """Drop entries beyond max_per_user for each user, then blobs nobody references."""
+        with self._transaction() as conn:
+            conn.execute(
+                'DELETE FROM analyses WHERE id IN ('
+                '  SELECT id FROM ('
+                '    SELECT id, ROW_NUMBER() OVER (PARTITION BY email ORDER BY id DESC) AS n FROM analyses'
+                '  ) WHERE n > ?'
+                ')',
+                (self.max_per_user,)
+            )
+            conn.execute('DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM analyses)')
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry and blob counts and storage sizes."""
+        conn = self._connection()
+        analyses = conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+        blobs, stored, raw = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(raw_size), 0) FROM blobs'
+        ).fetchone()
+        return {
+            'analyses': analyses,
+            'unique_results': blobs,
+            'stored_bytes': stored,
+            'raw_bytes': raw,
+            'bytes_per_analysis': round(stored / analyses, 1) if analyses else 0.0
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain the analysis history codecs.")
+    parser.add_argument("--build-dictionary", metavar="FILE", required=True,
+                        help="Write a zlib preset dictionary built from analyze() results of SAMPLE_ANALYSES")
+    parser.add_argument("--config", help="MarketingGeniusTool config to analyze with (default: built-in)")
+    args = parser.parse_args(argv)
+    if os.path.exists(args.build_dictionary):
+        # Stored blobs need their codec's exact dictionary
+        parser.error(f"{args.build_dictionary} exists; write a new file and register it under a new codec name")
+
+    from marketing_genius_tool import MarketingGeniusTool
+    tool = MarketingGeniusTool(args.config)
+    # Round trip through JSON, as the API serves and stores results
+    results = [json.loads(json.dumps(tool.analyze(url, employees))) for url, employees in SAMPLE_ANALYSES]
+    dictionary = build_dictionary(results)
+    with open(args.build_dictionary, 'wb') as f:
+        f.write(dictionary)
+    sizes = [(len(compress(canonical_json(r))), len(zlib.compress(canonical_json(r), 9)), len(canonical_json(r)))
+             for r in results]
+    print(f"Wrote {len(dictionary)} byte dictionary to {args.build_dictionary}")
+    for (url, _), (current, plain, raw) in zip(SAMPLE_ANALYSES, sizes):
+        print(f"{url}: {raw} bytes raw, zlib {plain}, current {DEFAULT_CODEC} {current}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+ASGI variant of the API for high-concurrency, I/O-bound traffic.
+
+Serve it with an async server, for example:
+
+    uvicorn asgi:app --app-dir api --workers 4
+
+Routes that mostly wait (PayPal checkout, analysis) are async handlers, so
+one worker can hold many in-flight requests without a thread each. The
+CPU-bound analysis pipeline runs in a bounded thread pool. Every other
+route is served by the Flask app in index.py through a WSGI adapter, so
+both variants share subscriptions, counters, caches and the
+MarketingGeniusTool instance.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import functools
+import os
+import secrets
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+import httpx
+import index
+from idempotency import IdempotencyError, request_fingerprint, upstream_request_id
+from outbound import OutboundUnavailable, current_timeout
+from single_flight import AsyncSingleFlight, SingleFlightTimeout
+
+def make_executor() -> ThreadPoolExecutor:
+    """Threads for CPU-bound analysis stages and blocking SQLite calls."""
+    return ThreadPoolExecutor(max_workers=int(os.getenv('ANALYZE_THREADS', 8)), thread_name_prefix='analyze')
+
+
+executor = make_executor()
+
+analysis_flight = AsyncSingleFlight()
+
+# The PayPal guard is shared with the Flask routes so both see one circuit breaker;
+# index configures it to treat httpx transport errors as failures too
+paypal = index.paypal
+
+http_client = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global executor, http_client
+    executor = make_executor()  # a fresh pool each startup, since shutdown below retires the old one
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=200, max_keepalive_connections=50))
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        executor.shutdown(wait=False)
+
+
+def error(message, status):
+    return JSONResponse({'error': message}, status_code=status)
+
+
+def paypal_unavailable(e):
+    """Response for requests that could not reach PayPal."""
+    print(f"PayPal unavailable: {e}")
+    response = error('Payment provider is temporarily unavailable, please try again shortly', 503)
+    response.headers['Retry-After'] = str(int(paypal.breaker.reset_timeout))
+    return response
+
+
+def paypal_request_id(request: Request):
+    """PayPal-Request-Id for this request: derived from its Idempotency-Key, random without one."""
+    key = request.headers.get('Idempotency-Key')
+    return upstream_request_id(request.url.path, key) if key else secrets.token_hex(16)
+
+
+def idempotent(endpoint):
+    """Run an endpoint at most once per Idempotency-Key, sharing the Flask routes' store."""
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return await endpoint(request)
+        rejected = index.check_idempotency_key(key)
+        if rejected:
+            return error(*rejected)
+        fingerprint = request_fingerprint(request.method, request.url.path, await request.body())
+        executed = []
+
+        async def handler():
+            response = await endpoint(request)
+            executed.append(response)
+            return response.status_code, response.body, response.headers.get('content-type')
+
+        try:
+            (status, body, content_type), replayed = await index.idempotency.run_async(
+                request.url.path, key, fingerprint, handler)
+        except IdempotencyError as e:
+            return error(str(e), e.status)
+        if executed:
+            return executed[0]
+        return Response(body, status_code=status, headers={'content-type': content_type,
+                                                           'Idempotent-Replayed': 'true'})
+    return wrapper
+
+
+async def analyze(request: Request):
+    """Analyze marketing data"""
+    try:
+        data = await request.json()
+        loop = asyncio.get_running_loop()
+        # Rate-limit and trial counters are SQLite writes that can wait on the lock: keep them off the loop
+        rejected = await loop.run_in_executor(executor, index.check_analyze_request, data)
+        if rejected:
+            return error(*rejected)
+
+        url = data.get('url')
+        employee_count = data.get('employee_count')
+        cache_key = index.analysis_cache_key(url, employee_count)
+
+        async def compute():
+            return await loop.run_in_executor(
+                executor,
+                index.result_cache.get_or_compute,
+                cache_key,
+                lambda: index.tool.analyze(url, employee_count)
+            )
+
+        (result, _), _ = await analysis_flight.do(cache_key, compute, timeout=index.ANALYZE_COALESCE_TIMEOUT)
+        await loop.run_in_executor(executor, index.record_analysis, data.get('email'), url, result)
+        return JSONResponse(result)
+    except SingleFlightTimeout:
+        return error('Analysis is taking longer than expected, please retry', 504)
+    except Exception as e:
+        print(f"Error analyzing data: {e}")
+        return error(str(e), 500)
+
+
+@idempotent
+async def create_subscription(request: Request):
+    """Create a PayPal billing subscription and return its approval URL."""
+    try:
+        data = await request.json()
+        email = data.get('email')
+        if not email:
+            return error('Email is required', 400)
+
+        base = index.PAYPAL_API_BASE
+        token_response = await paypal.call_async(lambda: http_client.post(
+            f'{base}/v1/oauth2/token',
+            headers={'Accept': 'application/json', 'Accept-Language': 'en_US'},
+            data={'grant_type': 'client_credentials'},
+            auth=(os.getenv('PAYPAL_CLIENT_ID') or '', os.getenv('PAYPAL_CLIENT_SECRET') or ''),
+            timeout=current_timeout()
+        ), idempotent=True)
+        access_token = token_response.json().get('access_token')
+        if not access_token:
+            return error('Could not get PayPal access token', 500)
+
+        sub_headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {access_token}',
+            # Lets PayPal deduplicate retried creates
+            'PayPal-Request-Id': paypal_request_id(request)
+        }
+        sub_response = await paypal.call_async(lambda: http_client.post(
+            f'{base}/v1/billing/subscriptions',
+            headers=sub_headers,
+            json=index.build_subscription_payload(email),
+            timeout=current_timeout()
+        ), idempotent=True)
+        sub_json = sub_response.json()
+        approval_url = index.find_approval_url(sub_json)
+        if approval_url:
+            return JSONResponse({'approval_url': approval_url})
+        return JSONResponse({'error': sub_json}, status_code=500)
+    except OutboundUnavailable as e:
+        return paypal_unavailable(e)
+    except Exception as e:
+        print(f"Error creating subscription: {e}")
+        return error(str(e), 500)
+
+
+async def cache_stats(request: Request):
+    """Report how much duplicate compute the shared result cache saved."""
+    stats = index.result_cache.stats()
+    stats['coalesced'] = analysis_flight.stats()
+    return JSONResponse(stats)
+
+
+async def outbound_metrics(request: Request):
+    """Circuit breaker state and latency of outbound calls."""
+    return JSONResponse(index.outbound_metrics_payload())
+
+
+async def health_check(request: Request):
+    """Health check endpoint."""
+    return JSONResponse(index.health_payload())
+
+
+class SecurityHeadersMiddleware:
+    """Adds the same security headers as the Flask app to async responses."""
+    def __init__(self, app):
+        self.app = app
+        self.headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in index.SECURITY_HEADERS.items()]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                existing = {name for name, _ in message.get('headers', [])}
+                message['headers'] = list(message.get('headers', [])) + [
+                    header for header in self.headers if header[0] not in existing
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+async_app = Starlette(
+    routes=[
+        Route('/api/analyze', analyze, methods=['POST']),
+        Route('/api/create-subscription', create_subscription, methods=['POST']),
+        Route('/api/cache/stats', cache_stats),
+        Route('/api/metrics/outbound', outbound_metrics),
+        Route('/health', health_check)
+    ],
+    middleware=[
+        Middleware(SecurityHeadersMiddleware),
+        Middleware(CORSMiddleware, allow_origins=index.CORS_ORIGINS, allow_methods=['GET', 'POST'],
+                   allow_headers=['Content-Type', 'Idempotency-Key'])
+    ],
+    lifespan=lifespan
+)
+
+ASYNC_PATHS = frozenset(route.path for route in async_app.routes)
+
+# Flask already applies its own CORS and security headers
+flask_app = WSGIMiddleware(index.app, workers=int(os.getenv('WSGI_THREADS', 10)))
+
+
+async def app(scope, receive, send):
+    """Dispatch async routes to Starlette and everything else to the Flask app."""
+    if scope['type'] == 'http' and scope['path'] not in ASYNC_PATHS:
+        return await flask_app(scope, receive, send)
+    return await async_app(scope, receive, send)
@@ -0,0 +1,219 @@
+"""
+Audience size estimates over a local demographic and interest dataset.
+
+Each dataset row is a demographic cell: an age, a geo and a set of
+interests, with the number of people in it. Rows are sorted by age when
+the dataset is built, so any age range is a contiguous slice found with
+two binary searches. Columns are flat binary files read through np.memmap;
+interests are stored as one packed bitmap per interest. Sizing an audience
+ORs the bitmaps of its interests over the age slice, ANDs an equality mask
+on the geo column and sums the people counts left, touching only the pages
+inside the slice.
+
+Estimates are memoized per normalized targeting signature (age range,
+known interests, geo), so repeated campaigns for the same industry cost a
+dict lookup.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from functools import lru_cache
+import argparse
+import json
+import logging
+import os
+import numpy as np
+from record_files import read_records
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    "age": np.uint8,
+    "geo": np.uint16,    # code into geos
+    "count": np.uint32   # people in the cell
+}
+ANY_GEO = ("", "default", "all")
+
+# (age_min, age_max, sorted known interests, geo or None)
+Signature = Tuple[int, int, Tuple[str, ...], Optional[str]]
+
+
+class AudienceDataset:
+    def __init__(self, directory: str):
+        """
+        Open a dataset written by AudienceDataset.build.
+
+        Args:
+            directory: Holds one <column>.bin file per column, interests.bin and meta.json
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.rows: int = meta["rows"]
+        self.geos: List[str] = meta["geos"]
+        self.interests: List[str] = meta["interests"]
+        self.geo_codes = {geo: i for i, geo in enumerate(self.geos)}
+        self.interest_codes = {interest: i for i, interest in enumerate(self.interests)}
+        self.row_bytes = (self.rows + 7) // 8
+        if self.rows:
+            self.columns = {name: np.memmap(self._path(directory, name), dtype=dtype, mode="r", shape=(self.rows,))
+                            for name, dtype in COLUMNS.items()}
+            self.bitmaps = np.memmap(os.path.join(directory, "interests.bin"), dtype=np.uint8, mode="r",
+                                     shape=(len(self.interests), self.row_bytes))
+        else:
+            self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+            self.bitmaps = np.zeros((len(self.interests), 0), dtype=np.uint8)
+        self.population = int(self.columns["count"].sum(dtype=np.uint64))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @staticmethod
+    def _path(directory: str, column: str) -> str:
+        return os.path.join(directory, f"{column}.bin")
+
+    @classmethod
+    def build(cls, directory: str, records: Iterable[Dict]) -> "AudienceDataset":
+        """
+        Write a dataset from records with age, geo, interests (a list, or a
+        string separated by ";" or ",") and count (people, default 1).
+        Replaces any dataset already in directory.
+        """
+        ages, geos, interest_lists, counts = [], [], [], []
+        for record in records:
+            interests = record.get("interests") or []
+            if isinstance(interests, str):
+                interests = interests.replace(";", ",").split(",")
+            ages.append(int(record["age"]))
+            geos.append(str(record.get("geo") or "").upper())
+            interest_lists.append({interest.strip().lower() for interest in interests if interest.strip()})
+            counts.append(1 if record.get("count") in (None, "") else int(record["count"]))
+
+        order = np.argsort(np.asarray(ages, dtype=np.int64), kind="stable")
+        geo_names = sorted(set(geos))
+        interest_names = sorted(set().union(*interest_lists))
+        geo_codes = {geo: i for i, geo in enumerate(geo_names)}
+        interest_codes = {interest: i for i, interest in enumerate(interest_names)}
+        rows = len(order)
+
+        columns = {
+            "age": np.asarray(ages, dtype=np.int64)[order].clip(0, 255).astype(COLUMNS["age"]),
+            "geo": np.asarray([geo_codes[geo] for geo in geos], dtype=COLUMNS["geo"])[order],
+            "count": np.asarray(counts, dtype=COLUMNS["count"])[order]
+        }
+        # Set one bit per (interest, cell), at the cell's position after sorting
+        position = np.empty(rows, dtype=np.int64)
+        position[order] = np.arange(rows)
+        sources = [source for source, interests in enumerate(interest_lists) for _ in interests]
+        codes = [interest_codes[interest] for interests in interest_lists for interest in interests]
+        bits = np.zeros((len(interest_names), rows), dtype=bool)
+        bits[np.asarray(codes, dtype=np.int64), position[np.asarray(sources, dtype=np.int64)]] = True
+
+        os.makedirs(directory, exist_ok=True)
+        for name, values in columns.items():
+            values.tofile(cls._path(directory, name))
+        np.packbits(bits, axis=1).tofile(os.path.join(directory, "interests.bin"))
+        tmp = os.path.join(directory, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"rows": rows, "geos": geo_names, "interests": interest_names}, f)
+        os.replace(tmp, os.path.join(directory, "meta.json"))
+        logger.info(f"Built audience dataset with {rows} cells, {len(interest_names)} interests, {len(geo_names)} geos")
+        return cls(directory)
+
+    def signature(self, age_range: Sequence[int], interests: Iterable[str] = (), geo: Optional[str] = None) -> Signature:
+        """
+        Normalized targeting: interests the dataset does not know are dropped
+        and any-geo values ("default", "", None) become None.
+        """
+        age_min, age_max = int(age_range[0]), int(age_range[1])
+        known = tuple(sorted({interest.strip().lower() for interest in interests} & self.interest_codes.keys()))
+        geo = None if geo is None or geo.strip().lower() in ANY_GEO else geo.strip().upper()
+        return age_min, age_max, known, geo
+
+    def count(self, signature: Signature) -> int:
+        """
+        People in the age range who have any of the interests (everyone when
+        there are none) in the geo (everywhere when None).
+        """
+        age_min, age_max, interests, geo = signature
+        ages = self.columns["age"]
+        if age_min > age_max or age_max < 0 or age_min > 255:
+            return 0
+        start = int(np.searchsorted(ages, max(age_min, 0), side="left"))
+        end = int(np.searchsorted(ages, min(age_max, 255), side="right"))
+        if start >= end:
+            return 0
+
+        mask = None
+        if interests:
+            # Whole bytes covering [start, end), then trim to the slice
+            first, last = start // 8, (end + 7) // 8
+            codes = [self.interest_codes[interest] for interest in interests]
+            packed = np.bitwise_or.reduce(self.bitmaps[codes, first:last], axis=0)
+            mask = np.unpackbits(packed)[start - first * 8:end - first * 8].view(bool)
+        if geo is not None:
+            code = self.geo_codes.get(geo)
+            if code is None:
+                return 0
+            in_geo = self.columns["geo"][start:end] == code
+            mask = in_geo if mask is None else mask & in_geo
+
+        counts = self.columns["count"][start:end]
+        return int((counts if mask is None else counts[mask]).sum(dtype=np.uint64))
+
+
+class ReachEstimator:
+    def __init__(self, dataset: AudienceDataset, cache_size: int = 4096):
+        """
+        Args:
+            dataset: Demographic dataset to size audiences against
+            cache_size: Targeting signatures whose estimate is memoized
+        """
+        self.dataset = dataset
+        self._count = lru_cache(maxsize=cache_size)(dataset.count)
+
+    @classmethod
+    def load(cls, directory: str, cache_size: int = 4096) -> "ReachEstimator":
+        return cls(AudienceDataset(directory), cache_size)
+
+    def estimate(self, age_range: Sequence[int], interests: Iterable[str] = (),
+                 geo: Optional[str] = None) -> Dict:
+        """
+        Audience size for a campaign's targeting.
+
+        Returns:
+            Dict with audience_size (people), share (of the dataset population)
+            and matched_interests (the interests the dataset knows)
+        """
+        signature = self.dataset.signature(age_range, interests, geo)
+        size = self._count(signature)
+        population = self.dataset.population
+        return {
+            "audience_size": size,
+            "share": round(size / population, 4) if population else 0.0,
+            "matched_interests": list(signature[2])
+        }
+
+    def cache_info(self):
+        return self._count.cache_info()
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Build an audience dataset and estimate reach.")
+    parser.add_argument("dataset", help="Dataset directory")
+    parser.add_argument("--build", help="CSV or JSONL file of cells (age, geo, interests, count) to build from")
+    parser.add_argument("--age", default="18-65", help="Age range, e.g. 25-34")
+    parser.add_argument("--interests", default="", help="Comma-separated interests")
+    parser.add_argument("--geo", help="Geo code, e.g. NZ")
+    args = parser.parse_args(argv)
+
+    if args.build:
+        dataset = AudienceDataset.build(args.dataset, read_records(args.build))
+    else:
+        dataset = AudienceDataset(args.dataset)
+    age_min, _, age_max = args.age.partition("-")
+    estimate = ReachEstimator(dataset).estimate(
+        (int(age_min), int(age_max or age_min)), [i for i in args.interests.split(",") if i], args.geo)
+    print(json.dumps(estimate))
+
+
+if __name__ == "__main__":
+    main()
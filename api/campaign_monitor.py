@@ -0,0 +1,334 @@
+"""
+Streaming campaign monitor.
+
+Consumes impression, click and conversion events and keeps rolling-window
+aggregates per (campaign, channel) in constant memory: a ring buffer of
+per-bucket counters plus running window totals, and an EWMA mean/variance
+of each closed bucket's CTR and CPC. When a bucket closes the window is
+checked against the same CPC/CTR thresholds monitor_campaign uses, and the
+bucket's metrics are checked against their EWMA for statistical anomalies.
+
+Recording an event is a dict lookup and a few list updates; all alert
+logic runs once per closed bucket.
+"""
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+import argparse
+import json
+import logging
+import math
+import time
+from record_files import read_records
+
+logger = logging.getLogger(__name__)
+
+# Thresholds shared with MarketingGeniusTool.monitor_campaign
+CPC_ALERT_THRESHOLD = 1.2
+CTR_ALERT_THRESHOLD = 2.0
+HIGH_CPC_MESSAGE = "Warning: High cost-per-click detected."
+LOW_CTR_MESSAGE = "Warning: Low click-through rate detected."
+
+# Smallest deviation, relative to the EWMA mean, used when computing z-scores
+MIN_RELATIVE_DEVIATION = 0.01
+
+IMPRESSION, CLICK, CONVERSION = 0, 1, 2
+EVENT_KINDS = {"impression": IMPRESSION, "click": CLICK, "conversion": CONVERSION}
+
+
+class Stream:
+    """Rolling aggregates for one (campaign, channel)."""
+
+    __slots__ = ("bucket", "impressions", "clicks", "conversions", "cost",
+                 "totals", "current", "ewma", "breaches")
+
+    def __init__(self, buckets: int):
+        self.bucket: Optional[int] = None
+        self.impressions = [0] * buckets
+        self.clicks = [0] * buckets
+        self.conversions = [0] * buckets
+        self.cost = [0.0] * buckets
+        # Window totals: impressions, clicks, conversions, cost
+        self.totals = [0, 0, 0, 0.0]
+        # Counters for the bucket being filled
+        self.current = [0, 0, 0, 0.0]
+        # metric -> [mean, variance, samples]
+        self.ewma: Dict[str, List[float]] = {}
+        self.breaches: set = set()
+
+    def window(self) -> Dict:
+        impressions, clicks, conversions, cost = self.totals
+        return {
+            "impressions": impressions,
+            "clicks": clicks,
+            "conversions": conversions,
+            "cost": round(cost, 2),
+            "CTR": round(clicks / impressions * 100, 2) if impressions else 0.0,
+            "CPC": round(cost / clicks, 2) if clicks else 0.0,
+            "CVR": round(conversions / clicks * 100, 2) if clicks else 0.0
+        }
+
+
+class CampaignMonitor:
+    def __init__(self, window_seconds: int = 3600, bucket_seconds: int = 60,
+                 cpc_threshold: float = CPC_ALERT_THRESHOLD, ctr_threshold: float = CTR_ALERT_THRESHOLD,
+                 min_impressions: int = 1000, min_bucket_impressions: int = 100,
+                 alpha: float = 0.1, z_threshold: float = 4.0, warmup: int = 10,
+                 on_alert: Optional[Callable[[Dict], None]] = None, max_alerts: int = 1000,
+                 max_skew: float = 300.0):
+        """
+        Args:
+            window_seconds: Length of the rolling window
+            bucket_seconds: Resolution of the ring buffer; alerts are evaluated per bucket
+            cpc_threshold: Alert when window CPC rises above this
+            ctr_threshold: Alert when window CTR (%) drops below this
+            min_impressions: Window impressions needed before threshold checks run
+            min_bucket_impressions: Bucket impressions needed before it feeds the EWMA
+            alpha: EWMA smoothing factor
+            z_threshold: Deviations from the EWMA mean that count as an anomaly
+            warmup: Buckets observed before anomaly checks run
+            on_alert: Called with each alert as it is raised
+            max_alerts: Most recent alerts kept in self.alerts
+            max_skew: Seconds an event may be stamped ahead of the clock; later
+                timestamps are clamped so one bad clock cannot push a stream's
+                buckets into the future
+        """
+        self.bucket_seconds = bucket_seconds
+        self.buckets = max(1, window_seconds // bucket_seconds)
+        self.cpc_threshold = cpc_threshold
+        self.ctr_threshold = ctr_threshold
+        self.min_impressions = min_impressions
+        self.min_bucket_impressions = min_bucket_impressions
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.on_alert = on_alert
+        self.streams: Dict[Tuple[str, str], Stream] = {}
+        self.alerts: Deque[Dict] = deque(maxlen=max_alerts)
+        self.alert_count = 0
+        self.max_skew = max_skew
+        self._horizon = 0.0
+        self._raised: Optional[List[Dict]] = None
+        self.events = 0
+
+    def record(self, timestamp: float, campaign: str, channel: str, kind: int, cost: float = 0.0):
+        """
+        Record one event.
+
+        Args:
+            timestamp: Epoch seconds
+            campaign: Campaign identifier
+            channel: Channel name
+            kind: IMPRESSION, CLICK or CONVERSION
+            cost: Spend attributed to the event (usually on clicks)
+        """
+        key = (campaign, channel)
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = self.streams[key] = Stream(self.buckets)
+        bucket = int(timestamp // self.bucket_seconds)
+        if bucket != stream.bucket:
+            if timestamp > self._horizon:
+                # Only timestamps past the last clock reading pay for a new one
+                self._horizon = time.time() + self.max_skew
+                if timestamp > self._horizon:
+                    bucket = int(self._horizon // self.bucket_seconds)
+            if stream.bucket is None:
+                stream.bucket = bucket
+            elif bucket > stream.bucket:
+                self._advance(key, stream, bucket)
+            # Late events land in the current bucket
+        current = stream.current
+        current[kind] += 1
+        if cost:
+            current[3] += cost
+        self.events += 1
+
+    def process(self, events: Iterable[Tuple]) -> List[Dict]:
+        """
+        Record (timestamp, campaign, channel, kind[, cost]) events.
+        kind may be an event name or one of IMPRESSION/CLICK/CONVERSION.
+
+        Returns:
+            Alerts raised while processing
+        """
+        self._raised = raised = []
+        record = self.record
+        kinds = EVENT_KINDS
+        try:
+            for event in events:
+                kind = event[3]
+                record(event[0], event[1], event[2], kinds[kind] if kind.__class__ is str else kind,
+                       event[4] if len(event) > 4 else 0.0)
+        finally:
+            self._raised = None
+        return raised
+
+    def flush(self, now: Optional[float] = None) -> List[Dict]:
+        """Close the current bucket of every stream, as if time had moved to now."""
+        self._raised = raised = []
+        try:
+            for key, stream in self.streams.items():
+                if stream.bucket is None:
+                    continue
+                bucket = int(now // self.bucket_seconds) if now is not None else stream.bucket + 1
+                if bucket > stream.bucket:
+                    self._advance(key, stream, bucket)
+        finally:
+            self._raised = None
+        return raised
+
+    def window(self, campaign: str, channel: str) -> Dict:
+        """Rolling-window metrics for a campaign and channel (closed buckets only)."""
+        stream = self.streams.get((campaign, channel))
+        return stream.window() if stream else Stream(1).window()
+
+    def _advance(self, key: Tuple[str, str], stream: Stream, bucket: int):
+        """Move a stream's current bucket into the ring and step forward to bucket."""
+        n = self.buckets
+        totals = stream.totals
+        self._close(key, stream, stream.bucket)
+        # Buckets skipped with no events are empty; more than a window of them clears the ring
+        steps = min(bucket - stream.bucket, n + 1)
+        for b in range(stream.bucket + 1, stream.bucket + steps):
+            self._store(stream, b % n, 0, 0, 0, 0.0)
+        stream.bucket = bucket
+        stream.current = [0, 0, 0, 0.0]
+        if totals[0] == 0:
+            totals[3] = 0.0  # drop float drift once the window is empty
+
+    def _store(self, stream: Stream, slot: int, impressions: int, clicks: int, conversions: int, cost: float):
+        totals = stream.totals
+        totals[0] += impressions - stream.impressions[slot]
+        totals[1] += clicks - stream.clicks[slot]
+        totals[2] += conversions - stream.conversions[slot]
+        totals[3] += cost - stream.cost[slot]
+        stream.impressions[slot] = impressions
+        stream.clicks[slot] = clicks
+        stream.conversions[slot] = conversions
+        stream.cost[slot] = cost
+
+    def _close(self, key: Tuple[str, str], stream: Stream, bucket: int):
+        impressions, clicks, conversions, cost = stream.current
+        self._store(stream, bucket % self.buckets, impressions, clicks, conversions, cost)
+        when = (bucket + 1) * self.bucket_seconds
+        self._check_thresholds(key, stream, when)
+        if impressions >= self.min_bucket_impressions:
+            self._check_anomaly(key, stream, "CTR", clicks / impressions * 100, when)
+            if clicks:
+                self._check_anomaly(key, stream, "CPC", cost / clicks, when)
+
+    def _check_thresholds(self, key: Tuple[str, str], stream: Stream, when: int):
+        impressions, clicks, _, cost = stream.totals
+        checks = []
+        if impressions >= self.min_impressions:
+            ctr = clicks / impressions * 100
+            checks.append(("CTR", ctr < self.ctr_threshold, ctr, LOW_CTR_MESSAGE))
+        if clicks:
+            cpc = cost / clicks
+            checks.append(("CPC", cpc > self.cpc_threshold, cpc, HIGH_CPC_MESSAGE))
+        for metric, breached, value, message in checks:
+            # Alert when a breach starts, not on every bucket while it lasts
+            if breached and metric not in stream.breaches:
+                stream.breaches.add(metric)
+                self._alert(key, when, "threshold", metric, value, message)
+            elif not breached:
+                stream.breaches.discard(metric)
+
+    def _check_anomaly(self, key: Tuple[str, str], stream: Stream, metric: str, value: float, when: int):
+        state = stream.ewma.get(metric)
+        if state is None:
+            stream.ewma[metric] = [value, 0.0, 1]
+            return
+        mean, variance, samples = state
+        if samples >= self.warmup:
+            # Floor the deviation so a perfectly steady metric does not alert on float noise
+            z = (value - mean) / max(math.sqrt(variance), MIN_RELATIVE_DEVIATION * abs(mean), 1e-9)
+            if abs(z) >= self.z_threshold:
+                direction = "spike" if z > 0 else "drop"
+                self._alert(key, when, "anomaly", metric, value,
+                            f"Anomaly: {metric} {direction} ({value:.2f} vs typical {mean:.2f}).",
+                            z=round(z, 2))
+        diff = value - mean
+        increment = self.alpha * diff
+        state[0] = mean + increment
+        state[1] = (1 - self.alpha) * (variance + diff * increment)
+        state[2] = samples + 1
+
+    def _alert(self, key: Tuple[str, str], when: int, kind: str, metric: str, value: float, message: str, **extra):
+        alert = {
+            "campaign": key[0],
+            "channel": key[1],
+            "time": when,
+            "type": kind,
+            "metric": metric,
+            "value": round(value, 2),
+            "message": message,
+            **extra
+        }
+        self.alerts.append(alert)
+        self.alert_count += 1
+        if self._raised is not None:
+            self._raised.append(alert)
+        if self.on_alert:
+            self.on_alert(alert)
+
+
+def read_events(path: str) -> Iterator[Tuple]:
+    """
+    Read recorded events from a CSV or JSONL log.
+    Rows need timestamp, campaign, channel and type; cost is optional.
+    """
+    for row in read_records(path):
+        yield (float(row["timestamp"]), row["campaign"], row["channel"],
+               EVENT_KINDS[row["type"]], float(row.get("cost") or 0.0))
+
+
+def replay(paths: Iterable[str], monitor: CampaignMonitor, speed: float = 0.0) -> Dict:
+    """
+    Feed recorded logs through a monitor.
+
+    Args:
+        paths: CSV or JSONL event logs, in time order
+        monitor: Monitor to feed
+        speed: Playback speed relative to the recorded timestamps; 0 replays as fast as possible
+
+    Returns:
+        Events replayed, elapsed seconds, events per second and alerts raised
+    """
+    start = time.perf_counter()
+    first_ts = None
+    for path in paths:
+        for event in read_events(path):
+            if speed > 0:
+                if first_ts is None:
+                    first_ts = event[0]
+                delay = (event[0] - first_ts) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            monitor.record(*event)
+    monitor.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        "events": monitor.events,
+        "seconds": round(elapsed, 3),
+        "events_per_second": round(monitor.events / elapsed) if elapsed else 0,
+        "alerts": monitor.alert_count
+    }
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay recorded campaign events through the streaming monitor.")
+    parser.add_argument("logs", nargs="+", help="CSV or JSONL event logs, in time order")
+    parser.add_argument("--speed", type=float, default=0.0, help="Playback speed; 0 replays as fast as possible")
+    parser.add_argument("--window", type=int, default=3600, help="Rolling window in seconds")
+    parser.add_argument("--bucket", type=int, default=60, help="Bucket size in seconds")
+    args = parser.parse_args(argv)
+
+    monitor = CampaignMonitor(window_seconds=args.window, bucket_seconds=args.bucket,
+                              on_alert=lambda alert: print(json.dumps(alert)))
+    summary = replay(args.logs, monitor, args.speed)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Trend-aware content strategy from per-format CTR history.
+
+Each content format (video, carousel, static, ...) keeps O(1) running
+statistics: Welford's mean and variance of CTR, plus an exponentially
+smoothed level and trend (Holt's linear method). Formats are ranked by
+expected lift: the forecast CTR for the next period minus the average
+across formats. Each lift carries the probability that it is positive,
+from a normal approximation on the standard error of the format's mean.
+
+Live impression and click counts are folded into CTR data points by
+observe(): each format's counts accumulate until they cover `window`
+impressions, which then become one observation.
+"""
+from typing import Dict, Iterable, List, Union
+import math
+
+# Below this confidence a format is reported as inconclusive rather than recommended
+MIN_CONFIDENCE = 0.8
+
+
+def parse_ctr(value: Union[str, float, int]) -> float:
+    """CTR in percent from "2.5%", "2.5" or 2.5."""
+    return float(str(value).strip().rstrip("%"))
+
+
+class FormatStats:
+    """Running CTR statistics for one content format, updated in O(1)."""
+
+    __slots__ = ("n", "mean", "m2", "level", "trend", "alpha", "beta")
+
+    def __init__(self, alpha: float = 0.3, beta: float = 0.2):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.level = 0.0
+        self.trend = 0.0
+        self.alpha = alpha
+        self.beta = beta
+
+    def update(self, ctr: float):
+        self.n += 1
+        # Welford
+        delta = ctr - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (ctr - self.mean)
+        # Holt: exponentially smoothed level and per-period trend
+        if self.n == 1:
+            self.level = ctr
+            return
+        previous = self.level
+        self.level = self.alpha * ctr + (1 - self.alpha) * (self.level + self.trend)
+        self.trend = self.beta * (self.level - previous) + (1 - self.beta) * self.trend
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    def forecast(self, periods: int = 1) -> float:
+        """Expected CTR `periods` data points ahead."""
+        return max(self.level + periods * self.trend, 0.0)
+
+
+class ContentStrategy:
+    def __init__(self, alpha: float = 0.3, beta: float = 0.2, horizon: int = 1, window: int = 1000):
+        """
+        Args:
+            alpha: Level smoothing factor
+            beta: Trend smoothing factor
+            horizon: Periods ahead to forecast when ranking
+            window: Impressions per CTR observation built by observe()
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.horizon = horizon
+        self.window = window
+        self.formats: Dict[str, FormatStats] = {}
+        # Impressions and clicks per format not yet folded into an observation
+        self.pending: Dict[str, List[int]] = {}
+
+    def update(self, content_format: str, ctr: Union[str, float]):
+        """Add one CTR observation (percent) for a format."""
+        stats = self.formats.get(content_format)
+        if stats is None:
+            stats = self.formats[content_format] = FormatStats(self.alpha, self.beta)
+        stats.update(parse_ctr(ctr))
+
+    def observe(self, content_format: str, impressions: int = 0, clicks: int = 0):
+        """Count impressions and clicks for a format; every `window` impressions become one CTR observation."""
+        counts = self.pending.setdefault(content_format, [0, 0])
+        counts[0] += impressions
+        counts[1] += clicks
+        if counts[0] >= self.window:
+            self.update(content_format, 100.0 * min(counts[1], counts[0]) / counts[0])
+            del self.pending[content_format]
+
+    def update_many(self, history: Dict[str, Iterable[Union[str, float]]]):
+        """Add CTR series per format, oldest first."""
+        for content_format, series in history.items():
+            for ctr in series:
+                self.update(content_format, ctr)
+
+    def rank(self) -> List[Dict]:
+        """
+        Rank formats by expected lift over the average across formats.
+
+        Returns:
+            Dicts with format, observations, mean_ctr, trend, expected_ctr,
+            lift (percentage points) and confidence that the lift is positive,
+            best first
+        """
+        if not self.formats:
+            return []
+        forecasts = {name: stats.forecast(self.horizon) for name, stats in self.formats.items()}
+        baseline = sum(forecasts.values()) / len(forecasts)
+        ranked = []
+        for name, stats in self.formats.items():
+            lift = forecasts[name] - baseline
+            standard_error = math.sqrt(stats.variance / stats.n) if stats.n > 1 else float("inf")
+            if standard_error == 0:
+                confidence = 1.0 if lift > 0 else 0.0 if lift < 0 else 0.5
+            else:
+                confidence = 0.5 * (1 + math.erf(lift / standard_error / math.sqrt(2)))
+            ranked.append({
+                "format": name,
+                "observations": stats.n,
+                "mean_ctr": round(stats.mean, 2),
+                "trend": round(stats.trend, 3),
+                "expected_ctr": round(forecasts[name], 2),
+                "lift": round(lift, 2),
+                "confidence": round(confidence, 3)
+            })
+        ranked.sort(key=lambda row: (row["lift"], row["confidence"]), reverse=True)
+        return ranked
+
+    def recommendations(self, min_confidence: float = MIN_CONFIDENCE) -> List[str]:
+        """Human-readable recommendations from rank()."""
+        ranked = self.rank()
+        if not ranked:
+            return []
+        tips = []
+        best = ranked[0]
+        if best["lift"] > 0 and best["confidence"] >= min_confidence:
+            tips.append(f"Prioritize {best['format']} posts next: expected CTR {best['expected_ctr']}% "
+                        f"(+{best['lift']} pts vs average, {best['confidence']:.0%} confidence).")
+        else:
+            tips.append(f"No format clearly leads yet; keep testing {', '.join(r['format'] for r in ranked)}.")
+        for row in ranked[1:]:
+            if row["lift"] < 0 and 1 - row["confidence"] >= min_confidence:
+                tips.append(f"Scale back {row['format']} posts: expected CTR {row['expected_ctr']}% "
+                            f"({row['lift']} pts vs average).")
+        for row in ranked:
+            if row["trend"] > 0 and row["observations"] >= 3 and row is not best:
+                tips.append(f"{row['format'].capitalize()} CTR is trending up ({row['trend']:+} pts per period).")
+        return tips
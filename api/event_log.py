@@ -0,0 +1,418 @@
+"""
+Durable ingest of impression, click and conversion events.
+
+Batches of events arrive as NDJSON. Each line is validated and normalized
+to one compact JSON line, and the batch is appended to the active segment
+of an append-only log. Appends use group commit: concurrent callers queue
+their batches, one of them writes everything queued with a single write()
+and a single fsync, and all of them return once that fsync is done. When
+append returns, the batch is on disk. A busy worker pays for one fsync per
+group rather than one per request.
+
+Every process writes its own segment, named events-<start>-<pid>.open. A
+segment is sealed by renaming it to .log once it reaches segment_bytes or
+segment_seconds. Compaction folds sealed segments, plus open segments
+left by processes that no longer exist, into the RoiStore. It aggregates
+events into one spend/conversions/revenue row per (day, channel,
+campaign) and then deletes the segments. The compactor writes an intent
+file before appending to the store and recovers from it after a crash, so
+every segment is counted exactly once.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict
+import argparse
+import fcntl
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+import numpy as np
+from roi_analytics import RoiStore, fsync_directory
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("impression", "click", "conversion")
+MAX_FIELD_LENGTH = 200
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".log"
+INTENT_FILE = "compaction.json"
+LOCK_FILE = "compaction.lock"
+
+
+class EventError(ValueError):
+    """Raised for an event that fails validation."""
+
+
+def validate_event(event, now: float) -> Dict:
+    """
+    Normalized copy of one event.
+
+    Events have type ("impression", "click" or "conversion"), campaign and
+    channel, and optionally timestamp (epoch seconds, default now), cost,
+    revenue, format (the content format of the post, e.g. "video"),
+    experiment and variant (an A/B test variant id).
+    """
+    if not isinstance(event, dict):
+        raise EventError("event must be an object")
+    kind = event.get("type")
+    if kind not in EVENT_TYPES:
+        raise EventError(f"type must be one of {EVENT_TYPES}")
+    normalized = {"type": kind}
+    for field in ("campaign", "channel"):
+        value = event.get(field)
+        if not isinstance(value, str) or not 0 < len(value) <= MAX_FIELD_LENGTH:
+            raise EventError(f"{field} must be a string of 1 to {MAX_FIELD_LENGTH} characters")
+        normalized[field] = value
+    timestamp = event.get("timestamp", now)
+    if timestamp.__class__ not in (int, float) or not 0 < timestamp < now + 86400:
+        raise EventError("timestamp must be epoch seconds, at most a day ahead")
+    normalized["timestamp"] = timestamp
+    for field in ("cost", "revenue"):
+        value = event.get(field)
+        if value is not None:
+            if value.__class__ not in (int, float) or not 0 <= value < math.inf:
+                raise EventError(f"{field} must be a non-negative number")
+            normalized[field] = value
+    content_format = event.get("format")
+    if content_format is not None:
+        if not isinstance(content_format, str) or not 0 < len(content_format) <= MAX_FIELD_LENGTH:
+            raise EventError(f"format must be a string of 1 to {MAX_FIELD_LENGTH} characters")
+        normalized["format"] = content_format
+    experiment = event.get("experiment")
+    if experiment is not None:
+        variant = event.get("variant")
+        if not isinstance(experiment, str) or not 0 < len(experiment) <= MAX_FIELD_LENGTH:
+            raise EventError(f"experiment must be a string of 1 to {MAX_FIELD_LENGTH} characters")
+        if variant.__class__ is not int or variant < 0:
+            raise EventError("variant must be a non-negative integer")
+        normalized["experiment"] = experiment
+        normalized["variant"] = variant
+    return normalized
+
+
+def parse_events(body: bytes, now: Optional[float] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Validate an NDJSON batch.
+
+    Returns:
+        Tuple of (valid events, rejections as {"line": n, "error": message}),
+        lines numbered from 1; blank lines are skipped
+    """
+    now = time.time() if now is None else now
+    events, rejected = [], []
+    loads = json.loads
+    for number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            events.append(validate_event(loads(line), now))
+        except (EventError, ValueError) as e:
+            rejected.append({"line": number, "error": str(e)})
+    return events, rejected
+
+
+class _Batch:
+    __slots__ = ("data", "events", "done", "error")
+
+    def __init__(self, data: bytes, events: int):
+        self.data = data
+        self.events = events
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class EventLog:
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024, segment_seconds: float = 60.0,
+                 fsync: bool = True):
+        """
+        Args:
+            directory: Directory holding the segments
+            segment_bytes: Size at which the active segment is sealed
+            segment_seconds: Age at which a non-empty active segment is sealed, so compaction sees quiet traffic
+            fsync: Sync every group commit to disk; without it an OS crash can lose recent batches
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._queue: List[_Batch] = []
+        self._committing = False
+        self._file = None
+        self._pid = None
+        self._opened_at = 0.0
+        self._size = 0
+        self.stats = {"events": 0, "batches": 0, "commits": 0, "segments": 0}
+
+    def append(self, events: List[Dict]) -> int:
+        """
+        Append events durably; returns once they are written (and synced).
+
+        Returns:
+            Number of events appended
+        """
+        if not events:
+            return 0
+        dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+        batch = _Batch("".join(dumps(event) + "\n" for event in events).encode(), len(events))
+        with self._cond:
+            self._queue.append(batch)
+            while not batch.done:
+                if self._committing:
+                    self._cond.wait()
+                    continue
+                # Lead a group commit of everything queued so far, including this batch
+                group, self._queue = self._queue, []
+                self._committing = True
+                self._cond.release()
+                error = None
+                try:
+                    self._write(b"".join(item.data for item in group))
+                except BaseException as e:
+                    error = e
+                self._cond.acquire()
+                self._committing = False
+                for item in group:
+                    item.done, item.error = True, error
+                if error is None:
+                    self.stats["events"] += sum(item.events for item in group)
+                    self.stats["batches"] += len(group)
+                    self.stats["commits"] += 1
+                self._cond.notify_all()
+        if batch.error is not None:
+            raise batch.error
+        return batch.events
+
+    def _write(self, data: bytes):
+        """Write one group to the active segment; only the group leader calls this."""
+        if self._file is None or self._pid != os.getpid():
+            self._open_segment()
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._file.write(view):]
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except OSError:
+            # The callers get an error and will retry: drop whatever part of the group was written
+            try:
+                self._file.truncate(self._size)
+            finally:
+                self._file.close()
+                self._file = None
+            raise
+        self._size += len(data)
+        if self._size >= self.segment_bytes or time.monotonic() - self._opened_at >= self.segment_seconds:
+            self._seal()
+
+    def _open_segment(self):
+        name = f"events-{time.time_ns():020d}-{os.getpid()}{OPEN_SUFFIX}"
+        self._file = open(os.path.join(self.directory, name), "ab", buffering=0)
+        self._pid = os.getpid()
+        self._opened_at = time.monotonic()
+        self._size = 0
+        if self.fsync:
+            # Make the new directory entry durable too
+            fsync_directory(self.directory)
+        self.stats["segments"] += 1
+
+    def _seal(self):
+        path = self._file.name
+        self._file.close()
+        self._file = None
+        os.replace(path, path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+
+    def seal(self, older_than: float = 0.0):
+        """
+        Seal the active segment so compaction can take it, e.g. before
+        shutdown, or periodically with older_than when traffic is quiet.
+        """
+        with self._cond:
+            while self._committing:
+                self._cond.wait()
+            if (self._file is not None and self._pid == os.getpid()
+                    and time.monotonic() - self._opened_at >= older_than):
+                self._seal()
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def compactable_segments(directory: str) -> List[str]:
+    """Sealed segments plus open segments whose writer has exited, oldest first."""
+    segments = glob.glob(os.path.join(directory, f"events-*{SEALED_SUFFIX}"))
+    for path in glob.glob(os.path.join(directory, f"events-*{OPEN_SUFFIX}")):
+        pid = int(os.path.basename(path)[:-len(OPEN_SUFFIX)].rsplit("-", 1)[1])
+        if pid != os.getpid() and not _process_alive(pid):
+            segments.append(path)
+    return sorted(segments, key=os.path.basename)
+
+
+def aggregate(paths: Iterable[str]) -> Dict[str, List]:
+    """
+    ROI columns for the events in segments: one row per (day, channel,
+    campaign) with summed cost, conversion count and revenue. A torn last
+    line left by a crash mid-write is skipped.
+    """
+    totals: Dict[Tuple[int, str, str], List[float]] = defaultdict(lambda: [0.0, 0, 0.0])
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable event line in {path}")
+                    continue
+                row = totals[(int(event["timestamp"] // 86400), event["channel"], event["campaign"])]
+                row[0] += event.get("cost", 0.0)
+                if event["type"] == "conversion":
+                    row[1] += 1
+                row[2] += event.get("revenue", 0.0)
+    keys = sorted(totals)
+    return {
+        "day": np.array([key[0] for key in keys], dtype="datetime64[D]"),
+        "channel": [key[1] for key in keys],
+        "campaign": [key[2] for key in keys],
+        "spend": [totals[key][0] for key in keys],
+        "conversions": [totals[key][1] for key in keys],
+        "revenue": [totals[key][2] for key in keys]
+    }
+
+
+def compact(directory: str, store: RoiStore, max_segments: int = 1000) -> Dict:
+    """
+    Fold compactable segments into store and delete them. Safe to call from
+    several processes: one compacts while the others return immediately.
+
+    Returns:
+        Dict with segments and rows compacted
+    """
+    lock = open(os.path.join(directory, LOCK_FILE), "w")
+    try:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return {"segments": 0, "rows": 0, "skipped": True}
+        store.refresh()
+        recovered = _recover(directory, store)
+        segments = compactable_segments(directory)[:max_segments]
+        if not segments:
+            return {"segments": recovered, "rows": 0}
+        columns = aggregate(segments)
+
+        # Intent first: after a crash, the store's commit record tells whether the append landed
+        commit = f"{os.getpid()}-{time.time_ns()}"
+        intent_path = os.path.join(directory, INTENT_FILE)
+        with open(intent_path + ".tmp", "w") as f:
+            json.dump({"commit": commit, "rows": len(columns["day"]),
+                       "segments": [os.path.basename(s) for s in segments]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(intent_path + ".tmp", intent_path)
+        fsync_directory(directory)
+        # append_columns returns only once the rows are on disk, so the segments can go
+        rows = store.append_columns(**columns, commit=commit)
+        _finish(directory, segments)
+        logger.info(f"Compacted {len(segments)} event segments into {rows} ROI rows")
+        return {"segments": len(segments) + recovered, "rows": rows}
+    finally:
+        lock.close()
+
+
+def _finish(directory: str, segments: List[str]):
+    for path in segments:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    # The intent must outlive the segments on disk, or a crash could bring back counted segments
+    fsync_directory(directory)
+    os.unlink(os.path.join(directory, INTENT_FILE))
+
+
+def _recover(directory: str, store: RoiStore) -> int:
+    """Complete or roll back a compaction interrupted by a crash."""
+    intent_path = os.path.join(directory, INTENT_FILE)
+    try:
+        with open(intent_path) as f:
+            intent = json.load(f)
+    except FileNotFoundError:
+        return 0
+    segments = [os.path.join(directory, name) for name in intent["segments"]]
+    store.refresh()
+    if intent["commit"] in store.commits:
+        _finish(directory, segments)
+        return len(segments)
+    # The append never committed: the segments are compacted again
+    os.unlink(intent_path)
+    return 0
+
+
+class EventCompactor:
+    """Runs compact on a daemon thread every interval seconds."""
+
+    def __init__(self, log: EventLog, store: RoiStore, interval: float = 30.0,
+                 on_compact: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            log: This process's event log; its segment is sealed once it is older than the log's segment_seconds
+            store: ROI store the events are folded into
+            interval: Seconds between compactions
+            on_compact: Called with the result of each compaction that added rows
+        """
+        self.log = log
+        self.store = store
+        self.interval = interval
+        self.on_compact = on_compact
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="event-compactor", daemon=True)
+
+    def start(self) -> "EventCompactor":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.log.seal(older_than=self.log.segment_seconds)
+                result = compact(self.log.directory, self.store)
+                if result["rows"] and self.on_compact:
+                    self.on_compact(result)
+            except Exception as e:
+                logger.error(f"Event compaction failed: {e}")
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Append NDJSON event files to the log or compact it into ROI rows.")
+    parser.add_argument("log", help="Event log directory")
+    parser.add_argument("--append", nargs="*", default=[], help="NDJSON event files to validate and append")
+    parser.add_argument("--compact", metavar="ROI_STORE", help="Compact sealed segments into this RoiStore directory")
+    args = parser.parse_args(argv)
+
+    log = EventLog(args.log)
+    for path in args.append:
+        with open(path, "rb") as f:
+            events, rejected = parse_events(f.read())
+        log.append(events)
+        print(json.dumps({"file": path, "accepted": len(events), "rejected": len(rejected)}))
+    log.seal()
+    if args.compact:
+        print(json.dumps(compact(args.log, RoiStore(args.compact))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Country and region targeting from a business URL and locale hints.
+
+Domain suffixes are the strongest signal: a ccTLD names a country
+(organicskincare.co.nz -> NZ), and some second-level and city/region
+suffixes name a region too (sydney.nsw.au-style state domains, .nyc,
+.bayern, .scot). The suffixes live in a trie keyed by reversed domain
+labels, built once per process; resolving a host walks at most a few
+labels from the right and keeps the deepest match. ccTLDs that are mostly
+registered as generic names (.io, .co, .ai, .tv, ...) give no signal.
+
+When the domain says nothing, locale hints such as a page's
+<html lang="en-NZ"> or og:locale "en_NZ" supply the country.
+Results are ISO 3166 codes: country "AU", region "AU-NSW".
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+from functools import lru_cache
+from urllib.parse import urlparse
+import argparse
+import re
+
+DEFAULT_GEO = "default"
+
+COUNTRY_CODES = (
+    "AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM BN BO BQ BR BS BT BV BW BY "
+    "BZ CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX CY CZ DE DJ DK DM DO DZ EC EE EG EH ER ES ET FI FJ FK "
+    "FM FO FR GA GB GD GE GF GG GH GI GL GM GN GP GQ GR GS GT GU GW GY HK HM HN HR HT HU ID IE IL IM IN IO IQ IR "
+    "IS IT JE JM JO JP KE KG KH KI KM KN KP KR KW KY KZ LA LB LC LI LK LR LS LT LU LV LY MA MC MD ME MF MG MH MK "
+    "ML MM MN MO MP MQ MR MS MT MU MV MW MX MY MZ NA NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM "
+    "PN PR PS PT PW PY QA RE RO RS RU RW SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV SX SY SZ TC TD TF "
+    "TG TH TJ TK TL TM TN TO TR TT TV TW TZ UA UG UM US UY UZ VA VC VE VG VI VN VU WF WS YE YT ZA ZM ZW"
+).split()
+# ccTLDs used mostly as generic names; only their country second-levels (com.co) count
+GENERIC_CCTLDS = {"ai", "cc", "co", "fm", "gg", "io", "ly", "me", "nu", "sh", "so", "to", "tv", "vc", "ws"}
+
+US_STATES = ("AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO MT NE NV NH NJ NM NY "
+             "NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY").split()
+AU_STATES = ("ACT", "NSW", "NT", "QLD", "SA", "TAS", "VIC", "WA")
+CA_PROVINCES = {"ab": "AB", "bc": "BC", "mb": "MB", "nb": "NB", "nf": "NL", "nl": "NL", "ns": "NS", "nt": "NT",
+                "nu": "NU", "on": "ON", "pe": "PE", "qc": "QC", "sk": "SK", "yk": "YT"}
+# City and region gTLDs
+REGION_TLDS = {
+    "nyc": "US-NY", "boston": "US-MA", "miami": "US-FL", "vegas": "US-NV",
+    "london": "GB-LND", "scot": "GB-SCT", "wales": "GB-WLS", "cymru": "GB-WLS",
+    "berlin": "DE-BE", "hamburg": "DE-HH", "bayern": "DE-BY", "koeln": "DE-NW", "cologne": "DE-NW",
+    "paris": "FR-IDF", "amsterdam": "NL-NH", "brussels": "BE-BRU", "vlaanderen": "BE-VLG", "wien": "AT-9",
+    "zuerich": "CH-ZH", "barcelona": "ES-CT", "cat": "ES-CT", "madrid": "ES-MD", "eus": "ES-PV", "gal": "ES-GA",
+    "tokyo": "JP-13", "osaka": "JP-27", "nagoya": "JP-23", "yokohama": "JP-14", "istanbul": "TR-34",
+    "moscow": "RU-MOW", "quebec": "CA-QC", "melbourne": "AU-VIC", "sydney": "AU-NSW",
+    "capetown": "ZA-WC", "joburg": "ZA-GT", "durban": "ZA-NL", "kiwi": "NZ",
+}
+LOCALE = re.compile(r"^[a-z]{2,3}(?:[-_][a-z]{4})?[-_]([a-z]{2})(?:$|[-_.@])", re.I)
+
+# Marks a trie node that ends a known suffix; never a valid domain label
+_VALUE = ""
+
+
+def default_suffixes() -> Dict[str, str]:
+    """Built-in suffix -> ISO 3166 code table."""
+    suffixes = {code.lower(): code for code in COUNTRY_CODES if code.lower() not in GENERIC_CCTLDS}
+    suffixes["uk"] = "GB"
+    for tld in GENERIC_CCTLDS:
+        for second_level in ("com", "net", "org"):
+            suffixes[f"{second_level}.{tld}"] = tld.upper()
+    for state in AU_STATES:
+        for second_level in ("", "gov.", "edu."):
+            suffixes[f"{state.lower()}.{second_level}au"] = f"AU-{state}"
+    for state in US_STATES:
+        suffixes[f"{state.lower()}.us"] = f"US-{state}"
+    for label, province in CA_PROVINCES.items():
+        suffixes[f"{label}.ca"] = f"CA-{province}"
+    suffixes.update(REGION_TLDS)
+    return suffixes
+
+
+def geo(code: str, source: str) -> Dict[str, Optional[str]]:
+    country, _, _ = code.partition("-")
+    return {"country": country, "region": code if "-" in code else None, "source": source}
+
+
+UNKNOWN = {"country": None, "region": None, "source": None}
+
+
+class GeoResolver:
+    def __init__(self, suffixes: Optional[Dict[str, str]] = None, cache_size: int = 10000):
+        """
+        Args:
+            suffixes: Domain suffix -> ISO 3166 country or region code, defaults to default_suffixes()
+            cache_size: Hosts whose resolution is memoized
+        """
+        self.trie: Dict[str, Dict] = {}
+        for suffix, code in (default_suffixes() if suffixes is None else suffixes).items():
+            node = self.trie
+            for label in reversed(suffix.lower().strip(".").split(".")):
+                node = node.setdefault(label, {})
+            node[_VALUE] = code
+        self._resolve_host = lru_cache(maxsize=cache_size)(self._match_host)
+
+    def _match_host(self, host: str) -> Optional[str]:
+        """Code of the longest known suffix of host, or None."""
+        node, code = self.trie, None
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            code = node.get(_VALUE, code)
+        return code
+
+    @staticmethod
+    def locale_country(locale: Optional[str]) -> Optional[str]:
+        """Country in a locale such as "en-NZ", "en_NZ" or "zh-Hant-TW", or None."""
+        match = LOCALE.match(locale.strip()) if locale else None
+        return match.group(1).upper() if match else None
+
+    def resolve(self, url: Optional[str] = None, hints: Iterable[Optional[str]] = ()) -> Dict[str, Optional[str]]:
+        """
+        Country and region for a URL, falling back to locale hints in order.
+
+        Returns:
+            Dict with country and region (ISO codes or None) and source
+            ("domain", "locale" or None)
+        """
+        if url:
+            host = (urlparse(url if "//" in url else f"//{url}").hostname or "").rstrip(".")
+            code = self._resolve_host(host) if host else None
+            if code:
+                return geo(code, "domain")
+        for hint in hints:
+            country = self.locale_country(hint)
+            if country:
+                return geo(country, "locale")
+        return dict(UNKNOWN)
+
+    def resolve_many(self, urls: Sequence[str],
+                     hints: Optional[Sequence[Iterable[Optional[str]]]] = None) -> List[Dict[str, Optional[str]]]:
+        """resolve for many URLs; hints, when given, is one hint list per URL."""
+        hints = hints if hints is not None else [()] * len(urls)
+        return [self.resolve(url, url_hints) for url, url_hints in zip(urls, hints)]
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Resolve the country and region of many URLs (one per line).")
+    parser.add_argument("urls", help="Text file with one URL per line, optionally followed by a locale")
+    args = parser.parse_args(argv)
+
+    with open(args.urls) as f:
+        lines = [line.split() for line in f if line.strip()]
+    resolver = GeoResolver()
+    for parts, result in zip(lines, resolver.resolve_many([p[0] for p in lines], [p[1:] for p in lines])):
+        print(f"{parts[0]}\t{result['region'] or result['country'] or DEFAULT_GEO}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Idempotency-Key handling for endpoints with side effects at PayPal.
+
+The first request with a given key claims it (an "in progress" row in a
+SQLite file shared by every worker), runs, and stores its final response.
+Repeats of the key get the stored response without running again;
+requests that arrive while the first is still running wait for it and
+then get the same response. A key reused with a different request body is
+rejected. Responses with a 5xx status are not stored, so the key is
+released and a later retry runs again. Stored responses expire after a
+TTL; a claim whose worker died is taken over after claim_timeout.
+"""
+from typing import Awaitable, Callable, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from shared_state import SQLiteState, state_dir
+
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+MAX_KEY_LENGTH = 255
+
+# (status, body, content type)
+StoredResponse = Tuple[int, bytes, str]
+
+
+class IdempotencyError(Exception):
+    """Base class for requests that cannot be served under their Idempotency-Key."""
+    status = 400
+
+
+class IdempotencyKeyReused(IdempotencyError):
+    """Raised when a key is sent again with a different request."""
+    status = 422
+
+
+class IdempotencyInProgress(IdempotencyError):
+    """Raised when the request holding a key does not finish within the wait."""
+    status = 409
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    """Hash of a request; JSON bodies are canonicalized so formatting differences do not count."""
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode()
+    except ValueError:
+        pass
+    return hashlib.sha256(b'%s %s\n%s' % (method.encode(), path.encode(), body)).hexdigest()
+
+
+def upstream_request_id(scope: str, key: str) -> str:
+    """
+    Request id to send upstream (PayPal-Request-Id) for a key, so a retry
+    after the stored response expired or was never stored is still
+    deduplicated by the provider.
+    """
+    return str(uuid.UUID(bytes=hashlib.sha256(f'{scope}\n{key}'.encode()).digest()[:16]))
+
+
+class IdempotencyStore(SQLiteState):
+    schema = """
+        CREATE TABLE IF NOT EXISTS idempotency (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            state TEXT NOT NULL,
+            status INTEGER,
+            body BLOB,
+            content_type TEXT,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (scope, key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idempotency_expires_at ON idempotency (expires_at);
+    """
+
+    # Expired rows are purged once every this many claims
+    purge_every = 100
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 86400, claim_timeout: float = 60,
+                 wait_timeout: float = 30, poll_interval: float = 0.05):
+        """
+        Args:
+            path: SQLite file, defaults to idempotency.db in the shared state dir
+            ttl: Seconds a final response is kept for replays
+            claim_timeout: Seconds after which an unfinished claim is treated as abandoned
+            wait_timeout: Seconds a concurrent duplicate waits for the first request
+            poll_interval: Seconds between checks while waiting
+        """
+        super().__init__(path or os.path.join(state_dir(), 'idempotency.db'))
+        self.ttl = ttl
+        self.claim_timeout = claim_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._claims = 0
+        self.stats = {'executed': 0, 'replayed': 0, 'waited': 0}
+
+    def claim(self, scope: str, key: str, fingerprint: str) -> Tuple[bool, Optional[StoredResponse]]:
+        """
+        Claim a key for this request, or look up what happened to it.
+
+        Returns:
+            (True, None) if this request now owns the key, (False, response)
+            if a final response is stored, (False, None) if another request
+            is still running
+
+        Raises:
+            IdempotencyKeyReused: If the key was used for a different request
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT fingerprint, state, status, body, content_type, expires_at FROM idempotency '
+                'WHERE scope = ? AND key = ?', (scope, key)).fetchone()
+            if row is None or row[5] <= now:
+                conn.execute(
+                    'INSERT OR REPLACE INTO idempotency (scope, key, fingerprint, state, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?)', (scope, key, fingerprint, IN_PROGRESS, now + self.claim_timeout))
+                claimed = True
+            elif row[0] != fingerprint:
+                raise IdempotencyKeyReused('Idempotency-Key was already used for a different request')
+            else:
+                claimed = False
+        self._claims += 1
+        if self._claims % self.purge_every == 0:
+            self.purge()
+        if claimed:
+            return True, None
+        if row[1] == DONE:
+            return False, (row[2], bytes(row[3]), row[4])
+        return False, None
+
+    def finish(self, scope: str, key: str, response: StoredResponse):
+        """Store the final response of a claimed key, or release the key for a 5xx."""
+        conn = self._connection()
+        with conn:
+            if response[0] >= 500:
+                conn.execute('DELETE FROM idempotency WHERE scope = ? AND key = ? AND state = ?',
+                             (scope, key, IN_PROGRESS))
+            else:
+                conn.execute(
+                    'UPDATE idempotency SET state = ?, status = ?, body = ?, content_type = ?, expires_at = ? '
+                    'WHERE scope = ? AND key = ?',
+                    (DONE, response[0], response[1], response[2], time.time() + self.ttl, scope, key))
+
+    def release(self, scope: str, key: str):
+        """Give up a claim without a response, e.g. when the handler raised."""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM idempotency WHERE scope = ? AND key = ? AND state = ?',
+                         (scope, key, IN_PROGRESS))
+
+    def purge(self):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM idempotency WHERE expires_at <= ?', (time.time(),))
+
+    def run(self, scope: str, key: str, fingerprint: str,
+            handler: Callable[[], StoredResponse]) -> Tuple[StoredResponse, bool]:
+        """
+        Run handler at most once per key and return its response.
+
+        Returns:
+            Tuple of (response, replayed)
+
+        Raises:
+            IdempotencyKeyReused: If the key was used for a different request
+            IdempotencyInProgress: If the first request is still running after wait_timeout
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            claimed, stored = self.claim(scope, key, fingerprint)
+            if claimed:
+                return self._execute(scope, key, handler), False
+            if stored is not None:
+                self.stats['replayed'] += 1
+                return stored, True
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress('A request with this Idempotency-Key is still in progress')
+            self.stats['waited'] += 1
+            time.sleep(self.poll_interval)
+
+    async def run_async(self, scope: str, key: str, fingerprint: str,
+                        handler: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        """run() for async handlers; the event loop is not blocked while waiting."""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            claimed, stored = await loop.run_in_executor(None, self.claim, scope, key, fingerprint)
+            if claimed:
+                try:
+                    response = await handler()
+                except BaseException:
+                    await loop.run_in_executor(None, self.release, scope, key)
+                    raise
+                await loop.run_in_executor(None, self.finish, scope, key, response)
+                self.stats['executed'] += 1
+                return response, False
+            if stored is not None:
+                self.stats['replayed'] += 1
+                return stored, True
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress('A request with this Idempotency-Key is still in progress')
+            self.stats['waited'] += 1
+            await asyncio.sleep(self.poll_interval)
+
+    def _execute(self, scope: str, key: str, handler: Callable[[], StoredResponse]) -> StoredResponse:
+        try:
+            response = handler()
+        except BaseException:
+            self.release(scope, key)
+            raise
+        self.finish(scope, key, response)
+        self.stats['executed'] += 1
+        return response
+
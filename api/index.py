@@ -1,6 +1,24 @@
 from flask import Flask, request, jsonify, render_template, redirect, url_for
 from flask_cors import CORS
 from marketing_genius_tool import MarketingGeniusTool
+from shared_state import SharedCounters, state_dir
+from result_cache import ResultCache, make_key
+from single_flight import SingleFlight, SingleFlightTimeout
+from outbound import OutboundService, OutboundUnavailable, current_timeout
+from posting_times import PostingTimeRecommender
+from roi_analytics import RoiStore
+from keyword_weights import KeywordWeights, SharedKeywordWeights
+from page_fetcher import PageFetcher
+from audience_reach import ReachEstimator
+from analysis_history import AnalysisHistory
+from page_cache import RenderedPageCache
+from webhook_verifier import DEFAULT_CERT_URL_PREFIXES, WebhookVerificationError, WebhookVerifier
+from subscription_store import SubscriptionStore
+from variant_server import VariantServer
+from event_log import EventCompactor, EventLog, parse_events
+from campaign_monitor import EVENT_KINDS, CampaignMonitor
+from idempotency import (MAX_KEY_LENGTH, IdempotencyError, IdempotencyStore, request_fingerprint,
+                         upstream_request_id)
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
@@ -9,59 +27,174 @@ import paypalrestsdk
 from flask_mail import Mail, Message
 import threading
 import requests
+import httpx
 from functools import wraps
+from collections import defaultdict
 import secrets
+import atexit
 import time
 import jwt
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
+# Templates and static assets live at the repository root, next to api/
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+app = Flask(
+    __name__,
+    template_folder=os.getenv('TEMPLATE_DIR', os.path.join(ROOT_DIR, 'templates')),
+    static_folder=os.getenv('STATIC_DIR', os.path.join(ROOT_DIR, 'public')),
+    static_url_path='/static'
+)
+# Browsers may reuse static assets for this long; they revalidate by ETag afterwards
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.getenv('STATIC_MAX_AGE', 86400))
+# Signs the bearer tokens (HS256, with an "email" claim) that per-user history reads require
+app.config['JWT_SECRET'] = os.getenv('JWT_SECRET')
+
+# Origins allowed to call the API (also used by the ASGI variant in asgi.py)
+CORS_ORIGINS = [
+    "https://geniusmarketingai.netlify.app",
+    "http://localhost:3000",  # For local development
+    "http://localhost:5173",  # Vite default port
+    "http://localhost:5174",  # Vite alternative port
+    "http://localhost:4173",  # Vite preview port
+    "http://127.0.0.1:5173",  # Vite alternative
+    "http://127.0.0.1:5174",  # Vite alternative port
+    "http://127.0.0.1:4173"   # Vite preview alternative
+]
 
 # Configure CORS to only allow requests from your Netlify domain
 CORS(app, resources={
     r"/api/*": {
-        "origins": [
-            "https://geniusmarketingai.netlify.app",
-            "http://localhost:3000",  # For local development
-            "http://localhost:5173",  # Vite default port
-            "http://localhost:5174",  # Vite alternative port
-            "http://localhost:4173",  # Vite preview port
-            "http://127.0.0.1:5173",  # Vite alternative
-            "http://127.0.0.1:5174",  # Vite alternative port
-            "http://127.0.0.1:4173"   # Vite preview alternative
-        ],
+        "origins": CORS_ORIGINS,
         "methods": ["GET", "POST"],
-        "allow_headers": ["Content-Type"]
+        "allow_headers": ["Content-Type", "Idempotency-Key"]
     }
 })
 
+SECURITY_HEADERS = {
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
+    'Content-Security-Policy': "default-src 'self'; script-src 'self' https://www.paypal.com https://www.paypalobjects.com; frame-src 'self' https://www.paypal.com; style-src 'self' 'unsafe-inline';"
+}
+
 # Security headers middleware
 @app.after_request
 def add_security_headers(response):
-    response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['X-Frame-Options'] = 'DENY'
-    response.headers['X-XSS-Protection'] = '1; mode=block'
-    response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-    response.headers['Content-Security-Policy'] = "default-src 'self'; script-src 'self' https://www.paypal.com https://www.paypalobjects.com; frame-src 'self' https://www.paypal.com; style-src 'self' 'unsafe-inline';"
+    response.headers.update(SECURITY_HEADERS)
     return response
 
+# Rendered HTML per context, re-rendered when the template changes on disk
+pages = RenderedPageCache(app)
+
+# PayPal REST base URL (override to point at a sandbox or local fake)
+PAYPAL_API_BASE = os.getenv('PAYPAL_API_BASE', 'https://api-m.paypal.com')
+
+class DeadlineApi(paypalrestsdk.Api):
+    """PayPal SDK client whose HTTP calls honour the outbound call timeout."""
+    def http_call(self, url, method, **kwargs):
+        kwargs.setdefault('timeout', current_timeout())
+        return super().http_call(url, method, **kwargs)
+
 # Initialize PayPal with proper error handling
 try:
-    paypalrestsdk.configure({
+    paypal_options = {
         "mode": os.getenv('PAYPAL_MODE', 'sandbox'),  # sandbox or live
         "client_id": os.getenv('PAYPAL_CLIENT_ID', 'your_client_id'),
         "client_secret": os.getenv('PAYPAL_CLIENT_SECRET', 'your_client_secret')
-    })
+    }
+    if os.getenv('PAYPAL_API_BASE'):
+        paypal_options["endpoint"] = PAYPAL_API_BASE
+    paypalrestsdk.configure(paypal_options)
+    paypal_api = DeadlineApi(paypal_options)
 except Exception as e:
     print(f"Error initializing PayPal: {e}")
+    paypal_api = None
+
+# Every outbound PayPal call goes through this guard (timeouts, retries, circuit breaker)
+paypal = OutboundService(
+    'paypal',
+    timeout=float(os.getenv('PAYPAL_TIMEOUT', 5)),
+    deadline=float(os.getenv('PAYPAL_DEADLINE', 10)),
+    max_retries=int(os.getenv('PAYPAL_MAX_RETRIES', 2)),
+    # httpx errors come from the ASGI routes, which share this guard
+    retry_on=(paypalrestsdk.exceptions.ServerError, httpx.TransportError)
+)
+
+def fetch_webhook_cert(url):
+    """Download a webhook signing certificate through the PayPal outbound guard."""
+    response = paypal.call(lambda: requests.get(url, timeout=current_timeout()), idempotent=True)
+    return response.content
+
+# Webhook signing certificates are cached per PAYPAL-CERT-URL until they expire.
+# PAYPAL_CERT_URL_PREFIXES (comma separated) allows extra certificate hosts, e.g. a local fake.
+webhook_verifier = WebhookVerifier(
+    fetch_webhook_cert,
+    cert_url_prefixes=DEFAULT_CERT_URL_PREFIXES + tuple(
+        prefix for prefix in os.getenv('PAYPAL_CERT_URL_PREFIXES', '').split(',') if prefix
+    )
+)
+
+def paypal_unavailable(e):
+    """Response for requests that could not reach PayPal."""
+    print(f"PayPal unavailable: {e}")
+    response = jsonify({'error': 'Payment provider is temporarily unavailable, please try again shortly'})
+    response.headers['Retry-After'] = str(int(paypal.breaker.reset_timeout))
+    return response, 503
+
+# Checkout requests with an Idempotency-Key run once per key across every worker on the host
+idempotency = IdempotencyStore(
+    ttl=float(os.getenv('IDEMPOTENCY_TTL', 86400)),
+    wait_timeout=float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 30))  # Seconds a concurrent duplicate waits
+)
+
+def check_idempotency_key(key):
+    """Error (message, status) for a malformed Idempotency-Key, or None."""
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters', 400
+    return None
+
+def paypal_request_id():
+    """PayPal-Request-Id for this request: derived from its Idempotency-Key, random without one."""
+    key = request.headers.get('Idempotency-Key')
+    return upstream_request_id(request.path, key) if key else secrets.token_hex(16)
+
+def idempotent(view):
+    """Run a view at most once per Idempotency-Key and replay its response to repeats."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(*args, **kwargs)
+        rejected = check_idempotency_key(key)
+        if rejected:
+            return jsonify({'error': rejected[0]}), rejected[1]
+        fingerprint = request_fingerprint(request.method, request.path, request.get_data())
+        executed = []
+
+        def handler():
+            response = app.make_response(view(*args, **kwargs))
+            executed.append(response)
+            return response.status_code, response.get_data(), response.content_type
+
+        try:
+            (status, body, content_type), replayed = idempotency.run(request.path, key, fingerprint, handler)
+        except IdempotencyError as e:
+            return jsonify({'error': str(e)}), e.status
+        if executed:
+            return executed[0]
+        response = app.response_class(body, status=status, content_type=content_type)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+    return wrapper
 
 # Initialize Flask-Mail with proper error handling
 try:
     app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER')
     app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() != 'false'
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER')
@@ -72,13 +205,94 @@ except Exception as e:
 
 # Initialize Marketing Genius Tool
 try:
-    tool = MarketingGeniusTool()
+    # Workers with the same config and code load the compiled state instead of rebuilding it.
+    # Snapshots are pickles, so only use a directory the operator chose, never the /tmp default.
+    snapshot_dir = os.getenv('TOOL_SNAPSHOT_DIR') or (
+        os.path.join(state_dir(), 'snapshots') if os.getenv('SHARED_STATE_DIR') else None)
+    tool = MarketingGeniusTool(os.getenv('MARKETING_CONFIG_PATH'), snapshot_dir=snapshot_dir)
+    # Histograms built by `python posting_times.py <logs> --store <file>`
+    if os.getenv('ENGAGEMENT_HISTOGRAMS'):
+        tool.posting_times = PostingTimeRecommender.load(os.getenv('ENGAGEMENT_HISTOGRAMS'))
+    # Keyword document frequencies shared by every worker, optionally seeded from a corpus
+    # built by `python keyword_weights.py <urls> --store <file>`
+    tool.keyword_weights = SharedKeywordWeights(
+        max_documents=int(os.getenv('KEYWORD_MAX_DOCUMENTS', 100_000)))
+    if os.getenv('KEYWORD_WEIGHTS'):
+        tool.keyword_weights.seed(KeywordWeights.load(os.getenv('KEYWORD_WEIGHTS')))
+    # Fetch page titles, meta tags and headings to improve industry classification
+    if os.getenv('PAGE_FETCH_CACHE_DIR'):
+        tool.page_fetcher = PageFetcher(
+            os.getenv('PAGE_FETCH_CACHE_DIR'),
+            timeout=float(os.getenv('PAGE_FETCH_TIMEOUT', 3.0)),
+            concurrency=int(os.getenv('PAGE_FETCH_CONCURRENCY', 16)),
+            max_entries=int(os.getenv('PAGE_FETCH_CACHE_MAX_ENTRIES', 10000))
+        )
+    # Demographic dataset built by `python audience_reach.py <dir> --build <cells>`
+    if os.getenv('AUDIENCE_DATASET_DIR'):
+        tool.reach_estimator = ReachEstimator.load(os.getenv('AUDIENCE_DATASET_DIR'))
+    # Columnar store built by `python roi_analytics.py <dir> --ingest <records>`
+    if os.getenv('ROI_STORE_DIR'):
+        tool.roi_store = RoiStore(os.getenv('ROI_STORE_DIR'))
 except Exception as e:
     print(f"Error initializing Marketing Genius Tool: {e}")
     tool = None
 
-# Simple in-memory storage for subscriptions (replace with database in production)
-subscriptions = {}
+# In-memory subscriptions, one compact row per email (replace with database in production)
+subscriptions = SubscriptionStore()
+
+# Counters shared by every worker on the host (trial usage, rate limits)
+counters = SharedCounters()
+
+# Analysis results shared by every worker on the host
+result_cache = ResultCache(
+    ttl=int(os.getenv('RESULT_CACHE_TTL', 3600)),
+    max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 10000))
+)
+atexit.register(result_cache.flush)
+
+# Per-user history of returned analyses, deduplicated and compressed
+analysis_history = AnalysisHistory(max_per_user=int(os.getenv('ANALYSIS_HISTORY_PER_USER', 1000)))
+ANALYSES_PAGE_LIMIT = 50  # Largest page /api/analyses returns
+
+# Thompson-sampling A/B variant selection; counters are flushed to shared state in batches.
+# Only the comma-separated experiments in AB_EXPERIMENTS are served.
+ab_server = VariantServer(
+    objective=os.getenv('AB_OBJECTIVE', 'clicks'),
+    flush_every=int(os.getenv('AB_FLUSH_EVERY', 1000)),
+    flush_interval=float(os.getenv('AB_FLUSH_INTERVAL', 1.0)),
+    experiments=[name.strip() for name in os.getenv('AB_EXPERIMENTS', '').split(',') if name.strip()]
+)
+atexit.register(ab_server.flush)
+AB_EXPERIMENT_MAX_LENGTH = 200
+
+# Impression, click and conversion events: a durable segmented log per worker,
+# compacted into the ROI store (ROI_STORE_DIR, or one in the shared state dir)
+event_log = EventLog(
+    os.getenv('EVENT_LOG_DIR') or os.path.join(state_dir(), 'events'),
+    segment_bytes=int(os.getenv('EVENT_SEGMENT_BYTES', 64 * 1024 * 1024)),
+    segment_seconds=float(os.getenv('EVENT_SEGMENT_SECONDS', 60)),
+    fsync=os.getenv('EVENT_LOG_FSYNC', 'true').lower() != 'false'
+)
+atexit.register(event_log.seal)
+event_store = tool.roi_store if tool and tool.roi_store is not None else RoiStore(os.path.join(state_dir(), 'roi'))
+if tool and tool.roi_store is None:
+    tool.roi_store = event_store
+event_compactor = EventCompactor(
+    event_log, event_store, interval=float(os.getenv('EVENT_COMPACT_INTERVAL', 30))
+).start()
+EVENTS_MAX_BYTES = int(os.getenv('EVENTS_MAX_BYTES', 1024 * 1024))  # Largest accepted batch
+EVENTS_MAX_REJECTIONS = 100  # Rejected lines listed in a response
+# Rolling campaign alerts over the events this worker receives
+event_monitor = CampaignMonitor(on_alert=lambda alert: print(f"Campaign alert: {alert}"))
+event_monitor_lock = threading.Lock()
+
+# Coalesces concurrent identical analyses within this worker
+analysis_flight = SingleFlight()
+ANALYZE_COALESCE_TIMEOUT = float(os.getenv('ANALYZE_COALESCE_TIMEOUT', 30))  # Seconds a duplicate waits
+
+TRIAL_ANALYSIS_LIMIT = 3  # Limit trial users to 3 analyses
+ANALYZE_RATE_LIMIT = int(os.getenv('ANALYZE_RATE_LIMIT', 30))  # Requests per client per window
+ANALYZE_RATE_WINDOW = int(os.getenv('ANALYZE_RATE_WINDOW', 60))  # Window length in seconds
 
 def send_email_async(app, msg):
     """Send email asynchronously."""
@@ -188,12 +402,16 @@ def check_trial_limits(email):
     """Check if trial user has exceeded their analysis limit"""
     subscription = subscriptions.get(email)
     if subscription and subscription.get('is_trial'):
-        analysis_count = subscription.get('analysis_count', 0)
-        if analysis_count >= 3:  # Limit trial users to 3 analyses
+        analysis_count = counters.increment_if_below(f"trial:{email}", TRIAL_ANALYSIS_LIMIT)
+        if analysis_count is None:
             return False
-        subscription['analysis_count'] = analysis_count + 1
+        subscription['analysis_count'] = analysis_count
     return True
 
+def check_rate_limit(client_id):
+    """Check if a client is within the per-client request rate limit"""
+    return counters.hit_window(f"rate:{client_id}", ANALYZE_RATE_LIMIT, ANALYZE_RATE_WINDOW)
+
 def get_paypal_client_id():
     """Get PayPal client ID based on environment"""
     return os.getenv('PAYPAL_CLIENT_ID', 'your_client_id')
@@ -201,9 +419,34 @@ def get_paypal_client_id():
 @app.route('/')
 def index():
     """Render the landing page."""
-    return render_template('index.html', paypal_client_id=get_paypal_client_id())
+    return pages.response('index.html', paypal_client_id=get_paypal_client_id())
+
+def build_subscription_payload(email):
+    """Request body for creating a PayPal billing subscription."""
+    return {
+        "plan_id": os.getenv('PAYPAL_PLAN_ID'),
+        "subscriber": {
+            "email_address": email
+        },
+        "application_context": {
+            "brand_name": "Marketing Genius Tool",
+            "locale": "en-US",
+            "shipping_preference": "NO_SHIPPING",
+            "user_action": "SUBSCRIBE_NOW",
+            "return_url": "https://geniusmarketingai.netlify.app/success",
+            "cancel_url": "https://geniusmarketingai.netlify.app/cancel"
+        }
+    }
+
+def find_approval_url(sub_json):
+    """Find the approval link in a PayPal subscription response."""
+    for link in sub_json.get('links', []):
+        if link.get('rel') == 'approve':
+            return link.get('href')
+    return None
 
 @app.route('/api/create-subscription', methods=['POST'])
+@idempotent
 def create_subscription():
     try:
         data = request.get_json()
@@ -216,12 +459,13 @@ def create_subscription():
         client_secret = os.getenv('PAYPAL_CLIENT_SECRET')
         auth = (client_id, client_secret)
         headers = {'Accept': 'application/json', 'Accept-Language': 'en_US'}
-        token_response = requests.post(
-            'https://api-m.paypal.com/v1/oauth2/token',
+        token_response = paypal.call(lambda: requests.post(
+            f'{PAYPAL_API_BASE}/v1/oauth2/token',
             headers=headers,
             data={'grant_type': 'client_credentials'},
-            auth=auth
-        )
+            auth=auth,
+            timeout=current_timeout()
+        ), idempotent=True)
         access_token = token_response.json().get('access_token')
         if not access_token:
             return jsonify({'error': 'Could not get PayPal access token'}), 500
@@ -229,39 +473,26 @@ def create_subscription():
         # 2. Create subscription
         sub_headers = {
             'Content-Type': 'application/json',
-            'Authorization': f'Bearer {access_token}'
+            'Authorization': f'Bearer {access_token}',
+            # Lets PayPal deduplicate retried creates
+            'PayPal-Request-Id': paypal_request_id()
         }
-        sub_data = {
-            "plan_id": os.getenv('PAYPAL_PLAN_ID'),
-            "subscriber": {
-                "email_address": email
-            },
-            "application_context": {
-                "brand_name": "Marketing Genius Tool",
-                "locale": "en-US",
-                "shipping_preference": "NO_SHIPPING",
-                "user_action": "SUBSCRIBE_NOW",
-                "return_url": "https://geniusmarketingai.netlify.app/success",
-                "cancel_url": "https://geniusmarketingai.netlify.app/cancel"
-            }
-        }
-        sub_response = requests.post(
-            'https://api-m.paypal.com/v1/billing/subscriptions',
+        sub_data = build_subscription_payload(email)
+        sub_response = paypal.call(lambda: requests.post(
+            f'{PAYPAL_API_BASE}/v1/billing/subscriptions',
             headers=sub_headers,
-            json=sub_data
-        )
+            json=sub_data,
+            timeout=current_timeout()
+        ), idempotent=True)
         sub_json = sub_response.json()
-        # Find approval link
-        approval_url = None
-        for link in sub_json.get('links', []):
-            if link.get('rel') == 'approve':
-                approval_url = link.get('href')
-                break
+        approval_url = find_approval_url(sub_json)
         if approval_url:
             return jsonify({'approval_url': approval_url})
         else:
             return jsonify({'error': sub_json}), 500
 
+    except OutboundUnavailable as e:
+        return paypal_unavailable(e)
     except Exception as e:
         print(f"Error creating subscription: {e}")
         return jsonify({'error': str(e)}), 500
@@ -270,26 +501,19 @@ def create_subscription():
 def webhook():
     """Handle PayPal webhook events"""
     try:
-        event_type = request.headers.get('PAYPAL-TRANSMISSION-SIG')
         webhook_id = os.getenv('PAYPAL_WEBHOOK_ID', 'your_webhook_id')
         
-        # Verify webhook signature
-        if not paypalrestsdk.WebhookEvent.verify(
-            request.headers,
-            request.data,
-            webhook_id
-        ):
+        # Verify the signature locally and take the event from the verified body
+        try:
+            event = webhook_verifier.verify(request.headers, request.get_data(), webhook_id)
+        except WebhookVerificationError as e:
+            print(f"Rejected webhook: {e}")
             return jsonify({'error': 'Invalid webhook signature'}), 400
-            
-        event = paypalrestsdk.WebhookEvent.find(request.headers.get('PAYPAL-TRANSMISSION-ID'))
         
-        if event.event_type == 'BILLING.SUBSCRIPTION.ACTIVATED':
+        if event.get('event_type') == 'BILLING.SUBSCRIPTION.ACTIVATED':
+            subscription_id = (event.get('resource') or {}).get('id')
             # Find email by subscription ID
-            email = next(
-                (email for email, sub in subscriptions.items() 
-                 if sub.get('subscription_id') == event.resource.id),
-                None
-            )
+            email = subscriptions.email_for_subscription_id(subscription_id)
             
             if email:
                 subscriptions[email].update({
@@ -300,6 +524,8 @@ def webhook():
                 send_subscription_confirmation_email(email)
                 
         return jsonify({'status': 'success'})
+    except OutboundUnavailable as e:
+        return paypal_unavailable(e)
     except Exception as e:
         print(f"Error processing webhook: {e}")
         return jsonify({'error': str(e)}), 400
@@ -322,7 +548,7 @@ def subscribe():
         subscriptions[email] = {
             'is_active': True,
             'is_trial': True,
-            'trial_end': (datetime.now() + timedelta(days=7)).isoformat()
+            'trial_end': datetime.now() + timedelta(days=7)
         }
         
         # Send personalized welcome email
@@ -351,125 +577,309 @@ def check_subscription():
         
         # Check if trial has expired
         if subscription['is_trial']:
-            trial_end = datetime.fromisoformat(subscription['trial_end'])
-            if datetime.now() > trial_end:
+            remaining = subscription.trial_end_epoch - time.time()
+            if remaining < 0:
                 subscription['is_active'] = False
                 subscription['is_trial'] = False
-            elif (trial_end - datetime.now()).days <= 3:
+            elif remaining < 4 * 86400:
                 # Send trial ending notification
                 send_trial_ending_email(email)
         
-        return jsonify(subscription)
+        return jsonify(dict(subscription))
         
     except Exception as e:
         print(f"Error checking subscription: {e}")
         return jsonify({'error': str(e)}), 500
 
+def check_analyze_request(data):
+    """
+    Validate an analyze request and apply the rate and trial limits.
+    Shared with the ASGI variant in asgi.py.
+
+    Returns:
+        (error message, status code) if the request is rejected, else None
+    """
+    email = data.get('email')
+    
+    if not email:
+        return 'Email is required', 400
+
+    if not check_rate_limit(email):
+        return 'Too many requests, please slow down', 429
+        
+    # Check if user has active subscription
+    subscription = subscriptions.get(email)
+    if not subscription or not subscription.get('is_active'):
+        return 'Active subscription required', 403
+        
+    if not tool:
+        return 'Marketing Genius Tool not initialized', 500
+        
+    if not data.get('url'):
+        return 'URL is required', 400
+
+    if not check_trial_limits(email):
+        return 'Trial analysis limit reached, please subscribe to continue', 403
+    return None
+
+def record_analysis(email, url, result):
+    """Keep a returned analysis in the user's history; failures never fail the request."""
+    try:
+        analysis_history.record(email, url, result)
+    except Exception as e:
+        print(f"Error recording analysis history: {e}")
+
+def analysis_cache_key(url, employee_count):
+    """Canonical key for an analysis, shared by the result cache and request coalescing."""
+    return make_key(url, tool.suggest_business_size(employee_count), tool.config_version)
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     """Analyze marketing data"""
     try:
         # Check subscription status first
         data = request.get_json()
-        email = data.get('email')
-        
-        if not email:
-            return jsonify({'error': 'Email is required'}), 400
-            
-        # Check if user has active subscription
-        subscription = subscriptions.get(email)
-        if not subscription or not subscription.get('is_active'):
-            return jsonify({'error': 'Active subscription required'}), 403
-            
-        if not tool:
-            return jsonify({'error': 'Marketing Genius Tool not initialized'}), 500
+        rejected = check_analyze_request(data)
+        if rejected:
+            return jsonify({'error': rejected[0]}), rejected[1]
             
         url = data.get('url')
         employee_count = data.get('employee_count')
         
-        if not url:
-            return jsonify({'error': 'URL is required'}), 400
-            
-        # Parse URL to get keywords
-        url_keywords = tool.parse_url_keywords(url)
-        
-        # Classify industry
-        industry = tool.classify_industry(','.join(url_keywords))
-        
-        # Determine business size
-        biz_size = tool.suggest_business_size(employee_count)
-        
-        # Build campaign
-        campaign = tool.build_campaign(url_keywords, industry)
-        
-        # Get marketing strategy
-        strategy = tool.suggest_marketing_strategy(industry, biz_size)
-        
-        # Get social media ideas
-        social_ideas = tool.generate_social_post_ideas(industry)
-        
-        # Predict performance
-        performance = tool.predict_performance(campaign)
-        
-        # Generate A/B test variations
-        ab_variations = tool.ab_test_variations(campaign)
-        
-        # Allocate budget
-        budget_alloc = tool.allocate_budget(campaign, budget=500)
-        
-        # Get schedule
-        schedule = tool.schedule_campaign(campaign)
-        
-        # Get monitoring alerts
-        alerts = tool.monitor_campaign(performance)
-        
-        # Calculate ROI
-        roi = tool.roi_dashboard(spend=500, conversions=30, revenue_per_conversion=25)
-        
-        # Get content strategy
-        content_recs = tool.generate_content_strategy(performance)
+        # Serve from the host-wide cache when another worker already ran this analysis,
+        # and let concurrent duplicates in this worker wait for the first caller
+        cache_key = analysis_cache_key(url, employee_count)
+        (result, _), _ = analysis_flight.do(
+            cache_key,
+            lambda: result_cache.get_or_compute(cache_key, lambda: tool.analyze(url, employee_count)),
+            timeout=ANALYZE_COALESCE_TIMEOUT
+        )
+        record_analysis(data.get('email'), url, result)
         
-        return jsonify({
-            'keywords': url_keywords,
-            'industry': industry,
-            'business_size': biz_size,
-            'campaign': campaign,
-            'strategy': strategy,
-            'social_ideas': social_ideas,
-            'performance': performance,
-            'ab_variations': ab_variations,
-            'budget_allocation': budget_alloc,
-            'schedule': schedule,
-            'alerts': alerts,
-            'roi': roi,
-            'content_recommendations': content_recs
-        })
+        return jsonify(result)
+    except SingleFlightTimeout:
+        return jsonify({'error': 'Analysis is taking longer than expected, please retry'}), 504
     except Exception as e:
         print(f"Error analyzing data: {e}")
         return jsonify({'error': str(e)}), 500
 
+def authenticated_email():
+    """Email claim of the request's bearer JWT if it verifies against JWT_SECRET, else None."""
+    header = request.headers.get('Authorization', '')
+    if not app.config['JWT_SECRET'] or not header.startswith('Bearer '):
+        return None
+    try:
+        claims = jwt.decode(header[len('Bearer '):], app.config['JWT_SECRET'], algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return None
+    email = claims.get('email')
+    return email if isinstance(email, str) else None
+
+@app.route('/api/analyses', methods=['POST'])
+def analyses():
+    """Past analyses of the signed-in user, newest first, paginated with a cursor"""
+    # Histories are private: the user comes from a signed token, never from a parameter
+    if not app.config['JWT_SECRET']:
+        return jsonify({'error': 'Analysis history is not configured'}), 503
+    email = authenticated_email()
+    if not email:
+        return jsonify({'error': 'A valid bearer token is required'}), 401
+    subscription = subscriptions.get(email)
+    if not subscription or not subscription.get('is_active'):
+        return jsonify({'error': 'Active subscription required'}), 403
+    try:
+        data = request.get_json(silent=True) or {}
+        limit = min(max(int(data.get('limit', 20)), 1), ANALYSES_PAGE_LIMIT)
+        page = analysis_history.page(email, cursor=data.get('cursor'), limit=limit,
+                                     include_results=data.get('results', True) is not False)
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error loading analysis history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/roi', methods=['POST'])
+def roi():
+    """Grouped ROI, ROAS and CPA over the historical spend and conversion store"""
+    try:
+        data = request.get_json() or {}
+        email = data.get('email')
+        if not email:
+            return jsonify({'error': 'Email is required'}), 400
+        if not get_available_features(subscriptions.get(email))['roi_dashboard']:
+            return jsonify({'error': 'Active subscription required'}), 403
+        if not tool or tool.roi_store is None:
+            return jsonify({'error': 'ROI history not available'}), 503
+
+        group_by = data.get('group_by', ['channel'])
+        filters = {key: data[key] for key in ('start', 'end', 'channel', 'campaign') if data.get(key)}
+        return jsonify({'rows': tool.roi_report(group_by, **filters)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error building ROI report: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def ab_experiment(data):
+    """Experiment id from a request, or raise ValueError."""
+    experiment = data.get('experiment')
+    if not isinstance(experiment, str) or not 0 < len(experiment) <= AB_EXPERIMENT_MAX_LENGTH:
+        raise ValueError(f'experiment must be a string of 1 to {AB_EXPERIMENT_MAX_LENGTH} characters')
+    return experiment
+
+def events_token_error():
+    """Error response unless the request carries the EVENTS_TOKEN bearer token (off while unset)."""
+    token = os.getenv('EVENTS_TOKEN')
+    if not token:
+        return jsonify({'error': 'Event ingest is not configured'}), 503
+    if not secrets.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': 'Invalid events token'}), 401
+    return None
+
+@app.route('/api/ab/select', methods=['POST'])
+def ab_select():
+    """Pick the variant to show for one impression; variants is a count or the list of variants"""
+    if not ab_server.experiments:
+        return jsonify({'error': 'No A/B experiments are configured'}), 503
+    try:
+        data = request.get_json() or {}
+        experiment = ab_experiment(data)
+        options = data.get('variants')
+        count = len(options) if isinstance(options, list) else options
+        if isinstance(count, bool) or not isinstance(count, int):
+            return jsonify({'error': 'variants must be a count or a list'}), 400
+        variant = ab_server.select(experiment, count)
+        response = {'experiment': experiment, 'variant': variant}
+        if isinstance(options, list):
+            response['selected'] = options[variant]
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error selecting A/B variant: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ab/record', methods=['POST'])
+def ab_record():
+    """Record clicks and conversions for a served variant"""
+    # Results steer the sampler, so they need the same token as event ingest
+    error = events_token_error()
+    if error:
+        return error
+    try:
+        data = request.get_json() or {}
+        experiment = ab_experiment(data)
+        variant, clicks, conversions = data.get('variant'), data.get('clicks', 0), data.get('conversions', 0)
+        if any(isinstance(value, bool) or not isinstance(value, int) for value in (variant, clicks, conversions)):
+            return jsonify({'error': 'variant, clicks and conversions must be integers'}), 400
+        ab_server.record(experiment, variant, clicks, conversions)
+        return jsonify({'status': 'recorded'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error recording A/B result: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ab/stats')
+def ab_stats():
+    """Counters and posterior mean per variant of an experiment"""
+    try:
+        experiment = ab_experiment(request.args)
+        return jsonify({'experiment': experiment, 'variants': ab_server.summary(experiment)})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+def feed_events(events):
+    """Pass durably logged events to the live consumers: campaign monitoring, content CTR and A/B learning."""
+    with event_monitor_lock:
+        for event in events:
+            event_monitor.record(event['timestamp'], event['campaign'], event['channel'],
+                                 EVENT_KINDS[event['type']], event.get('cost', 0.0))
+    if tool:
+        formats = defaultdict(lambda: [0, 0])
+        for event in events:
+            if 'format' in event and event['type'] != 'conversion':
+                formats[event['format']][event['type'] == 'click'] += 1
+        for content_format, (impressions, clicks) in formats.items():
+            tool.record_content_events(content_format, impressions, clicks)
+    for event in events:
+        # Impressions were counted when the variant was selected
+        if 'experiment' in event and event['type'] != 'impression':
+            try:
+                ab_server.record(event['experiment'], event['variant'],
+                                 clicks=int(event['type'] == 'click'), conversions=int(event['type'] == 'conversion'))
+            except ValueError:
+                pass  # Variant never served by this host
+
+@app.route('/api/events', methods=['POST'])
+def ingest_events():
+    """Append a batch of NDJSON events (one JSON object per line) to the event log"""
+    # Events feed A/B counters and ROI history, so ingest stays off until a token is configured
+    error = events_token_error()
+    if error:
+        return error
+    body = request.stream.read(EVENTS_MAX_BYTES + 1)
+    if len(body) > EVENTS_MAX_BYTES:
+        return jsonify({'error': f'Batches are limited to {EVENTS_MAX_BYTES} bytes'}), 413
+    events, rejected = parse_events(body)
+    if not events:
+        return jsonify({'accepted': 0, 'rejected': rejected[:EVENTS_MAX_REJECTIONS]}), 400 if rejected else 200
+    try:
+        # Returns once the batch is on disk
+        event_log.append(events)
+    except OSError as e:
+        print(f"Error appending events: {e}")
+        return jsonify({'error': 'Events could not be stored, please retry'}), 503
+    try:
+        feed_events(events)
+    except Exception as e:
+        print(f"Error feeding events to live consumers: {e}")
+    return jsonify({'accepted': len(events), 'rejected': rejected[:EVENTS_MAX_REJECTIONS]}), 202
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Report how much duplicate compute the shared result cache saved."""
+    stats = result_cache.stats()
+    stats['coalesced'] = analysis_flight.stats()
+    return jsonify(stats)
+
+@app.route('/api/metrics/outbound')
+def outbound_metrics():
+    """Circuit breaker state and latency of outbound calls."""
+    return jsonify(outbound_metrics_payload())
+
+def outbound_metrics_payload():
+    """Outbound metrics body, shared with the ASGI app."""
+    return {'paypal': paypal.metrics(), 'webhook_certificates': webhook_verifier.stats()}
+
 @app.route('/health')
 def health_check():
     """Health check endpoint."""
-    return jsonify({'status': 'healthy'})
+    return jsonify(health_payload())
+
+def health_payload():
+    """Health check body, shared with the ASGI app."""
+    return {'status': 'healthy', 'startup': tool.startup if tool else None}
 
 @app.route('/success')
 def success():
     """Handle successful payment"""
-    return render_template('index.html')
+    return pages.response('index.html')
 
 @app.route('/cancel')
 def cancel():
     """Handle cancelled payment"""
-    return render_template('index.html')
+    return pages.response('index.html')
 
 # Add catch-all route for client-side routing
 @app.route('/<path:path>')
 def catch_all(path):
     """Catch all routes and serve index.html"""
-    return render_template('index.html')
+    return pages.response('index.html')
 
 @app.route('/api/orders', methods=['POST'])
+@idempotent
 def create_order():
     try:
         # Validate request data
@@ -518,9 +928,11 @@ def create_order():
                 "return_url": "https://geniusmarketingai.netlify.app/success",
                 "cancel_url": "https://geniusmarketingai.netlify.app/cancel"
             }
-        })
+        }, api=paypal_api)
+        payment.request_id = paypal_request_id()
 
-        if payment.create():
+        # The SDK reuses the payment's PayPal-Request-Id, so retries are deduplicated
+        if paypal.call(payment.create, idempotent=True):
             return jsonify({
                 "id": payment.id,
                 "status": payment.state
@@ -528,6 +940,8 @@ def create_order():
         else:
             return jsonify({"error": payment.error}), 400
 
+    except OutboundUnavailable as e:
+        return paypal_unavailable(e)
     except Exception as e:
         print("Failed to create order:", str(e))
         return jsonify({"error": "Failed to create order"}), 500
@@ -543,9 +957,13 @@ def capture_order(order_id):
         if not payer_id:
             return jsonify({"error": "payerID is required"}), 400
 
-        payment = paypalrestsdk.Payment.find(order_id)
-        
-        if payment.execute({"payer_id": payer_id}):
+        payment = paypal.call(lambda: paypalrestsdk.Payment.find(order_id, api=paypal_api), idempotent=True)
+
+        # The SDK gives each execute a new PayPal-Request-Id unless the attributes carry one.
+        # A payment executes once, so an id fixed by the order lets PayPal deduplicate retries.
+        execution = paypalrestsdk.resource.Resource({"payer_id": payer_id}, api=paypal_api)
+        execution.request_id = upstream_request_id(request.path, payer_id)
+        if paypal.call(lambda: payment.execute(execution), idempotent=True):
             return jsonify({
                 "id": payment.id,
                 "status": payment.state,
@@ -561,6 +979,8 @@ def capture_order(order_id):
         else:
             return jsonify({"error": payment.error}), 400
 
+    except OutboundUnavailable as e:
+        return paypal_unavailable(e)
     except Exception as e:
         print("Failed to capture order:", str(e))
         return jsonify({"error": "Failed to capture order"}), 500
@@ -587,95 +1007,6 @@ def token_required(f):
         return f(*args, **kwargs)
     return decorated
 
-@app.route('/api/analyze', methods=['POST'])
-@token_required
-def analyze():
-    """Analyze marketing data"""
-    try:
-        # Check subscription status first
-        data = request.get_json()
-        email = data.get('email')
-        
-        if not email:
-            return jsonify({'error': 'Email is required'}), 400
-            
-        # Check if user has active subscription
-        subscription = subscriptions.get(email)
-        if not subscription or not subscription.get('is_active'):
-            return jsonify({'error': 'Active subscription required'}), 403
-            
-        if not tool:
-            return jsonify({'error': 'Marketing Genius Tool not initialized'}), 500
-            
-        url = data.get('url')
-        employee_count = data.get('employee_count')
-        
-        if not url:
-            return jsonify({'error': 'URL is required'}), 400
-            
-        # Parse URL to get keywords
-        url_keywords = tool.parse_url_keywords(url)
-        
-        # Classify industry
-        industry = tool.classify_industry(','.join(url_keywords))
-        
-        # Determine business size
-        biz_size = tool.suggest_business_size(employee_count)
-        
-        # Build campaign
-        campaign = tool.build_campaign(url_keywords, industry)
-        
-        # Get marketing strategy
-        strategy = tool.suggest_marketing_strategy(industry, biz_size)
-        
-        # Get social media ideas
-        social_ideas = tool.generate_social_post_ideas(industry)
-        
-        # Predict performance
-        performance = tool.predict_performance(campaign)
-        
-        # Generate A/B test variations
-        ab_variations = tool.ab_test_variations(campaign)
-        
-        # Allocate budget
-        budget_alloc = tool.allocate_budget(campaign, budget=500)
-        
-        # Get schedule
-        schedule = tool.schedule_campaign(campaign)
-        
-        # Get monitoring alerts
-        alerts = tool.monitor_campaign(performance)
-        
-        # Calculate ROI
-        roi = tool.roi_dashboard(spend=500, conversions=30, revenue_per_conversion=25)
-        
-        # Get content strategy
-        content_recs = tool.generate_content_strategy(performance)
-        
-        return jsonify({
-            'keywords': url_keywords,
-            'industry': industry,
-            'business_size': biz_size,
-            'campaign': campaign,
-            'strategy': strategy,
-            'social_ideas': social_ideas,
-            'performance': performance,
-            'ab_variations': ab_variations,
-            'budget_allocation': budget_alloc,
-            'schedule': schedule,
-            'alerts': alerts,
-            'roi': roi,
-            'content_recommendations': content_recs
-        })
-    except Exception as e:
-        print(f"Error analyzing data: {e}")
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/health')
-def health_check():
-    """Health check endpoint."""
-    return jsonify({'status': 'healthy'})
-
 if __name__ == "__main__":
     # This block is for local development, not for serverless deployment
     app.run(debug=True, port=5000)
@@ -0,0 +1,129 @@
+"""
+Weighted industry scoring over a sparse industry x vocabulary matrix.
+
+Every industry contributes its own name, its configured interests and its
+synonyms (config "synonyms" plus built-in defaults) as vocabulary terms,
+each with a weight by kind. A term shared by several industries is split
+between them, so it counts for less than a term only one industry uses.
+The matrix is stored transposed in CSR form (for each term, the industries
+it points to and their weights), which makes scoring one keyword set a
+handful of lookups and scoring thousands of sets a single vectorized
+sparse product: expand every (set, term) pair into its (industry, weight)
+entries and sum them with one bincount.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import argparse
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GENERAL = "general"
+NAME_WEIGHT = 1.0
+SYNONYM_WEIGHT = 0.8
+INTEREST_WEIGHT = 0.5
+DEFAULT_SYNONYMS = {
+    "skincare": ["skin", "serum", "serums", "cosmetics", "moisturiser", "moisturizer", "beauty", "spa"],
+    "tech": ["technology", "software", "saas", "app", "apps", "electronics", "computer", "computers", "digital"],
+}
+
+
+class IndustryClassifier:
+    def __init__(self, industry_map: Dict[str, Dict], synonyms: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            industry_map: Industry config; entries may list "interests" and "synonyms"
+            synonyms: Extra synonyms per industry, defaults to DEFAULT_SYNONYMS
+        """
+        self.industries = list(industry_map)
+        synonyms = DEFAULT_SYNONYMS if synonyms is None else synonyms
+        weights: Dict[str, Dict[int, float]] = {}
+        for i, (industry, config) in enumerate(industry_map.items()):
+            terms = [(industry, NAME_WEIGHT)]
+            terms += [(term, SYNONYM_WEIGHT) for term in list(config.get("synonyms", [])) + synonyms.get(industry, [])]
+            terms += [(term, INTEREST_WEIGHT) for term in config.get("interests", [])]
+            for term, weight in terms:
+                row = weights.setdefault(str(term).lower(), {})
+                row[i] = max(row.get(i, 0.0), weight)
+
+        self.vocabulary = {term: j for j, term in enumerate(weights)}
+        counts = np.array([len(weights[term]) for term in weights], dtype=np.int64)
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.term_industries = np.array([i for term in weights for i in weights[term]], dtype=np.int64)
+        # Shared terms are split between the industries using them
+        self.term_weights = np.array([w / len(weights[term]) for term in weights for w in weights[term].values()],
+                                     dtype=np.float64)
+
+    def scores(self, keyword_sets: Sequence[Iterable[str]]) -> np.ndarray:
+        """
+        Industry scores for many keyword sets: a (sets x industries) array
+        computed as one sparse product. Repeated keywords in a set count once.
+        """
+        rows, cols = [], []
+        vocabulary = self.vocabulary
+        for row, keywords in enumerate(keyword_sets):
+            for keyword in keywords:
+                col = vocabulary.get(keyword.strip().lower())
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        n_sets, n_industries = len(keyword_sets), len(self.industries)
+        if not rows or not n_industries:
+            return np.zeros((n_sets, n_industries))
+        pairs = np.unique(np.asarray(rows, dtype=np.int64) * len(vocabulary) + np.asarray(cols, dtype=np.int64))
+        rows, cols = pairs // len(vocabulary), pairs % len(vocabulary)
+        # Expand each (set, term) pair into the term's nonzero (industry, weight) entries
+        starts, lengths = self.indptr[cols], self.indptr[cols + 1] - self.indptr[cols]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        entries = np.repeat(starts, lengths) + offsets
+        flat = np.bincount(np.repeat(rows, lengths) * n_industries + self.term_industries[entries],
+                           weights=self.term_weights[entries], minlength=n_sets * n_industries)
+        return flat.reshape(n_sets, n_industries)
+
+    def top_k_many(self, keyword_sets: Sequence[Iterable[str]], k: int = 3) -> List[List[Tuple[str, float]]]:
+        """
+        Top k (industry, confidence) per keyword set, best first. Confidence
+        is the industry's share of the set's total score; a set matching no
+        industry gets [("general", 0.0)]. Ties keep config order.
+        """
+        scores = self.scores(keyword_sets)
+        totals = scores.sum(axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        results = []
+        for row, total in enumerate(totals):
+            if total <= 0:
+                results.append([(GENERAL, 0.0)])
+                continue
+            results.append([(self.industries[i], round(float(scores[row, i] / total), 3))
+                            for i in order[row] if scores[row, i] > 0])
+        return results
+
+    def top_k(self, keywords: Iterable[str], k: int = 3) -> List[Tuple[str, float]]:
+        return self.top_k_many([list(keywords)], k)[0]
+
+    def classify(self, keywords: Iterable[str]) -> str:
+        """Best matching industry, or "general" when nothing matches."""
+        return self.top_k(keywords, k=1)[0][0]
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    from marketing_genius_tool import MarketingGeniusTool
+
+    parser = argparse.ArgumentParser(description="Classify many URLs (one per line) into ranked industries.")
+    parser.add_argument("urls", help="Text file with one URL per line")
+    parser.add_argument("-k", type=int, default=3, help="Industries per URL")
+    args = parser.parse_args(argv)
+
+    tool = MarketingGeniusTool()
+    tool.rate_limiter.calls_per_second = float("inf")
+    with open(args.urls) as f:
+        urls = [line.strip() for line in f if line.strip()]
+    ranked = tool.industry_classifier.top_k_many([tool.parse_url_keywords(url) for url in urls], args.k)
+    geos = tool.geo_resolver.resolve_many(urls)
+    for url, industries, geo in zip(urls, ranked, geos):
+        print(f"{url}\t{geo['region'] or geo['country'] or '-'}\t" +
+              ", ".join(f"{industry} {confidence:.2f}" for industry, confidence in industries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+TF-IDF weighting of URL keywords against the URLs analyzed so far.
+
+Document frequencies are kept incrementally: each token has an integer id
+and a slot in a uint32 array, so adding a URL costs O(tokens) and the IDF
+of a token is one dict lookup and one array read. URLs are remembered by
+a 64-bit digest so re-analyzing a URL does not count it twice. Generic
+words that appear in most URLs ("shop", "products") sink below the terms
+that actually describe a page.
+
+The corpus is bounded by decay: once more than max_documents URLs have
+been counted, every frequency and the document count are halved, tokens
+that fall to zero are dropped and only the most recently seen half of the
+URL digests is kept. Recent URLs weigh more than old ones and memory stays
+flat however many URLs are analyzed.
+
+KeywordWeights lives in one process and is saved to .npz files by the CLI;
+SharedKeywordWeights keeps the same counts in the SQLite state every API
+worker on the host shares.
+"""
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional
+import argparse
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import numpy as np
+from shared_state import SQLiteState, state_dir
+
+logger = logging.getLogger(__name__)
+
+# URLs counted before frequencies are halved
+DEFAULT_MAX_DOCUMENTS = 100_000
+
+
+def url_digest(url: str) -> int:
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def signed_digest(digest: int) -> int:
+    """A url_digest as the signed 64-bit integer SQLite stores."""
+    return digest - (1 << 64) if digest >= 1 << 63 else digest
+
+
+def smoothed_idf(documents: int, frequency: int) -> float:
+    """Smoothed inverse document frequency; unseen tokens get the highest weight."""
+    return math.log((1 + documents) / (1 + frequency)) + 1.0
+
+
+def rank_by_tf_idf(tokens: List[str], documents: int, frequencies: Dict[str, int]) -> List[str]:
+    """Distinct tokens ordered by TF-IDF, highest first, ties in their original order."""
+    counts = Counter(tokens)
+    weights = {token: count * smoothed_idf(documents, frequencies.get(token, 0)) for token, count in counts.items()}
+    return sorted(counts, key=lambda token: -weights[token])
+
+
+class KeywordWeights:
+    def __init__(self, max_documents: int = DEFAULT_MAX_DOCUMENTS):
+        self.max_documents = max_documents
+        self.documents = 0
+        self._ids: Dict[str, int] = {}
+        self._df = array('I')
+        # URL digests, least recently seen first
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, url: str, tokens: Iterable[str]) -> bool:
+        """
+        Count a URL's tokens once towards document frequencies.
+
+        Returns:
+            False if the URL was already counted
+        """
+        digest = url_digest(url)
+        if digest in self._seen:
+            self._seen.move_to_end(digest)
+            return False
+        self._seen[digest] = None
+        self.documents += 1
+        for token in set(tokens):
+            token_id = self._ids.get(token)
+            if token_id is None:
+                self._ids[token] = len(self._df)
+                self._df.append(1)
+            else:
+                self._df[token_id] += 1
+        if self.documents > self.max_documents:
+            self._decay()
+        return True
+
+    def _decay(self):
+        df = np.frombuffer(self._df, dtype=np.uint32) // 2
+        tokens = sorted(self._ids, key=self._ids.get)
+        keep = np.flatnonzero(df)
+        self._ids = {tokens[i]: new_id for new_id, i in enumerate(keep.tolist())}
+        self._df = array('I', df[keep].tobytes())
+        self.documents //= 2
+        while len(self._seen) > self.max_documents // 2:
+            self._seen.popitem(last=False)
+        logger.info(f"Halved keyword frequencies: {self.documents} URLs, {len(self._ids)} keywords")
+
+    def document_frequency(self, token: str) -> int:
+        token_id = self._ids.get(token)
+        return 0 if token_id is None else self._df[token_id]
+
+    def idf(self, token: str) -> float:
+        """Smoothed inverse document frequency; unseen tokens get the highest weight."""
+        return smoothed_idf(self.documents, self.document_frequency(token))
+
+    def rank(self, tokens: List[str]) -> List[str]:
+        """
+        Distinct tokens ordered by TF-IDF, highest first. Ties keep their
+        original order, so with no corpus the parser's order is unchanged.
+        """
+        return rank_by_tf_idf(tokens, self.documents, {token: self.document_frequency(token) for token in tokens})
+
+    def save(self, path: str):
+        """Save the token table, frequencies and URL digests to an .npz file."""
+        tokens = sorted(self._ids, key=self._ids.get)
+        np.savez(
+            path,
+            tokens=np.asarray(tokens, dtype=str),
+            df=np.frombuffer(self._df, dtype=np.uint32) if len(self._df) else np.zeros(0, dtype=np.uint32),
+            seen=np.fromiter(self._seen, dtype=np.uint64, count=len(self._seen)),
+            documents=np.int64(self.documents)
+        )
+
+    @classmethod
+    def load(cls, path: str, max_documents: int = DEFAULT_MAX_DOCUMENTS) -> "KeywordWeights":
+        weights = cls(max_documents)
+        if not os.path.exists(path):
+            return weights
+        with np.load(path) as data:
+            weights._ids = {str(token): i for i, token in enumerate(data['tokens'])}
+            weights._df = array('I', data['df'].astype(np.uint32).tobytes())
+            weights._seen = OrderedDict.fromkeys(int(digest) for digest in data['seen'])
+            weights.documents = int(data['documents'])
+        while weights.documents > weights.max_documents:
+            weights._decay()
+        return weights
+
+
+class SharedKeywordWeights(SQLiteState):
+    """
+    KeywordWeights kept in SQLite, so every worker ranks against the same
+    corpus. Adding a URL is one write transaction; ranking reads the
+    frequencies of the URL's tokens in one query.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS keyword_urls (
+            digest INTEGER PRIMARY KEY,
+            seen INTEGER NOT NULL  -- increases every time any URL is seen, so the lowest is least recent
+        );
+        CREATE INDEX IF NOT EXISTS keyword_urls_seen ON keyword_urls (seen);
+        CREATE TABLE IF NOT EXISTS keyword_df (
+            token TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS keyword_documents (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            count INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO keyword_documents (id, count) VALUES (0, 0);
+    """
+
+    def __init__(self, path: Optional[str] = None, max_documents: int = DEFAULT_MAX_DOCUMENTS):
+        super().__init__(path or os.path.join(state_dir(), 'keywords.db'))
+        self.max_documents = max_documents
+
+    @property
+    def documents(self) -> int:
+        return self._connection().execute('SELECT count FROM keyword_documents').fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM keyword_df').fetchone()[0]
+
+    def add(self, url: str, tokens: Iterable[str]) -> bool:
+        """
+        Count a URL's tokens once towards document frequencies.
+
+        Returns:
+            False if the URL was already counted
+        """
+        digest = signed_digest(url_digest(url))
+        with self._transaction() as conn:
+            seen = conn.execute('SELECT COALESCE(MAX(seen), 0) + 1 FROM keyword_urls').fetchone()[0]
+            if conn.execute('UPDATE keyword_urls SET seen = ? WHERE digest = ?', (seen, digest)).rowcount:
+                return False
+            conn.execute('INSERT INTO keyword_urls (digest, seen) VALUES (?, ?)', (digest, seen))
+            conn.executemany(
+                'INSERT INTO keyword_df (token, count) VALUES (?, 1) ON CONFLICT(token) DO UPDATE SET count = count + 1',
+                ((token,) for token in set(tokens))
+            )
+            documents = conn.execute('UPDATE keyword_documents SET count = count + 1 RETURNING count').fetchone()[0]
+            if documents > self.max_documents:
+                self._decay(conn)
+        return True
+
+    def _decay(self, conn: sqlite3.Connection):
+        conn.execute('UPDATE keyword_df SET count = count / 2')
+        conn.execute('DELETE FROM keyword_df WHERE count = 0')
+        conn.execute('UPDATE keyword_documents SET count = count / 2')
+        conn.execute(
+            'DELETE FROM keyword_urls WHERE digest NOT IN '
+            '(SELECT digest FROM keyword_urls ORDER BY seen DESC LIMIT ?)',
+            (self.max_documents // 2,)
+        )
+        logger.info("Halved shared keyword frequencies")
+
+    def document_frequencies(self, tokens: Iterable[str]) -> Dict[str, int]:
+        tokens = list(set(tokens))
+        if not tokens:
+            return {}
+        rows = self._connection().execute(
+            f'SELECT token, count FROM keyword_df WHERE token IN ({",".join("?" * len(tokens))})', tokens
+        ).fetchall()
+        return dict(rows)
+
+    def document_frequency(self, token: str) -> int:
+        return self.document_frequencies([token]).get(token, 0)
+
+    def idf(self, token: str) -> float:
+        """Smoothed inverse document frequency; unseen tokens get the highest weight."""
+        return smoothed_idf(self.documents, self.document_frequency(token))
+
+    def rank(self, tokens: List[str]) -> List[str]:
+        """Distinct tokens ordered by TF-IDF, highest first, ties in their original order."""
+        return rank_by_tf_idf(tokens, self.documents, self.document_frequencies(tokens))
+
+    def seed(self, weights: KeywordWeights) -> bool:
+        """
+        Load a corpus built offline (see main) if the shared one is still empty.
+        Safe to call from every worker at startup; only the first one loads it.
+
+        Returns:
+            True if this call loaded the corpus
+        """
+        with self._transaction() as conn:
+            if conn.execute('SELECT count FROM keyword_documents').fetchone()[0]:
+                return False
+            conn.executemany('INSERT OR REPLACE INTO keyword_df (token, count) VALUES (?, ?)',
+                             ((token, weights._df[i]) for token, i in weights._ids.items()))
+            conn.executemany('INSERT OR IGNORE INTO keyword_urls (digest, seen) VALUES (?, ?)',
+                             ((signed_digest(digest), i) for i, digest in enumerate(weights._seen, 1)))
+            conn.execute('UPDATE keyword_documents SET count = ?', (weights.documents,))
+        return True
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    from marketing_genius_tool import MarketingGeniusTool
+
+    parser = argparse.ArgumentParser(description="Build keyword document frequencies from a list of URLs.")
+    parser.add_argument("urls", help="Text file with one URL per line")
+    parser.add_argument("--store", default="keyword_weights.npz", help="Frequency file, updated in place")
+    parser.add_argument("--max-documents", type=int, default=DEFAULT_MAX_DOCUMENTS,
+                        help="URLs counted before frequencies are halved")
+    args = parser.parse_args(argv)
+
+    tool = MarketingGeniusTool()
+    tool.rate_limiter.calls_per_second = float('inf')
+    weights = KeywordWeights.load(args.store, args.max_documents)
+    with open(args.urls) as f:
+        added = sum(weights.add(url, tool.parse_url_keywords(url)) for url in (line.strip() for line in f) if url)
+    weights.save(args.store)
+    print(f"Added {added} URLs; {weights.documents} URLs and {len(weights)} distinct keywords in {args.store}")
+
+
+if __name__ == "__main__":
+    main()
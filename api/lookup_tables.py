@@ -0,0 +1,82 @@
+"""
+Strategy and audience lookup tables for one configuration snapshot.
+
+The domain is small and fixed (configured industries x business sizes), so
+every answer is computed once when the config is loaded and stored in
+read-only structures shared by all requests: audiences are frozen
+mappings with tuples in place of lists, and strategies are nested dicts of
+final strings. suggest_audience and suggest_marketing_strategy become one
+or two dict lookups that allocate nothing.
+"""
+from typing import Any, Dict, Mapping
+from types import MappingProxyType
+import copyreg
+
+BUSINESS_SIZES = ("small", "medium", "large")
+GENERAL_STRATEGY = "Use general marketing approaches."
+DEFAULT_AUDIENCE = {
+    "channels": ["Facebook", "Google"],
+    "age_range": (18, 65),
+    "interests": ["general"],
+    "strategy": "Use broad marketing to test your audience."
+}
+
+
+def _mapping_proxy(mapping: Dict) -> MappingProxyType:
+    return MappingProxyType(mapping)
+
+
+def _reduce_mapping_proxy(proxy: MappingProxyType):
+    return _mapping_proxy, (dict(proxy),)
+
+
+# Let frozen tables be pickled (into startup snapshots) as the proxies they are
+copyreg.pickle(MappingProxyType, _reduce_mapping_proxy)
+
+
+def freeze(value: Any) -> Any:
+    """Read-only copy: dicts become mapping proxies, lists become tuples."""
+    # Exact type checks: this runs over whole configs at startup and ABC checks are slow
+    kind = type(value)
+    if kind is dict or kind is MappingProxyType:
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if kind is list or kind is tuple:
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class LookupTables:
+    __slots__ = ("config_version", "audiences", "default_audience", "strategies", "default_strategies")
+
+    def __init__(self, industry_map: Dict[str, Dict], business_size_templates: Dict[str, str],
+                 config_version: str = ""):
+        """
+        Args:
+            industry_map: Industry config (channels, age_range, interests, strategy)
+            business_size_templates: Strategy sentence per business size
+            config_version: Version of the config the tables were built from
+        """
+        self.config_version = config_version
+        self.audiences = freeze(industry_map)
+        self.default_audience = freeze(DEFAULT_AUDIENCE)
+        sizes = tuple(dict.fromkeys(BUSINESS_SIZES + tuple(business_size_templates)))
+
+        def row(industry_strategy: str) -> Mapping[str, str]:
+            return MappingProxyType({size: f"{industry_strategy} {business_size_templates.get(size, '')}"
+                                     for size in sizes})
+
+        self.strategies = MappingProxyType({
+            industry: row(config.get("strategy", GENERAL_STRATEGY)) for industry, config in industry_map.items()
+        })
+        self.default_strategies = row(GENERAL_STRATEGY)
+
+    def audience(self, industry: str) -> Mapping[str, Any]:
+        """Audience for an industry, or the broad default for unknown industries."""
+        return self.audiences.get(industry, self.default_audience)
+
+    def strategy(self, industry: str, business_size: str) -> str:
+        strategy = self.strategies.get(industry, self.default_strategies).get(business_size)
+        if strategy is None:
+            # Sizes outside the table only come from direct callers; match the old formatting
+            return f"{self.audiences.get(industry, {}).get('strategy', GENERAL_STRATEGY)} "
+        return strategy
@@ -1,4 +1,5 @@
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Iterable, Mapping, Optional, Any
+from concurrent.futures import Future, ThreadPoolExecutor
 from urllib.parse import urlparse
 import random
 import re
@@ -9,7 +10,18 @@ import os
 from pathlib import Path
 from functools import lru_cache
 import time
+import hashlib
 from threading import Lock
+from social_copy import SocialCopyFitter
+from roi_analytics import roi_metrics
+from content_strategy import ContentStrategy
+from keyword_weights import KeywordWeights
+from industry_classifier import IndustryClassifier
+from geo_resolver import DEFAULT_GEO, GeoResolver
+from lookup_tables import LookupTables
+from tool_snapshot import load_or_build
+from page_fetcher import summary_keywords
+from campaign_monitor import CPC_ALERT_THRESHOLD, CTR_ALERT_THRESHOLD, HIGH_CPC_MESSAGE, LOW_CTR_MESSAGE
 
 # Configure logging
 logging.basicConfig(
@@ -21,6 +33,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Config reloads run here, one at a time, off the request threads
+_config_reloader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='config-reload')
+
+# Illustrative figures roi_dashboard shows until ROI history is loaded
+EXAMPLE_ROI = {"spend": 500, "conversions": 30, "revenue_per_conversion": 25}
+
 class RateLimiter:
     def __init__(self, calls_per_second: float = 1.0):
         self.calls_per_second = calls_per_second
@@ -36,25 +54,113 @@ class RateLimiter:
             self.last_call_time = time.time()
 
 class MarketingGeniusTool:
-    def __init__(self, config_path: Optional[str] = None):
+    def __init__(self, config_path: Optional[str] = None, snapshot_dir: Optional[str] = None):
         """
         Initialize the Marketing Genius Tool with optional configuration.
         
         Args:
             config_path: Path to configuration JSON file. If None, uses default config.
-        """
-        self.config = self._load_config(config_path)
+            snapshot_dir: Directory for startup snapshots of the compiled config
+                state. If None, the state is always built from scratch.
+        """
+        started = time.perf_counter()
+        self.config_path = config_path
+        self.snapshot_dir = snapshot_dir
+        self._config_lock = Lock()
+        self._install_config(self._build_config_state(config_path))
         
-        # Load configurations
-        self.industry_map = self.config.get('industry_map', {})
-        self.social_platforms = self.config.get('social_platforms', {})
-        self.cta_list = self.config.get('cta_list', [])
-        self.business_size_templates = self.config.get('business_size_templates', {})
+        # Optional PostingTimeRecommender built from engagement logs
+        self.posting_times = None
+        # Optional RoiStore of historical spend and conversions
+        self.roi_store = None
+        # Running CTR statistics per content format, fed by record_content_performance
+        self.content_stats = ContentStrategy()
+        self._content_lock = Lock()
+        # Optional PageFetcher; when set, page titles, meta tags and headings inform classification
+        self.page_fetcher = None
+        # Document frequencies of URL keywords over every analyzed URL
+        self.keyword_weights = KeywordWeights()
+        self._keyword_lock = Lock()
+        # Optional ReachEstimator; when set, campaign targeting carries an audience size estimate
+        self.reach_estimator = None
+        # Domain suffix trie for campaign geo targeting, built once
+        self.geo_resolver = GeoResolver()
         
         # Initialize rate limiter
         self.rate_limiter = RateLimiter(calls_per_second=2.0)  # 2 calls per second
         
-        logger.info("Marketing Genius Tool initialized successfully")
+        # How long construction took and whether the snapshot was used ("loaded", "rebuilt" or "off")
+        self.startup = {'seconds': round(time.perf_counter() - started, 4), 'snapshot': self.snapshot}
+        logger.info(f"Marketing Genius Tool initialized in {self.startup['seconds'] * 1000:.1f} ms "
+                    f"(snapshot: {self.snapshot})")
+
+    def _build_config_state(self, config_path: Optional[str]) -> Dict[str, Any]:
+        """
+        Load a configuration and build everything derived from it, without
+        touching the live instance. With a snapshot directory the compiled
+        parts come from a startup snapshot when one matches.
+        """
+        config = self._load_config(config_path)
+        config_version = self._config_version(config)
+        if self.snapshot_dir:
+            compiled, snapshot = load_or_build(
+                self.snapshot_dir, config_version, lambda: self._compile_config(config, config_version))
+        else:
+            compiled, snapshot = self._compile_config(config, config_version), 'off'
+        return dict(compiled, **{
+            'config': config,
+            'config_version': config_version,
+            'industry_map': config.get('industry_map', {}),
+            'social_platforms': config.get('social_platforms', {}),
+            'cta_list': config.get('cta_list', []),
+            'business_size_templates': config.get('business_size_templates', {}),
+            'snapshot': snapshot
+        })
+
+    @staticmethod
+    def _compile_config(config: Dict, config_version: str) -> Dict[str, Any]:
+        """
+        Structures compiled from a config: the social copy fitter with posts
+        fitted for every configured industry, the industry classifier and the
+        lookup tables.
+        """
+        industry_map = config.get('industry_map', {})
+        social_copy = SocialCopyFitter(config.get('social_platforms', {}), industry_map)
+        social_copy.prebuild(list(industry_map) + ['general'])
+        return {
+            'social_copy': social_copy,
+            'industry_classifier': IndustryClassifier(industry_map),
+            # Every industry x business size answer, frozen for this snapshot
+            'tables': LookupTables(industry_map, config.get('business_size_templates', {}), config_version)
+        }
+
+    def _install_config(self, state: Dict[str, Any]):
+        with self._config_lock:
+            for name, value in state.items():
+                setattr(self, name, value)
+
+    def reload_config(self, config_path: Optional[str] = None) -> Future:
+        """
+        Rebuild the configuration and lookup tables on a background thread and
+        swap them in when ready; requests keep using the old snapshot meanwhile.
+
+        Args:
+            config_path: New configuration file, defaults to the current one
+
+        Returns:
+            Future resolving to the new config version
+        """
+        if config_path is not None:
+            self.config_path = config_path
+
+        def rebuild():
+            state = self._build_config_state(self.config_path)
+            self._install_config(state)
+            self.clear_cache()
+            logger.info(f"Reloaded configuration {state['config_version']}")
+            return state['config_version']
+
+        return _config_reloader.submit(rebuild)
 
     def _load_config(self, config_path: Optional[str]) -> Dict:
         """
@@ -113,6 +219,14 @@ class MarketingGeniusTool:
 
         return default_config
 
+    @staticmethod
+    def _config_version(config: Dict) -> str:
+        """
+        Short stable hash of the configuration, used to key cached results.
+        """
+        payload = json.dumps(config, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(payload).hexdigest()[:16]
+
     @lru_cache(maxsize=1000)
     def parse_url_keywords(self, url: str) -> List[str]:
         """
@@ -153,36 +267,45 @@ class MarketingGeniusTool:
             logger.error(f"Error parsing URL {url}: {e}")
             return []
 
+    def rank_keywords(self, url: str, keywords: List[str]) -> List[str]:
+        """
+        Count a URL's keywords towards the corpus and return them ranked by
+        TF-IDF, so downstream stages use the most distinctive terms first.
+        """
+        with self._keyword_lock:
+            self.keyword_weights.add(url, keywords)
+            return self.keyword_weights.rank(keywords)
+
     @lru_cache(maxsize=100)
     def classify_industry(self, keywords: str) -> str:
         """
-        Classify industry by matching keywords with industry map keys.
+        Classify industry by weighted overlap of keywords with each industry's
+        name, synonyms and interests.
         Results are cached for better performance.
         
         Args:
             keywords: Comma-separated string of keywords
             
         Returns:
-            Industry classification
+            Best scoring industry, or "general" if none match
         """
         self.rate_limiter.wait()
-        keyword_list = keywords.split(',')
-        for industry in self.industry_map:
-            if industry in keyword_list:
-                return industry
-        return "general"
+        return self.industry_classifier.classify(keywords.split(','))
 
-    def suggest_audience(self, industry: str) -> Dict:
+    def rank_industries(self, keywords: List[str], k: int = 3) -> List[Dict]:
+        """
+        Top k industries for a keyword list with confidence scores (each
+        industry's share of the total match weight), best first.
+        """
+        return [{"industry": industry, "confidence": confidence}
+                for industry, confidence in self.industry_classifier.top_k(keywords, k)]
+
+    def suggest_audience(self, industry: str) -> Mapping[str, Any]:
         """
         Suggest audience segments based on industry.
-        Defaults if industry unknown.
+        Defaults if industry unknown. The result is shared and read-only.
         """
-        return self.industry_map.get(industry, {
-            "channels": ["Facebook", "Google"],
-            "age_range": (18, 65),
-            "interests": ["general"],
-            "strategy": "Use broad marketing to test your audience."
-        })
+        return self.tables.audience(industry)
 
     def suggest_business_size(self, employee_count: Optional[int]) -> str:
         """
@@ -198,9 +321,16 @@ class MarketingGeniusTool:
         else:
             return "large"
 
-    def build_campaign(self, keywords: List[str], industry: str) -> Dict:
+    def build_campaign(self, keywords: List[str], industry: str, url: Optional[str] = None,
+                       locale_hints: Iterable[Optional[str]] = ()) -> Dict:
         """
         Build campaign with ad copy, image prompts, channels, targeting.
+
+        Args:
+            keywords: Ranked business keywords
+            industry: Classified industry
+            url: Business URL; its domain suffix sets the targeted country and region
+            locale_hints: Locales such as "en-NZ" used when the domain names no country
         """
         audience = self.suggest_audience(industry)
         ad_copy = self.generate_ad_copy(keywords)
@@ -209,8 +339,16 @@ class MarketingGeniusTool:
         targeting = {
             "age_range": audience.get("age_range", (18, 65)),
             "interests": audience.get("interests", []),
-            "geo": "default"  # Could be enhanced
+            "geo": DEFAULT_GEO
         }
+        location = self.geo_resolver.resolve(url, locale_hints)
+        if location["country"]:
+            targeting["geo"] = location["country"]
+            if location["region"]:
+                targeting["region"] = location["region"]
+        if self.reach_estimator is not None:
+            targeting["estimated_reach"] = self.reach_estimator.estimate(
+                targeting["age_range"], targeting["interests"], targeting["geo"])
 
         return {
             "ad_copy": ad_copy,
@@ -250,44 +388,16 @@ class MarketingGeniusTool:
 
     def suggest_marketing_strategy(self, industry: str, business_size: str) -> str:
         """
-        Combine industry strategy + business size template.
+        Combine industry strategy + business size template, precomputed per config snapshot.
         """
-        industry_strategy = self.industry_map.get(industry, {}).get("strategy", "Use general marketing approaches.")
-        size_strategy = self.business_size_templates.get(business_size, "")
-        return f"{industry_strategy} {size_strategy}"
+        return self.tables.strategy(industry, business_size)
 
     def generate_social_post_ideas(self, industry: str) -> Dict[str, List[str]]:
         """
         Generate platform-specific social media post ideas.
+        Posts fit each platform's max_length, with hashtags where allowed.
         """
-        ideas = {
-            "Facebook": [
-                f"Share a customer testimonial about your {industry} products.",
-                f"Post a behind-the-scenes look at how your {industry} items are made.",
-                f"Run a poll about favorite {industry} features."
-            ],
-            "Instagram": [
-                f"Create a visually stunning carousel showcasing your {industry} products.",
-                f"Use Stories to highlight limited-time offers on {industry} items.",
-                f"Post short videos demonstrating {industry} benefits."
-            ],
-            "TikTok": [
-                f"Post fun, trending videos related to {industry} tips or hacks.",
-                f"Show quick tutorials or product unboxings in {industry}.",
-                f"Create challenges or hashtag campaigns around {industry}."
-            ],
-            "LinkedIn": [
-                f"Publish articles on industry trends related to {industry}.",
-                f"Share professional testimonials or case studies.",
-                f"Highlight company culture focused on {industry} innovation."
-            ],
-            "Twitter": [
-                f"Tweet quick tips related to {industry}.",
-                f"Engage with trending topics about {industry}.",
-                f"Share links to blog posts or news in the {industry} space."
-            ]
-        }
-        return ideas
+        return self.social_copy.ideas(industry)
 
     def predict_performance(self, campaign: Dict) -> Dict:
         """
@@ -332,40 +442,84 @@ class MarketingGeniusTool:
         budget_per_channel = round(budget / len(channels), 2)
         return {channel: budget_per_channel for channel in channels}
 
-    def schedule_campaign(self, campaign: Dict) -> Dict:
+    def schedule_campaign(self, campaign: Dict, client: Optional[str] = None, timezone: str = "UTC") -> Dict:
         """
-        Suggest best days and hours to post (stub).
+        Suggest best days and hours to post.
+        Uses historical engagement when a posting-time recommender is loaded,
+        otherwise falls back to general best practice.
         """
-        return {
+        default = {
             "best_days": ["Tuesday", "Thursday"],
             "best_hours": ["12pm-2pm", "7pm-9pm"]
         }
+        if self.posting_times is None:
+            return default
+
+        windows = {
+            channel: self.posting_times.top_windows(channel, client, timezone)
+            for channel in campaign.get("channels", [])
+        }
+        ranked = sorted((w for ws in windows.values() for w in ws), key=lambda w: w["share"], reverse=True)
+        if not ranked:
+            return default
+
+        best_days = list(dict.fromkeys(w["day"] for w in ranked))[:2]
+        best_hours = list(dict.fromkeys(f"{w['start']}-{w['end']}" for w in ranked))[:2]
+        return {
+            "best_days": best_days,
+            "best_hours": best_hours,
+            "timezone": timezone,
+            "windows": windows
+        }
 
     def monitor_campaign(self, performance: Dict) -> List[str]:
         """
         Generate alerts based on CPC and CTR.
+        For event streams, see campaign_monitor.CampaignMonitor.
         """
         alerts = []
         cpc = float(performance["CPC"].strip("$"))
         ctr = float(performance["CTR"].strip("%"))
-        if cpc > 1.2:
-            alerts.append("Warning: High cost-per-click detected.")
-        if ctr < 2.0:
-            alerts.append("Warning: Low click-through rate detected.")
+        if cpc > CPC_ALERT_THRESHOLD:
+            alerts.append(HIGH_CPC_MESSAGE)
+        if ctr < CTR_ALERT_THRESHOLD:
+            alerts.append(LOW_CTR_MESSAGE)
         return alerts
 
-    def roi_dashboard(self, spend: float, conversions: int, revenue_per_conversion: float) -> Dict:
+    def roi_dashboard(self, spend: Optional[float] = None, conversions: Optional[int] = None,
+                      revenue_per_conversion: Optional[float] = None, **filters) -> Dict:
         """
-        Calculate ROAS and other KPIs.
+        Spend, conversions, revenue and ROAS at a glance.
+
+        When the ROI history store is loaded and has matching rows, this is
+        its ungrouped roi_report row (with ROI and CPA too). Otherwise the
+        given scalars are used, falling back to EXAMPLE_ROI.
+
+        Args:
+            spend, conversions, revenue_per_conversion: Figures for the fallback
+            **filters: start, end, channel, campaign for the store (see RoiStore.query)
+
+        Returns:
+            Dashboard dict; "source" is "history" for store totals, else "example" or "input"
         """
+        report = self.roi_report([], **filters) if self.roi_store is not None else []
+        if report:
+            return dict(report[0], source="history")
+
+        source = "input"
+        if spend is None and conversions is None and revenue_per_conversion is None:
+            source = "example"
+            spend, conversions, revenue_per_conversion = (EXAMPLE_ROI["spend"], EXAMPLE_ROI["conversions"],
+                                                          EXAMPLE_ROI["revenue_per_conversion"])
         try:
             revenue = conversions * revenue_per_conversion
-            roas = round(revenue / spend, 2) if spend and spend > 0 else 0
+            roas = float(roi_metrics(spend or 0, conversions, revenue)["ROAS"])
             return {
                 "Spend": f"${spend}",
                 "Conversions": conversions,
                 "Revenue": f"${revenue}",
-                "ROAS": roas
+                "ROAS": roas,
+                "source": source
             }
         except Exception as e:
             print(f"Error calculating ROI: {e}")
@@ -373,22 +527,123 @@ class MarketingGeniusTool:
                 "Spend": f"${spend}",
                 "Conversions": conversions,
                 "Revenue": "$0",
-                "ROAS": 0
+                "ROAS": 0,
+                "source": source
             }
 
+    def roi_report(self, group_by: List[str] = ("channel",), **filters) -> List[Dict]:
+        """
+        Grouped ROI, ROAS and CPA from the ROI history store, formatted like roi_dashboard.
+
+        Args:
+            group_by: Any of "channel", "campaign", "day"
+            **filters: start, end, channel, campaign (see RoiStore.query)
+
+        Returns:
+            One dashboard dict per group, or [] when no store is loaded
+        """
+        if self.roi_store is None:
+            return []
+        report = []
+        for row in self.roi_store.query(group_by, **filters):
+            entry = {key: row[key] for key in group_by}
+            entry.update({
+                "Spend": f"${row['spend']}",
+                "Conversions": row["conversions"],
+                "Revenue": f"${row['revenue']}",
+                "ROAS": row["ROAS"],
+                "ROI": row["ROI"],
+                "CPA": f"${row['CPA']}"
+            })
+            report.append(entry)
+        return report
+
     def generate_content_strategy(self, past_performance: Dict) -> List[str]:
         """
         Suggest content strategy based on past CTR.
+
+        Args:
+            past_performance: Either {"CTR": "2.1%"}, or {"formats": {"video": [...], ...}}
+                with CTR history per content format, oldest first. Without format history,
+                statistics recorded through record_content_performance and record_content_events
+                (fed by /api/events) are used when available.
+
+        Returns:
+            List of recommendations, best format first
         """
-        recommendations = []
-        ctr = float(past_performance.get("CTR", "0%").strip("%"))
-        if ctr < 2.5:
-            recommendations.append("Try short-form video next week.")
+        history = past_performance.get("formats")
+        if history:
+            stats = ContentStrategy()
+            stats.update_many(history)
+            recommendations = stats.recommendations()
         else:
-            recommendations.append("Carousel posts performed best this month.")
+            with self._content_lock:
+                recommendations = self.content_stats.recommendations()
+        if not recommendations:
+            ctr = float(past_performance.get("CTR", "0%").strip("%"))
+            if ctr < 2.5:
+                recommendations.append("Try short-form video next week.")
+            else:
+                recommendations.append("Carousel posts performed best this month.")
         recommendations.append("Consider retargeting recent visitors.")
         return recommendations
 
+    def record_content_performance(self, content_format: str, ctr: Any):
+        """Add one CTR data point for a content format; O(1) per point."""
+        with self._content_lock:
+            self.content_stats.update(content_format, ctr)
+
+    def record_content_events(self, content_format: str, impressions: int = 0, clicks: int = 0):
+        """Count live impressions and clicks for a content format, see ContentStrategy.observe."""
+        with self._content_lock:
+            self.content_stats.observe(content_format, impressions, clicks)
+
+    def analyze(self, url: str, employee_count: Optional[int] = None) -> Dict:
+        """
+        Run the full analysis pipeline for a business URL.
+
+        Args:
+            url: Business website URL
+            employee_count: Optional employee count, used for business size
+
+        Returns:
+            Dict with keywords, industry, campaign, strategy and KPIs
+        """
+        url_keywords = self.parse_url_keywords(url)
+        page = self.page_fetcher.summary(url) if self.page_fetcher else None
+        page_keywords = summary_keywords(page)
+        industry = self.classify_industry(','.join(url_keywords + page_keywords))
+        industry_matches = self.rank_industries(url_keywords + page_keywords)
+        biz_size = self.suggest_business_size(employee_count)
+        url_keywords = self.rank_keywords(url, url_keywords)
+        campaign = self.build_campaign(url_keywords, industry, url, [page.get('locale')] if page else ())
+        strategy = self.suggest_marketing_strategy(industry, biz_size)
+        social_ideas = self.generate_social_post_ideas(industry)
+        performance = self.predict_performance(campaign)
+        ab_variations = self.ab_test_variations(campaign)
+        budget_alloc = self.allocate_budget(campaign, budget=500)
+        schedule = self.schedule_campaign(campaign)
+        alerts = self.monitor_campaign(performance)
+        roi = self.roi_dashboard()
+        content_recs = self.generate_content_strategy(performance)
+
+        return {
+            'keywords': url_keywords,
+            'industry': industry,
+            'industry_matches': industry_matches,
+            'business_size': biz_size,
+            'campaign': campaign,
+            'strategy': strategy,
+            'social_ideas': social_ideas,
+            'performance': performance,
+            'ab_variations': ab_variations,
+            'budget_allocation': budget_alloc,
+            'schedule': schedule,
+            'alerts': alerts,
+            'roi': roi,
+            'content_recommendations': content_recs
+        }
+
     def clear_cache(self):
         """
         Clear all cached results.
@@ -396,6 +651,7 @@ class MarketingGeniusTool:
         """
         self.parse_url_keywords.cache_clear()
         self.classify_industry.cache_clear()
+        self.social_copy.clear_cache()
         logger.info("Cache cleared successfully")
 
 # === Example usage ===
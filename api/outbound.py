@@ -0,0 +1,284 @@
+"""
+Guarded outbound calls to third-party services.
+
+Every call gets a per-attempt timeout and an overall deadline, idempotent
+calls are retried with jittered exponential backoff, and a circuit breaker
+fails fast while the service keeps failing so a degraded dependency cannot
+tie up every worker.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+from collections import deque
+from contextvars import ContextVar
+from threading import Lock
+import asyncio
+import logging
+import random
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Set while a guarded call is running so lower layers (e.g. the PayPal SDK)
+# can pick up the time budget of the current attempt. A ContextVar works for
+# both worker threads and asyncio tasks.
+_attempt_deadline = ContextVar('attempt_deadline', default=None)
+
+
+def current_timeout(default: float = 10.0) -> float:
+    """
+    Seconds left for the current attempt, for passing as a requests timeout.
+    Outside a guarded call this returns default.
+    """
+    deadline = _attempt_deadline.get()
+    if deadline is None:
+        return default
+    return max(0.001, deadline - time.monotonic())
+
+
+class OutboundError(Exception):
+    """Raised for a server-side error response from the service."""
+
+
+class OutboundUnavailable(Exception):
+    """Raised when a service could not be reached within the call budget."""
+
+
+class CircuitOpenError(OutboundUnavailable):
+    """Raised without calling the service while its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.lock = Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. Lets a single trial call through when half open."""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Free the trial slot after a call that ended without a verdict on the service."""
+        with self.lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class OutboundService:
+    def __init__(self, name: str, timeout: float = 5.0, deadline: float = 10.0,
+                 max_retries: int = 2, backoff: float = 0.2,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 retry_on: Tuple[Type[BaseException], ...] = ()):
+        """
+        Args:
+            name: Service name used in logs and metrics
+            timeout: Seconds allowed for one attempt
+            deadline: Seconds allowed for the whole call including retries
+            max_retries: Extra attempts for idempotent calls
+            backoff: Base delay in seconds for exponential backoff
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds before an open circuit allows a trial call
+            retry_on: Extra exception types that count as service failures
+        """
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.retry_on = (requests.exceptions.Timeout, requests.exceptions.ConnectionError) + tuple(retry_on)
+        self.lock = Lock()
+        self.latencies = deque(maxlen=1024)
+        self.counts = {'calls': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+
+    def call(self, fn: Callable[[], Any], idempotent: bool = False) -> Any:
+        """
+        Run fn under the timeout, retry and circuit breaker policy.
+
+        fn should pass current_timeout() as the timeout of the HTTP request it makes.
+        A response with a 5xx status counts as a failure.
+
+        Args:
+            fn: Zero-argument function making the outbound request
+            idempotent: Whether fn is safe to retry
+
+        Returns:
+            Whatever fn returns
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            OutboundUnavailable: If every attempt failed or the deadline passed
+        """
+        attempts, call_deadline = self._begin(idempotent)
+        last_error = None
+        for attempt in range(attempts):
+            timeout = self._attempt_timeout(attempt, call_deadline)
+            if timeout is None:
+                break
+            token = _attempt_deadline.set(time.monotonic() + timeout)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except self.retry_on as e:
+                last_error = e
+            except BaseException:
+                # Not a service failure (e.g. a 404 raised by an SDK), but a
+                # half-open trial must not stay in flight forever
+                self.breaker.release()
+                raise
+            else:
+                last_error = self._check_result(result)
+                if last_error is None:
+                    self._succeeded(start)
+                    return result
+            finally:
+                _attempt_deadline.reset(token)
+
+            delay = self._failed(attempt, attempts, start, last_error, call_deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+
+        raise OutboundUnavailable(f"{self.name} is unavailable: {last_error}") from last_error
+
+    async def call_async(self, fn: Callable[[], Awaitable[Any]], idempotent: bool = False) -> Any:
+        """
+        Async counterpart of call(). fn is a zero-argument coroutine function;
+        each attempt is also cancelled once its timeout passes.
+        """
+        attempts, call_deadline = self._begin(idempotent)
+        last_error = None
+        for attempt in range(attempts):
+            timeout = self._attempt_timeout(attempt, call_deadline)
+            if timeout is None:
+                break
+            token = _attempt_deadline.set(time.monotonic() + timeout)
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(fn(), timeout)
+            except (asyncio.TimeoutError,) + self.retry_on as e:
+                last_error = e
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                last_error = self._check_result(result)
+                if last_error is None:
+                    self._succeeded(start)
+                    return result
+            finally:
+                _attempt_deadline.reset(token)
+
+            delay = self._failed(attempt, attempts, start, last_error, call_deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        raise OutboundUnavailable(f"{self.name} is unavailable: {last_error}") from last_error
+
+    def _begin(self, idempotent: bool) -> Tuple[int, float]:
+        self._count('calls')
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        return 1 + (self.max_retries if idempotent else 0), time.monotonic() + self.deadline
+
+    def _attempt_timeout(self, attempt: int, call_deadline: float) -> Optional[float]:
+        remaining = call_deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if attempt:
+            self._count('retries')
+        self._count('attempts')
+        return min(self.timeout, remaining)
+
+    def _check_result(self, result: Any) -> Optional[Exception]:
+        status = getattr(result, 'status_code', None)
+        if status is not None and status >= 500:
+            return OutboundError(f"{self.name} returned HTTP {status}")
+        return None
+
+    def _succeeded(self, start: float):
+        self._record_latency(start)
+        self.breaker.record_success()
+
+    def _failed(self, attempt: int, attempts: int, start: float, error: Exception, call_deadline: float) -> Optional[float]:
+        """Record a failed attempt and return the backoff delay, or None to give up."""
+        self._record_latency(start)
+        self._count('failures')
+        self.breaker.record_failure()
+        logger.warning(f"{self.name} call failed (attempt {attempt + 1}/{attempts}): {error!r}")
+        if attempt + 1 >= attempts or not self.breaker.allow():
+            return None
+        # Full jitter keeps retries from many workers from lining up
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        return min(delay, max(0.0, call_deadline - time.monotonic()))
+
+    def metrics(self) -> Dict[str, Any]:
+        """Breaker state, call counts and attempt latency percentiles in milliseconds."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            'service': self.name,
+            'breaker_state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            **counts,
+            'latency_ms': {
+                'p50': percentile(0.50),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': round(latencies[-1], 2) if latencies else None
+            }
+        }
+
+    def _count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def _record_latency(self, start: float):
+        with self.lock:
+            self.latencies.append((time.monotonic() - start) * 1000)
@@ -0,0 +1,87 @@
+"""
+Rendered-page cache for the HTML routes.
+
+The landing page and every SPA deep link render the same Jinja template
+with at most a handful of distinct contexts, so the rendered bytes are
+cached per (template, context) together with a strong ETag. An entry is
+re-rendered when the template file's mtime changes. Responses carry the
+ETag and are made conditional, so a browser revalidating an unchanged page
+gets a bodyless 304 Not Modified.
+"""
+from typing import Dict, Optional, Tuple
+import hashlib
+import os
+import threading
+import time
+from flask import Flask, Response, render_template, request
+
+# HTML must be revalidated on every navigation; the ETag makes that a 304
+HTML_CACHE_CONTROL = 'no-cache'
+
+
+class RenderedPageCache:
+    def __init__(self, app: Flask, check_interval: float = 1.0):
+        """
+        Args:
+            app: Flask app whose templates are rendered
+            check_interval: Seconds between template mtime checks
+        """
+        self.app = app
+        self.check_interval = check_interval
+        self._pages: Dict[Tuple, Tuple[float, bytes, str]] = {}
+        self._mtimes: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+
+    def _template_path(self, template: str) -> Optional[str]:
+        source = self.app.jinja_env.loader.get_source(self.app.jinja_env, template)
+        return source[1]
+
+    def _mtime(self, template: str) -> float:
+        """Template mtime, re-read from disk at most once per check_interval."""
+        now = time.monotonic()
+        checked = self._mtimes.get(template)
+        if checked and now - checked[1] < self.check_interval:
+            return checked[0]
+        path = self._template_path(template)
+        mtime = os.stat(path).st_mtime if path else 0.0
+        self._mtimes[template] = (mtime, now)
+        return mtime
+
+    def render(self, template: str, **context) -> Tuple[bytes, str]:
+        """
+        Rendered page and its ETag, rendering only when the cache is cold or stale.
+
+        Returns:
+            Tuple of (UTF-8 body, ETag value without quotes)
+        """
+        key = (template, tuple(sorted(context.items())))
+        mtime = self._mtime(template)
+        cached = self._pages.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        with self._lock:
+            cached = self._pages.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1], cached[2]
+            if cached and self.app.jinja_env.cache is not None:
+                # Jinja only reloads changed templates in debug mode; drop its compiled copy
+                self.app.jinja_env.cache.clear()
+            body = render_template(template, **context).encode('utf-8')
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            self._pages[key] = (mtime, body, etag)
+            self.renders += 1
+            return body, etag
+
+    def response(self, template: str, **context) -> Response:
+        """A conditional HTML response for the current request."""
+        body, etag = self.render(template, **context)
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = HTML_CACHE_CONTROL
+        return response.make_conditional(request)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._mtimes.clear()
@@ -0,0 +1,417 @@
+"""
+Optional page-content stage for keyword extraction.
+
+Fetches a business page with a bounded async HTTP pool and keeps only what
+classification needs: the title, description/keywords meta tags and h1-h3
+headings. The body is stream-parsed and the download stops as soon as the
+document is through its headings, the byte limit is reached or the time
+limit runs out, so a large or slow page costs no more than a small one.
+
+Parsed summaries are cached on disk with the response's ETag and
+Last-Modified. Within fresh_for seconds a URL is served from the cache
+without a request; after that it is revalidated with a conditional GET and
+a 304 reuses the stored summary. The cache holds at most max_entries pages:
+every prune_every writes, the least recently written files beyond that are
+deleted.
+
+Only http(s) URLs that resolve to public addresses are fetched, since the
+URLs come from users. The check happens in the connection layer: each new
+connection resolves its host once, refuses it if any address is not public
+and connects to the address it checked, so a DNS answer that changes
+between the check and the connect cannot reach an internal host. TLS and
+the Host header still use the hostname.
+"""
+from typing import Dict, Iterable, List, Optional
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+import argparse
+import asyncio
+import codecs
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import httpcore
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MAX_REDIRECTS = 3
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_HEADINGS = 20
+HEADING_TAGS = {'h1', 'h2', 'h3'}
+META_NAMES = {'description', 'keywords', 'og:title', 'og:description'}
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'you', 'your', 'our', 'are', 'from', 'that', 'this', 'all', 'new', 'more',
+    'can', 'not', 'get', 'has', 'have', 'will', 'www', 'com', 'home', 'page', 'welcome', 'official', 'site'
+}
+
+
+class PageFetchError(Exception):
+    """Raised when a page cannot or may not be fetched."""
+
+
+class PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend that connects only to vetted addresses.
+
+    connect_tcp resolves the host itself and hands the resulting IP, not
+    the hostname, to the underlying backend, so the address that was
+    checked is the address connected to.
+    """
+
+    def __init__(self, allow_private: bool = False):
+        self.allow_private = allow_private
+        self._backend = httpcore.AnyIOBackend()
+
+    async def resolve(self, host: str, port: int) -> List[str]:
+        """Addresses of a host, in resolver order."""
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(info[4][0] for info in infos))
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None,
+                          socket_options: Optional[Iterable] = None) -> httpcore.AsyncNetworkStream:
+        addresses = await self.resolve(host, port)
+        if not self.allow_private and not all(ipaddress.ip_address(address).is_global for address in addresses):
+            raise PageFetchError(f'{host} resolves to a non-public address')
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error or httpcore.ConnectError(f'{host} has no addresses')
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None,
+                                  socket_options: Optional[Iterable] = None) -> httpcore.AsyncNetworkStream:
+        raise PageFetchError('Unix sockets are not fetched')
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class PinnedTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connection pool connects through a PublicAddressBackend."""
+
+    def __init__(self, backend: PublicAddressBackend, limits: httpx.Limits):
+        super().__init__(limits=limits)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=backend
+        )
+
+
+class PageSummaryParser(HTMLParser):
+    """Incremental parser that keeps the title, selected meta tags and headings."""
+
+    def __init__(self, max_headings: int = MAX_HEADINGS):
+        super().__init__(convert_charrefs=True)
+        self.max_headings = max_headings
+        self.title = ''
+        self.meta: Dict[str, str] = {}
+        self.headings: List[str] = []
+        self.locale = ''
+        self.done = False
+        self._capture: Optional[str] = None
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta':
+            attrs = dict(attrs)
+            name = (attrs.get('name') or attrs.get('property') or '').lower()
+            if name in META_NAMES and attrs.get('content'):
+                self.meta[name] = attrs['content'].strip()
+            elif name == 'og:locale' and attrs.get('content'):
+                self.locale = attrs['content'].strip()
+        elif tag == 'html':
+            self.locale = self.locale or (dict(attrs).get('lang') or '').strip()
+        elif (tag == 'title' and not self.title) or tag in HEADING_TAGS:
+            self._capture, self._text = tag, []
+
+    def handle_endtag(self, tag):
+        if tag == self._capture:
+            text = ' '.join(''.join(self._text).split())
+            if tag == 'title':
+                self.title = text
+            elif text:
+                self.headings.append(text)
+                self.done = len(self.headings) >= self.max_headings
+            self._capture = None
+        elif tag == 'body':
+            self.done = True
+
+    def handle_data(self, data):
+        if self._capture:
+            self._text.append(data)
+
+    def summary(self) -> Dict:
+        return {'title': self.title, 'meta': self.meta, 'headings': self.headings, 'locale': self.locale}
+
+
+def summary_keywords(summary: Optional[Dict]) -> List[str]:
+    """Distinct lowercase words from a page summary, in document order."""
+    if not summary:
+        return []
+    text = ' '.join([summary.get('title', '')] + list(summary.get('meta', {}).values()) + summary.get('headings', []))
+    words = re.findall(r'[a-z][a-z0-9]{2,}', text.lower())
+    return list(dict.fromkeys(word for word in words if word not in STOPWORDS))
+
+
+class PageFetcher:
+    # Pruning runs once every this many cache writes
+    prune_every = 100
+    # Temporary files older than this are left over from a crashed writer
+    stale_tmp_seconds = 3600
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024, timeout: float = 5.0,
+                 concurrency: int = 16, fresh_for: float = 3600.0, allow_private: bool = False,
+                 max_entries: int = 10000):
+        """
+        Args:
+            cache_dir: Directory for cached page summaries
+            max_bytes: Bytes of HTML read per page at most
+            timeout: Seconds allowed per page, including redirects
+            concurrency: Pages fetched at the same time at most
+            fresh_for: Seconds a cached summary is used without revalidating
+            allow_private: Also fetch hosts on loopback/private networks (tests only)
+            max_entries: Cached summaries kept on disk at most
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.fresh_for = fresh_for
+        self.max_entries = max_entries
+        self._writes = 0
+        self.network_backend = PublicAddressBackend(allow_private)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self.stats = {'fetched': 0, 'not_modified': 0, 'cache_hits': 0, 'errors': 0}
+
+    # On-disk cache
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_cache(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self._cache_path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, url: str, entry: Dict):
+        path = self._cache_path(url)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Delete the least recently written summaries beyond max_entries, and
+        temporary files abandoned by crashed writers.
+
+        Returns:
+            Number of files deleted
+        """
+        entries, doomed = [], []
+        now = time.time()
+        with os.scandir(self.cache_dir) as it:
+            for item in it:
+                try:
+                    mtime = item.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if item.name.endswith('.json'):
+                    entries.append((mtime, item.path))
+                elif item.name.endswith('.tmp') and now - mtime > self.stale_tmp_seconds:
+                    doomed.append(item.path)
+        if len(entries) > self.max_entries:
+            entries.sort(reverse=True)
+            doomed += [path for _, path in entries[self.max_entries:]]
+        removed = 0
+        for path in doomed:
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass  # Another worker pruned it first
+        return removed
+
+    # Fetching
+
+    @staticmethod
+    def _check_url(url: str):
+        # Addresses are checked by the network backend when connecting
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            raise PageFetchError(f'Not an http(s) URL: {url}')
+
+    async def _get(self, url: str, cached: Optional[Dict]) -> Dict:
+        headers = {'Accept': 'text/html'}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        for _ in range(MAX_REDIRECTS + 1):
+            self._check_url(url)
+            async with self._client.stream('GET', url, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    self.stats['not_modified'] += 1
+                    return dict(cached, checked_at=time.time())
+                if response.status_code in REDIRECT_CODES and 'location' in response.headers:
+                    url = urljoin(url, response.headers['location'])
+                    continue
+                if response.status_code != 200:
+                    raise PageFetchError(f'{url} returned {response.status_code}')
+                if 'html' not in response.headers.get('content-type', 'text/html'):
+                    raise PageFetchError(f'{url} is not HTML')
+                summary = await self._parse(response)
+                self.stats['fetched'] += 1
+                return {
+                    'summary': summary,
+                    'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified'),
+                    'checked_at': time.time()
+                }
+        raise PageFetchError(f'Too many redirects for {url}')
+
+    async def _parse(self, response: httpx.Response) -> Dict:
+        """Feed the body to the parser chunk by chunk, stopping as early as possible."""
+        parser = PageSummaryParser()
+        decoder = codecs.getincrementaldecoder(response.charset_encoding or 'utf-8')(errors='replace')
+        received = 0
+        async for chunk in response.aiter_bytes():
+            chunk = chunk[:self.max_bytes - received]
+            received += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or received >= self.max_bytes:
+                break
+        return parser.summary()
+
+    async def fetch(self, url: str) -> Optional[Dict]:
+        """
+        Summary of a page (title, meta, headings), from the cache when fresh.
+
+        Returns:
+            The summary, or None if the page could not be fetched
+        """
+        cached = self._read_cache(url)
+        if cached and time.time() - cached.get('checked_at', 0) < self.fresh_for:
+            self.stats['cache_hits'] += 1
+            return cached['summary']
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            # Clients and semaphores belong to the loop that created them
+            self._client_loop = loop
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            # No environment proxies: a proxy would resolve and connect to the host itself
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=PinnedTransport(self.network_backend, limits),
+                trust_env=False,
+                headers={'User-Agent': 'MarketingGeniusTool/1.0 (+page summary)'}
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self._semaphore:
+                entry = await asyncio.wait_for(self._get(url, cached), self.timeout)
+            self._write_cache(url, entry)
+            return entry['summary']
+        except (PageFetchError, httpx.HTTPError, asyncio.TimeoutError, OSError, ValueError) as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Could not fetch page {url}: {e!r}")
+            return cached['summary'] if cached else None
+
+    async def fetch_many(self, urls: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Summaries for many URLs, fetched concurrently within the pool limit."""
+        urls = list(dict.fromkeys(urls))
+        summaries = await asyncio.gather(*(self.fetch(url) for url in urls))
+        return dict(zip(urls, summaries))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # Blocking interface for the analysis pipeline, which runs in worker threads
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        """One event loop per fetcher, so all threads share a connection pool."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='page-fetcher', daemon=True).start()
+            return self._loop
+
+    def summary(self, url: str) -> Optional[Dict]:
+        """fetch for synchronous callers; None if the page cannot be fetched."""
+        return asyncio.run_coroutine_threadsafe(self.fetch(url), self._background_loop()).result()
+
+    def keywords(self, url: str) -> List[str]:
+        """Keywords from a page's title, meta tags and headings; [] if it cannot be fetched."""
+        return summary_keywords(self.summary(url))
+
+    def close(self):
+        with self._loop_lock:
+            if self._loop is not None:
+                asyncio.run_coroutine_threadsafe(self.aclose(), self._loop).result()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    from marketing_genius_tool import MarketingGeniusTool
+
+    parser = argparse.ArgumentParser(description="Fetch pages concurrently and print their keywords and industry.")
+    parser.add_argument("urls", help="Text file with one URL per line")
+    parser.add_argument("--cache-dir", default="page_cache")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--max-entries", type=int, default=10000, help="Cached pages kept on disk at most")
+    args = parser.parse_args(argv)
+
+    with open(args.urls) as f:
+        urls = [line.strip() for line in f if line.strip()]
+    fetcher = PageFetcher(args.cache_dir, timeout=args.timeout, concurrency=args.concurrency,
+                          max_entries=args.max_entries)
+    tool = MarketingGeniusTool()
+    tool.rate_limiter.calls_per_second = float('inf')
+
+    async def run():
+        try:
+            return await fetcher.fetch_many(urls)
+        finally:
+            await fetcher.aclose()
+
+    start = time.perf_counter()
+    summaries = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    keyword_sets = [tool.parse_url_keywords(url) + summary_keywords(summary) for url, summary in summaries.items()]
+    ranked = tool.industry_classifier.top_k_many(keyword_sets, k=1)
+    geos = tool.geo_resolver.resolve_many(list(summaries), [[(summary or {}).get('locale')]
+                                                             for summary in summaries.values()])
+    for url, keywords, industries, geo in zip(summaries, keyword_sets, ranked, geos):
+        print(f"{industries[0][0]:<12} {geo['region'] or geo['country'] or '-':<8} {url}  {keywords[:8]}")
+    print(f"{len(summaries)} pages in {elapsed:.2f}s: {fetcher.stats}")
+
+
+if __name__ == "__main__":
+    main()
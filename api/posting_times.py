@@ -0,0 +1,308 @@
+"""
+Posting-time recommendations from historical engagement logs.
+
+Engagement timestamps are binned into 168 UTC hour-of-week buckets per
+(client, channel) and UTC week with np.bincount. Logs are read in
+fixed-size chunks, so memory stays flat for any file size. Histograms are
+additive and remember how far each log file was read, so re-feeding an
+appended log only counts the rows added since, in whatever order they are.
+
+Time zones are applied at query time: each week is rotated by the zone's
+UTC offset during that week, and the hours of a week that crosses a
+daylight-saving change are converted one at a time, so summer and winter
+posts land on the same local hour.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import argparse
+import json
+import logging
+import os
+import numpy as np
+from record_files import file_identity, iter_records
+
+logger = logging.getLogger(__name__)
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+HOURS_PER_WEEK = 168
+# 1970-01-01 was a Thursday; shift so bucket 0 is Monday 00:00
+EPOCH_HOUR_OFFSET = 3 * 24
+
+
+def hour_of_week(timestamps: np.ndarray) -> np.ndarray:
+    """UTC hour-of-week bucket (0 = Monday 00:00) for epoch-second timestamps."""
+    return (timestamps // 3600 + EPOCH_HOUR_OFFSET) % HOURS_PER_WEEK
+
+
+def to_epoch_seconds(values: List[str]) -> np.ndarray:
+    """
+    Convert epoch numbers or ISO 8601 strings to int64 epoch seconds.
+    Tries vectorized parses first and falls back to one value at a time
+    for strings with UTC offsets.
+    """
+    try:
+        return np.asarray(values, dtype=np.float64).astype(np.int64)
+    except ValueError:
+        pass
+    stripped = [v[:-1] if v.endswith('Z') else v for v in values]
+    if not any('+' in v or '-' in v[10:] for v in stripped):
+        try:
+            return np.asarray(stripped, dtype='datetime64[s]').astype(np.int64)
+        except ValueError:
+            pass
+    out = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=dt_timezone.utc)
+        out[i] = int(parsed.timestamp())
+    return out
+
+
+def format_hour(hour: int) -> str:
+    """Format an hour of day like the schedule stub did: 12am, 1pm, ..."""
+    hour %= 24
+    suffix = "am" if hour < 12 else "pm"
+    return f"{hour % 12 or 12}{suffix}"
+
+
+def week_start(week: int) -> int:
+    """Epoch second of Monday 00:00 UTC starting a week index (weeks since 1969-12-29)."""
+    return (week * HOURS_PER_WEEK - EPOCH_HOUR_OFFSET) * 3600
+
+
+def utc_offset_hours(tz: str, timestamp: float) -> int:
+    """Whole-hour UTC offset of a time zone at an epoch second (half-hour zones round)."""
+    offset = datetime.fromtimestamp(timestamp, ZoneInfo(tz)).utcoffset()
+    return int(round(offset.total_seconds() / 3600)) if offset else 0
+
+
+@lru_cache(maxsize=4096)
+def week_offsets(tz: str, week: int) -> Union[int, np.ndarray]:
+    """
+    UTC offset in hours of a time zone through one UTC week.
+
+    Returns:
+        One int when the offset is the same all week, otherwise an array
+        with the offset of each of its 168 hours
+    """
+    start = week_start(week)
+    first = utc_offset_hours(tz, start)
+    if utc_offset_hours(tz, start + (HOURS_PER_WEEK - 1) * 3600) == first:
+        return first
+    return np.array([utc_offset_hours(tz, start + hour * 3600) for hour in range(HOURS_PER_WEEK)])
+
+
+def to_local(weeks: Dict[int, np.ndarray], tz: str) -> np.ndarray:
+    """Fold per-week UTC hour-of-week counts into one local hour-of-week histogram."""
+    total = np.zeros(HOURS_PER_WEEK)
+    for week, counts in weeks.items():
+        offsets = week_offsets(tz, week)
+        if isinstance(offsets, int):
+            total += np.roll(counts, offsets)
+        else:
+            np.add.at(total, (np.arange(HOURS_PER_WEEK) + offsets) % HOURS_PER_WEEK, counts)
+    return total
+
+
+class PostingTimeRecommender:
+    def __init__(self):
+        # UTC hour-of-week totals, and the same counts split by UTC week for time zone conversion
+        self.histograms: Dict[Tuple[str, str], np.ndarray] = {}
+        self.weeks: Dict[Tuple[str, str], Dict[int, np.ndarray]] = {}
+        # Absolute log path -> (byte offset read up to, file identity)
+        self.sources: Dict[str, Tuple[int, str]] = {}
+
+    def add(self, timestamps: np.ndarray, channel: str, client: str = "", weights: Optional[np.ndarray] = None) -> int:
+        """
+        Add engagement timestamps for one client and channel.
+
+        Args:
+            timestamps: Epoch seconds (any integer array)
+            channel: Channel name, e.g. "Instagram"
+            client: Client identifier, "" for data not split by client
+            weights: Optional engagement weights per timestamp
+
+        Returns:
+            Number of timestamps counted
+        """
+        key = (client, channel)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if timestamps.size == 0:
+            return 0
+        hours = timestamps // 3600 + EPOCH_HOUR_OFFSET
+        week_ids, week_index = np.unique(hours // HOURS_PER_WEEK, return_inverse=True)
+        counts = np.bincount(week_index * HOURS_PER_WEEK + hours % HOURS_PER_WEEK, weights=weights,
+                             minlength=week_ids.size * HOURS_PER_WEEK).reshape(-1, HOURS_PER_WEEK)
+        self._add_weeks(key, zip(week_ids.tolist(), counts))
+        return int(timestamps.size)
+
+    def _add_weeks(self, key: Tuple[str, str], week_counts: Iterable[Tuple[int, np.ndarray]]):
+        weeks = self.weeks.setdefault(key, {})
+        total = self.histograms.get(key)
+        for week, counts in week_counts:
+            weeks[week] = weeks[week] + counts if week in weeks else counts.astype(np.float64)
+            total = total + counts if total is not None else counts.astype(np.float64)
+        if total is not None:
+            self.histograms[key] = total
+
+    def merge(self, other: "PostingTimeRecommender"):
+        """Add another recommender's counts to this one."""
+        for key, weeks in other.weeks.items():
+            self._add_weeks(key, weeks.items())
+
+    def ingest(self, path: str, chunk_size: int = 100_000, only_new: bool = True) -> int:
+        """
+        Stream a CSV or JSONL engagement log into the histograms.
+
+        Rows need "timestamp" and "channel" fields; "client" and "weight" are optional.
+        With only_new, a log ingested before is read from the byte where the last
+        call stopped, so an appended log can be fed again and only the appended
+        rows count, whatever their timestamps. A log whose first record changed
+        (rotated or rewritten) or that got shorter is read from the start.
+
+        Returns:
+            Number of rows counted
+        """
+        source = os.path.abspath(path)
+        identity = file_identity(path)
+        offset = 0
+        if only_new and source in self.sources:
+            seen_offset, seen_identity = self.sources[source]
+            if seen_identity == identity and seen_offset <= os.path.getsize(path):
+                offset = seen_offset
+            else:
+                logger.warning(f"{path} was rewritten since it was last ingested; reading it from the start")
+
+        # Chunks are counted into a staging copy and merged once the whole log has been read,
+        # so a row that fails to parse leaves both the counts and the read position untouched
+        staged = PostingTimeRecommender()
+        total = 0
+        position = offset
+        rows = []
+        for row, position in iter_records(path, offset):
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                total += staged._add_rows(rows)
+                rows = []
+        if rows:
+            total += staged._add_rows(rows)
+        self.merge(staged)
+        self.sources[source] = (position, identity)
+        if offset:
+            logger.info(f"Ingested {total} engagement rows from {path} after the {offset} bytes already ingested")
+        else:
+            logger.info(f"Ingested {total} engagement rows from {path}")
+        return total
+
+    def _add_rows(self, rows: List[Dict]) -> int:
+        groups: Dict[Tuple[str, str], Tuple[List[str], List[float]]] = {}
+        for row in rows:
+            ts_list, weight_list = groups.setdefault((row.get("client") or "", row["channel"]), ([], []))
+            ts_list.append(str(row["timestamp"]))
+            weight_list.append(float(row.get("weight") or 1.0))
+        return sum(self.add(to_epoch_seconds(ts_list), channel, client, weights=np.asarray(weight_list))
+                   for (client, channel), (ts_list, weight_list) in groups.items())
+
+    def histogram(self, channel: Optional[str] = None, client: Optional[str] = None, tz: str = "UTC") -> np.ndarray:
+        """
+        Engagement per local hour of week, summed over matching clients/channels.
+        None matches every client or channel.
+        """
+        keys = [key for key in self.histograms
+                if (client is None or key[0] == client) and (channel is None or key[1] == channel)]
+        if tz == "UTC":
+            return sum((self.histograms[key] for key in keys), np.zeros(HOURS_PER_WEEK))
+        weeks: Dict[int, np.ndarray] = {}
+        for key in keys:
+            for week, counts in self.weeks.get(key, {}).items():
+                weeks[week] = weeks[week] + counts if week in weeks else counts
+        return to_local(weeks, tz)
+
+    def top_windows(self, channel: Optional[str] = None, client: Optional[str] = None, tz: str = "UTC",
+                    n: int = 3, window_hours: int = 2) -> List[Dict]:
+        """
+        Best non-overlapping posting windows in local time.
+
+        Returns:
+            Up to n dicts with day, start, end, hour_of_week and share of engagement
+        """
+        hist = self.histogram(channel, client, tz)
+        total = hist.sum()
+        if total <= 0:
+            return []
+        # Circular sliding-window sums so Sunday night wraps into Monday morning
+        windows = sum(np.roll(hist, -k) for k in range(window_hours))
+        taken = np.zeros(HOURS_PER_WEEK, dtype=bool)
+        results = []
+        for start in np.argsort(windows)[::-1]:
+            span = [(start + k) % HOURS_PER_WEEK for k in range(window_hours)]
+            if taken[span].any() or windows[start] <= 0:
+                continue
+            taken[span] = True
+            results.append({
+                "day": DAYS[start // 24],
+                "start": format_hour(start % 24),
+                "end": format_hour(start % 24 + window_hours),
+                "hour_of_week": int(start),
+                "share": round(float(windows[start] / total), 4)
+            })
+            if len(results) >= n:
+                break
+        return results
+
+    def channels(self, client: Optional[str] = None) -> List[str]:
+        return sorted({channel for hist_client, channel in self.histograms if client is None or hist_client == client})
+
+    def save(self, path: str):
+        """Save histograms, per-week counts and log read positions to an .npz file."""
+        keys = list(self.histograms)
+        week_rows = [(i, week, counts) for i, key in enumerate(keys) for week, counts in self.weeks.get(key, {}).items()]
+        np.savez(
+            path,
+            keys=np.asarray(["\x1f".join(key) for key in keys]),
+            counts=np.stack([self.histograms[key] for key in keys]) if keys else np.zeros((0, HOURS_PER_WEEK)),
+            week_keys=np.asarray([row[0] for row in week_rows], dtype=np.int64),
+            week_ids=np.asarray([row[1] for row in week_rows], dtype=np.int64),
+            week_counts=np.stack([row[2] for row in week_rows]) if week_rows else np.zeros((0, HOURS_PER_WEEK)),
+            sources=np.asarray(json.dumps(self.sources))
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "PostingTimeRecommender":
+        """Load a store written by save; a missing file gives an empty recommender."""
+        recommender = cls()
+        if not os.path.exists(path):
+            return recommender
+        with np.load(path) as data:
+            keys = []
+            for key, counts in zip(data["keys"], data["counts"]):
+                client, channel = str(key).split("\x1f", 1)
+                keys.append((client, channel))
+                recommender.histograms[(client, channel)] = counts.astype(np.float64)
+            for index, week, counts in zip(data["week_keys"], data["week_ids"], data["week_counts"]):
+                recommender.weeks.setdefault(keys[index], {})[int(week)] = counts.astype(np.float64)
+            recommender.sources = {source: tuple(seen) for source, seen in json.loads(str(data["sources"])).items()}
+        return recommender
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Ingest engagement logs and print the best posting windows.")
+    parser.add_argument("logs", nargs="+", help="CSV or JSONL engagement logs")
+    parser.add_argument("--store", default="engagement_histograms.npz", help="Histogram file, updated in place")
+    parser.add_argument("--tz", default="UTC")
+    parser.add_argument("--client")
+    args = parser.parse_args(argv)
+
+    recommender = PostingTimeRecommender.load(args.store)
+    for path in args.logs:
+        recommender.ingest(path)
+    recommender.save(args.store)
+    for channel in recommender.channels(args.client):
+        print(channel, recommender.top_windows(channel, args.client, args.tz))
+
+
+if __name__ == "__main__":
+    main()
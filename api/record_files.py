@@ -0,0 +1,82 @@
+"""
+Streaming readers for the CSV and JSONL record files the ingest commands take.
+
+Files ending in .jsonl or .ndjson hold one JSON object per line; anything
+else is CSV with a header row. Rows are read lazily, so memory stays flat
+for any file size. iter_records also yields the byte offset just past each
+row, so a caller can remember where it stopped and resume an appended file
+from there instead of re-reading it.
+"""
+from typing import Dict, Iterator, List, Tuple
+import csv
+import hashlib
+import json
+
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+
+
+def iter_records(path: str, offset: int = 0) -> Iterator[Tuple[Dict, int]]:
+    """
+    Yield (row, end_offset) for each record in a CSV or JSONL file.
+
+    Args:
+        path: Record file
+        offset: Byte offset to start at, a previous end_offset; CSV files
+            still read their header first
+
+    Returns:
+        Iterator of row dicts with the byte offset just past each row
+    """
+    with open(path, "rb") as f:
+        if path.endswith(JSONL_SUFFIXES):
+            f.seek(offset)
+            position = offset
+            for line in f:
+                position += len(line)
+                if line.strip():
+                    yield json.loads(line), position
+            return
+
+        header = f.readline()
+        fieldnames = next(csv.reader([header.decode()]), [])
+        position = max(offset, len(header))
+        f.seek(position)
+
+        def lines() -> Iterator[str]:
+            nonlocal position
+            for line in f:
+                position += len(line)
+                yield line.decode()
+
+        for row in csv.DictReader(lines(), fieldnames=fieldnames):
+            yield row, position
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """Yield each record of a CSV or JSONL file as a dict."""
+    for row, _ in iter_records(path):
+        yield row
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[List[Dict]]:
+    """Yield the records of a CSV or JSONL file in lists of up to chunk_size."""
+    chunk = []
+    for row in read_records(path):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def file_identity(path: str) -> str:
+    """
+    Digest of a file's first record (with the header for CSV), to tell a
+    file that was appended to from one that was rotated or rewritten.
+    """
+    with open(path, "rb") as f:
+        head = f.readline()
+        if not path.endswith(JSONL_SUFFIXES):
+            head += f.readline()
+    return hashlib.sha256(head).hexdigest()[:16]
@@ -0,0 +1,202 @@
+"""
+Analysis result cache shared by every worker on the host.
+
+Entries are keyed by canonical URL, business size bucket and config version,
+expire after a TTL and are evicted least-recently-used once the cache holds
+more than max_entries results. Hit counters and the compute time saved by
+hits are kept in the same database so the stats cover all workers.
+
+A hit is a single read: each process counts hits and misses in memory and
+adds them to the shared stats at most every flush_interval seconds, and an
+entry's last_access is only rewritten once it is older than touch_fraction
+of the TTL, which is all the precision LRU eviction needs.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+import json
+import logging
+import os
+import threading
+import time
+from shared_state import SQLiteState, state_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize a URL so trivially different spellings share a cache entry.
+
+    Lowercases scheme and host, drops a leading "www.", default ports,
+    fragments and trailing slashes, and sorts query parameters.
+    """
+    parsed = urlparse(url.strip())
+    scheme = (parsed.scheme or 'http').lower()
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    netloc = host
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{parsed.port}"
+    path = parsed.path.rstrip('/')
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, path, '', query, ''))
+
+
+def make_key(url: str, business_size: str, config_version: str) -> str:
+    """Build the cache key for one analysis."""
+    return f"{config_version}|{business_size}|{canonical_url(url)}"
+
+
+class ResultCache(SQLiteState):
+    """
+    TTL and size bounded result cache in a SQLite file.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            compute_seconds REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+        CREATE TABLE IF NOT EXISTS stats (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    # Eviction runs once every this many writes
+    evict_every = 100
+    # Seconds between writes of this process's hit/miss counts to the shared stats
+    flush_interval = 5.0
+    # A hit refreshes last_access once it is older than this fraction of the TTL
+    touch_fraction = 0.1
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 3600, max_entries: int = 10000):
+        super().__init__(path or os.path.join(state_dir(), 'result_cache.db'))
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        self._pending: Dict[str, float] = {}
+        self._pending_lock = threading.Lock()
+        self._pending_pid = os.getpid()
+        self._flushed_at = time.monotonic()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached result.
+
+        Returns:
+            The cached value, or None on a miss or expired entry
+        """
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, compute_seconds, last_access FROM entries WHERE key = ? AND expires_at > ?',
+            (key, now)
+        ).fetchone()
+        if row is None:
+            self._count(misses=1)
+            return None
+        if row[2] < now - self.ttl * self.touch_fraction:
+            conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+        self._count(hits=1, saved_seconds=row[1])
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, compute_seconds: float = 0.0):
+        """Store a JSON-serializable result."""
+        now = time.time()
+        self._connection().execute(
+            'INSERT OR REPLACE INTO entries (key, value, expires_at, last_access, compute_seconds) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, json.dumps(value), now + self.ttl, now, compute_seconds)
+        )
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Return the cached result for key, computing and storing it on a miss.
+
+        Returns:
+            Tuple of (result, hit)
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, True
+        start = time.perf_counter()
+        result = compute()
+        self.set(key, result, time.perf_counter() - start)
+        # Round-trip through JSON so hits and misses return the same shapes
+        return json.loads(json.dumps(result)), False
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        conn = self._connection()
+        conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM entries WHERE key IN ('
+            '  SELECT key FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?'
+            ')',
+            (self.max_entries,)
+        )
+
+    def flush(self):
+        """Add this process's pending hit/miss counts to the shared stats."""
+        with self._pending_lock:
+            # Counts inherited from the parent process are the parent's to flush
+            pending = self._pending if self._pending_pid == os.getpid() else {}
+            self._pending, self._pending_pid = {}, os.getpid()
+            self._flushed_at = time.monotonic()
+        if pending:
+            self._bump(self._connection(), **pending)
+
+    def clear(self):
+        """Remove every entry and reset stats."""
+        with self._pending_lock:
+            self._pending = {}
+        conn = self._connection()
+        conn.execute('DELETE FROM entries')
+        conn.execute('DELETE FROM stats')
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit/miss counts and compute time saved, summed over all workers.
+        Other workers' counts can lag by up to flush_interval seconds.
+        """
+        self.flush()
+        conn = self._connection()
+        values = dict(conn.execute('SELECT name, value FROM stats').fetchall())
+        hits = int(values.get('hits', 0))
+        misses = int(values.get('misses', 0))
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'saved_compute_seconds': round(values.get('saved_seconds', 0.0), 4),
+            'entries': conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        }
+
+    def _count(self, **deltas):
+        with self._pending_lock:
+            if self._pending_pid != os.getpid():
+                self._pending, self._pending_pid = {}, os.getpid()
+            for name, delta in deltas.items():
+                self._pending[name] = self._pending.get(name, 0) + delta
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    @staticmethod
+    def _bump(conn, **deltas):
+        conn.executemany(
+            'INSERT INTO stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            list(deltas.items())
+        )
@@ -0,0 +1,390 @@
+"""
+Columnar ROI analytics over spend and conversion histories.
+
+Records are stored column by column in flat binary files (one NumPy dtype
+per column) and read back through np.memmap, so a store holding years of
+rows opens instantly and only the pages a query touches are read. Channel
+and campaign names are dictionary-encoded to small integer codes.
+
+Grouped queries build one integer group id per row and aggregate every
+measure with np.bincount, so ROI, ROAS and CPA by channel, campaign and
+day are a handful of vectorized passes over the columns.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from datetime import date, datetime, timedelta
+import argparse
+import fcntl
+import json
+import logging
+import os
+import threading
+import numpy as np
+from record_files import read_chunks
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    "day": np.int32,          # days since 1970-01-01
+    "channel": np.int16,      # code into channels
+    "campaign": np.int32,     # code into campaigns
+    "spend": np.float64,
+    "conversions": np.int64,
+    "revenue": np.float64
+}
+GROUP_KEYS = ("channel", "campaign", "day")
+EPOCH = date(1970, 1, 1)
+# Days from_day can turn back into a date (years 1 to 9999)
+MIN_DAY = (date.min - EPOCH).days
+MAX_DAY = (date.max - EPOCH).days
+# Tagged appends remembered in meta.json for crash recovery
+MAX_COMMITS = 100
+DayLike = Union[str, int, date, np.datetime64]
+
+
+def to_day(value: DayLike) -> int:
+    """Days since the epoch for an ISO date/datetime string, epoch-seconds number, date or datetime64."""
+    if isinstance(value, np.datetime64):
+        return int(value.astype("datetime64[D]").astype(np.int64))
+    if isinstance(value, datetime):
+        return (value.date() - EPOCH).days
+    if isinstance(value, date):
+        return (value - EPOCH).days
+    if isinstance(value, (int, float)):
+        return int(value // 86400)
+    try:
+        return int(float(value) // 86400)
+    except ValueError:
+        return (datetime.fromisoformat(value.replace('Z', '+00:00')).date() - EPOCH).days
+
+
+def from_day(day: int) -> str:
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def roi_metrics(spend, conversions, revenue) -> Dict:
+    """
+    ROI, ROAS and CPA for scalars or arrays. Ratios with a zero denominator are 0.
+
+    Returns:
+        Dict of ROI ((revenue - spend) / spend), ROAS (revenue / spend) and CPA (spend / conversions)
+    """
+    spend = np.asarray(spend, dtype=np.float64)
+    conversions = np.asarray(conversions, dtype=np.float64)
+    revenue = np.asarray(revenue, dtype=np.float64)
+    has_spend = spend > 0
+    safe_spend = np.where(has_spend, spend, 1.0)
+    safe_conversions = np.where(conversions > 0, conversions, 1.0)
+    return {
+        "ROI": np.round(np.where(has_spend, (revenue - spend) / safe_spend, 0.0), 2),
+        "ROAS": np.round(np.where(has_spend, revenue / safe_spend, 0.0), 2),
+        "CPA": np.round(np.where(conversions > 0, spend / safe_conversions, 0.0), 2)
+    }
+
+
+def fsync_directory(directory: str):
+    """Make renames and unlinks in a directory durable."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class RoiStore:
+    def __init__(self, directory: str):
+        """
+        Open (or create) a columnar store in directory.
+
+        Args:
+            directory: Holds one <column>.bin file per column and meta.json
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta_path = os.path.join(directory, "meta.json")
+        # Held exclusively for the whole of every append, by every process
+        self.lock_path = os.path.join(directory, "store.lock")
+        # Identity of the meta.json last read; it is replaced, never rewritten, on every append
+        self._meta_version: Optional[Tuple[int, int]] = None
+        self._load_meta()
+
+    def _load_meta(self):
+        meta = {"rows": 0, "channels": [], "campaigns": [], "commits": {}}
+        try:
+            with open(self.meta_path) as f:
+                self._meta_version = self._version(os.fstat(f.fileno()))
+                meta.update(json.load(f))
+        except FileNotFoundError:
+            self._meta_version = None
+        self.rows = meta["rows"]
+        self.channels: List[str] = meta["channels"]
+        self.campaigns: List[str] = meta["campaigns"]
+        # Recent tagged appends: commit id -> row count right after it
+        self.commits: Dict[str, int] = meta["commits"]
+        self._codes = {
+            "channel": {name: i for i, name in enumerate(self.channels)},
+            "campaign": {name: i for i, name in enumerate(self.campaigns)}
+        }
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+
+    def refresh(self):
+        """Pick up rows appended by another process (e.g. event compaction in another worker)."""
+        try:
+            version = self._version(os.stat(self.meta_path))
+        except FileNotFoundError:
+            version = None
+        if version != self._meta_version:
+            self._load_meta()
+
+    @staticmethod
+    def _version(stat: os.stat_result) -> Tuple[int, int]:
+        return stat.st_ino, stat.st_mtime_ns
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def _path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def _encode(self, kind: str, names: Sequence[str]) -> np.ndarray:
+        """Dictionary-encode names, registering new ones; encodes each distinct name once."""
+        codes = self._codes[kind]
+        names_list = self.channels if kind == "channel" else self.campaigns
+        unique, inverse = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+        lookup = np.empty(len(unique), dtype=COLUMNS[kind])
+        for i, name in enumerate(unique.tolist()):
+            code = codes.get(name)
+            if code is None:
+                code = codes[name] = len(names_list)
+                names_list.append(name)
+            lookup[i] = code
+        return lookup[inverse]
+
+    def append_columns(self, day: Sequence[DayLike], channel: Sequence[str], campaign: Sequence[str],
+                       spend: Sequence[float], conversions: Sequence[int], revenue: Sequence[float],
+                       commit: Optional[str] = None) -> int:
+        """
+        Append rows given as parallel sequences. Days are anything to_day
+        accepts (integers are epoch seconds); pass a datetime64 array to
+        append day numbers directly.
+
+        Appends from every process are serialized by an exclusive lock on
+        the store, and the column files, meta.json and the directory are
+        fsynced before this returns, so an append that returned survives
+        an OS crash.
+
+        Args:
+            commit: Optional id recorded in commits with the row count after
+                this append, so a caller can tell after a crash whether it landed
+
+        Returns:
+            Number of rows appended
+
+        Raises:
+            ValueError: If a day falls outside years 1 to 9999
+        """
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.refresh()
+            return self._append_locked(day, channel, campaign, spend, conversions, revenue, commit)
+
+    def _append_locked(self, day, channel, campaign, spend, conversions, revenue, commit: Optional[str]) -> int:
+        days = np.asarray(day)
+        if np.issubdtype(days.dtype, np.datetime64):
+            days = days.astype("datetime64[D]").astype(np.int64)
+        else:
+            days = np.fromiter((to_day(d) for d in day), dtype=np.int64, count=len(day))
+        if len(days) and (days.min() < MIN_DAY or days.max() > MAX_DAY):
+            raise ValueError(f"Dates must fall between {date.min} and {date.max}")
+        columns = {
+            "day": days.astype(COLUMNS["day"]),
+            "channel": self._encode("channel", channel),
+            "campaign": self._encode("campaign", campaign),
+            "spend": np.asarray(spend, dtype=COLUMNS["spend"]),
+            "conversions": np.asarray(conversions, dtype=COLUMNS["conversions"]),
+            "revenue": np.asarray(revenue, dtype=COLUMNS["revenue"])
+        }
+        n = len(columns["day"])
+        if any(len(values) != n for values in columns.values()):
+            raise ValueError("All columns must have the same length")
+        if n == 0:
+            return 0
+        for name, values in columns.items():
+            with open(self._path(name), "ab") as f:
+                # Drop any tail written by an append that crashed before its meta.json update
+                f.truncate(self.rows * values.itemsize)
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        self.rows += n
+        if commit is not None:
+            self.commits[commit] = self.rows
+            for old in list(self.commits)[:-MAX_COMMITS]:
+                del self.commits[old]
+        self._write_meta()
+        self._columns = None
+        return n
+
+    def append(self, records: Iterable[Dict]) -> int:
+        """
+        Append record dicts with date, channel, campaign, spend, conversions and
+        either revenue or revenue_per_conversion.
+        """
+        records = list(records)
+        conversions = [int(r.get("conversions") or 0) for r in records]
+        revenue = [float(r["revenue"]) if r.get("revenue") not in (None, "")
+                   else c * float(r.get("revenue_per_conversion") or 0)
+                   for r, c in zip(records, conversions)]
+        return self.append_columns(
+            [r["date"] for r in records], [r["channel"] for r in records], [r.get("campaign") or "" for r in records],
+            [float(r.get("spend") or 0) for r in records], conversions, revenue)
+
+    def ingest(self, path: str, chunk_size: int = 100_000) -> int:
+        """Stream a CSV or JSONL file of records into the store in chunks."""
+        total = 0
+        for chunk in read_chunks(path, chunk_size):
+            total += self.append(chunk)
+        logger.info(f"Ingested {total} ROI records from {path}")
+        return total
+
+    def _write_meta(self):
+        tmp = f"{self.meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"rows": self.rows, "channels": self.channels, "campaigns": self.campaigns,
+                       "commits": self.commits}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.meta_path)
+        fsync_directory(self.directory)
+        self._meta_version = self._version(os.stat(self.meta_path))
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Read-only memory-mapped views of every column."""
+        self.refresh()
+        if self._columns is None:
+            if self.rows == 0:
+                self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+            else:
+                self._columns = {name: np.memmap(self._path(name), dtype=dtype, mode="r", shape=(self.rows,))
+                                 for name, dtype in COLUMNS.items()}
+        return self._columns
+
+    def _mask(self, cols: Dict[str, np.ndarray], start: Optional[DayLike], end: Optional[DayLike],
+              channel: Optional[str], campaign: Optional[str]) -> Optional[np.ndarray]:
+        mask = None
+
+        def combine(condition):
+            return condition if mask is None else mask & condition
+
+        if start is not None:
+            mask = combine(cols["day"] >= to_day(start))
+        if end is not None:
+            mask = combine(cols["day"] <= to_day(end))
+        if channel is not None:
+            mask = combine(cols["channel"] == self._codes["channel"].get(channel, -1))
+        if campaign is not None:
+            mask = combine(cols["campaign"] == self._codes["campaign"].get(campaign, -1))
+        return mask
+
+    def query(self, group_by: Sequence[str] = ("channel",), start: Optional[DayLike] = None,
+              end: Optional[DayLike] = None, channel: Optional[str] = None,
+              campaign: Optional[str] = None) -> List[Dict]:
+        """
+        Grouped totals and ROI metrics.
+
+        Args:
+            group_by: Any of "channel", "campaign", "day"; empty for a single total
+            start, end: Inclusive day range
+            channel, campaign: Only rows for this channel/campaign
+
+        Returns:
+            One dict per non-empty group with the group keys, spend, conversions,
+            revenue, ROI, ROAS and CPA, ordered by group
+        """
+        for key in group_by:
+            if key not in GROUP_KEYS:
+                raise ValueError(f"Cannot group by {key!r}; expected one of {GROUP_KEYS}")
+        cols = self.columns()
+        mask = self._mask(cols, start, end, channel, campaign)
+        if mask is not None:
+            cols = {name: values[mask] for name, values in cols.items()}
+
+        # Dense mixed-radix group id: each key contributes its code range
+        group_id = np.zeros(len(cols["day"]), dtype=np.int64)
+        radices: List[Tuple[str, int, int]] = []
+        for key in group_by:
+            values = cols[key]
+            if values.size == 0:
+                return []
+            low = int(values.min()) if key == "day" else 0
+            size = (int(values.max()) - low + 1) if key == "day" else \
+                len(self.channels if key == "channel" else self.campaigns)
+            group_id = group_id * size + (values - low)
+            radices.append((key, low, size))
+        groups = int(np.prod([size for _, _, size in radices])) if radices else 1
+
+        if groups > max(len(group_id), 1 << 20):
+            # Sparse key space: compact ids to the groups actually present
+            present, group_id = np.unique(group_id, return_inverse=True)
+            groups = len(present)
+            spend = np.bincount(group_id, weights=cols["spend"], minlength=groups)
+            conversions = np.bincount(group_id, weights=cols["conversions"], minlength=groups)
+            revenue = np.bincount(group_id, weights=cols["revenue"], minlength=groups)
+        else:
+            spend = np.bincount(group_id, weights=cols["spend"], minlength=groups)
+            conversions = np.bincount(group_id, weights=cols["conversions"], minlength=groups)
+            revenue = np.bincount(group_id, weights=cols["revenue"], minlength=groups)
+            present = np.flatnonzero(np.bincount(group_id, minlength=groups))
+            spend, conversions, revenue = spend[present], conversions[present], revenue[present]
+        metrics = roi_metrics(spend, conversions, revenue)
+
+        # Decode group ids back into key values
+        decoded = {}
+        remainder = present
+        for key, low, size in reversed(radices):
+            codes = remainder % size + low
+            remainder = remainder // size
+            if key == "day":
+                decoded[key] = [from_day(code) for code in codes]
+            else:
+                names = self.channels if key == "channel" else self.campaigns
+                decoded[key] = [names[code] for code in codes]
+
+        rows = []
+        for i in range(len(present)):
+            row = {key: decoded[key][i] for key in group_by}
+            row.update({
+                "spend": round(float(spend[i]), 2),
+                "conversions": int(conversions[i]),
+                "revenue": round(float(revenue[i]), 2),
+                "ROI": float(metrics["ROI"][i]),
+                "ROAS": float(metrics["ROAS"][i]),
+                "CPA": float(metrics["CPA"][i])
+            })
+            rows.append(row)
+        return rows
+
+    def totals(self, **filters) -> Dict:
+        """Ungrouped totals and metrics, with the same filters as query."""
+        rows = self.query(group_by=(), **filters)
+        return rows[0] if rows else {"spend": 0.0, "conversions": 0, "revenue": 0.0, "ROI": 0.0, "ROAS": 0.0, "CPA": 0.0}
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Ingest spend/conversion records and print grouped ROI.")
+    parser.add_argument("store", help="Store directory")
+    parser.add_argument("--ingest", nargs="*", default=[], help="CSV or JSONL record files to add first")
+    parser.add_argument("--group-by", default="channel", help="Comma-separated: channel,campaign,day")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    args = parser.parse_args(argv)
+
+    store = RoiStore(args.store)
+    for path in args.ingest:
+        store.ingest(path)
+    group_by = [key for key in args.group_by.split(",") if key]
+    for row in store.query(group_by, start=args.start, end=args.end):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
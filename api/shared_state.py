@@ -0,0 +1,225 @@
+"""
+Host-wide shared state for the API workers.
+
+Gunicorn runs several worker processes, so anything kept in a module-level
+dict is private to one worker. The helpers here keep small pieces of state
+in a SQLite database on local disk that every worker on the host opens.
+"""
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import logging
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def state_dir() -> str:
+    """
+    Directory holding the shared state files.
+    Override with the SHARED_STATE_DIR environment variable.
+
+    The default lives in the world-writable temp directory, so it is
+    created private to this user and refused if someone else got there first.
+    """
+    if os.getenv('SHARED_STATE_DIR'):
+        path = os.getenv('SHARED_STATE_DIR')
+        os.makedirs(path, exist_ok=True)
+        return path
+    return private_dir(os.path.join(tempfile.gettempdir(), 'marketing_genius'))
+
+
+def private_dir(path: str) -> str:
+    """
+    Create path with mode 0700 if needed and check nobody else can write to it.
+
+    Raises:
+        PermissionError: If path is a symlink, not a directory, owned by
+            another user or writable by group or others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    if info.st_uid != os.geteuid():
+        raise PermissionError(f"{path} is owned by uid {info.st_uid}, not {os.geteuid()}")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} is writable by group or others")
+    return path
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open a SQLite connection tuned for many short writes from several processes.
+
+    WAL lets readers run alongside the single writer, and synchronous=NORMAL
+    skips the fsync on every commit (the database stays consistent, the last
+    few commits may be lost on power failure).
+    """
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
+
+
+class SQLiteState:
+    """
+    Base class for stores that keep one SQLite connection per thread.
+    Connections are reopened after a fork, since SQLite handles must not
+    cross process boundaries.
+    """
+    schema = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(self.schema)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = connect(self.path)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block in one write transaction.
+
+        Connections are in autocommit mode, so `with conn:` alone commits
+        every statement separately. BEGIN IMMEDIATE takes the write lock up
+        front: reads inside the block see no concurrent writers, and the
+        block commits or rolls back as a whole.
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+class SharedCounters(SQLiteState):
+    """
+    Atomic integer counters shared by every worker on the host.
+
+    Each update is a single UPSERT ... RETURNING statement, so the
+    read-modify-write happens inside SQLite's write lock and no two workers
+    can observe the same value.
+    """
+    schema = """
+        CREATE TABLE IF NOT EXISTS counters (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL,
+            expires_at REAL
+        ) WITHOUT ROWID;
+    """
+
+    # Expired window counters are swept once every this many seconds
+    purge_interval = 60.0
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__(path or os.path.join(state_dir(), 'counters.db'))
+        self._last_purge = time.time()
+
+    def increment(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """
+        Add amount to a counter and return the new value.
+
+        Args:
+            key: Counter name
+            amount: Value to add
+            ttl: Seconds until the counter resets to zero. None never expires.
+
+        Returns:
+            The counter value after the increment
+        """
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        row = self._connection().execute(
+            """
+            INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END,
+                expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END
+            RETURNING value
+            """,
+            (key, amount, expires_at, now, now)
+        ).fetchone()
+        return row[0]
+
+    def increment_if_below(self, key: str, limit: int, ttl: Optional[float] = None) -> Optional[int]:
+        """
+        Increment a counter only if it is currently below limit.
+
+        Args:
+            key: Counter name
+            limit: Maximum value the counter may reach
+            ttl: Seconds until the counter resets to zero. None never expires.
+
+        Returns:
+            The new value, or None if the limit was already reached
+        """
+        if limit <= 0:
+            return None
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        row = self._connection().execute(
+            """
+            INSERT INTO counters (key, value, expires_at) VALUES (?, 1, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = CASE WHEN expires_at <= ? THEN 1 ELSE value + 1 END,
+                expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END
+            WHERE value < ? OR expires_at <= ?
+            RETURNING value
+            """,
+            (key, expires_at, now, now, limit, now)
+        ).fetchone()
+        self._maybe_purge(now)
+        return row[0] if row else None
+
+    def hit_window(self, key: str, limit: int, window: float) -> bool:
+        """
+        Fixed-window rate limit check.
+
+        Args:
+            key: Client identifier (email, IP address, ...)
+            limit: Allowed hits per window
+            window: Window length in seconds
+
+        Returns:
+            True if the hit is allowed, False if the client is over the limit
+        """
+        bucket = int(time.time() // window)
+        return self.increment_if_below(f"{key}:{bucket}", limit, ttl=window) is not None
+
+    def get(self, key: str) -> int:
+        """Return the current value of a counter, 0 if unset or expired."""
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def reset(self, key: str):
+        """Delete a counter."""
+        self._connection().execute('DELETE FROM counters WHERE key = ?', (key,))
+
+    def _maybe_purge(self, now: float):
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            self._connection().execute('DELETE FROM counters WHERE expires_at <= ?', (now,))
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not purge expired counters: {e}")
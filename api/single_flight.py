@@ -0,0 +1,147 @@
+"""
+Request coalescing for concurrent identical calls.
+
+The first caller for a key runs the function; callers that arrive while it
+is still running wait for that result instead of repeating the work. Nothing
+is kept once the call finishes, so this is not a cache.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from threading import Event, Lock
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Raised when a waiting caller gives up on the in-flight call."""
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Run fn once per key among concurrent callers.
+
+        Args:
+            key: Canonical identity of the call
+            fn: Zero-argument function computing the result
+            timeout: Seconds a duplicate caller waits for the leader. None waits forever.
+
+        Returns:
+            Tuple of (result, shared) where shared is True for callers that
+            received another caller's result
+
+        Raises:
+            SingleFlightTimeout: If the leader did not finish within timeout
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout(f"Timed out waiting for in-flight call {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        """Number of executed and coalesced calls in this process."""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls)
+            }
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for asyncio code. Must be used from a single event loop.
+    """
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Await fn once per key among concurrent callers.
+
+        Args:
+            key: Canonical identity of the call
+            fn: Zero-argument coroutine function computing the result
+            timeout: Seconds a duplicate caller waits for the leader. None waits forever.
+
+        Returns:
+            Tuple of (result, shared)
+
+        Raises:
+            SingleFlightTimeout: If the leader did not finish within timeout
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                # shield() so a timed-out waiter does not cancel the leader's work
+                return await asyncio.wait_for(asyncio.shield(future), timeout), True
+            except asyncio.TimeoutError:
+                raise SingleFlightTimeout(f"Timed out waiting for in-flight call {key}")
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self.executed += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Number of executed and coalesced calls on this event loop."""
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls)
+        }
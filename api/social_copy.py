@@ -0,0 +1,153 @@
+"""
+Platform-aware social post copy.
+
+Idea templates are compiled once into literal fragments around the
+{industry} slot, so rendering a post is a single str.join. Each post is
+fitted to the platform's max_length and gets hashtags appended where the
+platform allows them and there is room. Results are memoized per industry.
+"""
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from functools import lru_cache
+from types import MappingProxyType
+import re
+
+IDEA_TEMPLATES = {
+    "Facebook": (
+        "Share a customer testimonial about your {industry} products.",
+        "Post a behind-the-scenes look at how your {industry} items are made.",
+        "Run a poll about favorite {industry} features."
+    ),
+    "Instagram": (
+        "Create a visually stunning carousel showcasing your {industry} products.",
+        "Use Stories to highlight limited-time offers on {industry} items.",
+        "Post short videos demonstrating {industry} benefits."
+    ),
+    "TikTok": (
+        "Post fun, trending videos related to {industry} tips or hacks.",
+        "Show quick tutorials or product unboxings in {industry}.",
+        "Create challenges or hashtag campaigns around {industry}."
+    ),
+    "LinkedIn": (
+        "Publish articles on industry trends related to {industry}.",
+        "Share professional testimonials or case studies.",
+        "Highlight company culture focused on {industry} innovation."
+    ),
+    "Twitter": (
+        "Tweet quick tips related to {industry}.",
+        "Engage with trending topics about {industry}.",
+        "Share links to blog posts or news in the {industry} space."
+    )
+}
+
+# Used for configured platforms without their own templates
+DEFAULT_TEMPLATES = (
+    "Discover top-rated {industry} products today.",
+    "Compare {industry} options and find your favorite.",
+    "Save on {industry} essentials this week."
+)
+
+PLACEHOLDER = "{industry}"
+ELLIPSIS = "…"
+MAX_HASHTAGS = 3
+
+
+def compile_template(template: str) -> Tuple[str, ...]:
+    """Split a template into the literal fragments around {industry}."""
+    return tuple(template.split(PLACEHOLDER))
+
+
+def fit_text(text: str, max_length: int, hashtags: Iterable[str] = ()) -> str:
+    """
+    Fit text into max_length characters.
+
+    Over-long text is cut at a word boundary and ends with an ellipsis.
+    Hashtags are appended in order while they still fit.
+    """
+    if len(text) > max_length:
+        cut = text[:max(max_length - 1, 0)]
+        if ' ' in cut:
+            cut = cut[:cut.rfind(' ')]
+        text = cut.rstrip(' ,.;:') + ELLIPSIS
+    for tag in hashtags:
+        if len(text) + 1 + len(tag) > max_length:
+            break
+        text = f"{text} {tag}"
+    return text
+
+
+class SocialCopyFitter:
+    def __init__(self, social_platforms: Dict[str, Dict], industry_map: Optional[Dict] = None,
+                 templates: Optional[Dict[str, Tuple[str, ...]]] = None, cache_size: int = 4096):
+        """
+        Args:
+            social_platforms: Platform name -> {"max_length": int, "hashtags": bool}
+            industry_map: Industry config, whose interests become extra hashtags
+            templates: Platform name -> idea templates. Defaults to IDEA_TEMPLATES.
+            cache_size: Industries to keep memoized
+        """
+        templates = templates or IDEA_TEMPLATES
+        self.industry_map = industry_map or {}
+        self.platforms = tuple(
+            (name,
+             int(spec.get("max_length", 280)),
+             bool(spec.get("hashtags", False)),
+             tuple(compile_template(t) for t in templates.get(name, DEFAULT_TEMPLATES)))
+            for name, spec in social_platforms.items()
+        )
+        self.cache_size = cache_size
+        # Posts fitted ahead of time (see prebuild), e.g. restored from a startup snapshot
+        self._prebuilt: Dict[str, Mapping[str, Tuple[str, ...]]] = {}
+        self.posts_for = lru_cache(maxsize=cache_size)(self._build_posts)
+
+    def hashtags(self, industry: str) -> Tuple[str, ...]:
+        """Hashtags for an industry: the industry itself, then its configured interests."""
+        words = [industry] + list(self.industry_map.get(industry, {}).get("interests", []))
+        tags = []
+        for word in words:
+            tag = "#" + re.sub(r"[^0-9A-Za-z]", "", word.title() if " " in word else word)
+            if len(tag) > 1 and tag not in tags:
+                tags.append(tag)
+        return tuple(tags[:MAX_HASHTAGS])
+
+    def _build_posts(self, industry: str) -> Mapping[str, Tuple[str, ...]]:
+        prebuilt = self._prebuilt.get(industry)
+        if prebuilt is not None:
+            return prebuilt
+        tags = self.hashtags(industry)
+        return MappingProxyType({
+            name: tuple(
+                fit_text(industry.join(fragments), max_length, tags if allow_tags else ())
+                for fragments in compiled
+            )
+            for name, max_length, allow_tags, compiled in self.platforms
+        })
+
+    def ideas(self, industry: str) -> Dict[str, List[str]]:
+        """Fitted post ideas for every configured platform, as fresh lists."""
+        return {name: list(posts) for name, posts in self.posts_for(industry).items()}
+
+    def fit_many(self, industries: Iterable[str]) -> Dict[str, Mapping[str, Tuple[str, ...]]]:
+        """Fitted posts for many industries at once, as shared read-only mappings."""
+        return {industry: self.posts_for(industry) for industry in industries}
+
+    def prebuild(self, industries: Iterable[str]):
+        """Fit posts for these industries now, so they survive cache clears and snapshots."""
+        self._prebuilt.update((industry, self._build_posts(industry)) for industry in industries)
+
+    def clear_cache(self):
+        self.posts_for.cache_clear()
+
+    def __getstate__(self):
+        return {
+            'industry_map': self.industry_map,
+            'platforms': self.platforms,
+            'cache_size': self.cache_size,
+            'prebuilt': self._prebuilt
+        }
+
+    def __setstate__(self, state):
+        self.industry_map = state['industry_map']
+        self.platforms = state['platforms']
+        self.cache_size = state['cache_size']
+        self._prebuilt = state['prebuilt']
+        self.posts_for = lru_cache(maxsize=self.cache_size)(self._build_posts)
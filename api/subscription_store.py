@@ -0,0 +1,297 @@
+"""
+Compact in-memory subscription store.
+
+Each subscriber is a row id: the email maps to an integer, and the fields
+live in parallel typed arrays (a flag byte, an analysis counter and the
+trial end as epoch seconds) instead of one dict of ISO strings per user.
+At a million subscribers that is a few dozen bytes per row on top of the
+email index, and trial checks compare floats instead of re-parsing dates.
+
+Routes keep the dict-style API: ``subscriptions[email]`` returns a view
+that reads and writes the row, so ``sub['is_active']``, ``sub.get(...)``,
+``sub.update({...})`` and ``dict(sub)`` behave as they did with plain
+dicts, including fields that were never set being absent. Rows are reused
+after a delete, so each row carries a generation number and a view kept
+across a delete raises StaleSubscription instead of reaching the next
+subscriber's row.
+"""
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+import math
+import threading
+
+# Bits of the per-row flag byte: two boolean values, then "field was set"
+# markers so unset fields stay absent like missing dict keys
+IS_ACTIVE = 0x01
+IS_TRIAL = 0x02
+HAS_IS_ACTIVE = 0x04
+HAS_IS_TRIAL = 0x08
+HAS_TRIAL_END = 0x10
+HAS_ANALYSIS_COUNT = 0x20
+HAS_SUBSCRIPTION_ID = 0x40
+
+BOOLEAN_FIELDS = {'is_active': (IS_ACTIVE, HAS_IS_ACTIVE), 'is_trial': (IS_TRIAL, HAS_IS_TRIAL)}
+FIELDS = ('is_active', 'is_trial', 'trial_end', 'analysis_count', 'subscription_id')
+NO_TIME = math.nan
+
+
+def to_epoch(value: Any) -> float:
+    """Epoch seconds from an ISO string, datetime, number or None (NaN)."""
+    if value is None:
+        return NO_TIME
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def from_epoch(seconds: float) -> Optional[str]:
+    """ISO string in local time, the format subscriptions have always returned."""
+    return None if math.isnan(seconds) else datetime.fromtimestamp(seconds).isoformat()
+
+
+class StaleSubscription(KeyError):
+    """Raised when a Subscription view is used after its subscriber was deleted."""
+
+
+class Subscription(MutableMapping):
+    """Dict-like view of one row of a SubscriptionStore."""
+    __slots__ = ('_store', '_row', '_generation')
+
+    def __init__(self, store: 'SubscriptionStore', row: int, generation: int):
+        self._store = store
+        self._row = row
+        self._generation = generation
+
+    def __getitem__(self, key: str) -> Any:
+        store = self._store
+        if store._generations[self._row] != self._generation:
+            raise StaleSubscription('Subscription was deleted')
+        return store._get_field(self._row, key)
+
+    def __setitem__(self, key: str, value: Any):
+        self._store._set_field(self._row, key, value, self._generation)
+
+    def __delitem__(self, key: str):
+        self._store._del_field(self._row, key, self._generation)
+
+    def __iter__(self) -> Iterator[str]:
+        self._store._check(self._row, self._generation)
+        return iter(self._store._keys(self._row))
+
+    def __len__(self) -> int:
+        self._store._check(self._row, self._generation)
+        return len(self._store._keys(self._row))
+
+    def __repr__(self) -> str:
+        return f'Subscription({dict(self)!r})'
+
+    @property
+    def trial_end_epoch(self) -> float:
+        """Trial end as epoch seconds (NaN when there is none), without parsing."""
+        self._store._check(self._row, self._generation)
+        return self._store._trial_end[self._row]
+
+
+class SubscriptionStore(MutableMapping):
+    """
+    Email -> subscription mapping backed by typed arrays.
+
+    Assigning a dict replaces the row's fields; reading returns a live
+    Subscription view. Fields outside FIELDS are kept in a side dict so any
+    key a route sets still round-trips.
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, int] = {}
+        self._emails: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._flags = array('B')
+        self._analysis_count = array('i')
+        self._trial_end = array('d')
+        # Bumped when a row is freed, so views of the old subscriber go stale
+        self._generations = array('I')
+        # Sparse: only rows that have them
+        self._subscription_ids: Dict[int, str] = {}
+        self._by_subscription_id: Dict[str, int] = {}
+        self._extra: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, email: str) -> Subscription:
+        view = self.get(email)
+        if view is None:
+            raise KeyError(email)
+        return view
+
+    def get(self, email: str, default=None) -> Optional[Subscription]:
+        rows = self._rows
+        row = rows.get(email)
+        if row is None:
+            return default
+        generation = self._generations[row]
+        # Deletes unmap the email before bumping the generation, so if the email
+        # still maps to this row the generation read belongs to this subscriber
+        if rows.get(email) != row:
+            return self.get(email, default)
+        return Subscription(self, row, generation)
+
+    def __setitem__(self, email: str, fields: Dict[str, Any]):
+        fields = dict(fields)  # fields may be a view of the row being replaced
+        # Encode the common fields in one pass; anything else goes through _set_field
+        flags = 0
+        for key, (bit, has) in BOOLEAN_FIELDS.items():
+            if key in fields:
+                flags |= has | (bit if fields.pop(key) else 0)
+        trial_end = NO_TIME
+        if 'trial_end' in fields:
+            trial_end = to_epoch(fields.pop('trial_end'))
+            flags |= HAS_TRIAL_END
+        analysis_count = 0
+        if 'analysis_count' in fields:
+            analysis_count = int(fields.pop('analysis_count'))
+            flags |= HAS_ANALYSIS_COUNT
+        with self._lock:
+            row = self._rows.get(email)
+            if row is None:
+                row = self._allocate(email)
+            else:
+                self._clear(row)
+            self._flags[row] = flags
+            self._trial_end[row] = trial_end
+            self._analysis_count[row] = analysis_count
+            for key, value in fields.items():
+                self._set_field_locked(row, key, value)
+
+    def __delitem__(self, email: str):
+        with self._lock:
+            row = self._rows.pop(email)
+            self._clear(row)
+            self._emails[row] = None
+            self._generations[row] = (self._generations[row] + 1) & 0xFFFFFFFF
+            self._free.append(row)
+
+    def __contains__(self, email: object) -> bool:
+        return email in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._rows))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def email_for_subscription_id(self, subscription_id: str) -> Optional[str]:
+        """Email of the row holding a PayPal subscription id, without scanning."""
+        row = self._by_subscription_id.get(subscription_id)
+        return None if row is None else self._emails[row]
+
+    def _allocate(self, email: str) -> int:
+        if self._free:
+            row = self._free.pop()
+            self._emails[row] = email
+        else:
+            row = len(self._emails)
+            self._emails.append(email)
+            self._flags.append(0)
+            self._analysis_count.append(0)
+            self._trial_end.append(NO_TIME)
+            self._generations.append(0)
+        self._rows[email] = row
+        return row
+
+    def _clear(self, row: int):
+        self._flags[row] = 0
+        self._analysis_count[row] = 0
+        self._trial_end[row] = NO_TIME
+        subscription_id = self._subscription_ids.pop(row, None)
+        if subscription_id is not None:
+            self._by_subscription_id.pop(subscription_id, None)
+        self._extra.pop(row, None)
+
+    def _check(self, row: int, generation: int):
+        if self._generations[row] != generation:
+            raise StaleSubscription('Subscription was deleted')
+
+    def _keys(self, row: int) -> List[str]:
+        flags = self._flags[row]
+        keys = [key for key, has in (('is_active', HAS_IS_ACTIVE), ('is_trial', HAS_IS_TRIAL),
+                                     ('trial_end', HAS_TRIAL_END), ('analysis_count', HAS_ANALYSIS_COUNT),
+                                     ('subscription_id', HAS_SUBSCRIPTION_ID)) if flags & has]
+        return keys + list(self._extra.get(row, ()))
+
+    def _get_field(self, row: int, key: str) -> Any:
+        flags = self._flags[row]
+        if key in BOOLEAN_FIELDS:
+            value, has = BOOLEAN_FIELDS[key]
+            if flags & has:
+                return bool(flags & value)
+        elif key == 'trial_end':
+            if flags & HAS_TRIAL_END:
+                return from_epoch(self._trial_end[row])
+        elif key == 'analysis_count':
+            if flags & HAS_ANALYSIS_COUNT:
+                return self._analysis_count[row]
+        elif key == 'subscription_id':
+            if flags & HAS_SUBSCRIPTION_ID:
+                return self._subscription_ids[row]
+        elif key in self._extra.get(row, {}):
+            return self._extra[row][key]
+        raise KeyError(key)
+
+    def _set_field(self, row: int, key: str, value: Any, generation: Optional[int] = None):
+        # Flag updates are read-modify-write on a shared byte, so they run under the lock
+        with self._lock:
+            if generation is not None:
+                self._check(row, generation)
+            self._set_field_locked(row, key, value)
+
+    def _set_field_locked(self, row: int, key: str, value: Any):
+        if key in BOOLEAN_FIELDS:
+            bit, has = BOOLEAN_FIELDS[key]
+            self._flags[row] = (self._flags[row] & ~bit) | has | (bit if value else 0)
+        elif key == 'trial_end':
+            self._trial_end[row] = to_epoch(value)
+            self._flags[row] |= HAS_TRIAL_END
+        elif key == 'analysis_count':
+            self._analysis_count[row] = int(value)
+            self._flags[row] |= HAS_ANALYSIS_COUNT
+        elif key == 'subscription_id':
+            old = self._subscription_ids.get(row)
+            if old is not None:
+                self._by_subscription_id.pop(old, None)
+            self._subscription_ids[row] = value
+            if value is not None:
+                self._by_subscription_id[value] = row
+            self._flags[row] |= HAS_SUBSCRIPTION_ID
+        else:
+            self._extra.setdefault(row, {})[key] = value
+
+    def _del_field(self, row: int, key: str, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None:
+                self._check(row, generation)
+            self._get_field(row, key)  # KeyError if absent
+            if key in BOOLEAN_FIELDS:
+                bit, has = BOOLEAN_FIELDS[key]
+                self._flags[row] &= ~(bit | has)
+            elif key == 'trial_end':
+                self._trial_end[row] = NO_TIME
+                self._flags[row] &= ~HAS_TRIAL_END
+            elif key == 'analysis_count':
+                self._analysis_count[row] = 0
+                self._flags[row] &= ~HAS_ANALYSIS_COUNT
+            elif key == 'subscription_id':
+                self._by_subscription_id.pop(self._subscription_ids.pop(row), None)
+                self._flags[row] &= ~HAS_SUBSCRIPTION_ID
+            else:
+                del self._extra[row][key]
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by the typed arrays (excluding the email index)."""
+        return {
+            'rows': len(self._emails),
+            'array_bytes': sum(a.itemsize * len(a) for a in (self._flags, self._analysis_count, self._trial_end,
+                                                             self._generations))
+        }
@@ -0,0 +1,153 @@
+"""
+Startup snapshots of the tool's compiled, config-derived state.
+
+Building the industry classifier matrix, the strategy/audience tables and
+the fitted social copy for every industry is pure work on the config, so
+it is done once and pickled to a snapshot file. The file name carries a
+key hashed from the config version, the source of the modules that build
+the state and SNAPSHOT_FORMAT; a worker starting with the same config and
+code loads the file instead of rebuilding, and any change to either gives
+a new key, so a stale snapshot is never read and is pruned on the next
+save.
+
+Snapshots are pickles, so they are only read from a directory private to
+this user (mode 0700, not group or world writable) and carry an HMAC that
+is checked before unpickling. The HMAC key comes from TOOL_SNAPSHOT_KEY,
+or from a key file generated in the snapshot directory on first use.
+"""
+from typing import Any, Callable, Dict, Optional, Tuple
+import glob
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import secrets
+import sys
+
+from shared_state import private_dir
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+# Modules whose code shapes the snapshot contents
+SNAPSHOT_MODULES = ('marketing_genius_tool', 'social_copy', 'industry_classifier', 'lookup_tables', 'tool_snapshot')
+PREFIX = 'tool-state-'
+KEY_FILE = '.snapshot-key'
+
+_code_version: Optional[str] = None
+
+
+def code_version() -> str:
+    """Hash of the source of SNAPSHOT_MODULES, computed once per process."""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode())
+        for name in SNAPSHOT_MODULES:
+            module = sys.modules.get(name) or __import__(name)
+            with open(module.__file__, 'rb') as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def snapshot_key(config_version: str) -> str:
+    return hashlib.sha256(f'{config_version}|{code_version()}'.encode()).hexdigest()[:24]
+
+
+def snapshot_path(directory: str, key: str) -> str:
+    return os.path.join(directory, f'{PREFIX}{key}.pickle')
+
+
+def signing_key(directory: str) -> bytes:
+    """
+    HMAC key for snapshots: TOOL_SNAPSHOT_KEY if set, otherwise a random key
+    kept in a 0600 file in the (already checked) snapshot directory.
+    """
+    if os.getenv('TOOL_SNAPSHOT_KEY'):
+        return os.getenv('TOOL_SNAPSHOT_KEY').encode()
+    path = os.path.join(directory, KEY_FILE)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_uid != os.geteuid():
+            raise PermissionError(f"{path} is owned by another user")
+        return f.read().strip()
+
+
+def _signature(key: bytes, payload: bytes) -> bytes:
+    return hmac.new(key, payload, hashlib.sha256).digest()
+
+
+def load_snapshot(directory: str, key: str) -> Optional[Dict[str, Any]]:
+    """The snapshot saved under key, or None if it is missing, unsigned or unreadable."""
+    try:
+        with open(snapshot_path(directory, key), 'rb') as f:
+            data = f.read()
+        secret = signing_key(directory)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Ignoring tool snapshot {key}: {e}")
+        return None
+    signature, payload = data[:32], data[32:]
+    if not hmac.compare_digest(signature, _signature(secret, payload)):
+        logger.warning(f"Ignoring tool snapshot {key} with a bad signature")
+        return None
+    try:
+        header, state = pickle.loads(payload)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable tool snapshot {key}: {e!r}")
+        return None
+    if header != {'format': SNAPSHOT_FORMAT, 'key': key}:
+        return None
+    return state
+
+
+def save_snapshot(directory: str, key: str, state: Dict[str, Any]):
+    """Write a signed snapshot atomically and remove snapshots under other keys."""
+    private_dir(directory)
+    path = snapshot_path(directory, key)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    payload = pickle.dumps(({'format': SNAPSHOT_FORMAT, 'key': key}, state), protocol=pickle.HIGHEST_PROTOCOL)
+    with open(tmp, 'wb') as f:
+        f.write(_signature(signing_key(directory), payload) + payload)
+    os.replace(tmp, path)
+    for old in glob.glob(os.path.join(directory, f'{PREFIX}*.pickle')):
+        if old != path:
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+
+
+def load_or_build(directory: str, config_version: str,
+                  build: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], str]:
+    """
+    Compiled state for config_version from its snapshot, building and
+    saving it when there is none.
+
+    Returns:
+        Tuple of (state, "loaded", "rebuilt", or "off" when the directory
+        is not private to this user)
+    """
+    try:
+        private_dir(directory)
+    except PermissionError as e:
+        logger.warning(f"Not using tool snapshots: {e}")
+        return build(), 'off'
+    key = snapshot_key(config_version)
+    state = load_snapshot(directory, key)
+    if state is not None:
+        return state, 'loaded'
+    state = build()
+    try:
+        save_snapshot(directory, key, state)
+    except (OSError, pickle.PicklingError) as e:
+        logger.warning(f"Could not save tool snapshot: {e}")
+    return state, 'rebuilt'
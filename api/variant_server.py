@@ -0,0 +1,220 @@
+"""
+Thompson-sampling variant selection for A/B tests.
+
+Each experiment keeps impressions, clicks and conversions per variant. To
+pick a variant for an impression, one sample is drawn from every variant's
+Beta(1 + successes, 1 + failures) posterior and the highest wins, so traffic
+shifts towards the variant most likely to be best while the others still
+get explored. A selection costs one beta draw per variant and never looks
+at history beyond the running counters.
+
+Counter updates stay in memory and are flushed to a SQLite table shared by
+every worker on the host, as one transaction per batch: when flush_every
+updates are pending or flush_interval seconds have passed. After a flush
+the worker reloads the experiment's host-wide totals, so the posteriors of
+all workers converge. Updates not yet flushed when a process dies are lost,
+which costs the sampler a little information and never corrupts counters.
+
+Only registered experiments are served, so callers cannot make a worker
+keep counters (in memory and on disk) for arbitrary experiment names.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import os
+import random
+import threading
+import time
+from shared_state import SQLiteState, state_dir
+
+logger = logging.getLogger(__name__)
+
+OBJECTIVES = ("clicks", "conversions")
+MAX_VARIANTS = 100
+IMPRESSIONS, CLICKS, CONVERSIONS = 0, 1, 2
+
+
+class VariantCounts(SQLiteState):
+    """Durable per-variant counters, updated in batches."""
+    schema = """
+        CREATE TABLE IF NOT EXISTS ab_counts (
+            experiment TEXT NOT NULL,
+            variant INTEGER NOT NULL,
+            impressions INTEGER NOT NULL DEFAULT 0,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            conversions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (experiment, variant)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__(path or os.path.join(state_dir(), 'ab_counts.db'))
+
+    def add(self, deltas: Dict[Tuple[str, int], List[int]]):
+        """Add (impressions, clicks, conversions) deltas per (experiment, variant) in one transaction."""
+        with self._transaction() as conn:
+            conn.executemany(
+                """
+                INSERT INTO ab_counts (experiment, variant, impressions, clicks, conversions) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(experiment, variant) DO UPDATE SET
+                    impressions = impressions + excluded.impressions,
+                    clicks = clicks + excluded.clicks,
+                    conversions = conversions + excluded.conversions
+                """,
+                [(experiment, variant, *counts) for (experiment, variant), counts in deltas.items()]
+            )
+
+    def load(self, experiment: str) -> Dict[int, List[int]]:
+        rows = self._connection().execute(
+            'SELECT variant, impressions, clicks, conversions FROM ab_counts WHERE experiment = ?', (experiment,))
+        return {variant: [impressions, clicks, conversions] for variant, impressions, clicks, conversions in rows}
+
+
+class VariantServer:
+    def __init__(self, counts: Optional[VariantCounts] = None, objective: str = "clicks",
+                 flush_every: int = 1000, flush_interval: float = 1.0, seed: Optional[int] = None,
+                 experiments: Iterable[str] = ()):
+        """
+        Args:
+            counts: Durable counter store, defaults to ab_counts.db in the shared state dir
+            objective: What counts as a success: "clicks" (per impression) or "conversions"
+            flush_every: Pending counter updates that trigger a flush
+            flush_interval: Seconds after which pending updates are flushed on the next call
+            seed: Random seed, for repeatable selections
+            experiments: Experiment ids select serves; anything else is rejected
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {OBJECTIVES}")
+        self.counts = counts or VariantCounts()
+        self.experiments = frozenset(experiments)
+        self.success = CLICKS if objective == "clicks" else CONVERSIONS
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._random = random.Random(seed)
+        # experiment -> per-variant [impressions, clicks, conversions], host totals plus pending
+        self._experiments: Dict[str, List[List[int]]] = {}
+        self._pending: Dict[Tuple[str, int], List[int]] = {}
+        self._pending_updates = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"selections": 0, "flushes": 0}
+
+    def _experiment(self, experiment: str, variants: int) -> List[List[int]]:
+        """In-memory counters of an experiment with room for variants; caller holds the lock."""
+        counters = self._experiments.get(experiment)
+        if counters is None:
+            stored = self.counts.load(experiment)
+            size = max([variants] + [variant + 1 for variant in stored])
+            counters = [stored.get(i, [0, 0, 0]) for i in range(size)]
+            if not counters:
+                return counters  # Unknown experiment looked up by record or summary: keep nothing
+            self._experiments[experiment] = counters
+        while len(counters) < variants:
+            counters.append([0, 0, 0])
+        return counters
+
+    def _add(self, experiment: str, variant: int, field: int, amount: int):
+        """Count an update in memory and in the pending batch; caller holds the lock."""
+        self._experiments[experiment][variant][field] += amount
+        pending = self._pending.get((experiment, variant))
+        if pending is None:
+            pending = self._pending[(experiment, variant)] = [0, 0, 0]
+        pending[field] += amount
+        self._pending_updates += 1
+
+    def select(self, experiment: str, variants: int) -> int:
+        """
+        Pick a variant for one impression and count the impression.
+
+        Args:
+            experiment: Experiment id
+            variants: Number of variants; variant ids are 0 to variants - 1
+
+        Returns:
+            Chosen variant id
+        """
+        if experiment not in self.experiments:
+            raise ValueError(f"Unknown experiment {experiment!r}")
+        if not 1 <= variants <= MAX_VARIANTS:
+            raise ValueError(f"variants must be between 1 and {MAX_VARIANTS}")
+        betavariate = self._random.betavariate
+        success = self.success
+        with self._lock:
+            counters = self._experiment(experiment, variants)
+            best, best_sample = 0, -1.0
+            for variant in range(variants):
+                impressions, successes = counters[variant][IMPRESSIONS], counters[variant][success]
+                sample = betavariate(1 + successes, 1 + max(impressions - successes, 0))
+                if sample > best_sample:
+                    best, best_sample = variant, sample
+            self._add(experiment, best, IMPRESSIONS, 1)
+            self.stats["selections"] += 1
+        self._maybe_flush()
+        return best
+
+    def record(self, experiment: str, variant: int, clicks: int = 0, conversions: int = 0):
+        """Count clicks and conversions for a variant that was served."""
+        if clicks < 0 or conversions < 0:
+            raise ValueError("clicks and conversions must not be negative")
+        with self._lock:
+            counters = self._experiment(experiment, 0)
+            if not 0 <= variant < len(counters):
+                raise ValueError(f"Unknown variant {variant} for experiment {experiment!r}")
+            if clicks:
+                self._add(experiment, variant, CLICKS, clicks)
+            if conversions:
+                self._add(experiment, variant, CONVERSIONS, conversions)
+        self._maybe_flush()
+
+    def summary(self, experiment: str) -> List[Dict]:
+        """Counters and posterior mean success rate per variant."""
+        with self._lock:
+            counters = [list(row) for row in self._experiment(experiment, 0)]
+        summary = []
+        for variant, (impressions, clicks, conversions) in enumerate(counters):
+            successes = clicks if self.success == CLICKS else conversions
+            summary.append({
+                "variant": variant,
+                "impressions": impressions,
+                "clicks": clicks,
+                "conversions": conversions,
+                "posterior_mean": round((1 + successes) / (2 + max(impressions, successes)), 4)
+            })
+        return summary
+
+    def _maybe_flush(self):
+        if (self._pending_updates >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write pending updates in one transaction and reload host-wide totals."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._pending_updates = self._pending, {}, 0
+                self._last_flush = time.monotonic()
+            if not pending:
+                return
+            try:
+                self.counts.add(pending)
+            except Exception as e:
+                logger.error(f"Could not flush A/B counters, retrying with the next batch: {e}")
+                with self._lock:
+                    for key, counts in pending.items():
+                        merged = self._pending.setdefault(key, [0, 0, 0])
+                        for field, amount in enumerate(counts):
+                            merged[field] += amount
+                    self._pending_updates += len(pending)
+                return
+            experiments = {experiment for experiment, _ in pending}
+            totals = {experiment: self.counts.load(experiment) for experiment in experiments}
+            with self._lock:
+                for experiment, stored in totals.items():
+                    counters = self._experiments[experiment]
+                    for variant, row in stored.items():
+                        while len(counters) <= variant:
+                            counters.append([0, 0, 0])
+                        # Host totals plus whatever this worker counted since the swap
+                        unflushed = self._pending.get((experiment, variant), (0, 0, 0))
+                        counters[variant] = [total + extra for total, extra in zip(row, unflushed)]
+                self.stats["flushes"] += 1
@@ -0,0 +1,231 @@
+"""
+Local verification of PayPal webhook signatures.
+
+PayPal signs "<transmission id>|<transmission time>|<webhook id>|<crc32 of
+body>" with the key of the certificate at PAYPAL-CERT-URL. Certificates
+are fetched once per URL, checked (allowed URL, chain up to a trusted CA
+through certificates marked as CAs, a leaf key allowed to sign, PayPal
+common name, validity period) and cached until they expire, so a steady
+stream of webhooks is verified without any outbound calls. Concurrent
+first deliveries for the same URL share one fetch. Deliveries whose
+transmission time is more than a few minutes from now are rejected, so a
+captured delivery cannot be replayed later.
+"""
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import base64
+import binascii
+import json
+import logging
+import os
+import re
+import threading
+import warnings
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.x509.oid import NameOID
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# PayPal only signs with SHA256withRSA; anything else is rejected
+AUTH_ALGORITHMS = {'SHA256withRSA': hashes.SHA256}
+SIGNER_COMMON_NAME_SUFFIX = '.paypal.com'
+DEFAULT_CERT_URL_PREFIXES = ('https://api.paypal.com/', 'https://api-m.paypal.com/',
+                             'https://api.sandbox.paypal.com/', 'https://api-m.sandbox.paypal.com/')
+# Seconds PAYPAL-TRANSMISSION-TIME may differ from now, either way
+MAX_TRANSMISSION_SKEW = 300
+
+
+class WebhookVerificationError(Exception):
+    """Raised when a webhook delivery cannot be shown to come from PayPal."""
+
+
+def extension_value(cert: x509.Certificate, extension_type):
+    """Value of a certificate extension, or None when the certificate does not have it."""
+    try:
+        return cert.extensions.get_extension_for_class(extension_type).value
+    except x509.ExtensionNotFound:
+        return None
+
+
+def parse_transmission_time(value: str) -> datetime:
+    """PAYPAL-TRANSMISSION-TIME (ISO 8601, e.g. 2024-05-29T12:00:00Z) as an aware UTC datetime."""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise WebhookVerificationError('Transmission time is not an ISO 8601 timestamp')
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def default_trust_anchors() -> List[x509.Certificate]:
+    """
+    CA certificates a signing certificate must chain to: the certifi bundle,
+    the DigiCert certificates shipped with paypalrestsdk, and any PEM file
+    named by PAYPAL_WEBHOOK_CA_FILE.
+    """
+    paths = []
+    try:
+        import certifi
+        paths.append(certifi.where())
+    except ImportError:
+        pass
+    try:
+        import paypalrestsdk
+        data_dir = os.path.join(os.path.dirname(paypalrestsdk.__file__), 'data')
+        paths += [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir)) if name.endswith('.pem')]
+    except (ImportError, OSError):
+        pass
+    if os.getenv('PAYPAL_WEBHOOK_CA_FILE'):
+        paths.append(os.getenv('PAYPAL_WEBHOOK_CA_FILE'))
+    anchors = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            blocks = re.findall(rb'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', f.read(), re.S)
+        for block in blocks:
+            # Load one by one so a single malformed bundle entry does not discard the rest
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    anchors.append(x509.load_pem_x509_certificate(block))
+            except ValueError:
+                logger.warning(f"Skipping unreadable CA certificate in {path}")
+    return anchors
+
+
+class WebhookVerifier:
+    def __init__(self, fetch: Callable[[str], bytes], trust_anchors: Optional[Iterable[x509.Certificate]] = None,
+                 cert_url_prefixes: Iterable[str] = DEFAULT_CERT_URL_PREFIXES, max_certs: int = 32,
+                 max_skew: float = MAX_TRANSMISSION_SKEW):
+        """
+        Args:
+            fetch: Downloads a certificate URL and returns the PEM bytes
+            trust_anchors: CA certificates signing certificates must chain to.
+                Defaults to default_trust_anchors().
+            cert_url_prefixes: PAYPAL-CERT-URL must start with one of these
+            max_certs: Certificates kept in the cache
+            max_skew: Seconds the transmission time may be from now
+        """
+        self.fetch = fetch
+        anchors = list(trust_anchors) if trust_anchors is not None else default_trust_anchors()
+        self._anchors_by_subject: Dict[x509.Name, List[x509.Certificate]] = {}
+        for anchor in anchors:
+            self._anchors_by_subject.setdefault(anchor.subject, []).append(anchor)
+        self.cert_url_prefixes = tuple(cert_url_prefixes)
+        self.max_certs = max_certs
+        self.max_skew = max_skew
+        self._certs: Dict[str, Tuple[x509.Certificate, datetime]] = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.fetches = 0
+        self.hits = 0
+
+    def verify(self, headers: Mapping[str, str], body: bytes, webhook_id: str) -> Dict:
+        """
+        Verify a webhook delivery and return the event parsed from its body.
+
+        Raises:
+            WebhookVerificationError: If headers are missing, the transmission is
+                not recent, the certificate is not trusted or the signature does
+                not match
+        """
+        names = ('PAYPAL-TRANSMISSION-ID', 'PAYPAL-TRANSMISSION-TIME', 'PAYPAL-TRANSMISSION-SIG',
+                 'PAYPAL-CERT-URL', 'PAYPAL-AUTH-ALGO')
+        values = [headers.get(name) for name in names]
+        if not all(values):
+            raise WebhookVerificationError('Missing PayPal transmission headers')
+        transmission_id, transmission_time, signature, cert_url, auth_algo = values
+        algorithm = AUTH_ALGORITHMS.get(auth_algo)
+        if algorithm is None:
+            raise WebhookVerificationError(f'Unsupported auth algorithm {auth_algo}')
+        skew = (datetime.now(timezone.utc) - parse_transmission_time(transmission_time)).total_seconds()
+        if abs(skew) > self.max_skew:
+            raise WebhookVerificationError('Transmission time is too far from now')
+
+        cert = self.certificate(cert_url)
+        message = f"{transmission_id}|{transmission_time}|{webhook_id}|{binascii.crc32(body) & 0xffffffff}"
+        try:
+            cert.public_key().verify(base64.b64decode(signature), message.encode('utf-8'),
+                                     padding.PKCS1v15(), algorithm())
+        except (InvalidSignature, ValueError, binascii.Error):
+            raise WebhookVerificationError('Signature does not match')
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise WebhookVerificationError('Body is not valid JSON')
+
+    def certificate(self, cert_url: str) -> x509.Certificate:
+        """The signing certificate for cert_url, from the cache while it is still valid."""
+        now = datetime.now(timezone.utc)
+        cached = self._certs.get(cert_url)
+        if cached and now < cached[1]:
+            self.hits += 1
+            return cached[0]
+        if not cert_url.startswith(self.cert_url_prefixes) or urlparse(cert_url).username:
+            raise WebhookVerificationError('Certificate URL is not a PayPal URL')
+        cert, _ = self._flight.do(cert_url, lambda: self._load(cert_url))
+        return cert
+
+    def _load(self, cert_url: str) -> x509.Certificate:
+        self.fetches += 1
+        try:
+            chain = x509.load_pem_x509_certificates(self.fetch(cert_url))
+        except ValueError:
+            raise WebhookVerificationError('Certificate URL did not return a PEM certificate')
+        leaf = chain[0]
+        now = datetime.now(timezone.utc)
+        expires = self._check_chain(chain, now)
+        common_names = leaf.subject.get_attributes_for_oid(NameOID.COMMON_NAME)
+        if not common_names or not str(common_names[0].value).lower().endswith(SIGNER_COMMON_NAME_SUFFIX):
+            raise WebhookVerificationError('Certificate is not issued to PayPal')
+        with self._lock:
+            if len(self._certs) >= self.max_certs:
+                self._certs.pop(min(self._certs, key=lambda url: self._certs[url][1]))
+            self._certs[cert_url] = (leaf, expires)
+        logger.info(f"Cached PayPal webhook certificate {cert_url} until {expires.isoformat()}")
+        return leaf
+
+    def _check_chain(self, chain: List[x509.Certificate], now: datetime) -> datetime:
+        """
+        Check each certificate is valid now and issued by the next, ending at a
+        trust anchor. Every issuer must be a CA and the signing certificate's
+        key must be allowed to make digital signatures.
+
+        Returns:
+            When the first certificate in the chain expires
+        """
+        expires = min(cert.not_valid_after_utc for cert in chain)
+        for cert in chain:
+            if not cert.not_valid_before_utc <= now < cert.not_valid_after_utc:
+                raise WebhookVerificationError('Certificate is expired or not yet valid')
+        key_usage = extension_value(chain[0], x509.KeyUsage)
+        if key_usage is None or not key_usage.digital_signature:
+            raise WebhookVerificationError('Certificate key is not allowed to sign')
+        for cert, issuer in zip(chain, chain[1:]):
+            constraints = extension_value(issuer, x509.BasicConstraints)
+            if constraints is None or not constraints.ca:
+                raise WebhookVerificationError('Certificate is issued by a certificate that is not a CA')
+            try:
+                cert.verify_directly_issued_by(issuer)
+            except (ValueError, TypeError, InvalidSignature):
+                raise WebhookVerificationError('Certificate chain is broken')
+        last = chain[-1]
+        for anchor in self._anchors_by_subject.get(last.issuer, []) + self._anchors_by_subject.get(last.subject, []):
+            if anchor == last:
+                return expires
+            # Old roots predate the extension; trust anchors are CAs unless they say otherwise
+            constraints = extension_value(anchor, x509.BasicConstraints)
+            if constraints is not None and not constraints.ca:
+                continue
+            try:
+                last.verify_directly_issued_by(anchor)
+                return min(expires, anchor.not_valid_after_utc)
+            except (ValueError, TypeError, InvalidSignature):
+                continue
+        raise WebhookVerificationError('Certificate does not chain to a trusted CA')
+
+    def stats(self) -> Dict[str, int]:
+        return {'cached': len(self._certs), 'fetches': self.fetches, 'hits': self.hits}
@@ -0,0 +1,72 @@
+"""
+Thompson-sampling selection throughput.
+
+Times VariantServer.select with simulated clicks in-process (one and
+several threads), then the /api/ab/select route through the Flask test
+client, against a durable counter store in a temporary directory.
+
+Usage:
+    python benchmarks/ab_select.py [--selections 200000] [--variants 9] [--threads 8]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+
+def run(server, selections, variants, rates, seed):
+    rng = random.Random(seed)
+    for _ in range(selections):
+        variant = server.select('bench', variants)
+        if rng.random() < rates[variant]:
+            server.record('bench', variant, clicks=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--selections', type=int, default=200_000)
+    parser.add_argument('--variants', type=int, default=9)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['SHARED_STATE_DIR'] = directory
+        from variant_server import VariantCounts, VariantServer
+
+        rates = [0.01 + 0.005 * i for i in range(args.variants)]
+        server = VariantServer(VariantCounts(os.path.join(directory, 'ab.db')), experiments=['bench'])
+        start = time.perf_counter()
+        run(server, args.selections, args.variants, rates, 0)
+        elapsed = time.perf_counter() - start
+        print(f"1 thread:   {args.selections / elapsed:>9,.0f} selections/s  "
+              f"({server.stats['flushes']} flushes)")
+
+        per_thread = args.selections // args.threads
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(lambda seed: run(server, per_thread, args.variants, rates, seed), range(args.threads)))
+        elapsed = time.perf_counter() - start
+        print(f"{args.threads} threads:  {per_thread * args.threads / elapsed:>9,.0f} selections/s")
+        server.flush()
+        impressions = [row['impressions'] for row in server.summary('bench')]
+        print(f"share of impressions on the best variant: {impressions[-1] / sum(impressions):.0%}")
+
+        os.environ['AB_EXPERIMENTS'] = 'http'
+        import index
+        client = index.app.test_client()
+        requests = min(args.selections, 20_000)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.post('/api/ab/select', json={'experiment': 'http', 'variants': args.variants})
+        elapsed = time.perf_counter() - start
+        print(f"/api/ab/select via test client: {requests / elapsed:>7,.0f} requests/s")
+
+
+if __name__ == '__main__':
+    main()
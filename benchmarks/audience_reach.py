@@ -0,0 +1,72 @@
+"""
+Audience size estimate latency over a large demographic dataset.
+
+Builds a dataset of synthetic demographic cells (ages 13-80, --geos geos,
+--interests interests, a few interests per cell) in a temporary directory,
+then times uncached estimates against the memory-mapped columns and the
+memoized repeat of the same targeting.
+
+Usage:
+    python benchmarks/audience_reach.py [--cells 2000000] [--interests 200] [--geos 50] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+from audience_reach import AudienceDataset, ReachEstimator
+
+QUERIES = [
+    ('all ages, no interests', ((13, 80), [], None)),
+    ('25-34', ((25, 34), [], None)),
+    ('18-65, 3 interests', ((18, 65), ['interest-1', 'interest-2', 'interest-3'], None)),
+    ('18-34, 1 interest, geo', ((18, 34), ['interest-7'], 'G1')),
+    ('18-65, 10 interests, geo', ((18, 65), [f'interest-{i}' for i in range(10, 20)], 'G2')),
+]
+
+
+def cells(n, interests, geos, seed=1):
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(13, 81, n)
+    geo_codes = rng.integers(0, geos, n)
+    counts = rng.integers(1, 5000, n)
+    picks = rng.integers(0, interests, (n, 3))
+    for i in range(n):
+        yield {'age': int(ages[i]), 'geo': f'G{geo_codes[i]}', 'count': int(counts[i]),
+               'interests': [f'interest-{j}' for j in picks[i]]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cells', type=int, default=2_000_000)
+    parser.add_argument('--interests', type=int, default=200)
+    parser.add_argument('--geos', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        dataset = AudienceDataset.build(directory, cells(args.cells, args.interests, args.geos))
+        print(f"built {len(dataset):,} cells in {time.perf_counter() - start:.1f}s")
+        for name, (age_range, interests, geo) in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                estimator = ReachEstimator(dataset)
+                start = time.perf_counter()
+                size = estimator.estimate(age_range, interests, geo)['audience_size']
+                timings.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            estimator.estimate(age_range, interests, geo)
+            cached = time.perf_counter() - start
+            print(f"{name:<28} {size:>14,} people  best {min(timings) * 1000:>6.1f} ms  "
+                  f"memoized {cached * 1e6:>5.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Sustained event ingest rate and what each mode guarantees.
+
+Generates synthetic impression/click/conversion batches and times, in a
+temporary directory:
+
+  validate   parse_events over NDJSON batches (one core)
+  append     EventLog.append from --threads threads, with and without fsync
+  route      POST /api/events through the Flask test client
+  compact    folding the sealed segments into a RoiStore
+
+Durability: with fsync (the default), an append returns only after its
+group's fsync, so an accepted batch survives a process crash or power loss.
+With EVENT_LOG_FSYNC=false it survives a process crash but the last
+moments of batches can be lost if the OS goes down. Compaction counts each
+segment exactly once, including across a compactor crash.
+
+Usage:
+    python benchmarks/event_ingest.py [--events 400000] [--batch 200] [--threads 16]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+CHANNELS = ('Google', 'Facebook', 'Instagram', 'TikTok', 'LinkedIn')
+
+
+def batches(n, batch, seed=1):
+    """NDJSON batches of ~3% CTR traffic over 100 campaigns."""
+    rng = random.Random(seed)
+    now = time.time()
+    lines = []
+    for i in range(n):
+        roll = rng.random()
+        event = {'type': 'impression', 'campaign': f'campaign-{rng.randrange(100)}',
+                 'channel': rng.choice(CHANNELS), 'timestamp': now - rng.uniform(0, 7 * 86400)}
+        if roll < 0.03:
+            event.update(type='click', cost=round(rng.uniform(0.2, 2.0), 2))
+        elif roll < 0.033:
+            event.update(type='conversion', revenue=round(rng.uniform(10, 80), 2))
+        lines.append(json.dumps(event))
+    return ['\n'.join(lines[i:i + batch]).encode() for i in range(0, n, batch)]
+
+
+def rate(events, seconds):
+    return f"{events / seconds:>12,.0f} events/s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=400_000)
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['SHARED_STATE_DIR'] = directory
+        from event_log import EventLog, compact, parse_events
+        from roi_analytics import RoiStore
+
+        bodies = batches(args.events, args.batch)
+        start = time.perf_counter()
+        parsed = [parse_events(body)[0] for body in bodies]
+        print(f"validate                      {rate(args.events, time.perf_counter() - start)}")
+
+        for fsync in (True, False):
+            for threads in (1, args.threads):
+                log = EventLog(os.path.join(directory, f'events-{fsync}-{threads}'), fsync=fsync)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(threads) as pool:
+                    list(pool.map(log.append, parsed))
+                elapsed = time.perf_counter() - start
+                log.seal()
+                group = log.stats['batches'] / log.stats['commits']
+                print(f"append fsync={str(fsync):<5} threads={threads:<3} {rate(args.events, elapsed)}  "
+                      f"{log.stats['commits'] / elapsed:>7,.0f} commits/s, {group:.1f} batches per commit")
+
+        store = RoiStore(os.path.join(directory, 'roi'))
+        start = time.perf_counter()
+        result = compact(os.path.join(directory, f'events-True-{args.threads}'), store)
+        print(f"compact                       {rate(args.events, time.perf_counter() - start)}  "
+              f"({result['segments']} segments -> {result['rows']} ROI rows)")
+
+        os.environ['EVENTS_TOKEN'] = 'bench'
+        import index
+        index.event_log = EventLog(os.path.join(directory, 'route'))
+        client = index.app.test_client()
+        requests = bodies[:max(1, 50_000 // args.batch)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # campaign alerts from the monitor
+            for body in requests:
+                client.post('/api/events', data=body, content_type='application/x-ndjson',
+                            headers={'Authorization': 'Bearer bench'})
+        elapsed = time.perf_counter() - start
+        print(f"route (1 client, fsync)       {rate(len(requests) * args.batch, elapsed)}")
+
+
+if __name__ == '__main__':
+    main()
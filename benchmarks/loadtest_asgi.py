@@ -0,0 +1,116 @@
+"""
+Concurrent-request capacity: gunicorn sync workers vs. the ASGI variant.
+
+Starts a local fake PayPal with a fixed response latency, serves the API
+once with `gunicorn index:app` (sync workers) and once with
+`uvicorn asgi:app`, and drives /api/create-subscription from many
+concurrent clients. Each request makes two PayPal calls, so the route is
+almost entirely I/O wait.
+
+Usage:
+    python benchmarks/loadtest_asgi.py [--workers 2] [--concurrency 64] [--duration 10] [--latency 0.1]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_paypal import FakePayPal
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port, workers, env):
+    api_dir = os.path.join(ROOT, 'api')
+    if kind == 'gunicorn-sync':
+        cmd = ['gunicorn', '--chdir', api_dir, '-w', str(workers), '-b', f'127.0.0.1:{port}',
+               '--log-level', 'warning', 'index:app']
+    else:
+        cmd = ['uvicorn', 'asgi:app', '--app-dir', api_dir, '--workers', str(workers),
+               '--port', str(port), '--log-level', 'warning', '--no-access-log']
+    return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_healthy(base, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f'{base}/health', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Server at {base} did not become healthy')
+
+
+async def drive(base, concurrency, duration):
+    latencies = []
+    statuses = {}
+    stop_at = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        async def user(i):
+            while time.perf_counter() < stop_at:
+                start = time.perf_counter()
+                try:
+                    response = await client.post('/api/create-subscription', json={'email': f'load{i}@example.com'})
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return latencies, statuses
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=0.1, help='Fake PayPal latency per call (seconds)')
+    args = parser.parse_args()
+
+    with FakePayPal(latency=args.latency) as fake:
+        env = dict(os.environ,
+                   PAYPAL_API_BASE=fake.url, PAYPAL_CLIENT_ID='id', PAYPAL_CLIENT_SECRET='secret',
+                   PAYPAL_PLAN_ID='P-1', SHARED_STATE_DIR=tempfile.mkdtemp())
+        print(f"{args.workers} workers, {args.concurrency} concurrent clients, "
+              f"{args.duration:.0f}s, PayPal latency {args.latency * 1000:.0f} ms/call")
+        print(f"{'server':<14} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+        for kind in ('gunicorn-sync', 'uvicorn-asgi'):
+            port = free_port()
+            server = start_server(kind, port, args.workers, env)
+            try:
+                base = f'http://127.0.0.1:{port}'
+                wait_healthy(base)
+                latencies, statuses = asyncio.run(drive(base, args.concurrency, args.duration))
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{kind:<14} {len(latencies) / args.duration:>8.1f} "
+                  f"{percentile(latencies, 0.50) * 1000:>8.0f} {percentile(latencies, 0.95) * 1000:>8.0f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.0f}  {statuses}")
+
+
+if __name__ == '__main__':
+    main()
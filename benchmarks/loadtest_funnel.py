@@ -0,0 +1,217 @@
+"""
+Load test of the subscription funnel against local PayPal and SMTP fakes.
+
+Starts FakePayPal and FakeSMTP with the configured latency and error
+rates, serves the API (gunicorn sync workers or uvicorn ASGI) pointed at
+them, and starts one funnel every 1/--rate seconds (open loop, so a slow
+server builds a backlog instead of lowering the offered load). Each
+funnel walks:
+
+    POST /api/subscribe
+    POST /api/create-subscription
+    POST /api/orders
+    POST /api/orders/<id>/capture
+    POST /api/webhook            (signed like a PayPal delivery)
+
+and the report gives, per endpoint, throughput, p50/p95/p99 latency and a
+breakdown of non-2xx statuses and client errors. Funnel emails, payloads
+and fault injection are all derived from --seed, so two runs with the
+same flags are comparable; --json saves a report and --compare prints the
+difference against a saved one.
+
+Usage:
+    python benchmarks/loadtest_funnel.py [--rate 20] [--funnels 400] [--server gunicorn-sync]
+        [--paypal-latency 0.05] [--paypal-error-rate 0.0] [--smtp-latency 0.01] [--smtp-error-rate 0.0]
+        [--seed 1] [--json report.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_paypal import FakePayPal
+from fake_smtp import FakeSMTP
+from loadtest_asgi import free_port, percentile, start_server, wait_healthy
+
+WEBHOOK_ID = 'WH-LOADTEST'
+STEPS = ('subscribe', 'create-subscription', 'orders', 'capture', 'webhook')
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+
+    def record(self, step, seconds, outcome):
+        self.latencies[step].append(seconds)
+        self.outcomes[step][outcome] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for step in STEPS:
+            latencies = self.latencies.get(step, [])
+            outcomes = self.outcomes.get(step, Counter())
+            ok = sum(n for outcome, n in outcomes.items() if str(outcome).startswith('2'))
+            endpoints[step] = {
+                'requests': len(latencies),
+                'ok': ok,
+                'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+                'errors': {str(k): v for k, v in sorted(outcomes.items(), key=str) if not str(k).startswith('2')}
+            }
+        return endpoints
+
+
+async def timed(client, recorder, step, method, path, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        outcome = response.status_code
+    except httpx.HTTPError as e:
+        response, outcome = None, type(e).__name__
+    recorder.record(step, time.perf_counter() - start, outcome)
+    return response
+
+
+async def funnel(client, recorder, fake, run_id, i):
+    email = f'funnel-{run_id}-{i}@example.com'
+    await timed(client, recorder, 'subscribe', 'POST', '/api/subscribe', json={'email': email, 'name': f'User {i}'})
+
+    response = await timed(client, recorder, 'create-subscription', 'POST', '/api/create-subscription',
+                           json={'email': email})
+    approval_url = response.json().get('approval_url', '') if response is not None and response.is_success else ''
+    subscription_id = approval_url.rsplit('/', 1)[-1] or f'I-MISSING-{i}'
+
+    response = await timed(client, recorder, 'orders', 'POST', '/api/orders',
+                           json={'cart': [{'price': '20.00'}]})
+    if response is not None and response.is_success:
+        order_id = response.json().get('id')
+        await timed(client, recorder, 'capture', 'POST', f'/api/orders/{order_id}/capture',
+                    json={'payerID': f'PAYER-{i}'})
+
+    body = json.dumps({
+        'id': f'WH-{run_id}-{i}',
+        'event_type': 'BILLING.SUBSCRIPTION.ACTIVATED',
+        'resource_type': 'subscription',
+        'resource': {'id': subscription_id, 'status': 'ACTIVE'}
+    }).encode()
+    headers = dict(fake.webhook_headers(body, WEBHOOK_ID), **{'Content-Type': 'application/json'})
+    await timed(client, recorder, 'webhook', 'POST', '/api/webhook', content=body, headers=headers)
+
+
+async def drive(base, fake, rate, funnels, run_id, concurrency):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        tasks = []
+        for i in range(funnels):
+            # Open loop: funnel i starts at i / rate regardless of how earlier ones are doing
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(funnel(client, recorder, fake, run_id, i)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+
+def print_report(report, baseline=None):
+    print(f"{'endpoint':<20} {'req':>6} {'ok':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  errors")
+    for step, row in report['endpoints'].items():
+        line = (f"{step:<20} {row['requests']:>6} {row['ok']:>6} {row['throughput']:>7.1f} "
+                f"{row['p50_ms'] or 0:>8.1f} {row['p95_ms'] or 0:>8.1f} {row['p99_ms'] or 0:>8.1f}  {row['errors'] or ''}")
+        print(line)
+        old = (baseline or {}).get('endpoints', {}).get(step)
+        if old and old.get('p95_ms') and row['p95_ms']:
+            print(f"{'':<20} vs baseline: req/s {row['throughput'] - old['throughput']:+.1f}, "
+                  f"p50 {row['p50_ms'] - old['p50_ms']:+.1f} ms, p95 {row['p95_ms'] - old['p95_ms']:+.1f} ms, "
+                  f"p99 {row['p99_ms'] - old['p99_ms']:+.1f} ms, ok {row['ok'] - old['ok']:+d}")
+    fakes = report['fakes']
+    print(f"PayPal calls: {fakes['paypal_calls']}  emails delivered: {fakes['emails_delivered']}, "
+          f"rejected: {fakes['emails_rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=('gunicorn-sync', 'uvicorn-asgi'), default='gunicorn-sync')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=20, help='Funnels started per second')
+    parser.add_argument('--funnels', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=256, help='Client connection limit')
+    parser.add_argument('--paypal-latency', type=float, default=0.05)
+    parser.add_argument('--paypal-error-rate', type=float, default=0.0)
+    parser.add_argument('--smtp-latency', type=float, default=0.01)
+    parser.add_argument('--smtp-error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--compare', help='Baseline report to diff against')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    fake_paypal = FakePayPal(latency=args.paypal_latency, error_rate=args.paypal_error_rate, seed=args.seed)
+    fake_smtp = FakeSMTP(latency=args.smtp_latency, error_rate=args.smtp_error_rate, seed=args.seed)
+    with fake_paypal, fake_smtp:
+        # The fake signs webhooks with a certificate from its own CA; trust that CA for this run
+        ca_file = os.path.join(tempfile.mkdtemp(), 'fake-paypal-ca.pem')
+        with open(ca_file, 'wb') as f:
+            f.write(fake_paypal.ca_pem)
+        env = dict(os.environ,
+                   PAYPAL_API_BASE=fake_paypal.url, PAYPAL_MODE='sandbox',
+                   PAYPAL_CLIENT_ID='id', PAYPAL_CLIENT_SECRET='secret', PAYPAL_PLAN_ID='P-1',
+                   PAYPAL_WEBHOOK_ID=WEBHOOK_ID, PAYPAL_CERT_URL_PREFIXES=fake_paypal.url + '/',
+                   PAYPAL_WEBHOOK_CA_FILE=ca_file,
+                   MAIL_SERVER=fake_smtp.host, MAIL_PORT=str(fake_smtp.port), MAIL_USE_TLS='false',
+                   MAIL_DEFAULT_SENDER='noreply@example.com',
+                   SHARED_STATE_DIR=tempfile.mkdtemp())
+        port = free_port()
+        server = start_server(args.server, port, args.workers, env)
+        try:
+            base = f'http://127.0.0.1:{port}'
+            wait_healthy(base)
+            recorder, elapsed = asyncio.run(
+                drive(base, fake_paypal, args.rate, args.funnels, f'{args.seed}-{port}', args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        # Welcome emails are sent from background threads; give stragglers a moment
+        time.sleep(max(1.0, args.smtp_latency * 10))
+        report = {
+            'config': {key: value for key, value in vars(args).items() if key not in ('json', 'compare')},
+            'elapsed_seconds': round(elapsed, 2),
+            'funnels_per_second': round(args.funnels / elapsed, 2),
+            'endpoints': recorder.report(elapsed),
+            'fakes': {
+                'paypal_calls': {f'{method} {path}': n for (method, path), n in sorted(fake_paypal.calls.items())},
+                'emails_delivered': len(fake_smtp.messages),
+                'emails_rejected': fake_smtp.rejected
+            }
+        }
+
+    print(f"{args.server}, {args.workers} workers, {args.funnels} funnels at {args.rate}/s "
+          f"({report['funnels_per_second']}/s achieved in {report['elapsed_seconds']}s), "
+          f"PayPal {args.paypal_latency * 1000:.0f} ms / {args.paypal_error_rate:.0%} errors, "
+          f"SMTP {args.smtp_latency * 1000:.0f} ms / {args.smtp_error_rate:.0%} errors")
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
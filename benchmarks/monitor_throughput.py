@@ -0,0 +1,66 @@
+"""
+Single-core throughput of the streaming campaign monitor.
+
+Generates a synthetic event stream (impressions, clicks with cost,
+conversions) spread over many campaigns and channels, optionally writes it
+to a JSONL log, and times CampaignMonitor.process over it.
+
+Usage:
+    python benchmarks/monitor_throughput.py [--events 1000000] [--campaigns 200] [--rate 1000] [--log events.jsonl]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+from campaign_monitor import CampaignMonitor, CLICK, CONVERSION, IMPRESSION
+
+CHANNELS = ('Google', 'Facebook', 'Instagram', 'TikTok', 'LinkedIn')
+KIND_NAMES = {IMPRESSION: 'impression', CLICK: 'click', CONVERSION: 'conversion'}
+
+
+def generate(n, campaigns, rate, seed=1):
+    """n events at `rate` events per second of simulated time, ~3% CTR and $0.90 CPC."""
+    rng = random.Random(seed)
+    start = 1_700_000_000.0
+    events = []
+    for i in range(n):
+        r = rng.random()
+        kind = IMPRESSION if r < 0.965 else CLICK if r < 0.995 else CONVERSION
+        campaign = rng.randrange(campaigns)
+        events.append((start + i / rate, f'campaign-{campaign}', CHANNELS[campaign % len(CHANNELS)],
+                       kind, round(rng.uniform(0.5, 1.3), 2) if kind == CLICK else 0.0))
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--campaigns', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=1000, help='Simulated events per second')
+    parser.add_argument('--log', help='Also write the events to this JSONL file for replay')
+    args = parser.parse_args()
+
+    events = generate(args.events, args.campaigns, args.rate)
+    if args.log:
+        with open(args.log, 'w') as f:
+            for ts, campaign, channel, kind, cost in events:
+                f.write(json.dumps({'timestamp': ts, 'campaign': campaign, 'channel': channel,
+                                    'type': KIND_NAMES[kind], 'cost': cost}) + '\n')
+
+    monitor = CampaignMonitor()
+    start = time.perf_counter()
+    monitor.process(events)
+    monitor.flush()
+    elapsed = time.perf_counter() - start
+    print(f"{len(events)} events, {len(monitor.streams)} streams, {elapsed:.2f}s, "
+          f"{len(events) / elapsed:,.0f} events/s, {monitor.alert_count} alerts")
+
+
+if __name__ == '__main__':
+    main()
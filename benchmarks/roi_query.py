@@ -0,0 +1,76 @@
+"""
+Grouped ROI query latency over a large columnar store.
+
+Builds a store of synthetic daily spend/conversion rows (5 channels,
+--campaigns campaigns, three years of days) in a temporary directory, then
+times grouped queries against the memory-mapped columns.
+
+Usage:
+    python benchmarks/roi_query.py [--rows 10000000] [--campaigns 500] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+from roi_analytics import RoiStore
+
+CHANNELS = ['Google', 'Facebook', 'Instagram', 'TikTok', 'LinkedIn']
+QUERIES = [
+    ('total', dict(group_by=())),
+    ('by channel', dict(group_by=('channel',))),
+    ('by campaign', dict(group_by=('campaign',))),
+    ('by day', dict(group_by=('day',))),
+    ('by channel, day', dict(group_by=('channel', 'day'))),
+    ('by channel, last 90 days', dict(group_by=('channel',), start='2023-10-03')),
+    ('one campaign by day', dict(group_by=('day',), campaign='campaign-7')),
+]
+
+
+def build(directory, rows, campaigns, chunk=2_000_000, seed=1):
+    rng = np.random.default_rng(seed)
+    store = RoiStore(directory)
+    channel_names = np.array(CHANNELS)
+    campaign_names = np.array([f'campaign-{i}' for i in range(campaigns)])
+    first_day = np.datetime64('2021-01-01')
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        spend = rng.gamma(2.0, 20.0, n)
+        conversions = rng.poisson(spend / 25)
+        store.append_columns(
+            first_day + rng.integers(0, 3 * 365, n),
+            channel_names[rng.integers(0, len(CHANNELS), n)],
+            campaign_names[rng.integers(0, campaigns, n)],
+            spend, conversions, conversions * rng.uniform(20, 60, n))
+    return RoiStore(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--campaigns', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        store = build(directory, args.rows, args.campaigns)
+        print(f"built {len(store):,} rows in {time.perf_counter() - start:.1f}s")
+        for name, query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                groups = store.query(**query)
+                timings.append(time.perf_counter() - start)
+            print(f"{name:<28} {len(groups):>7} groups  best {min(timings) * 1000:>7.0f} ms  "
+                  f"first {timings[0] * 1000:>7.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
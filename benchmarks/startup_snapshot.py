@@ -0,0 +1,83 @@
+"""
+Tool startup time with and without the compiled-state snapshot.
+
+Writes a synthetic config with --industries industries, then starts fresh
+Python processes that construct MarketingGeniusTool three ways: with no
+snapshot directory (build everything), with an empty one (build and save
+the snapshot) and with the saved snapshot (load it). Reports the median
+constructor time over --runs processes per mode.
+
+Usage:
+    python benchmarks/startup_snapshot.py [--industries 2000] [--runs 5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API = os.path.join(ROOT, 'api')
+
+CHILD = """
+import json, logging, sys
+sys.path.insert(0, {api!r})
+logging.disable(logging.INFO)
+from marketing_genius_tool import MarketingGeniusTool
+tool = MarketingGeniusTool({config!r}, snapshot_dir={snapshot_dir!r})
+print(json.dumps(tool.startup))
+"""
+
+
+def synthetic_config(industries):
+    return {'industry_map': {
+        f'industry{i}': {
+            'channels': ['Facebook', 'Instagram', 'Google'][:1 + i % 3],
+            'age_range': [18 + i % 10, 40 + i % 20],
+            'interests': [f'interest{i}', f'interest{i + 1}', f'topic{i % 50}'],
+            'synonyms': [f'synonym{i}', f'alias{i}'],
+            'strategy': f'Strategy sentence for industry {i} with a few more words.'
+        } for i in range(industries)
+    }}
+
+
+def start(config, snapshot_dir):
+    code = CHILD.format(api=API, config=config, snapshot_dir=snapshot_dir)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--industries', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        config = os.path.join(directory, 'config.json')
+        with open(config, 'w') as f:
+            json.dump(synthetic_config(args.industries), f)
+        snapshot_dir = os.path.join(directory, 'snapshots')
+
+        timings = {'no snapshot': [], 'stale/missing (rebuild + save)': [], 'snapshot loaded': []}
+        for _ in range(args.runs):
+            timings['no snapshot'].append(start(config, None))
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            timings['stale/missing (rebuild + save)'].append(start(config, snapshot_dir))
+            timings['snapshot loaded'].append(start(config, snapshot_dir))
+
+        size = sum(os.path.getsize(os.path.join(snapshot_dir, name)) for name in os.listdir(snapshot_dir))
+        print(f"{args.industries} industries, snapshot {size / 1e6:.1f} MB, median of {args.runs} processes")
+        for mode, runs in timings.items():
+            assert {run['snapshot'] for run in runs} <= {'off', 'rebuilt', 'loaded'}
+            print(f"{mode:<32} {statistics.median(run['seconds'] for run in runs) * 1000:>8.1f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Memory and access cost of the subscription store at scale.
+
+Fills the current representation (a dict of per-user dicts holding ISO
+date strings) and SubscriptionStore with the same --subscribers trial
+users, measuring allocated bytes with tracemalloc, then times the hot
+paths: a subscription lookup plus trial-expiry check, and a counter update.
+
+Usage:
+    python benchmarks/subscription_memory.py [--subscribers 1000000] [--lookups 200000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+from subscription_store import SubscriptionStore
+
+
+def fill_dicts(emails, trial_ends):
+    subscriptions = {}
+    for i, email in enumerate(emails):
+        subscriptions[email] = {'is_active': True, 'is_trial': True, 'trial_end': trial_ends[i].isoformat(),
+                                'analysis_count': i % 3}
+    return subscriptions
+
+
+def fill_store(emails, trial_ends):
+    subscriptions = SubscriptionStore()
+    for i, email in enumerate(emails):
+        subscriptions[email] = {'is_active': True, 'is_trial': True, 'trial_end': trial_ends[i],
+                                'analysis_count': i % 3}
+    return subscriptions
+
+
+def measure(fill, emails, trial_ends):
+    """Bytes allocated by fill (excluding the shared email strings) and its runtime."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    subscriptions = fill(emails, trial_ends)
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return subscriptions, size, elapsed
+
+
+def expired_dict(subscriptions, email, now, now_epoch):
+    subscription = subscriptions.get(email)
+    return subscription['is_trial'] and datetime.fromisoformat(subscription['trial_end']) < now
+
+
+def expired_store(subscriptions, email, now, now_epoch):
+    subscription = subscriptions.get(email)
+    return subscription['is_trial'] and subscription.trial_end_epoch < now_epoch
+
+
+def time_lookups(subscriptions, expired, sample):
+    now = datetime.now()
+    now_epoch = now.timestamp()
+    start = time.perf_counter()
+    for email in sample:
+        expired(subscriptions, email, now, now_epoch)
+        subscriptions[email]['analysis_count'] = 1
+    return (time.perf_counter() - start) / len(sample)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    emails = [f'user{i}@example.com' for i in range(args.subscribers)]
+    base = datetime.now()
+    trial_ends = [base + timedelta(seconds=rng.randrange(-7 * 86400, 7 * 86400)) for _ in emails]
+    sample = [rng.choice(emails) for _ in range(args.lookups)]
+
+    print(f"{args.subscribers:,} subscribers (email strings excluded from both)")
+    print(f"{'representation':<22} {'MB':>8} {'bytes/sub':>10} {'fill s':>8} {'lookup+check us':>16}")
+    for name, fill, expired in (('dict of dicts', fill_dicts, expired_dict),
+                                ('SubscriptionStore', fill_store, expired_store)):
+        subscriptions, size, elapsed = measure(fill, emails, trial_ends)
+        per_lookup = time_lookups(subscriptions, expired, sample)
+        print(f"{name:<22} {size / 1e6:>8.1f} {size / args.subscribers:>10.0f} {elapsed:>8.2f} "
+              f"{per_lookup * 1e6:>16.2f}")
+        del subscriptions
+
+
+if __name__ == '__main__':
+    main()
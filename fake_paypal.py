@@ -0,0 +1,272 @@
+"""
+Local stand-in for the PayPal REST API, for tests and load tests.
+
+Serves the endpoints the API uses (OAuth token, billing subscriptions,
+payments, webhook events) from memory, with configurable latency and
+error injection. Creates and executes honour PayPal-Request-Id the way
+PayPal does: a repeated request id returns the first response, while a
+second execute of a payment under a new id fails with PAYMENT_ALREADY_DONE.
+
+Webhook deliveries can be signed the way PayPal signs them, with a
+certificate issued by a fake CA and served from the fake's own cert URL.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from threading import Lock, Thread
+import base64
+import binascii
+import itertools
+import json
+import random
+import re
+import time
+import uuid
+
+CERT_PATH = '/v1/notifications/certs/CERT-fake-webhook-signing'
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Load tests open many connections at once
+
+
+class FakePayPal:
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        """
+        Args:
+            latency: Seconds to wait before answering each request
+            error_rate: Fraction of requests answered with HTTP 503
+            seed: Random seed, so error injection is repeatable
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.fail_next = Counter()  # Path -> number of upcoming requests answered with 503
+        self.lose_next = Counter()  # Path -> number of upcoming requests processed, then answered with 503
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.lock = Lock()
+        self.ids = itertools.count(1)
+        self.payments = {}
+        self.created_by_request_id = {}
+        self.executed_by_request_id = {}
+        self._signing = None
+        self.server = _Server(('127.0.0.1', 0), self._handler())
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def cert_url(self):
+        return self.url + CERT_PATH
+
+    def _signing_key(self):
+        """
+        RSA key with a signing certificate issued by a fake CA, created on first use.
+
+        Returns:
+            Tuple of (signing key, PEM of the certificate followed by the CA, PEM of the CA)
+        """
+        with self.lock:
+            if self._signing is None:
+                from cryptography import x509
+                from cryptography.hazmat.primitives import hashes, serialization
+                from cryptography.hazmat.primitives.asymmetric import rsa
+                from cryptography.x509.oid import NameOID
+
+                now = datetime.now(timezone.utc)
+                ca_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+                ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'Fake PayPal CA')])
+                ca = (x509.CertificateBuilder()
+                      .subject_name(ca_name).issuer_name(ca_name).public_key(ca_key.public_key())
+                      .serial_number(x509.random_serial_number())
+                      .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=365))
+                      .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+                      .add_extension(x509.KeyUsage(False, False, False, False, False, True, True, False, False),
+                                     critical=True)
+                      .sign(ca_key, hashes.SHA256()))
+                key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+                name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'messageverificationcerts.paypal.com')])
+                cert = (x509.CertificateBuilder()
+                        .subject_name(name).issuer_name(ca_name).public_key(key.public_key())
+                        .serial_number(x509.random_serial_number())
+                        .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=30))
+                        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+                        .add_extension(x509.KeyUsage(True, False, False, False, False, False, False, False, False),
+                                       critical=True)
+                        .sign(ca_key, hashes.SHA256()))
+                ca_pem = ca.public_bytes(serialization.Encoding.PEM)
+                self._signing = (key, cert.public_bytes(serialization.Encoding.PEM) + ca_pem, ca_pem)
+            return self._signing
+
+    @property
+    def cert_pem(self):
+        """The certificate chain served at cert_url, signing certificate first."""
+        return self._signing_key()[1]
+
+    @property
+    def ca_pem(self):
+        """The CA certificate the signing certificate chains to; trust it to verify deliveries."""
+        return self._signing_key()[2]
+
+    def webhook_headers(self, body, webhook_id, sent_at=None):
+        """
+        Headers PayPal would send with a webhook delivery of body (bytes), sent
+        at sent_at (a datetime, default now). The signature covers transmission
+        id, time, webhook id and the body's CRC32.
+        """
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        key = self._signing_key()[0]
+        transmission_id = str(uuid.uuid4())
+        transmission_time = (sent_at or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        message = f"{transmission_id}|{transmission_time}|{webhook_id}|{binascii.crc32(body) & 0xffffffff}"
+        signature = key.sign(message.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256())
+        return {
+            'PAYPAL-TRANSMISSION-ID': transmission_id,
+            'PAYPAL-TRANSMISSION-TIME': transmission_time,
+            'PAYPAL-TRANSMISSION-SIG': base64.b64encode(signature).decode('ascii'),
+            'PAYPAL-CERT-URL': self.cert_url,
+            'PAYPAL-AUTH-ALGO': 'SHA256withRSA'
+        }
+
+    def _should_fail(self, path):
+        with self.lock:
+            if self.fail_next[path] > 0:
+                self.fail_next[path] -= 1
+                return True
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def _next_id(self, prefix):
+        with self.lock:
+            return f"{prefix}-{next(self.ids):08d}"
+
+    def _create_once(self, request_id, create):
+        """Run create unless this PayPal-Request-Id was already seen."""
+        if request_id:
+            with self.lock:
+                if request_id in self.created_by_request_id:
+                    return self.created_by_request_id[request_id]
+        resource = create()
+        if request_id:
+            with self.lock:
+                resource = self.created_by_request_id.setdefault(request_id, resource)
+        return resource
+
+    def route(self, method, path, body, headers):
+        """Return (status, json_body) for one request; bytes bodies are sent as-is."""
+        request_id = headers.get('PayPal-Request-Id')
+
+        if method == 'POST' and path == '/v1/oauth2/token':
+            return 200, {'access_token': 'fake-access-token', 'token_type': 'Bearer', 'expires_in': 32400}
+
+        if method == 'POST' and path == '/v1/billing/subscriptions':
+            def create():
+                sub_id = self._next_id('I')
+                return {
+                    'id': sub_id,
+                    'status': 'APPROVAL_PENDING',
+                    'links': [{'rel': 'approve', 'href': f"{self.url}/approve/{sub_id}"}]
+                }
+            return 201, self._create_once(request_id, create)
+
+        if method == 'POST' and path == '/v1/payments/payment':
+            def create():
+                payment = dict(body, id=self._next_id('PAYID'), state='created')
+                with self.lock:
+                    self.payments[payment['id']] = payment
+                return payment
+            return 201, self._create_once(request_id, create)
+
+        match = re.fullmatch(r'/v1/payments/payment/([^/]+)(/execute)?', path)
+        if match:
+            payment = self.payments.get(match.group(1))
+            if payment is None:
+                return 404, {'name': 'INVALID_RESOURCE_ID'}
+            if method == 'POST' and match.group(2):
+                with self.lock:
+                    if request_id in self.executed_by_request_id:
+                        return self.executed_by_request_id[request_id]
+                if payment['state'] == 'approved':
+                    return 400, {'name': 'PAYMENT_ALREADY_DONE'}
+                payment = dict(payment, state='approved')
+                payment['transactions'] = [dict(
+                    transaction,
+                    related_resources=[{'sale': {'id': f"SALE-{payment['id']}", 'state': 'completed'}}]
+                ) for transaction in payment.get('transactions', [])]
+                with self.lock:
+                    self.payments[payment['id']] = payment
+                    self.executed_by_request_id[request_id] = (200, payment)
+            return 200, payment
+
+        if method == 'GET' and path == CERT_PATH:
+            return 200, self.cert_pem
+
+        match = re.fullmatch(r'/v1/notifications/webhooks-events/([^/]+)', path)
+        if match and method == 'GET':
+            return 200, {'id': match.group(1), 'event_type': 'BILLING.SUBSCRIPTION.ACTIVATED', 'resource': {'id': 'I-00000001'}}
+
+        return 404, {'name': 'NOT_FOUND'}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                path = self.path.split('?', 1)[0]
+                with fake.lock:
+                    fake.calls[(self.command, re.sub(r'/[A-Z]+-[0-9]+', '/{id}', path))] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake._should_fail(path):
+                    status, payload = 503, {'name': 'SERVICE_UNAVAILABLE'}
+                else:
+                    try:
+                        body = json.loads(raw) if raw.startswith(b'{') else {}
+                    except ValueError:
+                        body = {}
+                    status, payload = fake.route(self.command, path, body, self.headers)
+                    with fake.lock:
+                        if fake.lose_next[path] > 0:
+                            fake.lose_next[path] -= 1
+                            status, payload = 503, {'name': 'SERVICE_UNAVAILABLE'}
+                is_json = not isinstance(payload, bytes)
+                data = json.dumps(payload).encode('utf-8') if is_json else payload
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json' if is_json else 'application/x-pem-file')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Client gave up (timeout)
+
+            do_GET = _serve
+            do_POST = _serve
+
+        return Handler
@@ -0,0 +1,114 @@
+"""
+Local stand-in for an SMTP relay, for tests and load tests.
+
+Speaks just enough SMTP for smtplib/Flask-Mail (no TLS, no auth), keeps
+delivered messages in memory, and has configurable latency and error
+injection: a failed delivery is answered with 451 after DATA.
+"""
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread
+import random
+import time
+
+
+class _Server(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+
+
+class FakeSMTP:
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        """
+        Args:
+            latency: Seconds to wait before accepting each message
+            error_rate: Fraction of messages rejected with 451
+            seed: Random seed, so error injection is repeatable
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = Lock()
+        self.messages = []  # (sender, recipients, data)
+        self.rejected = 0
+        self.server = _Server(('127.0.0.1', 0), self._handler())
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _deliver(self, sender, recipients, data):
+        """Return True if the message is accepted."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if self.error_rate > 0 and self.random.random() < self.error_rate:
+                self.rejected += 1
+                return False
+            self.messages.append((sender, recipients, data))
+            return True
+
+    def _handler(self):
+        fake = self
+
+        class Handler(StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode('ascii') + b'\r\n')
+
+            def handle(self):
+                self.reply('220 fake-smtp ready')
+                sender, recipients = None, []
+                for raw in self.rfile:
+                    command = raw.decode('utf-8', 'replace').rstrip('\r\n')
+                    verb = command[:4].upper()
+                    if verb == 'EHLO':
+                        self.reply('250-fake-smtp')
+                        self.reply('250 8BITMIME')
+                    elif verb == 'HELO':
+                        self.reply('250 fake-smtp')
+                    elif verb == 'MAIL':
+                        sender, recipients = command.split(':', 1)[1].strip(), []
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        recipients.append(command.split(':', 1)[1].strip())
+                        self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        lines = []
+                        for line in self.rfile:
+                            if line in (b'.\r\n', b'.\n'):
+                                break
+                            lines.append(line)
+                        if fake._deliver(sender, recipients, b''.join(lines)):
+                            self.reply('250 OK queued')
+                        else:
+                            self.reply('451 Temporary failure, try again later')
+                        sender, recipients = None, []
+                    elif verb in ('RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Command not implemented')
+
+        return Handler
@@ -0,0 +1,80 @@
+import unittest
+import json
+import os
+import tempfile
+import zlib
+from analysis_history import AnalysisHistory, canonical_json, compress, decode_cursor, encode_cursor
+from marketing_genius_tool import MarketingGeniusTool
+
+
+class TestAnalysisHistory(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tool = MarketingGeniusTool()
+        # As served by the API: JSON types only
+        cls.result = json.loads(json.dumps(tool.analyze('https://www.example.com/skincare/serum', 10)))
+
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.history = AnalysisHistory(os.path.join(self.temp_dir.name, 'history.db'), max_per_user=5)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        """Test a stored result comes back unchanged."""
+        entry = self.history.record('a@example.com', 'https://example.com/skincare', self.result)
+        self.assertEqual(self.history.get('a@example.com', entry['id']), self.result)
+        self.assertIsNone(self.history.get('b@example.com', entry['id']))
+
+    def test_dedup_and_compression(self):
+        """Test identical results are stored once and compressed."""
+        for email in ('a@example.com', 'b@example.com', 'a@example.com'):
+            self.history.record(email, 'https://example.com/skincare', dict(reversed(list(self.result.items()))))
+        stats = self.history.stats()
+        self.assertEqual(stats['analyses'], 3)
+        self.assertEqual(stats['unique_results'], 1)
+        self.assertLess(stats['stored_bytes'], stats['raw_bytes'] / 3)
+
+    def test_dictionary_matches_real_results(self):
+        """Test the dictionary shrinks a result it was not built from well below plain zlib."""
+        result = json.loads(json.dumps(MarketingGeniusTool().analyze('https://store.example.org/software/crm', 400)))
+        data = canonical_json(result)
+        self.assertLess(len(compress(data)), len(zlib.compress(data, 9)) / 3)
+
+    def test_pagination(self):
+        """Test cursor pages walk the history newest first without overlap."""
+        for i in range(5):
+            self.history.record('a@example.com', f'https://example.com/{i}', {'n': i}, created_at=1000 + i)
+        self.history.record('b@example.com', 'https://example.com/other', {'n': 99})
+        seen = []
+        cursor = None
+        while True:
+            page = self.history.page('a@example.com', cursor=cursor, limit=2)
+            seen += [entry['result']['n'] for entry in page['analyses']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, [4, 3, 2, 1, 0])
+        summary = self.history.page('a@example.com', limit=1, include_results=False)
+        self.assertNotIn('result', summary['analyses'][0])
+
+    def test_cursor_validation(self):
+        """Test malformed cursors are rejected."""
+        self.assertEqual(decode_cursor(encode_cursor(42)), 42)
+        with self.assertRaises(ValueError):
+            self.history.page('a@example.com', cursor='not a cursor')
+
+    def test_trim(self):
+        """Test old entries and unreferenced blobs are dropped."""
+        for i in range(8):
+            self.history.record('a@example.com', 'https://example.com', {'n': i})
+        self.history.trim()
+        page = self.history.page('a@example.com', limit=10)
+        self.assertEqual([entry['result']['n'] for entry in page['analyses']], [7, 6, 5, 4, 3])
+        self.assertEqual(self.history.stats()['unique_results'], 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+from unittest import mock
+import os
+import tempfile
+import time
+
+# Keep shared state (counters, caches) out of the real state directory
+os.environ['SHARED_STATE_DIR'] = tempfile.mkdtemp()
+
+import jwt
+import index
+from roi_analytics import RoiStore
+
+HISTORY_SECRET = 'analysis-history-test-secret-32-bytes'
+
+
+class TestAnalyzeEndpoint(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.client = index.app.test_client()
+        self.email = f"trial-{self._testMethodName}@example.com"
+        index.subscriptions[self.email] = {
+            'is_active': True,
+            'is_trial': True,
+            'trial_end': '2099-01-01T00:00:00'
+        }
+
+    def tearDown(self):
+        """Clean up after tests."""
+        index.subscriptions.pop(self.email, None)
+        index.counters.reset(f"trial:{self.email}")
+
+    def analyze(self, email=None):
+        return self.client.post('/api/analyze', json={
+            'email': email or self.email,
+            'url': 'https://www.organicskincare.co.nz/products/serum',
+            'employee_count': 10
+        })
+
+    def test_trial_limit(self):
+        """Test trial users are limited to three analyses."""
+        statuses = [self.analyze().status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 403])
+        self.assertEqual(index.subscriptions[self.email]['analysis_count'], 3)
+
+    def test_result_cache(self):
+        """Test repeated analyses are served from the shared cache."""
+        index.subscriptions[self.email]['is_trial'] = False
+        before = index.result_cache.stats()['hits']
+        first = self.analyze()
+        second = self.analyze()
+        self.assertEqual(first.get_json(), second.get_json())
+        self.assertGreater(self.client.get('/api/cache/stats').get_json()['hits'], before)
+
+    def test_rate_limit(self):
+        """Test per-client rate limiting."""
+        index.subscriptions[self.email]['is_trial'] = False
+        limit = index.ANALYZE_RATE_LIMIT
+        # One very long window so the test cannot straddle a window boundary
+        with mock.patch.object(index, 'ANALYZE_RATE_WINDOW', 10 ** 9):
+            statuses = [self.analyze().status_code for _ in range(limit + 1)]
+        self.assertEqual(statuses[:limit], [200] * limit)
+        self.assertEqual(statuses[-1], 429)
+
+    def test_analysis_history(self):
+        """Test analyses are kept per user and paginated."""
+        index.subscriptions[self.email]['is_trial'] = False
+        for _ in range(3):
+            self.analyze()
+        with mock.patch.dict(index.app.config, {'JWT_SECRET': HISTORY_SECRET}):
+            auth = self.bearer(self.email)
+            first = self.client.post('/api/analyses', json={'limit': 2}, headers=auth).get_json()
+            self.assertEqual(len(first['analyses']), 2)
+            self.assertEqual(first['analyses'][0]['result'], self.analyze().get_json())
+            second = self.client.post('/api/analyses', json={'limit': 2, 'cursor': first['next_cursor']},
+                                      headers=auth).get_json()
+            self.assertEqual(len(second['analyses']), 1)
+            self.assertIsNone(second['next_cursor'])
+            self.assertEqual(self.client.post('/api/analyses', json={'cursor': '!!'}, headers=auth).status_code, 400)
+            self.assertEqual(self.client.post('/api/analyses', headers=self.bearer('x@example.com')).status_code, 403)
+
+            # The email alone, a token signed with another key or an expired token get nothing
+            self.assertEqual(self.client.post('/api/analyses', json={'email': self.email}).status_code, 401)
+            forged = {'Authorization': 'Bearer ' + jwt.encode({'email': self.email}, 'guessed-secret-of-at-least-32-bytes', algorithm='HS256')}
+            self.assertEqual(self.client.post('/api/analyses', headers=forged).status_code, 401)
+            self.assertEqual(self.client.post('/api/analyses', headers=self.bearer(self.email, -60)).status_code, 401)
+            self.assertNotIn(b'next_cursor', self.client.get('/api/analyses', query_string={'email': self.email}).data)
+        with mock.patch.dict(index.app.config, {'JWT_SECRET': None}):
+            self.assertEqual(self.client.post('/api/analyses', headers=auth).status_code, 503)
+
+    def bearer(self, email, expires_in=600):
+        claims = {'email': email, 'exp': int(time.time()) + expires_in}
+        return {'Authorization': 'Bearer ' + jwt.encode(claims, HISTORY_SECRET, algorithm='HS256')}
+
+    def test_roi_report(self):
+        """Test grouped ROI for subscribers."""
+        self.assertEqual(self.client.post('/api/roi', json={'email': 'nobody@example.com'}).status_code, 403)
+        store = RoiStore(tempfile.mkdtemp())
+        store.append([{'date': '2024-01-01', 'channel': 'Google', 'spend': 100, 'conversions': 4, 'revenue': 250}])
+        with mock.patch.object(index.tool, 'roi_store', store):
+            response = self.client.post('/api/roi', json={'email': self.email, 'group_by': ['channel', 'day']})
+            self.assertEqual(response.get_json()['rows'][0]['ROAS'], 2.5)
+            bad = self.client.post('/api/roi', json={'email': self.email, 'group_by': ['week']})
+            self.assertEqual(bad.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from unittest import mock
+import os
+import tempfile
+import threading
+
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp())
+
+from starlette.testclient import TestClient
+import asgi
+import index
+from fake_paypal import FakePayPal
+
+
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.fake = FakePayPal().start()
+        self.email = f"asgi-{self._testMethodName}@example.com"
+        index.subscriptions[self.email] = {'is_active': True, 'is_trial': False, 'trial_end': None}
+        patches = [
+            mock.patch.object(index, 'PAYPAL_API_BASE', self.fake.url),
+            mock.patch.dict(os.environ, {'PAYPAL_CLIENT_ID': 'id', 'PAYPAL_CLIENT_SECRET': 'secret', 'PAYPAL_PLAN_ID': 'P-1'}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = TestClient(asgi.app)
+        self.client.__enter__()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.client.__exit__(None, None, None)
+        self.fake.stop()
+        index.subscriptions.pop(self.email, None)
+
+    def test_analyze(self):
+        """Test the async analyze route matches the Flask response shape."""
+        response = self.client.post('/api/analyze', json={
+            'email': self.email,
+            'url': 'https://www.example.com/skincare/serum'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['industry'], 'skincare')
+        self.assertEqual(response.headers['X-Frame-Options'], 'DENY')
+
+    def test_request_checks_run_off_the_event_loop(self):
+        """Test the SQLite-backed request checks run in the executor, not on the loop thread."""
+        threads = []
+        check = index.check_analyze_request
+
+        def recording_check(data):
+            threads.append(threading.current_thread().name)
+            return check(data)
+        with mock.patch.object(index, 'check_analyze_request', recording_check):
+            response = self.client.post('/api/analyze', json={'email': self.email, 'url': 'https://www.example.com/'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(threads[0].startswith('analyze'), threads)
+
+    def test_analyze_rejects_unknown_subscriber(self):
+        """Test the shared request checks apply."""
+        response = self.client.post('/api/analyze', json={'email': 'nobody@example.com', 'url': 'https://example.com'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_create_subscription(self):
+        """Test the async PayPal checkout against the fake."""
+        response = self.client.post('/api/create-subscription', json={'email': self.email})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/approve/', response.json()['approval_url'])
+
+    def test_falls_back_to_flask(self):
+        """Test routes without an async handler are served by the Flask app."""
+        response = self.client.post('/api/check-subscription', json={'email': self.email})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_active'])
+
+    def test_shared_routes_match_flask(self):
+        """Test the async health and metrics routes return the same payloads as Flask."""
+        flask_client = index.app.test_client()
+        for path in ('/health', '/api/metrics/outbound'):
+            self.assertEqual(self.client.get(path).json(), flask_client.get(path).get_json())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import numpy as np
+from audience_reach import AudienceDataset, ReachEstimator
+from marketing_genius_tool import MarketingGeniusTool
+from record_files import read_records
+
+CELLS = [
+    {"age": 30, "geo": "NZ", "interests": "beauty;wellness", "count": 100},
+    {"age": 22, "geo": "nz", "interests": ["fashion"], "count": 50},
+    {"age": 45, "geo": "AU", "interests": "beauty", "count": 70},
+    {"age": 19, "geo": "AU", "interests": "", "count": 5},
+    {"age": 30, "geo": "AU", "interests": "technology,gadgets", "count": 40},
+]
+
+
+class TestAudienceReach(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.estimator = ReachEstimator(AudienceDataset.build(self.temp_dir.name, CELLS))
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def size(self, *args, **kwargs):
+        return self.estimator.estimate(*args, **kwargs)["audience_size"]
+
+    def test_filters(self):
+        """Test age ranges, interests (any of) and geo combine."""
+        self.assertEqual(self.size((18, 65)), 265)
+        self.assertEqual(self.size((20, 30)), 190)
+        self.assertEqual(self.size((18, 65), ["beauty"]), 170)
+        self.assertEqual(self.size((18, 35), ["Beauty", "fashion"]), 150)
+        self.assertEqual(self.size((18, 65), ["beauty"], "AU"), 70)
+        self.assertEqual(self.size((18, 65), geo="nz"), 150)
+        self.assertEqual(self.size((50, 65)), 0)
+        self.assertEqual(self.size((18, 65), geo="US"), 0)
+
+    def test_unknown_interests_and_default_geo_are_ignored(self):
+        """Test targeting the dataset cannot resolve does not narrow the audience."""
+        estimate = self.estimator.estimate((18, 65), ["general", "beauty"], "default")
+        self.assertEqual(estimate["audience_size"], 170)
+        self.assertEqual(estimate["matched_interests"], ["beauty"])
+        self.assertEqual(estimate["share"], round(170 / 265, 4))
+
+    def test_memoized_per_signature(self):
+        """Test equivalent targeting shares one cached estimate."""
+        self.estimator.estimate((18, 65), ["beauty", "general"], "default")
+        self.estimator.estimate([18, 65], ["BEAUTY"], None)
+        info = self.estimator.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_count_defaults(self):
+        """Test a missing or blank count means one person, but an explicit zero stays zero."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/cells.csv"
+            with open(path, "w") as f:
+                f.write("age,geo,interests,count\n30,NZ,beauty,0\n31,NZ,beauty,\n32,NZ,beauty,7\n")
+            with open(f"{directory}/cells.jsonl", "w") as f:
+                f.write('{"age": 30, "geo": "NZ", "interests": ["beauty"], "count": 0}\n'
+                        '{"age": 31, "geo": "NZ", "interests": ["beauty"]}\n')
+            for name, expected in (("cells.csv", 8), ("cells.jsonl", 1)):
+                dataset = AudienceDataset.build(f"{directory}/data", read_records(f"{directory}/{name}"))
+                self.assertEqual(ReachEstimator(dataset).estimate((18, 65))["audience_size"], expected)
+
+    def test_matches_brute_force(self):
+        """Test unaligned age slices over many cells agree with a direct scan."""
+        rng = np.random.default_rng(3)
+        interests = ["a", "b", "c", "d"]
+        cells = [{"age": int(rng.integers(13, 80)), "geo": ["NZ", "AU", "US"][int(rng.integers(3))],
+                  "interests": [i for i in interests if rng.random() < 0.3], "count": int(rng.integers(1, 1000))}
+                 for _ in range(2000)]
+        with tempfile.TemporaryDirectory() as directory:
+            estimator = ReachEstimator(AudienceDataset.build(directory, cells))
+            for age_range, wanted, geo in [((21, 21), ["a"], None), ((18, 34), ["b", "d"], "NZ"),
+                                           ((35, 79), [], "US"), ((13, 80), ["c"], None)]:
+                expected = sum(c["count"] for c in cells
+                               if age_range[0] <= c["age"] <= age_range[1]
+                               and (not wanted or set(wanted) & set(c["interests"]))
+                               and (geo is None or c["geo"] == geo))
+                self.assertEqual(estimator.estimate(age_range, wanted, geo)["audience_size"], expected)
+
+    def test_campaign_targeting(self):
+        """Test build_campaign adds the estimate when a dataset is loaded."""
+        tool = MarketingGeniusTool()
+        self.assertNotIn("estimated_reach", tool.build_campaign(["serum"], "skincare")["targeting"])
+        tool.reach_estimator = self.estimator
+        targeting = tool.build_campaign(["serum"], "skincare")["targeting"]
+        self.assertIn("audience_size", targeting["estimated_reach"])
+
+if __name__ == '__main__':
+    unittest.main()
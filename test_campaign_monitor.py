@@ -0,0 +1,123 @@
+import unittest
+import json
+import os
+import random
+import tempfile
+import time
+from campaign_monitor import CampaignMonitor, CLICK, IMPRESSION, HIGH_CPC_MESSAGE, LOW_CTR_MESSAGE, replay
+from marketing_genius_tool import MarketingGeniusTool
+
+START = 1_700_000_040.0
+
+
+def minute_of_traffic(minute, impressions=1000, clicks=30, cpc=0.9, campaign="spring", channel="Google"):
+    """Events for one minute: impressions followed by clicks carrying cost."""
+    base = START + minute * 60
+    events = [(base + i * 0.01, campaign, channel, "impression") for i in range(impressions)]
+    events += [(base + 30 + i * 0.01, campaign, channel, "click", cpc) for i in range(clicks)]
+    return events
+
+
+class TestCampaignMonitor(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.monitor = CampaignMonitor(window_seconds=600, bucket_seconds=60)
+
+    def test_rolling_window(self):
+        """Test the window holds only the last window_seconds of closed buckets."""
+        for minute in range(15):
+            self.monitor.process(minute_of_traffic(minute))
+        self.monitor.flush()
+        window = self.monitor.window("spring", "Google")
+        self.assertEqual(window["impressions"], 10 * 1000)
+        self.assertEqual(window["clicks"], 10 * 30)
+        self.assertEqual(window["CTR"], 3.0)
+        self.assertEqual(window["CPC"], 0.9)
+
+    def test_constant_memory(self):
+        """Test ring buffers do not grow with the number of buckets seen."""
+        for minute in range(100):
+            self.monitor.record(START + minute * 60, "spring", "Google", IMPRESSION)
+        stream = self.monitor.streams[("spring", "Google")]
+        self.assertEqual(len(stream.impressions), 10)
+
+    def test_alert_history_is_bounded(self):
+        """Test only the most recent alerts are kept while every one is counted and returned."""
+        monitor = CampaignMonitor(window_seconds=60, bucket_seconds=60, min_impressions=10, max_alerts=3)
+        raised = []
+        for minute in range(20):
+            # Alternate breach and recovery so each breaching minute raises a new alert
+            raised += monitor.process(minute_of_traffic(minute, impressions=100, cpc=2.0 if minute % 2 else 0.5))
+        raised += monitor.flush()
+        self.assertEqual(len(raised), 10)
+        self.assertEqual(monitor.alert_count, 10)
+        self.assertEqual(list(monitor.alerts), raised[-3:])
+
+    def test_future_timestamps_are_clamped(self):
+        """Test one event stamped far ahead does not clear the window for real traffic."""
+        monitor = CampaignMonitor(window_seconds=600, bucket_seconds=60)
+        now = time.time()
+        monitor.record(now, "spring", "Google", IMPRESSION)
+        monitor.record(now + 86000, "spring", "Google", IMPRESSION)
+        monitor.record(now + 1, "spring", "Google", IMPRESSION)
+        monitor.flush(now + 600)
+        self.assertEqual(monitor.window("spring", "Google")["impressions"], 3)
+
+    def test_gap_clears_window(self):
+        """Test a gap longer than the window empties it."""
+        self.monitor.process(minute_of_traffic(0))
+        self.monitor.flush(START + 3600)
+        self.assertEqual(self.monitor.window("spring", "Google")["impressions"], 0)
+
+    def test_threshold_alerts(self):
+        """Test the monitor_campaign thresholds fire once per breach."""
+        for minute in range(5):
+            self.monitor.process(minute_of_traffic(minute, clicks=10, cpc=1.5))
+        alerts = self.monitor.flush()
+        messages = [a["message"] for a in self.monitor.alerts]
+        self.assertEqual(messages.count(HIGH_CPC_MESSAGE), 1)
+        self.assertEqual(messages.count(LOW_CTR_MESSAGE), 1)
+        self.assertEqual(alerts, [])
+
+    def test_anomaly_alert(self):
+        """Test a sudden CTR drop is flagged against the EWMA baseline."""
+        rng = random.Random(3)
+        for minute in range(30):
+            self.monitor.process(minute_of_traffic(minute, clicks=rng.randint(28, 32)))
+        self.assertEqual([a for a in self.monitor.alerts if a["type"] == "anomaly"], [])
+        self.monitor.process(minute_of_traffic(30, clicks=5))
+        anomalies = [a for a in self.monitor.flush() if a["type"] == "anomaly"]
+        self.assertEqual(len(anomalies), 1)
+        self.assertEqual(anomalies[0]["metric"], "CTR")
+        self.assertIn("drop", anomalies[0]["message"])
+
+    def test_streams_are_independent(self):
+        """Test campaigns and channels keep separate aggregates."""
+        self.monitor.process(minute_of_traffic(0, channel="Google"))
+        self.monitor.process(minute_of_traffic(0, channel="TikTok", clicks=0))
+        self.monitor.flush()
+        self.assertEqual(self.monitor.window("spring", "Google")["clicks"], 30)
+        self.assertEqual(self.monitor.window("spring", "TikTok")["clicks"], 0)
+
+    def test_replay(self):
+        """Test replaying a recorded JSONL log."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "events.jsonl")
+            with open(path, "w") as f:
+                for minute in range(3):
+                    for ts, campaign, channel, kind, *cost in minute_of_traffic(minute, clicks=10, cpc=1.5):
+                        f.write(json.dumps({"timestamp": ts, "campaign": campaign, "channel": channel,
+                                            "type": kind, "cost": cost[0] if cost else 0}) + "\n")
+            summary = replay([path], self.monitor)
+        self.assertEqual(summary["events"], 3 * 1010)
+        self.assertGreaterEqual(summary["alerts"], 1)
+        self.assertEqual(self.monitor.window("spring", "Google")["clicks"], 30)
+
+    def test_monitor_campaign_thresholds(self):
+        """Test the snapshot check still uses the shared thresholds."""
+        tool = MarketingGeniusTool()
+        self.assertEqual(tool.monitor_campaign({"CPC": "$1.50", "CTR": "1.0%"}), [HIGH_CPC_MESSAGE, LOW_CTR_MESSAGE])
+        self.assertEqual(tool.monitor_campaign({"CPC": "$0.80", "CTR": "3.0%"}), [])
+
+if __name__ == '__main__':
+    unittest.main()
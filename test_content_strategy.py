@@ -0,0 +1,78 @@
+import unittest
+import random
+from content_strategy import ContentStrategy, FormatStats
+from marketing_genius_tool import MarketingGeniusTool
+
+
+class TestContentStrategy(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.strategy = ContentStrategy()
+
+    def test_welford_matches_batch(self):
+        """Test running mean and variance match a batch computation."""
+        rng = random.Random(7)
+        values = [rng.uniform(1, 5) for _ in range(500)]
+        stats = FormatStats()
+        for value in values:
+            stats.update(value)
+        mean = sum(values) / len(values)
+        variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+        self.assertAlmostEqual(stats.mean, mean, places=9)
+        self.assertAlmostEqual(stats.variance, variance, places=9)
+
+    def test_trend(self):
+        """Test the smoothed trend follows a rising series."""
+        stats = FormatStats()
+        for week in range(60):
+            stats.update(1.0 + 0.2 * week)
+        self.assertAlmostEqual(stats.trend, 0.2, places=2)
+        self.assertGreater(stats.forecast(), 12.6)
+
+    def test_rank_by_expected_lift(self):
+        """Test a rising format outranks one with a higher but falling average."""
+        self.strategy.update_many({
+            "video": ["1.5%", "2.0%", "2.5%", "3.0%", "3.5%", "4.0%"],
+            "carousel": [4.0, 3.6, 3.2, 2.8, 2.4, 2.0],
+            "static": [1.9, 2.1, 2.0, 1.9, 2.1, 2.0]
+        })
+        ranked = self.strategy.rank()
+        self.assertEqual(ranked[0]["format"], "video")
+        self.assertGreater(ranked[0]["lift"], 0)
+        self.assertGreater(ranked[0]["confidence"], 0.8)
+        carousel = next(row for row in ranked if row["format"] == "carousel")
+        self.assertGreater(carousel["mean_ctr"], ranked[0]["mean_ctr"])
+        self.assertLess(carousel["trend"], 0)
+
+    def test_inconclusive(self):
+        """Test noisy, similar formats are not recommended with confidence."""
+        self.strategy.update_many({"video": [1.0, 4.0, 2.0], "static": [3.5, 1.5, 2.2]})
+        self.assertTrue(self.strategy.recommendations()[0].startswith("No format clearly leads"))
+
+    def test_observe_windows(self):
+        """Test live counts become one CTR observation per window of impressions."""
+        strategy = ContentStrategy(window=100)
+        strategy.observe("video", impressions=60, clicks=3)
+        self.assertNotIn("video", strategy.formats)
+        strategy.observe("video", impressions=40, clicks=2)
+        self.assertEqual(strategy.formats["video"].n, 1)
+        self.assertAlmostEqual(strategy.formats["video"].mean, 5.0)
+        self.assertNotIn("video", strategy.pending)
+
+    def test_generate_content_strategy(self):
+        """Test the tool uses format history and keeps the single-CTR fallback."""
+        tool = MarketingGeniusTool()
+        self.assertEqual(tool.generate_content_strategy({"CTR": "2.0%"})[0], "Try short-form video next week.")
+        recs = tool.generate_content_strategy({"formats": {
+            "carousel": [3.0, 3.2, 3.4, 3.6], "static": [1.0, 1.1, 1.0, 1.1]
+        }})
+        self.assertTrue(recs[0].startswith("Prioritize carousel"))
+        self.assertEqual(recs[-1], "Consider retargeting recent visitors.")
+
+        for ctr in (1.0, 1.2, 1.1, 1.0):
+            tool.record_content_performance("static", ctr)
+            tool.record_content_performance("video", ctr + 2)
+        self.assertTrue(tool.generate_content_strategy({"CTR": "2.0%"})[0].startswith("Prioritize video"))
+
+if __name__ == '__main__':
+    unittest.main()
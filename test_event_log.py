@@ -0,0 +1,219 @@
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp())
+
+import event_log
+import index
+from content_strategy import ContentStrategy
+from event_log import EventLog, compact, compactable_segments, parse_events
+from marketing_genius_tool import MarketingGeniusTool
+from roi_analytics import RoiStore
+from variant_server import VariantCounts, VariantServer
+
+NOW = 1_717_000_000.0  # 2024-05-29
+
+
+def event(kind, campaign='spring', channel='Google', timestamp=NOW, **fields):
+    return dict(fields, type=kind, campaign=campaign, channel=channel, timestamp=timestamp)
+
+
+def append_rows(directory, n):
+    store = RoiStore(directory)
+    for _ in range(n):
+        store.append([{'date': '2024-05-01', 'channel': 'Google', 'campaign': 'a', 'spend': 1, 'conversions': 0,
+                       'revenue': 0}])
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.log_dir = os.path.join(self.temp_dir.name, 'events')
+        self.store = RoiStore(os.path.join(self.temp_dir.name, 'roi'))
+
+    def test_parse_events(self):
+        """Test valid lines are normalized and invalid lines are reported by number."""
+        body = b'\n'.join([
+            json.dumps(event('click', cost=0.9)).encode(),
+            b'{"type": "view", "campaign": "a", "channel": "b"}',
+            b'',
+            b'not json',
+            json.dumps({'type': 'conversion', 'campaign': 'a', 'channel': 'b', 'revenue': 40}).encode(),
+            json.dumps(event('click', cost=-1)).encode(),
+        ])
+        events, rejected = parse_events(body, now=NOW)
+        self.assertEqual([e['type'] for e in events], ['click', 'conversion'])
+        self.assertEqual(events[1]['timestamp'], NOW)
+        self.assertEqual([r['line'] for r in rejected], [2, 4, 6])
+
+    def test_group_commit(self):
+        """Test concurrent appends share fsyncs and every event reaches the log."""
+        log = EventLog(self.log_dir)
+        fsync = os.fsync
+
+        def slow_fsync(fd):
+            time.sleep(0.005)
+            fsync(fd)
+
+        with mock.patch.object(event_log.os, 'fsync', side_effect=slow_fsync) as synced:
+            with ThreadPoolExecutor(16) as pool:
+                list(pool.map(lambda i: log.append([event('impression', campaign=f'c{i}')] * 10), range(200)))
+        self.assertEqual(log.stats['events'], 2000)
+        self.assertEqual(log.stats['batches'], 200)
+        self.assertLess(log.stats['commits'], 200)
+        self.assertLessEqual(synced.call_count, log.stats['commits'] + log.stats['segments'])
+        log.seal()
+        lines = sum(len(open(path).readlines()) for path in compactable_segments(self.log_dir))
+        self.assertEqual(lines, 2000)
+
+    def test_compaction(self):
+        """Test sealed segments fold into ROI rows once and are removed."""
+        log = EventLog(self.log_dir, segment_bytes=200)
+        log.append([event('click', cost=1.5), event('click', cost=0.5), event('impression')])
+        log.append([event('conversion', revenue=30), event('click', channel='Facebook', cost=2)])
+        log.append([event('click', timestamp=NOW - 86400, cost=4)])
+        log.seal()
+        result = compact(self.log_dir, self.store)
+        self.assertGreater(result['segments'], 1)
+        self.assertEqual(compactable_segments(self.log_dir), [])
+        google = self.store.totals(channel='Google')
+        self.assertEqual((google['spend'], google['conversions'], google['revenue']), (6.0, 1, 30.0))
+        self.assertEqual(len(self.store.query(['day'])), 2)
+
+        self.assertEqual(compact(self.log_dir, self.store)['rows'], 0)
+        self.assertEqual(self.store.totals()['spend'], 8.0)
+
+    def test_recovers_interrupted_compaction(self):
+        """Test a crash after the store append does not count segments twice, and one before it redoes them."""
+        log = EventLog(self.log_dir)
+        log.append([event('click', cost=1.0)])
+        log.seal()
+        with mock.patch.object(event_log, '_finish', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                compact(self.log_dir, self.store)
+        self.assertEqual(compact(self.log_dir, self.store)['segments'], 1)
+        self.assertEqual(self.store.totals()['spend'], 1.0)
+
+        log.append([event('click', cost=2.0)])
+        log.seal()
+        with mock.patch.object(self.store, 'append_columns', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                compact(self.log_dir, self.store)
+        compact(self.log_dir, self.store)
+        self.assertEqual(self.store.totals()['spend'], 3.0)
+
+    def test_recovery_ignores_other_writers(self):
+        """Test rows appended by another writer after a crash do not pass for the lost compaction."""
+        log = EventLog(self.log_dir)
+        log.append([event('click', cost=2.0)])
+        log.seal()
+        with mock.patch.object(self.store, 'append_columns', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                compact(self.log_dir, self.store)
+        RoiStore(self.store.directory).append([{'date': '2024-05-01', 'channel': 'Google', 'campaign': 'a',
+                                                'spend': 5, 'conversions': 0, 'revenue': 0}])
+        compact(self.log_dir, self.store)
+        self.assertEqual(self.store.totals()['spend'], 7.0)
+
+    def test_concurrent_store_writers(self):
+        """Test appends from several processes are serialized and all kept."""
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=append_rows, args=(self.store.directory, 50)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.store.refresh()
+        self.assertEqual(len(self.store), 200)
+        self.assertEqual(self.store.totals()['spend'], 200.0)
+
+    def test_takes_over_segments_of_exited_workers(self):
+        """Test open segments are left alone while their writer lives."""
+        log = EventLog(self.log_dir)
+        log.append([event('click', cost=1.0)])
+        self.assertEqual(compactable_segments(self.log_dir), [])
+        os.rename(log._file.name, os.path.join(self.log_dir, 'events-00000000000000000001-999999999.open'))
+        self.assertEqual(len(compactable_segments(self.log_dir)), 1)
+
+    def test_store_sees_other_writers(self):
+        """Test a second RoiStore handle on the same directory picks up appended rows."""
+        other = RoiStore(self.store.directory)
+        self.store.append([{'date': '2024-05-01', 'channel': 'Google', 'campaign': 'a', 'spend': 5, 'conversions': 1,
+                            'revenue': 10}])
+        self.assertEqual(other.totals()['spend'], 5.0)
+        other.append([{'date': '2024-05-02', 'channel': 'Google', 'campaign': 'a', 'spend': 1, 'conversions': 0,
+                       'revenue': 0}])
+        self.assertEqual(self.store.totals()['spend'], 6.0)
+
+
+class TestEventsRoute(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.log = EventLog(os.path.join(self.temp_dir.name, 'events'))
+        self.ab = VariantServer(VariantCounts(os.path.join(self.temp_dir.name, 'ab.db')), experiments=['home'])
+        for patch in (mock.patch.object(index, 'event_log', self.log), mock.patch.object(index, 'ab_server', self.ab),
+                      mock.patch.dict(os.environ, {'EVENTS_TOKEN': 'secret'})):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = index.app.test_client()
+
+    def post(self, events, token='secret'):
+        body = '\n'.join(e if isinstance(e, str) else json.dumps(e) for e in events)
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return self.client.post('/api/events', data=body, content_type='application/x-ndjson', headers=headers)
+
+    def test_ingest(self):
+        """Test valid events are logged, invalid ones reported and A/B results recorded."""
+        variant = self.ab.select('home', 2)
+        response = self.post([event('click', experiment='home', variant=variant, timestamp=time.time()),
+                              event('impression', timestamp=time.time()), '{"type": "nope"}'])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.get_json()['accepted'], 2)
+        self.assertEqual(response.get_json()['rejected'][0]['line'], 3)
+        self.assertEqual(self.log.stats['events'], 2)
+        self.assertEqual(self.ab.summary('home')[variant]['clicks'], 1)
+
+    def test_content_formats(self):
+        """Test impressions and clicks tagged with a content format feed the tool's content strategy."""
+        tool = MarketingGeniusTool()
+        tool.content_stats = ContentStrategy(window=4)
+        with mock.patch.object(index, 'tool', tool):
+            for clicks in (1, 1, 2):
+                events = [event('impression', format='video', timestamp=time.time()) for _ in range(4)]
+                events += [event('click', format='video', timestamp=time.time()) for _ in range(clicks)]
+                events += [event('impression', format='static', timestamp=time.time()) for _ in range(4)]
+                self.assertEqual(self.post(events).status_code, 202)
+        self.assertEqual(tool.content_stats.formats['video'].n, 3)
+        self.assertAlmostEqual(tool.content_stats.formats['video'].mean, 100 * 4 / 12)
+        self.assertTrue(tool.generate_content_strategy({'CTR': '1.0%'})[0].startswith('Prioritize video'))
+        self.assertEqual(self.post([event('click', format='')]).status_code, 400)
+
+    def test_limits(self):
+        """Test oversized, empty-of-valid and unauthenticated batches are refused."""
+        self.assertEqual(self.post(['{"type": "nope"}']).status_code, 400)
+        with mock.patch.object(index, 'EVENTS_MAX_BYTES', 10):
+            self.assertEqual(self.post([event('click')]).status_code, 413)
+        self.assertEqual(self.post([event('click')], token=None).status_code, 401)
+        self.assertEqual(self.post([event('click')], token='wrong').status_code, 401)
+        self.assertEqual(self.post([event('click')]).status_code, 202)
+        with mock.patch.dict(os.environ, {'EVENTS_TOKEN': ''}):
+            self.assertEqual(self.post([event('click')]).status_code, 503)
+        self.assertEqual(self.log.stats['events'], 1)
+
+    def test_default_config_compacts(self):
+        """Test the worker compacts its event log even without ROI_STORE_DIR."""
+        self.assertIsNotNone(index.event_compactor)
+        self.assertIs(index.event_compactor.store, index.event_store)
+
+if __name__ == '__main__':
+    unittest.main()
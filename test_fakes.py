@@ -0,0 +1,41 @@
+import unittest
+import base64
+import binascii
+import smtplib
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from fake_paypal import FakePayPal
+from fake_smtp import FakeSMTP
+
+
+class TestFakeSMTP(unittest.TestCase):
+    def test_delivery_and_rejection(self):
+        """Test messages are kept, and rejected at the configured error rate."""
+        with FakeSMTP() as fake:
+            with smtplib.SMTP(fake.host, fake.port) as client:
+                client.sendmail('a@example.com', ['b@example.com'], 'Subject: hi\r\n\r\nhello')
+            self.assertEqual(len(fake.messages), 1)
+            self.assertIn(b'hello', fake.messages[0][2])
+            fake.error_rate = 1.0
+            with smtplib.SMTP(fake.host, fake.port) as client:
+                with self.assertRaises(smtplib.SMTPDataError):
+                    client.sendmail('a@example.com', ['b@example.com'], 'Subject: hi\r\n\r\nhello')
+            self.assertEqual(fake.rejected, 1)
+
+
+class TestFakePayPalWebhooks(unittest.TestCase):
+    def test_signed_webhook(self):
+        """Test webhook headers verify against the served certificate."""
+        with FakePayPal() as fake:
+            body = b'{"event_type": "BILLING.SUBSCRIPTION.ACTIVATED"}'
+            headers = fake.webhook_headers(body, 'WH-1')
+            cert = x509.load_pem_x509_certificate(requests.get(headers['PAYPAL-CERT-URL'], timeout=5).content)
+        message = (f"{headers['PAYPAL-TRANSMISSION-ID']}|{headers['PAYPAL-TRANSMISSION-TIME']}|WH-1|"
+                   f"{binascii.crc32(body) & 0xffffffff}").encode()
+        cert.public_key().verify(base64.b64decode(headers['PAYPAL-TRANSMISSION-SIG']), message,
+                                 padding.PKCS1v15(), hashes.SHA256())
+
+if __name__ == '__main__':
+    unittest.main()
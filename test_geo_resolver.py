@@ -0,0 +1,56 @@
+import unittest
+from geo_resolver import GeoResolver
+from marketing_genius_tool import MarketingGeniusTool
+
+
+class TestGeoResolver(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.resolver = GeoResolver()
+
+    def code(self, url, hints=()):
+        result = self.resolver.resolve(url, hints)
+        return result["region"] or result["country"]
+
+    def test_country_suffixes(self):
+        """Test ccTLDs and their second levels resolve to countries."""
+        self.assertEqual(self.code("https://organicskincare.co.nz/serums"), "NZ")
+        self.assertEqual(self.code("https://shop.example.co.uk"), "GB")
+        self.assertEqual(self.code("example.de"), "DE")
+        self.assertEqual(self.code("https://WWW.EXAMPLE.FR."), "FR")
+        self.assertEqual(self.code("https://tienda.com.co"), "CO")
+
+    def test_region_suffixes(self):
+        """Test state domains and city/region TLDs resolve to regions."""
+        result = self.resolver.resolve("https://harbourcafe.sydney.nsw.au")
+        self.assertEqual(result, {"country": "AU", "region": "AU-NSW", "source": "domain"})
+        self.assertEqual(self.code("https://pizza.nyc"), "US-NY")
+        self.assertEqual(self.code("https://brauerei.bayern"), "DE-BY")
+        self.assertEqual(self.code("http://ci.boston.ma.us"), "US-MA")
+
+    def test_generic_domains_fall_back_to_locale_hints(self):
+        """Test generic and generic-use TLDs give no signal, so hints decide."""
+        self.assertIsNone(self.code("https://example.com"))
+        self.assertIsNone(self.code("https://startup.io"))
+        self.assertEqual(self.code("https://startup.io", [None, "en", "en_NZ"]), "NZ")
+        self.assertEqual(self.code("https://example.com", ["zh-Hant-TW"]), "TW")
+        self.assertEqual(self.resolver.resolve("https://example.com", ["fr-CA"])["source"], "locale")
+        self.assertEqual(self.code("https://example.co.nz", ["en-AU"]), "NZ")
+
+    def test_resolve_many(self):
+        """Test batch resolution with per-URL hints."""
+        results = self.resolver.resolve_many(["a.co.nz", "b.com", "c.com"], [[], ["en-IE"], []])
+        self.assertEqual([r["country"] for r in results], ["NZ", "IE", None])
+
+    def test_campaign_targeting(self):
+        """Test build_campaign targets the business's country."""
+        tool = MarketingGeniusTool()
+        targeting = tool.build_campaign(["serum"], "skincare", "https://organicskincare.co.nz")["targeting"]
+        self.assertEqual(targeting["geo"], "NZ")
+        self.assertNotIn("region", targeting)
+        targeting = tool.build_campaign(["coffee"], "general", "https://cafe.melbourne")["targeting"]
+        self.assertEqual((targeting["geo"], targeting["region"]), ("AU", "AU-VIC"))
+        self.assertEqual(tool.build_campaign(["serum"], "skincare")["targeting"]["geo"], "default")
+
+if __name__ == '__main__':
+    unittest.main()
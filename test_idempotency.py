@@ -0,0 +1,177 @@
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import os
+import tempfile
+import time
+
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp())
+
+from starlette.testclient import TestClient
+import asgi
+import index
+from fake_paypal import FakePayPal
+from idempotency import IdempotencyInProgress, IdempotencyKeyReused, IdempotencyStore
+from outbound import OutboundService
+
+SUBSCRIPTION_CREATES = ('POST', '/v1/billing/subscriptions')
+PAYMENT_CREATES = ('POST', '/v1/payments/payment')
+
+
+class TestIdempotencyStore(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.store = IdempotencyStore(os.path.join(tempfile.mkdtemp(), 'idempotency.db'),
+                                      ttl=60, wait_timeout=0.5, poll_interval=0.01)
+
+    def test_replays_stored_response(self):
+        """Test a repeated key gets the first response without running again."""
+        calls = []
+
+        def handler():
+            calls.append(1)
+            return 200, b'{"id": 1}', 'application/json'
+
+        first = self.store.run('/api/orders', 'k1', 'fp', handler)
+        second = self.store.run('/api/orders', 'k1', 'fp', handler)
+        self.assertEqual(first, ((200, b'{"id": 1}', 'application/json'), False))
+        self.assertEqual(second, ((200, b'{"id": 1}', 'application/json'), True))
+        self.assertEqual(len(calls), 1)
+
+    def test_rejects_reused_key(self):
+        """Test a key sent with a different request is rejected."""
+        self.store.run('/api/orders', 'k1', 'fp', lambda: (200, b'{}', 'application/json'))
+        with self.assertRaises(IdempotencyKeyReused):
+            self.store.run('/api/orders', 'k1', 'other', lambda: (200, b'{}', 'application/json'))
+
+    def test_server_errors_and_exceptions_release_the_key(self):
+        """Test 5xx responses are not stored and a failing handler releases its claim."""
+        self.store.run('/api/orders', 'k1', 'fp', lambda: (503, b'{}', 'application/json'))
+        with self.assertRaises(RuntimeError):
+            self.store.run('/api/orders', 'k1', 'fp', mock.Mock(side_effect=RuntimeError))
+        response, replayed = self.store.run('/api/orders', 'k1', 'fp', lambda: (201, b'{}', 'application/json'))
+        self.assertEqual((response[0], replayed), (201, False))
+
+    def test_expiry(self):
+        """Test expired responses and abandoned claims can be claimed again."""
+        self.store.ttl = 0
+        self.store.run('/api/orders', 'k1', 'fp', lambda: (200, b'{}', 'application/json'))
+        self.assertEqual(self.store.claim('/api/orders', 'k1', 'fp'), (True, None))
+        with self.assertRaises(IdempotencyInProgress):
+            self.store.run('/api/orders', 'k1', 'fp', lambda: (200, b'{}', 'application/json'))
+        self.store.claim_timeout = 0
+        self.assertEqual(self.store.claim('/api/orders', 'k2', 'fp'), (True, None))
+        time.sleep(0.01)
+        self.assertEqual(self.store.claim('/api/orders', 'k2', 'fp'), (True, None))
+
+
+def claim_keys(path, keys, barrier, results):
+    store = IdempotencyStore(path)
+    claimed = []
+    for key in keys:
+        barrier.wait()
+        if store.claim('/api/orders', key, 'fp')[0]:
+            claimed.append(key)
+    results.put(claimed)
+
+
+class TestIdempotencyAcrossProcesses(unittest.TestCase):
+    def test_each_key_is_claimed_by_one_process(self):
+        """Test workers racing on the same fresh keys never both win a claim."""
+        path = os.path.join(tempfile.mkdtemp(), 'idempotency.db')
+        IdempotencyStore(path)
+        context = multiprocessing.get_context('fork')
+        keys = [f'key-{i}' for i in range(100)]
+        barrier, results = context.Barrier(4), context.Queue()
+        workers = [context.Process(target=claim_keys, args=(path, keys, barrier, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        claimed = [key for _ in workers for key in results.get(timeout=60)]
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sorted(claimed), sorted(keys))
+
+
+class IdempotentRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        """Point the API at a slow local fake PayPal and a fresh idempotency store."""
+        self.fake = FakePayPal(latency=0.2).start()
+        self.addCleanup(self.fake.stop)
+        guard = OutboundService("paypal", timeout=2, deadline=5, max_retries=2, backoff=0.01,
+                                retry_on=index.paypal.retry_on)
+        store = IdempotencyStore(os.path.join(tempfile.mkdtemp(), 'idempotency.db'), wait_timeout=5,
+                                 poll_interval=0.01)
+        patches = [
+            mock.patch.object(index, 'paypal', guard),
+            mock.patch.object(asgi, 'paypal', guard),
+            mock.patch.object(index, 'idempotency', store),
+            mock.patch.object(index, 'PAYPAL_API_BASE', self.fake.url),
+            mock.patch.object(index.paypal_api, 'endpoint', self.fake.url),
+            mock.patch.object(index.paypal_api, 'token_endpoint', self.fake.url),
+            mock.patch.object(index.paypal_api, 'token_hash', None),
+            mock.patch.dict(os.environ, {'PAYPAL_CLIENT_ID': 'id', 'PAYPAL_CLIENT_SECRET': 'secret', 'PAYPAL_PLAN_ID': 'P-1'}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def concurrently(self, post, n=8):
+        with ThreadPoolExecutor(n) as pool:
+            return list(pool.map(lambda _: post(), range(n)))
+
+
+class TestFlaskIdempotency(IdempotentRoutesTestCase):
+    def post(self, path, json, key):
+        return index.app.test_client().post(path, json=json, headers={'Idempotency-Key': key})
+
+    def test_concurrent_subscriptions_call_paypal_once(self):
+        """Test concurrent checkouts with one key create one PayPal subscription."""
+        responses = self.concurrently(lambda: self.post('/api/create-subscription', {'email': 'a@example.com'}, 'sub-1'))
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(len({r.get_json()['approval_url'] for r in responses}), 1)
+        self.assertEqual(sum('Idempotent-Replayed' in r.headers for r in responses), len(responses) - 1)
+        self.assertEqual(self.fake.calls[SUBSCRIPTION_CREATES], 1)
+
+        self.post('/api/create-subscription', {'email': 'a@example.com'}, 'sub-2')
+        self.assertEqual(self.fake.calls[SUBSCRIPTION_CREATES], 2)
+
+    def test_concurrent_orders_call_paypal_once(self):
+        """Test concurrent order creates with one key create one PayPal payment."""
+        cart = {'cart': [{'price': '20.00'}]}
+        responses = self.concurrently(lambda: self.post('/api/orders', cart, 'order-1'))
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(len({r.get_json()['id'] for r in responses}), 1)
+        self.assertEqual(self.fake.calls[PAYMENT_CREATES], 1)
+
+    def test_rejects_bad_keys(self):
+        """Test reused and malformed keys are rejected before reaching PayPal."""
+        self.post('/api/orders', {'cart': [{'price': '20.00'}]}, 'order-1')
+        self.assertEqual(self.post('/api/orders', {'cart': [{'price': '30.00'}]}, 'order-1').status_code, 422)
+        self.assertEqual(self.post('/api/orders', {'cart': [{'price': '20.00'}]}, 'k' * 256).status_code, 400)
+        self.assertEqual(self.fake.calls[PAYMENT_CREATES], 1)
+
+    def test_requests_without_key_are_unchanged(self):
+        """Test requests without a key still run every time."""
+        client = index.app.test_client()
+        for _ in range(2):
+            self.assertEqual(client.post('/api/create-subscription', json={'email': 'a@example.com'}).status_code, 200)
+        self.assertEqual(self.fake.calls[SUBSCRIPTION_CREATES], 2)
+
+
+class TestAsgiIdempotency(IdempotentRoutesTestCase):
+    def test_concurrent_subscriptions_call_paypal_once(self):
+        """Test the async checkout shares the key store and calls PayPal once per key."""
+        with TestClient(asgi.app) as client:
+            post = lambda: client.post('/api/create-subscription', json={'email': 'a@example.com'},
+                                       headers={'Idempotency-Key': 'sub-1'})
+            responses = self.concurrently(post)
+            flask_response = index.app.test_client().post(
+                '/api/create-subscription', json={'email': 'a@example.com'}, headers={'Idempotency-Key': 'sub-1'})
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(len({r.json()['approval_url'] for r in responses}), 1)
+        self.assertEqual(flask_response.get_json(), responses[0].json())
+        self.assertEqual(self.fake.calls[SUBSCRIPTION_CREATES], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import random
+from industry_classifier import IndustryClassifier
+
+INDUSTRY_MAP = {
+    "skincare": {"interests": ["organic", "beauty"]},
+    "tech": {"interests": ["software", "gadgets"], "synonyms": ["cloud"]},
+    "fitness": {"interests": ["organic", "wellness"], "synonyms": ["gym", "workout"]},
+}
+
+
+class TestIndustryClassifier(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.classifier = IndustryClassifier(INDUSTRY_MAP, synonyms={})
+
+    def test_weighted_overlap(self):
+        """Test industries are ranked by weighted overlap, not first match."""
+        self.assertEqual(self.classifier.classify(["tech", "gym", "workout", "wellness"]), "fitness")
+        ranked = self.classifier.top_k(["tech", "gym", "workout", "wellness"], k=3)
+        self.assertEqual([industry for industry, _ in ranked], ["fitness", "tech"])
+        self.assertAlmostEqual(sum(confidence for _, confidence in ranked), 1.0, places=2)
+
+    def test_shared_terms_are_split(self):
+        """Test a term used by two industries counts half for each."""
+        scores = self.classifier.scores([["organic"], ["beauty"]])
+        self.assertEqual(scores[0].tolist(), [0.25, 0.0, 0.25])
+        self.assertEqual(scores[1].tolist(), [0.5, 0.0, 0.0])
+        # Ties keep config order
+        self.assertEqual(self.classifier.classify(["organic"]), "skincare")
+
+    def test_no_match(self):
+        """Test unknown keywords fall back to general."""
+        self.assertEqual(self.classifier.top_k(["unknown", "keywords"]), [("general", 0.0)])
+        self.assertEqual(self.classifier.top_k([]), [("general", 0.0)])
+
+    def test_batch_matches_single(self):
+        """Test one batched product equals classifying each set on its own."""
+        rng = random.Random(3)
+        vocabulary = list(self.classifier.vocabulary) + ["shop", "products", "nz"]
+        keyword_sets = [rng.sample(vocabulary, rng.randint(0, 5)) for _ in range(2000)]
+        batch = self.classifier.top_k_many(keyword_sets, k=2)
+        self.assertEqual(batch[:50], [self.classifier.top_k(keywords, k=2) for keywords in keyword_sets[:50]])
+        self.assertEqual(len(batch), 2000)
+
+    def test_default_synonyms(self):
+        """Test built-in synonyms apply to the default industries."""
+        classifier = IndustryClassifier(INDUSTRY_MAP)
+        self.assertEqual(classifier.classify(["serum", "shop"]), "skincare")
+        self.assertEqual(classifier.classify(["saas", "pricing"]), "tech")
+
+
+if __name__ == '__main__':
+    unittest.main()
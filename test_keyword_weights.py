@@ -0,0 +1,143 @@
+import unittest
+import multiprocessing
+import os
+import tempfile
+from keyword_weights import KeywordWeights, SharedKeywordWeights
+from marketing_genius_tool import MarketingGeniusTool
+
+CORPUS = [
+    ('https://www.shop-a.co.nz/products/serum', ['shop', 'products', 'serum']),
+    ('https://www.shop-b.co.nz/products/boots', ['shop', 'products', 'boots']),
+    ('https://www.shop-c.co.nz/products/laptops', ['shop', 'products', 'laptops']),
+]
+
+
+class TestKeywordWeights(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.weights = KeywordWeights()
+        for url, tokens in CORPUS:
+            self.weights.add(url, tokens)
+
+    def test_document_frequencies(self):
+        """Test each URL counts once and each token once per URL."""
+        self.assertFalse(self.weights.add(*CORPUS[0]))
+        self.weights.add('https://example.com/serum-serum', ['serum', 'serum'])
+        self.assertEqual(self.weights.documents, 4)
+        self.assertEqual(self.weights.document_frequency('shop'), 3)
+        self.assertEqual(self.weights.document_frequency('serum'), 2)
+        self.assertEqual(self.weights.document_frequency('unseen'), 0)
+
+    def test_generic_words_rank_last(self):
+        """Test distinctive keywords outrank words common to every URL."""
+        self.assertEqual(self.weights.rank(['shop', 'products', 'serum']), ['serum', 'shop', 'products'])
+        self.assertEqual(self.weights.rank(['shop', 'boots', 'boots']), ['boots', 'shop'])
+        self.assertEqual(KeywordWeights().rank(['b', 'a', 'c']), ['b', 'a', 'c'])
+
+    def test_save_load(self):
+        """Test frequencies and seen URLs survive a round trip."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'weights.npz')
+            self.weights.save(path)
+            loaded = KeywordWeights.load(path)
+        self.assertEqual(loaded.documents, 3)
+        self.assertEqual(loaded.document_frequency('products'), 3)
+        self.assertFalse(loaded.add(*CORPUS[1]))
+        self.assertEqual(loaded.rank(['shop', 'serum']), self.weights.rank(['shop', 'serum']))
+
+    def test_analysis_uses_ranked_keywords(self):
+        """Test ad copy leads with the most distinctive keyword."""
+        tool = MarketingGeniusTool()
+        tool.rate_limiter.calls_per_second = float('inf')
+        for url, tokens in CORPUS:
+            tool.keyword_weights.add(url, tokens)
+        result = tool.analyze('https://www.shop-d.co.nz/products/candles')
+        self.assertEqual(result['keywords'][0], 'candles')
+        self.assertEqual(result['campaign']['ad_copy'][0]['headline'], 'Discover the best Candles now!')
+        self.assertEqual(tool.keyword_weights.documents, 4)
+
+    def test_corpus_is_bounded(self):
+        """Test frequencies halve and old URLs are forgotten past max_documents."""
+        weights = KeywordWeights(max_documents=10)
+        for i in range(25):
+            weights.add(f'https://example.com/{i}', ['shop', f'item{i}'])
+        self.assertLessEqual(weights.documents, 10)
+        self.assertLessEqual(len(weights._seen), 10)
+        self.assertLess(len(weights), 12)
+        self.assertEqual(weights.document_frequency('item0'), 0)
+        self.assertEqual(weights.document_frequency('shop'), weights.documents)
+        self.assertTrue(weights.add('https://example.com/0', ['shop']))
+        self.assertFalse(weights.add('https://example.com/24', ['shop']))
+
+
+def add_urls(path, urls):
+    weights = SharedKeywordWeights(path)
+    for url in urls:
+        weights.add(url, ['shop', url.rsplit('/', 1)[-1]])
+
+
+class TestSharedKeywordWeights(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'keywords.db')
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def test_matches_in_memory_weights(self):
+        """Test the shared store counts and ranks like KeywordWeights."""
+        shared = SharedKeywordWeights(self.path)
+        local = KeywordWeights()
+        for url, tokens in CORPUS:
+            self.assertTrue(shared.add(url, tokens))
+            local.add(url, tokens)
+        self.assertFalse(shared.add(*CORPUS[0]))
+        self.assertEqual(shared.documents, 3)
+        self.assertEqual(len(shared), len(local))
+        self.assertEqual(shared.document_frequency('products'), 3)
+        self.assertEqual(shared.rank(['shop', 'boots', 'boots']), local.rank(['shop', 'boots', 'boots']))
+        self.assertAlmostEqual(shared.idf('serum'), local.idf('serum'))
+
+    def test_workers_share_one_corpus(self):
+        """Test URLs added by several processes are all counted, each once."""
+        context = multiprocessing.get_context('fork')
+        urls = [f'https://example.com/{i}' for i in range(50)]
+        workers = [context.Process(target=add_urls, args=(self.path, urls)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        shared = SharedKeywordWeights(self.path)
+        self.assertEqual(shared.documents, 50)
+        self.assertEqual(shared.document_frequency('shop'), 50)
+
+    def test_corpus_is_bounded(self):
+        """Test the shared store decays like the in-memory one."""
+        shared = SharedKeywordWeights(self.path, max_documents=10)
+        local = KeywordWeights(max_documents=10)
+        for i in range(25):
+            shared.add(f'https://example.com/{i}', ['shop', f'item{i}'])
+            local.add(f'https://example.com/{i}', ['shop', f'item{i}'])
+        self.assertEqual(shared.documents, local.documents)
+        self.assertEqual(len(shared), len(local))
+        self.assertEqual(shared.document_frequency('shop'), local.document_frequency('shop'))
+        self.assertTrue(shared.add('https://example.com/0', ['shop']))
+        self.assertFalse(shared.add('https://example.com/24', ['shop']))
+
+    def test_seed(self):
+        """Test an offline corpus seeds an empty store only once."""
+        local = KeywordWeights()
+        for url, tokens in CORPUS:
+            local.add(url, tokens)
+        shared = SharedKeywordWeights(self.path)
+        self.assertTrue(shared.seed(local))
+        self.assertFalse(SharedKeywordWeights(self.path).seed(local))
+        self.assertEqual(shared.documents, 3)
+        self.assertEqual(shared.document_frequency('shop'), 3)
+        self.assertFalse(shared.add(*CORPUS[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
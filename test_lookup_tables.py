@@ -0,0 +1,69 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+from marketing_genius_tool import MarketingGeniusTool
+from lookup_tables import LookupTables, freeze
+
+
+class TestLookupTables(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.tool = MarketingGeniusTool()
+
+    def test_matches_string_building(self):
+        """Test every precomputed strategy equals the industry + size sentence."""
+        for industry in list(self.tool.industry_map) + ["unknown"]:
+            for size in ("small", "medium", "large", "huge"):
+                expected = "{} {}".format(
+                    self.tool.industry_map.get(industry, {}).get("strategy", "Use general marketing approaches."),
+                    self.tool.business_size_templates.get(size, ""))
+                self.assertEqual(self.tool.suggest_marketing_strategy(industry, size), expected)
+
+    def test_lookups_are_shared(self):
+        """Test the hot path returns the same precomputed objects every time."""
+        self.assertIs(self.tool.suggest_marketing_strategy("tech", "medium"),
+                      self.tool.suggest_marketing_strategy("tech", "medium"))
+        self.assertIs(self.tool.suggest_audience("unknown"), self.tool.suggest_audience("other"))
+        self.assertEqual(self.tool.suggest_audience("unknown")["channels"], ("Facebook", "Google"))
+
+    def test_frozen(self):
+        """Test shared tables cannot be modified by callers."""
+        audience = self.tool.suggest_audience("skincare")
+        with self.assertRaises(TypeError):
+            audience["channels"] = []
+        with self.assertRaises(AttributeError):
+            audience["interests"].append("hacked")
+        self.assertEqual(freeze({"a": [1, {"b": [2]}]}), {"a": (1, {"b": (2,)})})
+
+    def test_reload_off_thread(self):
+        """Test reload builds new tables on another thread and swaps them in."""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({"industry_map": {"bakery": {"channels": ["Instagram"], "strategy": "Show fresh bread."}}}, f)
+        self.addCleanup(os.unlink, f.name)
+        old_tables, old_version = self.tool.tables, self.tool.config_version
+        threads = []
+        original = LookupTables.__init__
+
+        def tracking_init(tables, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            original(tables, *args, **kwargs)
+
+        LookupTables.__init__ = tracking_init
+        try:
+            version = self.tool.reload_config(f.name).result(timeout=10)
+        finally:
+            LookupTables.__init__ = original
+        self.assertTrue(threads[0].startswith('config-reload'))
+        self.assertNotEqual(version, old_version)
+        self.assertEqual(self.tool.config_version, version)
+        self.assertEqual(self.tool.tables.config_version, version)
+        self.assertEqual(self.tool.suggest_marketing_strategy("bakery", "small"),
+                         "Show fresh bread. " + self.tool.business_size_templates["small"])
+        # The old snapshot is untouched for requests still holding it
+        self.assertIn("skincare", old_tables.strategies)
+
+
+if __name__ == '__main__':
+    unittest.main()
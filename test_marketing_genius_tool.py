@@ -88,6 +88,20 @@ class TestMarketingGeniusTool(unittest.TestCase):
         tool_default = MarketingGeniusTool()
         self.assertIn("skincare", tool_default.industry_map)
 
+    def test_analyze(self):
+        """Test the full analysis pipeline."""
+        result = self.tool.analyze("https://www.example.com/skincare/serum", 35)
+        self.assertEqual(result["industry"], "skincare")
+        self.assertEqual(result["business_size"], "small")
+        self.assertIn("campaign", result)
+        self.assertIn("roi", result)
+
+    def test_config_version(self):
+        """Test config version changes with the configuration."""
+        tool_with_config = MarketingGeniusTool(self.temp_config_file.name)
+        self.assertEqual(self.tool.config_version, MarketingGeniusTool().config_version)
+        self.assertNotEqual(self.tool.config_version, tool_with_config.config_version)
+
     def test_cache_clearing(self):
         """Test cache clearing functionality."""
         # First call should cache results
@@ -0,0 +1,173 @@
+import unittest
+from unittest import mock
+import os
+import tempfile
+import time
+import requests
+
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp())
+
+import index
+from fake_paypal import FakePayPal
+from outbound import CircuitBreaker, CircuitOpenError, OutboundService, OutboundUnavailable, current_timeout
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_and_recovers(self):
+        """Test the breaker opens after consecutive failures and half-opens after the reset timeout."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, "half_open")
+        self.assertFalse(breaker.allow())  # Only one trial call
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+
+class TestOutboundService(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.service = OutboundService("test", timeout=0.5, deadline=2, max_retries=2, backoff=0.01, failure_threshold=3)
+
+    def flaky(self, failures, result="ok"):
+        calls = []
+
+        def fn():
+            calls.append(current_timeout())
+            if len(calls) <= failures:
+                raise requests.exceptions.ConnectionError("down")
+            return result
+        return fn, calls
+
+    def test_retries_idempotent_calls(self):
+        """Test idempotent calls are retried."""
+        fn, calls = self.flaky(2)
+        self.assertEqual(self.service.call(fn, idempotent=True), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(all(timeout <= 0.5 for timeout in calls))
+        self.assertEqual(self.service.metrics()["retries"], 2)
+
+    def test_does_not_retry_non_idempotent_calls(self):
+        """Test non-idempotent calls get a single attempt."""
+        fn, calls = self.flaky(1)
+        with self.assertRaises(OutboundUnavailable):
+            self.service.call(fn)
+        self.assertEqual(len(calls), 1)
+
+    def test_circuit_fails_fast(self):
+        """Test calls are rejected without reaching the service once the circuit is open."""
+        fn, calls = self.flaky(100)
+        with self.assertRaises(OutboundUnavailable):
+            self.service.call(fn, idempotent=True)
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(CircuitOpenError):
+            self.service.call(fn, idempotent=True)
+        self.assertEqual(len(calls), 3)
+        metrics = self.service.metrics()
+        self.assertEqual(metrics["breaker_state"], "open")
+        self.assertEqual(metrics["rejected"], 1)
+        self.assertIsNotNone(metrics["latency_ms"]["p95"])
+
+    def test_trial_call_raising_other_errors_frees_the_breaker(self):
+        """Test a half-open trial that raises a non-retryable error does not wedge the breaker."""
+        self.service.breaker.reset_timeout = 0.01
+        with self.assertRaises(OutboundUnavailable):
+            self.service.call(self.flaky(100)[0], idempotent=True)
+        time.sleep(0.02)
+
+        def not_found():
+            raise LookupError("no such payment")
+        with self.assertRaises(LookupError):
+            self.service.call(not_found)
+        self.assertEqual(self.service.call(lambda: "ok"), "ok")
+        self.assertEqual(self.service.metrics()["breaker_state"], "closed")
+
+
+class TestPayPalRoutes(unittest.TestCase):
+    def setUp(self):
+        """Point the API at a local fake PayPal."""
+        self.fake = FakePayPal().start()
+        self.client = index.app.test_client()
+        self.guard = OutboundService("paypal", timeout=0.3, deadline=1, max_retries=2, backoff=0.01, failure_threshold=3,
+                                     retry_on=index.paypal.retry_on)
+        patches = [
+            mock.patch.object(index, 'paypal', self.guard),
+            mock.patch.object(index, 'PAYPAL_API_BASE', self.fake.url),
+            mock.patch.object(index.paypal_api, 'endpoint', self.fake.url),
+            mock.patch.object(index.paypal_api, 'token_endpoint', self.fake.url),
+            mock.patch.object(index.paypal_api, 'token_hash', None),
+            mock.patch.dict(os.environ, {'PAYPAL_CLIENT_ID': 'id', 'PAYPAL_CLIENT_SECRET': 'secret', 'PAYPAL_PLAN_ID': 'P-1'}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.fake.stop()
+
+    def create_subscription(self):
+        return self.client.post('/api/create-subscription', json={'email': 'buyer@example.com'})
+
+    def test_create_subscription(self):
+        """Test the subscription checkout against the fake."""
+        response = self.create_subscription()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('/approve/', response.get_json()['approval_url'])
+
+    def test_create_subscription_retries_once_created(self):
+        """Test a retried create is deduplicated by PayPal-Request-Id."""
+        self.fake.fail_next['/v1/billing/subscriptions'] = 1
+        response = self.create_subscription()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.fake.calls[('POST', '/v1/billing/subscriptions')], 2)
+        self.assertEqual(len(self.fake.created_by_request_id), 1)
+
+    def test_slow_paypal_times_out(self):
+        """Test a slow PayPal cannot hold the request past the deadline."""
+        self.fake.latency = 0.5
+        start = time.monotonic()
+        response = self.create_subscription()
+        self.assertEqual(response.status_code, 503)
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    def test_breaker_returns_503_without_calling_paypal(self):
+        """Test requests fail fast while the breaker is open."""
+        self.fake.error_rate = 1.0
+        self.assertEqual(self.create_subscription().status_code, 503)
+        calls = sum(self.fake.calls.values())
+        response = self.create_subscription()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertEqual(sum(self.fake.calls.values()), calls)
+        metrics = self.client.get('/api/metrics/outbound').get_json()['paypal']
+        self.assertEqual(metrics['breaker_state'], 'open')
+
+    def test_order_create_and_capture(self):
+        """Test SDK order calls go through the guard to the fake."""
+        order = self.client.post('/api/orders', json={'cart': [{'price': '20.00'}]})
+        self.assertEqual(order.status_code, 200)
+        order_id = order.get_json()['id']
+
+        capture = self.client.post(f'/api/orders/{order_id}/capture', json={'payerID': 'PAYER'})
+        self.assertEqual(capture.status_code, 200)
+        self.assertEqual(capture.get_json()['purchase_units'][0]['payments']['captures'][0]['status'], 'completed')
+        self.assertGreater(self.guard.metrics()['calls'], 0)
+
+    def test_capture_retry_is_deduplicated(self):
+        """Test a capture whose response was lost is retried under the same PayPal-Request-Id."""
+        order_id = self.client.post('/api/orders', json={'cart': [{'price': '20.00'}]}).get_json()['id']
+        self.fake.lose_next[f'/v1/payments/payment/{order_id}/execute'] = 1
+        capture = self.client.post(f'/api/orders/{order_id}/capture', json={'payerID': 'PAYER'})
+        self.assertEqual(capture.status_code, 200)
+        self.assertEqual(self.fake.calls[('POST', '/v1/payments/payment/{id}/execute')], 2)
+        self.assertEqual(len(self.fake.executed_by_request_id), 1)
+
+if __name__ == '__main__':
+    unittest.main()
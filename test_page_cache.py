@@ -0,0 +1,69 @@
+import unittest
+import os
+import tempfile
+from flask import Flask
+
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp())
+
+import index
+from page_cache import RenderedPageCache
+
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.client = index.app.test_client()
+        index.pages.clear()
+
+    def test_spa_routes_render_once(self):
+        """Test deep links share one cached render."""
+        before = index.pages.renders
+        for path in ('/success', '/cancel', '/dashboard', '/reports/2024'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'<html', response.data)
+        self.assertEqual(index.pages.renders - before, 1)
+        self.client.get('/')
+        self.assertEqual(index.pages.renders - before, 2)
+
+    def test_conditional_get(self):
+        """Test a matching If-None-Match gets a bodyless 304."""
+        first = self.client.get('/')
+        etag = first.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(first.headers['Cache-Control'], 'no-cache')
+        second = self.client.get('/', headers={'If-None-Match': etag})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.data, b'')
+        self.assertEqual(second.headers['ETag'], etag)
+        self.assertEqual(self.client.get('/', headers={'If-None-Match': '"stale"'}).status_code, 200)
+
+    def test_template_change_invalidates(self):
+        """Test editing the template re-renders with a new ETag."""
+        with tempfile.TemporaryDirectory() as template_dir:
+            path = os.path.join(template_dir, 'page.html')
+            with open(path, 'w') as f:
+                f.write('<p>{{ name }} v1</p>')
+            app = Flask(__name__, template_folder=template_dir)
+            cache = RenderedPageCache(app, check_interval=0)
+            with app.test_request_context('/'):
+                body, etag = cache.render('page.html', name='a')
+                self.assertEqual(cache.render('page.html', name='a'), (body, etag))
+                self.assertNotEqual(cache.render('page.html', name='b')[1], etag)
+                with open(path, 'w') as f:
+                    f.write('<p>{{ name }} v2</p>')
+                os.utime(path, (os.path.getmtime(path) + 5,) * 2)
+                body2, etag2 = cache.render('page.html', name='a')
+            self.assertEqual(body2, b'<p>a v2</p>')
+            self.assertNotEqual(etag2, etag)
+            self.assertEqual(cache.renders, 3)
+
+    def test_static_cache_headers(self):
+        """Test static assets get a max-age."""
+        response = self.client.get('/static/_redirects')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=', response.headers['Cache-Control'])
+        response.close()
+
+if __name__ == '__main__':
+    unittest.main()
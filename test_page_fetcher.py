@@ -0,0 +1,196 @@
+import unittest
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from marketing_genius_tool import MarketingGeniusTool
+from page_fetcher import PageFetcher, summary_keywords
+
+PAGE = b"""<!doctype html><html lang="en-NZ"><head>
+<title>Kauri Organics &amp; Co</title>
+<meta name="description" content="Organic skincare serums made in Nelson">
+<meta property="og:title" content="Kauri Organics">
+</head><body><h1>Natural skincare</h1><p>ignored text</p><h2>Vitamin C serum</h2></body></html>"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get('If-None-Match')))
+            server.hosts.append(self.headers.get('Host'))
+        if self.path.startswith('/slow'):
+            time.sleep(float(self.path.split('/')[2]))
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', '/page')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = PAGE
+        if self.path == '/huge':
+            body = b'<html><head><title>Huge</title></head><body>' + b'<p>x</p>' * 200000 + b'<h1>Late</h1>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class TestPageFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.server.requests = []
+        cls.server.hosts = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.server.requests.clear()
+        self.server.hosts.clear()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def fetcher(self, **kwargs):
+        kwargs.setdefault('allow_private', True)
+        return PageFetcher(self.temp_dir.name, **kwargs)
+
+    def run_fetch(self, fetcher, *urls):
+        async def run():
+            try:
+                return await fetcher.fetch_many(urls)
+            finally:
+                await fetcher.aclose()
+        return asyncio.run(run())
+
+    def test_summary(self):
+        """Test the title, meta tags and headings are extracted, following redirects."""
+        summary = self.run_fetch(self.fetcher(), f'{self.base}/redirect')[f'{self.base}/redirect']
+        self.assertEqual(summary['title'], 'Kauri Organics & Co')
+        self.assertEqual(summary['meta']['description'], 'Organic skincare serums made in Nelson')
+        self.assertEqual(summary['headings'], ['Natural skincare', 'Vitamin C serum'])
+        self.assertEqual(summary['locale'], 'en-NZ')
+        self.assertEqual(summary_keywords(summary)[:4], ['kauri', 'organics', 'organic', 'skincare'])
+
+    def test_conditional_get(self):
+        """Test stale entries are revalidated and a 304 reuses the cached summary."""
+        fetcher = self.fetcher(fresh_for=0)
+        first = self.run_fetch(fetcher, f'{self.base}/page')
+        second = self.run_fetch(fetcher, f'{self.base}/page')
+        self.assertEqual(first, second)
+        self.assertEqual([etag for _, etag in self.server.requests], [None, '"v1"'])
+        self.assertEqual(fetcher.stats['not_modified'], 1)
+
+        cached = self.fetcher()
+        self.run_fetch(cached, f'{self.base}/page')
+        self.assertEqual(cached.stats['cache_hits'], 1)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_cache_is_bounded(self):
+        """Test writes beyond max_entries prune the least recently written summaries."""
+        fetcher = self.fetcher(max_entries=3)
+        fetcher.prune_every = 2
+        for i in range(5):
+            fetcher._write_cache(f'{self.base}/page{i}', {'summary': {'title': str(i)}, 'checked_at': time.time()})
+            os.utime(fetcher._cache_path(f'{self.base}/page{i}'), (1000 + i, 1000 + i))
+        stale_tmp = os.path.join(self.temp_dir.name, 'abandoned.json.1.2.tmp')
+        open(stale_tmp, 'w').close()
+        os.utime(stale_tmp, (1000, 1000))
+        self.assertEqual(fetcher.prune(), 2)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)),
+                         sorted(os.path.basename(fetcher._cache_path(f'{self.base}/page{i}')) for i in (2, 3, 4)))
+        self.assertIsNone(fetcher._read_cache(f'{self.base}/page0'))
+        self.assertEqual(fetcher._read_cache(f'{self.base}/page4')['summary']['title'], '4')
+
+    def test_limits(self):
+        """Test the byte limit stops reading and slow pages time out."""
+        fetcher = self.fetcher(max_bytes=4096, timeout=0.3)
+        start = time.perf_counter()
+        summaries = self.run_fetch(fetcher, f'{self.base}/huge', f'{self.base}/slow/2')
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertEqual(summaries[f'{self.base}/huge'], {'title': 'Huge', 'meta': {}, 'headings': [], 'locale': ''})
+        self.assertIsNone(summaries[f'{self.base}/slow/2'])
+        self.assertEqual(fetcher.stats['errors'], 1)
+
+    def test_batch_is_concurrent(self):
+        """Test a batch of slow pages is fetched in parallel within the pool size."""
+        urls = [f'{self.base}/slow/0.2/{i}' for i in range(20)]
+        start = time.perf_counter()
+        summaries = self.run_fetch(self.fetcher(concurrency=10), *urls)
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertTrue(all(summaries[url]['title'] for url in urls))
+
+    def test_private_hosts_refused(self):
+        """Test hosts on non-public addresses are not fetched by default."""
+        summaries = self.run_fetch(self.fetcher(allow_private=False), f'{self.base}/page', 'file:///etc/passwd')
+        self.assertEqual(list(summaries.values()), [None, None])
+        self.assertEqual(self.server.requests, [])
+
+    def resolve_to(self, fetcher, *answers):
+        """Make the fetcher's resolver return each answer in turn (the last one repeats)."""
+        calls = []
+
+        async def resolve(host, port):
+            calls.append(host)
+            return answers[min(len(calls), len(answers)) - 1]
+        fetcher.network_backend.resolve = resolve
+        return calls
+
+    def test_connects_to_resolved_address(self):
+        """Test a connection goes to the address resolved for it, with the original Host header."""
+        fetcher = self.fetcher()
+        calls = self.resolve_to(fetcher, ['127.0.0.1'], ['192.0.2.1'])
+        port = self.server.server_address[1]
+        summaries = self.run_fetch(fetcher, f'http://pages.test:{port}/page')
+        self.assertEqual(summaries[f'http://pages.test:{port}/page']['title'], 'Kauri Organics & Co')
+        self.assertEqual(calls, ['pages.test'])
+        self.assertEqual(self.server.hosts, [f'pages.test:{port}'])
+
+    def test_dns_rebinding_refused(self):
+        """Test a host that resolves to a public address and then a private one is never reached."""
+        port = self.server.server_address[1]
+        fetcher = self.fetcher(allow_private=False, timeout=0.5)
+        self.resolve_to(fetcher, ['93.184.216.34'], ['127.0.0.1'])
+        self.assertEqual(list(self.run_fetch(fetcher, f'http://rebind.test:{port}/page').values()), [None])
+        fetcher = self.fetcher(allow_private=False)
+        self.resolve_to(fetcher, ['93.184.216.34', '127.0.0.1'])
+        self.assertEqual(list(self.run_fetch(fetcher, f'http://mixed.test:{port}/page').values()), [None])
+        self.assertEqual(self.server.requests, [])
+
+    def test_classification_uses_page(self):
+        """Test page keywords inform industry classification."""
+        tool = MarketingGeniusTool()
+        tool.rate_limiter.calls_per_second = float('inf')
+        tool.page_fetcher = self.fetcher()
+        try:
+            self.assertEqual(tool.analyze(f'{self.base}/page')['industry'], 'skincare')
+        finally:
+            tool.page_fetcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+from marketing_genius_tool import MarketingGeniusTool
+from posting_times import PostingTimeRecommender, hour_of_week, to_epoch_seconds
+
+# Wednesday 2024-01-03 18:00 UTC
+WEDNESDAY_6PM = int(datetime(2024, 1, 3, 18, tzinfo=timezone.utc).timestamp())
+WEEK = 7 * 24 * 3600
+
+
+class TestPostingTimes(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.recommender = PostingTimeRecommender()
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "w") as f:
+            f.write("timestamp,channel,client\n")
+            for ts, channel in rows:
+                f.write(f"{ts},{channel},acme\n")
+        return path
+
+    def peak_rows(self, weeks=4):
+        rows = []
+        for week in range(weeks):
+            for minute in range(0, 120, 5):
+                rows.append((WEDNESDAY_6PM + week * WEEK + minute * 60, "Instagram"))
+            rows.append((WEDNESDAY_6PM + week * WEEK - 30 * 3600, "Instagram"))
+        return rows
+
+    def test_hour_of_week(self):
+        """Test Monday 00:00 UTC is bucket 0."""
+        monday = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+        self.assertEqual(hour_of_week(np.array([monday]))[0], 0)
+        self.assertEqual(hour_of_week(np.array([WEDNESDAY_6PM]))[0], 2 * 24 + 18)
+
+    def test_to_epoch_seconds(self):
+        """Test epoch and ISO 8601 inputs."""
+        self.assertEqual(to_epoch_seconds([str(WEDNESDAY_6PM)])[0], WEDNESDAY_6PM)
+        self.assertEqual(to_epoch_seconds(["2024-01-03T18:00:00Z"])[0], WEDNESDAY_6PM)
+        self.assertEqual(to_epoch_seconds(["2024-01-04T07:00:00+13:00"])[0], WEDNESDAY_6PM)
+
+    def test_ingest_csv_in_chunks(self):
+        """Test chunked CSV ingest finds the peak window."""
+        path = self.write_csv("log.csv", self.peak_rows())
+        self.assertEqual(self.recommender.ingest(path, chunk_size=7), 4 * 25)
+        best = self.recommender.top_windows("Instagram", "acme")[0]
+        self.assertEqual((best["day"], best["start"], best["end"]), ("Wednesday", "6pm", "8pm"))
+
+    def test_ingest_jsonl(self):
+        """Test JSONL ingest with ISO timestamps."""
+        path = os.path.join(self.temp_dir.name, "log.jsonl")
+        with open(path, "w") as f:
+            for _ in range(3):
+                f.write(json.dumps({"timestamp": "2024-01-03T18:30:00Z", "channel": "TikTok"}) + "\n")
+        self.assertEqual(self.recommender.ingest(path), 3)
+        self.assertEqual(self.recommender.top_windows("TikTok")[0]["day"], "Wednesday")
+
+    def test_time_zone_rotation(self):
+        """Test windows are reported in local time."""
+        self.recommender.add(np.array([WEDNESDAY_6PM]), "Instagram")
+        # Auckland is on daylight time (UTC+13) in January: Thursday 7am
+        local = self.recommender.histogram("Instagram", tz="Pacific/Auckland")
+        self.assertEqual(int(np.argmax(local)), 3 * 24 + 7)
+
+    def test_daylight_saving(self):
+        """Test each timestamp uses the UTC offset in force when it was posted."""
+        tz = ZoneInfo("America/New_York")
+        posts = [datetime(2024, 1, 3, 18, tzinfo=tz), datetime(2024, 3, 6, 18, tzinfo=tz),
+                 datetime(2024, 3, 13, 18, tzinfo=tz), datetime(2024, 7, 3, 18, tzinfo=tz)]
+        self.recommender.add(np.array([int(post.timestamp()) for post in posts]), "Instagram")
+        local = self.recommender.histogram("Instagram", tz="America/New_York")
+        self.assertEqual(local[2 * 24 + 18], 4)
+        self.assertEqual(self.recommender.top_windows("Instagram", tz="America/New_York")[0]["share"], 1.0)
+
+    def test_daylight_saving_mid_week(self):
+        """Test hours on both sides of a change within one UTC week."""
+        tz = ZoneInfo("America/New_York")
+        # The 2024 change was Sunday 10 March 2am, inside the UTC week starting Monday 4 March
+        posts = [datetime(2024, 3, 9, 12, tzinfo=tz), datetime(2024, 3, 10, 12, tzinfo=tz)]
+        self.recommender.add(np.array([int(post.timestamp()) for post in posts]), "Instagram")
+        local = self.recommender.histogram("Instagram", tz="America/New_York")
+        self.assertEqual(local[5 * 24 + 12], 1)
+        self.assertEqual(local[6 * 24 + 12], 1)
+
+    def test_incremental_ingest(self):
+        """Test re-feeding an appended log only counts new rows."""
+        rows = self.peak_rows(weeks=2)
+        path = self.write_csv("log.csv", rows)
+        first = self.recommender.ingest(path)
+        path = self.write_csv("log.csv", rows + [(WEDNESDAY_6PM + 10 * WEEK, "Instagram")])
+        self.assertEqual(self.recommender.ingest(path), 1)
+        self.assertEqual(self.recommender.histogram("Instagram").sum(), first + 1)
+
+    def test_incremental_ingest_out_of_order(self):
+        """Test appended rows older than earlier ones are still counted, exactly once."""
+        rows = self.peak_rows(weeks=2)
+        path = self.write_csv("log.csv", rows)
+        first = self.recommender.ingest(path)
+        late = [(WEDNESDAY_6PM - 3 * WEEK, "Instagram"), (WEDNESDAY_6PM + 60, "Instagram")]
+        path = self.write_csv("log.csv", rows + late)
+        self.assertEqual(self.recommender.ingest(path), 2)
+        self.assertEqual(self.recommender.ingest(path), 0)
+        self.assertEqual(self.recommender.histogram("Instagram").sum(), first + 2)
+
+    def test_failed_ingest_counts_nothing(self):
+        """Test a log that fails partway leaves the counts and read position unchanged."""
+        rows = self.peak_rows(weeks=2)
+        path = self.write_csv("log.csv", rows + [("not a time", "Instagram")])
+        with self.assertRaises(ValueError):
+            self.recommender.ingest(path, chunk_size=7)
+        self.assertEqual(self.recommender.histogram("Instagram").sum(), 0)
+        self.assertEqual(self.recommender.sources, {})
+        path = self.write_csv("log.csv", rows)
+        self.assertEqual(self.recommender.ingest(path, chunk_size=7), len(rows))
+        self.assertEqual(self.recommender.histogram("Instagram").sum(), len(rows))
+
+    def test_rewritten_log_is_read_again(self):
+        """Test a log replaced by a different file is read from the start."""
+        path = self.write_csv("log.csv", self.peak_rows(weeks=2))
+        self.recommender.ingest(path)
+        path = self.write_csv("log.csv", [(WEDNESDAY_6PM + 10 * WEEK, "Instagram")])
+        self.assertEqual(self.recommender.ingest(path), 1)
+
+    def test_save_and_load(self):
+        """Test histograms survive a save/load round trip."""
+        self.recommender.ingest(self.write_csv("log.csv", self.peak_rows()))
+        store = os.path.join(self.temp_dir.name, "hist.npz")
+        self.recommender.save(store)
+        loaded = PostingTimeRecommender.load(store)
+        np.testing.assert_array_equal(loaded.histogram("Instagram"), self.recommender.histogram("Instagram"))
+        self.assertEqual(loaded.sources, self.recommender.sources)
+        np.testing.assert_array_equal(loaded.histogram("Instagram", tz="America/New_York"),
+                                      self.recommender.histogram("Instagram", tz="America/New_York"))
+        self.assertEqual(loaded.ingest(os.path.join(self.temp_dir.name, "log.csv")), 0)
+
+    def test_schedule_campaign(self):
+        """Test schedule_campaign uses engagement history when available."""
+        tool = MarketingGeniusTool()
+        campaign = {"channels": ["Instagram"]}
+        self.assertEqual(tool.schedule_campaign(campaign)["best_days"], ["Tuesday", "Thursday"])
+
+        self.recommender.ingest(self.write_csv("log.csv", self.peak_rows()))
+        tool.posting_times = self.recommender
+        schedule = tool.schedule_campaign(campaign, client="acme")
+        self.assertEqual(schedule["best_days"][0], "Wednesday")
+        self.assertEqual(schedule["best_hours"][0], "6pm-8pm")
+        self.assertIn("Instagram", schedule["windows"])
+
+if __name__ == '__main__':
+    unittest.main()
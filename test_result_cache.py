@@ -0,0 +1,106 @@
+import unittest
+import os
+import tempfile
+import time
+from result_cache import ResultCache, canonical_url, make_key
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache.db")
+        self.cache = ResultCache(self.path, ttl=60, max_entries=3)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def test_canonical_url(self):
+        """Test URL canonicalization."""
+        expected = "https://organicskincare.co.nz/products?a=1&b=2"
+        self.assertEqual(canonical_url("HTTPS://www.OrganicSkincare.co.nz:443/products/?b=2&a=1#top"), expected)
+        self.assertEqual(canonical_url("https://organicskincare.co.nz/products?a=1&b=2"), expected)
+        self.assertNotEqual(canonical_url("https://example.com:8443/"), canonical_url("https://example.com/"))
+
+    def test_make_key(self):
+        """Test keys separate size buckets and config versions."""
+        url = "https://www.example.com/shop"
+        self.assertEqual(make_key(url, "small", "v1"), make_key("https://example.com/shop/", "small", "v1"))
+        self.assertNotEqual(make_key(url, "small", "v1"), make_key(url, "large", "v1"))
+        self.assertNotEqual(make_key(url, "small", "v1"), make_key(url, "small", "v2"))
+
+    def test_get_or_compute(self):
+        """Test a second lookup is served from the cache."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"industry": "tech", "age_range": (18, 45)}
+
+        first, hit = self.cache.get_or_compute("k", compute)
+        self.assertFalse(hit)
+        second, hit = self.cache.get_or_compute("k", compute)
+        self.assertTrue(hit)
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_shared_between_instances(self):
+        """Test a second process-level instance sees the same entries."""
+        self.cache.set("k", {"value": 1}, compute_seconds=0.5)
+        other = ResultCache(self.path)
+        self.assertEqual(other.get("k"), {"value": 1})
+        other.flush()
+        self.assertEqual(self.cache.stats()["saved_compute_seconds"], 0.5)
+
+    def test_ttl(self):
+        """Test entries expire."""
+        cache = ResultCache(self.path, ttl=0.05)
+        cache.set("k", {"value": 1})
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("k"))
+
+    def test_eviction(self):
+        """Test least recently used entries are evicted beyond max_entries."""
+        for i in range(5):
+            self.cache.set(f"k{i}", i)
+        # Age every entry past the last_access refresh threshold
+        self.cache._connection().execute("UPDATE entries SET last_access = last_access - 10")
+        self.cache.get("k0")
+        self.cache.evict()
+        self.assertEqual(self.cache.stats()["entries"], 3)
+        self.assertEqual(self.cache.get("k0"), 0)
+        self.assertIsNone(self.cache.get("k1"))
+
+    def test_hits_are_reads(self):
+        """Test hits leave the database alone until counts are flushed or last_access is stale."""
+        self.cache.set("k", 1)
+        conn = self.cache._connection()
+        last_access = conn.execute("SELECT last_access FROM entries").fetchone()[0]
+        for _ in range(10):
+            self.cache.get("k")
+        self.cache.get("missing")
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM stats").fetchone()[0], 0)
+        self.assertEqual(conn.execute("SELECT last_access FROM entries").fetchone()[0], last_access)
+        self.assertEqual(ResultCache(self.path).stats()["hits"], 0)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (10, 1))
+        self.assertEqual(ResultCache(self.path).stats()["hits"], 10)
+
+        conn.execute("UPDATE entries SET last_access = last_access - 10")
+        self.cache.get("k")
+        self.assertGreater(conn.execute("SELECT last_access FROM entries").fetchone()[0], last_access)
+
+    def test_flush_interval(self):
+        """Test counts reach the shared stats on their own once flush_interval has passed."""
+        self.cache.flush_interval = 0
+        self.cache.get("missing")
+        self.assertEqual(ResultCache(self.path).stats()["misses"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from marketing_genius_tool import MarketingGeniusTool
+from roi_analytics import RoiStore, roi_metrics, to_day
+
+RECORDS = [
+    {"date": "2024-01-01", "channel": "Google", "campaign": "spring", "spend": 100, "conversions": 10, "revenue": 300},
+    {"date": "2024-01-01", "channel": "Facebook", "campaign": "spring", "spend": 50, "conversions": 0, "revenue": 0},
+    {"date": "2024-01-02", "channel": "Google", "campaign": "summer", "spend": 100, "conversions": 5,
+     "revenue_per_conversion": 20},
+    {"date": "2024-01-03", "channel": "Facebook", "campaign": "summer", "spend": 0, "conversions": 2, "revenue": 40},
+]
+
+
+class TestRoiAnalytics(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = RoiStore(self.temp_dir.name)
+        self.store.append(RECORDS)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def test_roi_metrics(self):
+        """Test ratios and zero denominators."""
+        metrics = roi_metrics([100, 0], [10, 0], [300, 50])
+        self.assertEqual(metrics["ROAS"].tolist(), [3.0, 0.0])
+        self.assertEqual(metrics["ROI"].tolist(), [2.0, 0.0])
+        self.assertEqual(metrics["CPA"].tolist(), [10.0, 0.0])
+
+    def test_group_by_channel(self):
+        """Test grouped totals and metrics."""
+        rows = {row["channel"]: row for row in self.store.query(["channel"])}
+        self.assertEqual(rows["Google"]["spend"], 200)
+        self.assertEqual(rows["Google"]["conversions"], 15)
+        self.assertEqual(rows["Google"]["revenue"], 400)
+        self.assertEqual(rows["Google"]["ROAS"], 2.0)
+        self.assertEqual(rows["Google"]["CPA"], 13.33)
+        self.assertEqual(rows["Facebook"]["ROAS"], 0.8)
+
+    def test_group_by_campaign_and_day(self):
+        """Test multi-key grouping only returns groups with rows."""
+        rows = self.store.query(["campaign", "day"])
+        self.assertEqual([(r["campaign"], r["day"]) for r in rows],
+                         [("spring", "2024-01-01"), ("summer", "2024-01-02"), ("summer", "2024-01-03")])
+        self.assertEqual(rows[0]["spend"], 150)
+
+    def test_filters(self):
+        """Test day range and channel filters."""
+        self.assertEqual(self.store.totals(start="2024-01-02")["spend"], 100)
+        self.assertEqual(self.store.totals(channel="Facebook", end="2024-01-01")["spend"], 50)
+        self.assertEqual(self.store.totals(channel="Unknown")["spend"], 0.0)
+        with self.assertRaises(ValueError):
+            self.store.query(["week"])
+
+    def test_reopen_memory_mapped(self):
+        """Test a reopened store reads the same columns through memmap."""
+        store = RoiStore(self.temp_dir.name)
+        self.assertEqual(len(store), 4)
+        self.assertIsInstance(store.columns()["spend"], np.memmap)
+        self.assertEqual(store.query(["channel"]), self.store.query(["channel"]))
+        store.append([{"date": "2024-01-04", "channel": "TikTok", "spend": 10, "conversions": 1, "revenue": 30}])
+        self.assertEqual(RoiStore(self.temp_dir.name).totals(channel="TikTok")["ROAS"], 3.0)
+
+    def test_ingest_csv(self):
+        """Test chunked CSV ingest."""
+        path = os.path.join(self.temp_dir.name, "records.csv")
+        with open(path, "w") as f:
+            f.write("date,channel,campaign,spend,conversions,revenue\n")
+            for day in range(1, 11):
+                f.write(f"2024-02-{day:02d},Google,winter,10,1,25\n")
+        store = RoiStore(os.path.join(self.temp_dir.name, "csv_store"))
+        self.assertEqual(store.ingest(path, chunk_size=3), 10)
+        self.assertEqual(len(store.query(["day"])), 10)
+        self.assertEqual(store.totals()["ROAS"], 2.5)
+
+    def test_to_day(self):
+        """Test date parsing."""
+        self.assertEqual(to_day("1970-01-02"), 1)
+        self.assertEqual(to_day("2024-01-01T23:00:00Z"), to_day("2024-01-01"))
+        self.assertEqual(to_day(86400 * 3), 3)
+        self.assertEqual(to_day(np.datetime64("1970-01-04")), 3)
+
+    def test_numeric_dates_are_epoch_seconds(self):
+        """Test integer dates from JSONL are read as epoch seconds and impossible days are refused."""
+        store = RoiStore(os.path.join(self.temp_dir.name, "numeric"))
+        store.append([{"date": 1704067200, "channel": "Google", "spend": 5}])
+        self.assertEqual([r["day"] for r in store.query(["day"])], ["2024-01-01"])
+        with self.assertRaises(ValueError):
+            store.append_columns(np.array([10 ** 7], dtype="datetime64[D]"), ["Google"], [""], [1], [0], [0])
+        store.append_columns(np.array(["2024-01-02"], dtype="datetime64[D]"), ["Google"], [""], [1], [0], [0])
+        self.assertEqual(len(store.query(["day"])), 2)
+
+    def test_dashboard_views(self):
+        """Test roi_dashboard and roi_report format store metrics."""
+        tool = MarketingGeniusTool()
+        self.assertEqual(tool.roi_dashboard(spend=100, conversions=10, revenue_per_conversion=20)["ROAS"], 2.0)
+        self.assertEqual(tool.roi_report(["channel"]), [])
+        tool.roi_store = self.store
+        report = {row["channel"]: row for row in tool.roi_report(["channel"])}
+        self.assertEqual(report["Google"]["Spend"], "$200.0")
+        self.assertEqual(report["Google"]["ROAS"], 2.0)
+        self.assertEqual(report["Google"]["CPA"], "$13.33")
+
+    def test_dashboard_uses_history(self):
+        """Test roi_dashboard reports store totals instead of example figures once history exists."""
+        tool = MarketingGeniusTool()
+        tool.rate_limiter.calls_per_second = float("inf")
+        self.assertEqual(tool.roi_dashboard()["source"], "example")
+        tool.roi_store = self.store
+        totals = self.store.totals()
+        roi = tool.analyze("https://www.example.com/skincare")["roi"]
+        self.assertEqual(roi["source"], "history")
+        self.assertEqual(roi["Spend"], f"${totals['spend']}")
+        self.assertEqual(roi["ROAS"], totals["ROAS"])
+        self.assertEqual(tool.roi_dashboard(spend=1, conversions=1, revenue_per_conversion=1)["source"], "history")
+        self.assertEqual(tool.roi_dashboard(channel="Google")["Spend"], "$200.0")
+        self.assertEqual(tool.roi_dashboard(channel="Nowhere", spend=100, conversions=10,
+                                            revenue_per_conversion=20)["source"], "input")
+
+if __name__ == '__main__':
+    unittest.main()
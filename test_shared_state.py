@@ -0,0 +1,88 @@
+import unittest
+import multiprocessing
+import os
+import tempfile
+import time
+from shared_state import SharedCounters
+
+
+def _increment_worker(path, n):
+    counters = SharedCounters(path)
+    for _ in range(n):
+        counters.increment("hits")
+
+
+def _trial_worker(path, attempts, results):
+    counters = SharedCounters(path)
+    granted = sum(1 for _ in range(attempts) if counters.increment_if_below("trial", 3) is not None)
+    results.put(granted)
+
+
+class TestSharedCounters(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "counters.db")
+        self.counters = SharedCounters(self.path)
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def test_increment(self):
+        """Test basic increments."""
+        self.assertEqual(self.counters.increment("a"), 1)
+        self.assertEqual(self.counters.increment("a", 4), 5)
+        self.assertEqual(self.counters.get("a"), 5)
+        self.assertEqual(self.counters.get("missing"), 0)
+
+        self.counters.reset("a")
+        self.assertEqual(self.counters.get("a"), 0)
+
+    def test_increment_if_below(self):
+        """Test capped increments."""
+        results = [self.counters.increment_if_below("trial", 3) for _ in range(5)]
+        self.assertEqual(results, [1, 2, 3, None, None])
+        self.assertIsNone(self.counters.increment_if_below("other", 0))
+
+    def test_ttl_expiry(self):
+        """Test counters reset after their TTL."""
+        self.counters.increment("windowed", ttl=0.05)
+        self.assertEqual(self.counters.increment("windowed", ttl=0.05), 2)
+        time.sleep(0.1)
+        self.assertEqual(self.counters.get("windowed"), 0)
+        self.assertEqual(self.counters.increment("windowed", ttl=0.05), 1)
+
+    def test_hit_window(self):
+        """Test fixed-window rate limiting."""
+        allowed = [self.counters.hit_window("client", 2, window=60) for _ in range(3)]
+        self.assertEqual(allowed, [True, True, False])
+
+    def test_cross_process_increments(self):
+        """Test that increments from several processes are not lost."""
+        workers = [
+            multiprocessing.Process(target=_increment_worker, args=(self.path, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.counters.get("hits"), 200)
+
+    def test_cross_process_limit(self):
+        """Test that a limit is enforced across processes."""
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_trial_worker, args=(self.path, 5, results))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        granted = sum(results.get() for _ in workers)
+        self.assertEqual(granted, 3)
+
+if __name__ == '__main__':
+    unittest.main()
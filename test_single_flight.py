@@ -0,0 +1,78 @@
+import unittest
+import threading
+import time
+from single_flight import SingleFlight, SingleFlightTimeout
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.flight = SingleFlight()
+
+    def run_concurrently(self, n, target):
+        threads = [threading.Thread(target=target) for _ in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_calls_coalesce(self):
+        """Test concurrent identical calls run the function once."""
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"industry": "tech"}
+
+        def caller():
+            results.append(self.flight.do("key", compute, timeout=5))
+
+        self.run_concurrently(8, caller)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result == {"industry": "tech"} for result, _ in results))
+        self.assertEqual(sum(1 for _, shared in results if not shared), 1)
+        self.assertEqual(self.flight.stats(), {"executed": 1, "coalesced": 7, "in_flight": 0})
+
+    def test_sequential_calls_recompute(self):
+        """Test nothing is kept once a call finishes."""
+        self.assertEqual(self.flight.do("key", lambda: 1), (1, False))
+        self.assertEqual(self.flight.do("key", lambda: 2), (2, False))
+
+    def test_error_shared_with_waiters(self):
+        """Test waiters receive the leader's exception."""
+        errors = []
+
+        def compute():
+            time.sleep(0.2)
+            raise ValueError("boom")
+
+        def caller():
+            try:
+                self.flight.do("key", compute, timeout=5)
+            except ValueError as e:
+                errors.append(e)
+
+        self.run_concurrently(4, caller)
+        self.assertEqual(len(errors), 4)
+
+    def test_waiter_timeout(self):
+        """Test waiters give up after the timeout."""
+        started = threading.Event()
+
+        def compute():
+            started.set()
+            time.sleep(0.3)
+            return 1
+
+        leader = threading.Thread(target=self.flight.do, args=("key", compute))
+        leader.start()
+        started.wait()
+        with self.assertRaises(SingleFlightTimeout):
+            self.flight.do("key", compute, timeout=0.05)
+        leader.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from marketing_genius_tool import MarketingGeniusTool
+from social_copy import SocialCopyFitter, fit_text
+
+
+class TestSocialCopyFitter(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.tool = MarketingGeniusTool()
+        self.fitter = self.tool.social_copy
+
+    def test_fit_text(self):
+        """Test truncation and hashtag fitting."""
+        self.assertEqual(fit_text("short post", 20, ["#a", "#bb"]), "short post #a #bb")
+        self.assertEqual(fit_text("short post", 14, ["#a", "#bb"]), "short post #a")
+        truncated = fit_text("one two three four five", 12)
+        self.assertEqual(truncated, "one two…")
+        self.assertLessEqual(len(truncated), 12)
+
+    def test_posts_respect_platform_limits(self):
+        """Test every platform's posts stay within max_length."""
+        industry = "artisanal sustainable handcrafted furniture restoration"
+        ideas = self.tool.generate_social_post_ideas(industry)
+        self.assertEqual(set(ideas), set(self.tool.social_platforms))
+        for platform, posts in ideas.items():
+            limit = self.tool.social_platforms[platform]["max_length"]
+            for post in posts:
+                self.assertLessEqual(len(post), limit, f"{platform}: {post}")
+
+    def test_hashtags_only_where_allowed(self):
+        """Test hashtags follow the platform config."""
+        ideas = self.tool.generate_social_post_ideas("skincare")
+        self.assertIn("#skincare", ideas["Instagram"][0])
+        self.assertIn("#organic", ideas["Instagram"][0])
+        self.assertNotIn("#", ideas["LinkedIn"][0])
+        self.assertNotIn("#", ideas["Google"][0])
+
+    def test_memoized_per_industry(self):
+        """Test posts are built once per industry."""
+        self.assertIs(self.fitter.posts_for("tech"), self.fitter.posts_for("tech"))
+        ideas = self.tool.generate_social_post_ideas("tech")
+        ideas["Twitter"].append("mutated")
+        self.assertNotIn("mutated", self.tool.generate_social_post_ideas("tech")["Twitter"])
+
+    def test_fit_many(self):
+        """Test batch fitting across many industries."""
+        fitter = SocialCopyFitter({"Tiny": {"max_length": 40, "hashtags": True}})
+        industries = [f"industry{i}" for i in range(2000)]
+        posts = fitter.fit_many(industries)
+        self.assertEqual(len(posts), 2000)
+        self.assertTrue(all(len(post) <= 40 for by_platform in posts.values() for post in by_platform["Tiny"]))
+
+if __name__ == '__main__':
+    unittest.main()
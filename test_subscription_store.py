@@ -0,0 +1,95 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
+from datetime import datetime, timedelta
+from subscription_store import StaleSubscription, SubscriptionStore
+
+
+class TestSubscriptionStore(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.subscriptions = SubscriptionStore()
+
+    def test_dict_round_trip(self):
+        """Test rows read back exactly like the dicts they were set from."""
+        fields = {'is_active': True, 'is_trial': True, 'trial_end': '2099-01-01T00:00:00'}
+        self.subscriptions['a@example.com'] = fields
+        self.assertIn('a@example.com', self.subscriptions)
+        self.assertEqual(dict(self.subscriptions['a@example.com']), fields)
+        self.assertIsNone(self.subscriptions['a@example.com'].get('analysis_count'))
+        self.assertIsNone(self.subscriptions.get('missing@example.com'))
+        with self.assertRaises(KeyError):
+            self.subscriptions['a@example.com']['subscription_id']
+
+    def test_views_write_through(self):
+        """Test item assignment and update on a view change the stored row."""
+        self.subscriptions['a@example.com'] = {'is_active': True, 'is_trial': True,
+                                               'trial_end': datetime.now() + timedelta(days=7)}
+        subscription = self.subscriptions['a@example.com']
+        subscription['analysis_count'] = 2
+        subscription.update({'is_active': False, 'is_trial': False, 'trial_end': None, 'plan': 'monthly'})
+        self.assertEqual(dict(self.subscriptions['a@example.com']), {
+            'is_active': False, 'is_trial': False, 'trial_end': None, 'analysis_count': 2, 'plan': 'monthly'})
+
+    def test_trial_end_epoch(self):
+        """Test trial ends are kept as epoch seconds."""
+        trial_end = datetime.now() + timedelta(days=7)
+        self.subscriptions['a@example.com'] = {'is_trial': True, 'trial_end': trial_end.isoformat()}
+        subscription = self.subscriptions['a@example.com']
+        self.assertAlmostEqual(subscription.trial_end_epoch, trial_end.timestamp(), places=3)
+        self.assertGreater(subscription.trial_end_epoch, time.time())
+        subscription['trial_end'] = None
+        self.assertTrue(math.isnan(subscription.trial_end_epoch))
+
+    def test_subscription_id_index(self):
+        """Test rows can be found by PayPal subscription id."""
+        self.subscriptions['a@example.com'] = {'is_active': False, 'subscription_id': 'I-1'}
+        self.subscriptions['b@example.com'] = {'is_active': False}
+        self.assertEqual(self.subscriptions.email_for_subscription_id('I-1'), 'a@example.com')
+        self.subscriptions['a@example.com']['subscription_id'] = 'I-2'
+        self.assertIsNone(self.subscriptions.email_for_subscription_id('I-1'))
+        self.assertEqual(self.subscriptions.email_for_subscription_id('I-2'), 'a@example.com')
+        del self.subscriptions['a@example.com']
+        self.assertIsNone(self.subscriptions.email_for_subscription_id('I-2'))
+
+    def test_rows_are_reused(self):
+        """Test removed rows are recycled and start empty."""
+        for i in range(10):
+            self.subscriptions[f'{i}@example.com'] = {'is_active': True, 'analysis_count': i}
+        self.subscriptions.pop('3@example.com')
+        self.subscriptions['new@example.com'] = {'is_trial': True}
+        self.assertEqual(len(self.subscriptions), 10)
+        self.assertEqual(self.subscriptions.memory_usage()['rows'], 10)
+        self.assertEqual(dict(self.subscriptions['new@example.com']), {'is_trial': True})
+        self.assertEqual(self.subscriptions['9@example.com']['analysis_count'], 9)
+        self.assertEqual(sorted(self.subscriptions)[0], '0@example.com')
+
+    def test_views_do_not_outlive_their_row(self):
+        """Test a view kept across a delete cannot touch the subscriber who reuses the row."""
+        self.subscriptions['old@example.com'] = {'is_active': True}
+        stale = self.subscriptions['old@example.com']
+        del self.subscriptions['old@example.com']
+        self.subscriptions['new@example.com'] = {'is_active': False}
+        with self.assertRaises(StaleSubscription):
+            stale['is_active'] = True
+        with self.assertRaises(StaleSubscription):
+            stale['is_active']
+        self.assertEqual(dict(self.subscriptions['new@example.com']), {'is_active': False})
+
+    def test_concurrent_flag_updates(self):
+        """Test updates to different flags of one row do not overwrite each other."""
+        self.subscriptions['a@example.com'] = {}
+        subscription = self.subscriptions['a@example.com']
+
+        def toggle(key):
+            for i in range(2000):
+                subscription[key] = i % 2 == 0
+            subscription[key] = True
+        with ThreadPoolExecutor(2) as pool:
+            list(pool.map(toggle, ['is_active', 'is_trial']))
+        self.assertEqual(dict(subscription), {'is_active': True, 'is_trial': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import glob
+import json
+import os
+import tempfile
+from unittest import mock
+import tool_snapshot
+from marketing_genius_tool import MarketingGeniusTool
+
+
+class TestToolSnapshot(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.snapshot_dir = os.path.join(self.temp_dir.name, 'snapshots')
+        self.config_path = os.path.join(self.temp_dir.name, 'config.json')
+        self.write_config('Bake daily.')
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def write_config(self, strategy):
+        with open(self.config_path, 'w') as f:
+            json.dump({"industry_map": {"bakery": {"channels": ["Instagram"], "interests": ["bread"],
+                                                   "strategy": strategy}}}, f)
+
+    def tool(self):
+        return MarketingGeniusTool(self.config_path, snapshot_dir=self.snapshot_dir)
+
+    def snapshots(self):
+        return glob.glob(os.path.join(self.snapshot_dir, '*.pickle'))
+
+    def test_loaded_state_matches_built(self):
+        """Test a second start loads the snapshot and behaves like a fresh build."""
+        built = self.tool()
+        loaded = self.tool()
+        self.assertEqual((built.snapshot, loaded.snapshot), ('rebuilt', 'loaded'))
+        self.assertEqual(loaded.startup['snapshot'], 'loaded')
+        for tool in (built, loaded):
+            self.assertEqual(tool.suggest_marketing_strategy('bakery', 'small'),
+                             MarketingGeniusTool(self.config_path).suggest_marketing_strategy('bakery', 'small'))
+        self.assertEqual(loaded.generate_social_post_ideas('bakery'), built.generate_social_post_ideas('bakery'))
+        self.assertEqual(loaded.industry_classifier.top_k(['bread']), [('bakery', 1.0)])
+        with self.assertRaises(TypeError):
+            loaded.suggest_audience('bakery')['channels'] = []
+
+    def test_stale_snapshots_are_rebuilt(self):
+        """Test a config or code change builds a new snapshot and prunes the old one."""
+        self.tool()
+        first = self.snapshots()
+        self.write_config('Bake twice a day.')
+        tool = self.tool()
+        self.assertEqual(tool.snapshot, 'rebuilt')
+        self.assertTrue(tool.suggest_marketing_strategy('bakery', 'small').startswith('Bake twice a day.'))
+        self.assertEqual(len(self.snapshots()), 1)
+        self.assertNotEqual(self.snapshots(), first)
+        with mock.patch.object(tool_snapshot, '_code_version', 'different-code'):
+            self.assertEqual(self.tool().snapshot, 'rebuilt')
+        self.assertEqual(self.tool().snapshot, 'rebuilt')
+
+    def test_corrupt_snapshot(self):
+        """Test an unreadable snapshot is ignored and replaced."""
+        self.tool()
+        with open(self.snapshots()[0], 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertEqual(self.tool().snapshot, 'rebuilt')
+        self.assertEqual(self.tool().snapshot, 'loaded')
+
+    def test_unsigned_snapshot_is_not_unpickled(self):
+        """Test a planted pickle without a valid signature is never loaded."""
+        self.tool()
+        path = self.snapshots()[0]
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 32 + data[32:])
+        with mock.patch.object(tool_snapshot.pickle, 'loads') as loads:
+            self.assertEqual(self.tool().snapshot, 'rebuilt')
+        loads.assert_not_called()
+        with mock.patch.dict(os.environ, {'TOOL_SNAPSHOT_KEY': 'another-key'}):
+            self.assertEqual(self.tool().snapshot, 'rebuilt')
+
+    def test_shared_directory_is_refused(self):
+        """Test a group or world writable snapshot directory is not used."""
+        self.tool()
+        os.chmod(self.snapshot_dir, 0o777)
+        self.assertEqual(self.tool().snapshot, 'off')
+        os.chmod(self.snapshot_dir, 0o700)
+        self.assertEqual(self.tool().snapshot, 'loaded')
+
+    def test_disabled(self):
+        """Test no snapshot is written without a snapshot directory."""
+        self.assertEqual(MarketingGeniusTool(self.config_path).snapshot, 'off')
+        self.assertFalse(os.path.exists(self.snapshot_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
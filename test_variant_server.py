@@ -0,0 +1,158 @@
+import unittest
+from unittest import mock
+import os
+import sqlite3
+import tempfile
+
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp())
+
+import index
+from variant_server import VariantCounts, VariantServer
+
+
+class TestVariantServer(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.counts = VariantCounts(os.path.join(self.temp_dir.name, 'ab.db'))
+
+    def tearDown(self):
+        """Clean up after tests."""
+        self.temp_dir.cleanup()
+
+    def server(self, **kwargs):
+        kwargs.setdefault('flush_interval', 3600)
+        kwargs.setdefault('experiments', ['exp', 'headline', 'cta'])
+        return VariantServer(self.counts, seed=1, **kwargs)
+
+    def test_traffic_shifts_to_best_variant(self):
+        """Test Thompson sampling sends most impressions to the variant with the best CTR."""
+        server = self.server()
+        rates = [0.02, 0.10, 0.04]
+        for i in range(3000):
+            variant = server.select('headline', 3)
+            # Deterministic clicks at each variant's rate
+            if int((i + 1) * rates[variant]) > int(i * rates[variant]):
+                server.record('headline', variant, clicks=1)
+        impressions = [row['impressions'] for row in server.summary('headline')]
+        self.assertEqual(sum(impressions), 3000)
+        self.assertEqual(impressions.index(max(impressions)), 1)
+        self.assertGreater(impressions[1], 1500)
+
+    def test_counters_are_flushed_in_batches(self):
+        """Test updates reach the durable store once per batch and survive a new server."""
+        server = self.server(flush_every=100)
+        with mock.patch.object(self.counts, 'add', wraps=self.counts.add) as add:
+            for _ in range(250):
+                server.select('cta', 2)
+            self.assertEqual(add.call_count, 2)
+            server.record('cta', 0, clicks=3, conversions=1)
+            server.flush()
+            self.assertEqual(add.call_count, 3)
+        stored = self.counts.load('cta')
+        self.assertEqual(sum(row[0] for row in stored.values()), 250)
+        self.assertEqual(stored[0][1:], [3, 1])
+
+        restarted = self.server()
+        self.assertEqual([row['impressions'] for row in restarted.summary('cta')],
+                         [row['impressions'] for row in server.summary('cta')])
+
+    def test_failed_flush_is_not_counted_twice(self):
+        """Test a flush failing partway commits nothing, so the retried batch counts once."""
+        conn = self.counts._connection()
+        conn.execute("CREATE TRIGGER fail BEFORE INSERT ON ab_counts WHEN NEW.variant = 1 "
+                     "BEGIN SELECT RAISE(ABORT, 'database is locked'); END")
+        deltas = {('exp', 0): [1, 1, 0], ('exp', 1): [1, 0, 0]}
+        with self.assertRaises(sqlite3.DatabaseError):
+            self.counts.add(deltas)
+        self.assertEqual(self.counts.load('exp'), {})
+        conn.execute('DROP TRIGGER fail')
+        self.counts.add(deltas)
+        self.assertEqual(self.counts.load('exp'), {0: [1, 1, 0], 1: [1, 0, 0]})
+
+    def test_workers_share_totals(self):
+        """Test a flush picks up counts flushed by other workers."""
+        first, second = self.server(), self.server()
+        first.select('exp', 2)
+        second.select('exp', 2)
+        first.flush()
+        second.flush()
+        first.select('exp', 2)
+        first.flush()
+        self.assertEqual(sum(row['impressions'] for row in first.summary('exp')), 3)
+
+    def test_rejects_unknown_variants(self):
+        """Test invalid variant counts and unknown variants are rejected."""
+        server = self.server()
+        with self.assertRaises(ValueError):
+            server.select('exp', 0)
+        with self.assertRaises(ValueError):
+            server.record('exp', 0, clicks=1)
+        server.select('exp', 2)
+        with self.assertRaises(ValueError):
+            server.record('exp', 2, clicks=1)
+
+
+class TestVariantRoutes(unittest.TestCase):
+    def setUp(self):
+        """Set up test cases."""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        server = VariantServer(VariantCounts(os.path.join(self.temp_dir.name, 'ab.db')), flush_every=10,
+                               experiments=['home', 'x'])
+        for patch in (mock.patch.object(index, 'ab_server', server),
+                      mock.patch.dict(os.environ, {'EVENTS_TOKEN': 'secret'})):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = index.app.test_client()
+        self.auth = {'Authorization': 'Bearer secret'}
+
+    def test_select_and_record(self):
+        """Test variants are served, results recorded and reported."""
+        options = [{'headline': 'A'}, {'headline': 'B'}]
+        response = self.client.post('/api/ab/select', json={'experiment': 'home', 'variants': options})
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body['selected'], options[body['variant']])
+
+        response = self.client.post('/api/ab/record', json={'experiment': 'home', 'variant': body['variant'],
+                                                            'clicks': 1}, headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        stats = self.client.get('/api/ab/stats?experiment=home').get_json()['variants']
+        self.assertEqual(stats[body['variant']]['clicks'], 1)
+        self.assertEqual(sum(row['impressions'] for row in stats), 1)
+
+    def test_validation(self):
+        """Test malformed requests are rejected."""
+        self.assertEqual(self.client.post('/api/ab/select', json={'variants': 2}).status_code, 400)
+        self.assertEqual(self.client.post('/api/ab/select', json={'experiment': 'x', 'variants': 'two'}).status_code, 400)
+        self.assertEqual(self.client.post('/api/ab/select', json={'experiment': 'x', 'variants': 1000}).status_code, 400)
+        self.assertEqual(self.client.post('/api/ab/record', json={'experiment': 'x', 'variant': 0},
+                                          headers=self.auth).status_code, 400)
+
+    def test_record_needs_events_token(self):
+        """Test clicks and conversions cannot be posted without the events token."""
+        self.client.post('/api/ab/select', json={'experiment': 'home', 'variants': 2})
+        for headers in ({}, {'Authorization': 'Bearer wrong'}):
+            response = self.client.post('/api/ab/record', json={'experiment': 'home', 'variant': 0, 'clicks': 5},
+                                        headers=headers)
+            self.assertEqual(response.status_code, 401)
+        with mock.patch.dict(os.environ, {'EVENTS_TOKEN': ''}):
+            response = self.client.post('/api/ab/record', json={'experiment': 'home', 'variant': 0, 'clicks': 5},
+                                        headers=self.auth)
+            self.assertEqual(response.status_code, 503)
+        stats = self.client.get('/api/ab/stats?experiment=home').get_json()['variants']
+        self.assertEqual(sum(row['clicks'] for row in stats), 0)
+
+    def test_only_registered_experiments(self):
+        """Test select refuses experiments that were not registered and keeps nothing for them."""
+        for i in range(20):
+            response = self.client.post('/api/ab/select', json={'experiment': f'spam-{i}', 'variants': 2})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(index.ab_server._experiments), set())
+        with mock.patch.object(index.ab_server, 'experiments', frozenset()):
+            response = self.client.post('/api/ab/select', json={'experiment': 'home', 'variants': 2})
+            self.assertEqual(response.status_code, 503)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import unittest
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fake_paypal import FakePayPal
+from webhook_verifier import WebhookVerificationError, WebhookVerifier
+
+os.environ.setdefault('SHARED_STATE_DIR', tempfile.mkdtemp())
+
+import index
+
+WEBHOOK_ID = 'WH-TEST'
+EVENT = {'id': 'WH-1', 'event_type': 'BILLING.SUBSCRIPTION.ACTIVATED', 'resource': {'id': 'I-00000042'}}
+
+
+def issue(common_name, issuer=None, ca=None, digital_signature=True):
+    """
+    Certificate and key for common_name, signed by issuer (a (cert, key) pair)
+    or self-signed. ca sets BasicConstraints, None leaves the extension out.
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    issuer_cert, issuer_key = issuer or (None, key)
+    now = datetime.now(timezone.utc)
+    builder = (x509.CertificateBuilder()
+               .subject_name(name).issuer_name(issuer_cert.subject if issuer_cert else name)
+               .public_key(key.public_key()).serial_number(x509.random_serial_number())
+               .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=30))
+               .add_extension(x509.KeyUsage(digital_signature, False, False, False, False, bool(ca), bool(ca),
+                                            False, False), critical=True))
+    if ca is not None:
+        builder = builder.add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+    return builder.sign(issuer_key, hashes.SHA256()), key
+
+
+def pem(*certs):
+    return b''.join(cert.public_bytes(serialization.Encoding.PEM) for cert in certs)
+
+
+class TestWebhookVerifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fake = FakePayPal().start()
+        cls.anchor = x509.load_pem_x509_certificate(cls.fake.ca_pem)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+
+    def setUp(self):
+        """Set up test cases."""
+        self.fake.calls.clear()
+        self.verifier = self.make_verifier([self.anchor])
+
+    def make_verifier(self, anchors):
+        return WebhookVerifier(lambda url: requests.get(url, timeout=5).content, trust_anchors=anchors,
+                               cert_url_prefixes=(self.fake.url + '/',))
+
+    def delivery(self, event=EVENT, webhook_id=WEBHOOK_ID):
+        body = json.dumps(event).encode()
+        return self.fake.webhook_headers(body, webhook_id), body
+
+    def cert_fetches(self):
+        return sum(n for (method, path), n in self.fake.calls.items() if '/certs/' in path)
+
+    def test_verifies_and_parses_body(self):
+        """Test a signed delivery verifies and the event comes from the body."""
+        headers, body = self.delivery()
+        self.assertEqual(self.verifier.verify(headers, body, WEBHOOK_ID), EVENT)
+
+    def test_steady_state_makes_no_calls(self):
+        """Test the certificate is fetched once for many deliveries."""
+        for _ in range(50):
+            self.verifier.verify(*self.delivery(), WEBHOOK_ID)
+        self.assertEqual(self.cert_fetches(), 1)
+        self.assertEqual(sum(self.fake.calls.values()), 1)
+        self.assertEqual(self.verifier.stats()['hits'], 49)
+
+    def test_expired_cache_entry_is_refetched(self):
+        """Test a cached certificate past its expiry is downloaded again."""
+        headers, body = self.delivery()
+        self.verifier.verify(headers, body, WEBHOOK_ID)
+        url = headers['PAYPAL-CERT-URL']
+        cert, _ = self.verifier._certs[url]
+        self.verifier._certs[url] = (cert, datetime.now(timezone.utc) - timedelta(seconds=1))
+        self.verifier.verify(headers, body, WEBHOOK_ID)
+        self.assertEqual(self.cert_fetches(), 2)
+
+    def test_rejects_tampering(self):
+        """Test modified bodies, other webhook ids and bad headers are rejected."""
+        headers, body = self.delivery()
+        with self.assertRaises(WebhookVerificationError):
+            self.verifier.verify(headers, body.replace(b'42', b'43'), WEBHOOK_ID)
+        with self.assertRaises(WebhookVerificationError):
+            self.verifier.verify(headers, body, 'WH-OTHER')
+        with self.assertRaises(WebhookVerificationError):
+            self.verifier.verify(dict(headers, **{'PAYPAL-AUTH-ALGO': 'SHA1withRSA'}), body, WEBHOOK_ID)
+        with self.assertRaises(WebhookVerificationError):
+            self.verifier.verify({}, body, WEBHOOK_ID)
+
+    def test_rejects_untrusted_certificates(self):
+        """Test certificates outside the trust anchors or allowed URLs are refused."""
+        headers, body = self.delivery()
+        with self.assertRaises(WebhookVerificationError):
+            self.make_verifier([]).verify(headers, body, WEBHOOK_ID)
+        with self.assertRaises(WebhookVerificationError):
+            self.verifier.verify(dict(headers, **{'PAYPAL-CERT-URL': 'https://evil.example.com/cert'}), body, WEBHOOK_ID)
+        self.assertEqual(self.cert_fetches(), 1)
+
+    def test_rejects_stale_transmissions(self):
+        """Test deliveries sent more than a few minutes from now are refused before any fetch."""
+        body = json.dumps(EVENT).encode()
+        for minutes in (-10, 10):
+            headers = self.fake.webhook_headers(body, WEBHOOK_ID, datetime.now(timezone.utc) + timedelta(minutes=minutes))
+            with self.assertRaisesRegex(WebhookVerificationError, 'Transmission time'):
+                self.verifier.verify(headers, body, WEBHOOK_ID)
+        with self.assertRaisesRegex(WebhookVerificationError, 'Transmission time'):
+            self.verifier.verify(dict(self.delivery()[0], **{'PAYPAL-TRANSMISSION-TIME': 'yesterday'}), body, WEBHOOK_ID)
+        self.assertEqual(self.cert_fetches(), 0)
+        headers = self.fake.webhook_headers(body, WEBHOOK_ID, datetime.now(timezone.utc) - timedelta(minutes=2))
+        self.assertEqual(self.verifier.verify(headers, body, WEBHOOK_ID), EVENT)
+
+    def test_requires_ca_issuers_and_signing_key(self):
+        """Test chains through non-CA certificates and leaves that may not sign are refused."""
+        root = issue('Root', ca=True)
+        intermediate = issue('Intermediate', root, ca=True)
+        leaf = issue('messageverificationcerts.paypal.com', intermediate, ca=False)
+        not_ca = issue('Not a CA', root, ca=False)
+        no_constraints = issue('No constraints', root)
+        cases = {
+            'good': pem(leaf[0], intermediate[0]),
+            'not-ca': pem(issue('messageverificationcerts.paypal.com', not_ca)[0], not_ca[0]),
+            'no-constraints': pem(issue('messageverificationcerts.paypal.com', no_constraints)[0], no_constraints[0]),
+            'leaf-issued': pem(issue('api.paypal.com', leaf)[0], leaf[0], intermediate[0]),
+            'cannot-sign': pem(issue('messageverificationcerts.paypal.com', intermediate, digital_signature=False)[0],
+                               intermediate[0]),
+        }
+        verifier = WebhookVerifier(lambda url: cases[url.rsplit('/', 1)[1]], trust_anchors=[root[0]],
+                                   cert_url_prefixes=('https://certs/',))
+        self.assertEqual(verifier.certificate('https://certs/good'), leaf[0])
+        for name, message in (('not-ca', 'not a CA'), ('no-constraints', 'not a CA'), ('leaf-issued', 'not a CA'),
+                              ('cannot-sign', 'not allowed to sign')):
+            with self.assertRaisesRegex(WebhookVerificationError, message):
+                verifier.certificate(f'https://certs/{name}')
+
+    def test_webhook_route(self):
+        """Test the route activates subscriptions from the verified body without refetching the event."""
+        email = 'webhook@example.com'
+        index.subscriptions[email] = {'is_active': False, 'subscription_id': 'I-00000042'}
+        client = index.app.test_client()
+        try:
+            with mock.patch.object(index, 'webhook_verifier', self.verifier), \
+                    mock.patch.dict(os.environ, {'PAYPAL_WEBHOOK_ID': WEBHOOK_ID}):
+                headers, body = self.delivery()
+                response = client.post('/api/webhook', data=body, headers=headers, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(index.subscriptions[email]['is_active'])
+                bad = client.post('/api/webhook', data=body, headers=dict(headers, **{'PAYPAL-TRANSMISSION-SIG': 'AAAA'}),
+                                  content_type='application/json')
+                self.assertEqual(bad.status_code, 400)
+            self.assertFalse(any('webhooks-events' in path for _, path in self.fake.calls))
+        finally:
+            index.subscriptions.pop(email, None)
+
+if __name__ == '__main__':
+    unittest.main()